@@ -23,6 +23,20 @@ from utils.global_real_city2graph import global_real_city2graph, get_real_semant
 from services.hybrid_city2graph_service import get_hybrid_service
 from utils.geo_utils import haversine_km
 from services.ortools_monitoring import ortools_monitor, get_monitoring_dashboard, get_benchmark_report
+from utils.ortools_decision_engine import DecisionCache, count_trip_days, get_decision_engine
+from utils.http_client_registry import get_http_registry
+from utils.rate_limiter import get_rate_limiter_stats
+from utils.places_quota_manager import get_quota_manager
+from services.places_prewarm_service import get_prewarm_service
+from utils.geographic_cache_manager import get_cache_manager
+from utils.place_details_cache import get_place_details_cache
+from utils.reverse_geocode_cache import get_reverse_geocode_cache
+from utils.city_resolver import get_city_resolver
+from utils.shared_cache import get_shared_cache_stats
+from utils.intercity_od_table import get_intercity_od_table
+from services.h3_demand_index import get_demand_index
+from services.hotel_index import get_hotel_index
+from utils.place_label_resolver import get_place_name_cache
 
 # Configurar logging optimizado
 logger = setup_production_logging()
@@ -76,6 +90,29 @@ def calculate_real_route(origin_lat: float, origin_lon: float,
 # 🧠 CITY2GRAPH DECISION ALGORITHM - FASE 1 (NO AFECTA ENDPOINTS ACTUALES)
 # ========================================================================
 
+# Cache acotado de decisiones City2Graph + overhead por decisión (p50/p99 µs)
+city2graph_decision_cache = DecisionCache(
+    max_entries=settings.DECISION_CACHE_MAX_ENTRIES,
+    ttl_s=settings.DECISION_CACHE_TTL_S
+)
+
+# ⚡ Decisión precalculada para itinerarios que el score nunca envía a City2Graph
+_TRIVIAL_CITY2GRAPH_DECISION = {
+    "use_city2graph": False,
+    "reason": "trivial_itinerary_fast_path",
+    "complexity_score": 0.0,
+    "factors": {}
+}
+
+def _city2graph_score_upper_bound(places_count: int, trip_days: int) -> float:
+    """Score máximo alcanzable con esta cantidad de lugares y días (factores restantes al tope)"""
+    places_score = min(places_count / settings.CITY2GRAPH_MIN_PLACES, 2.0) * 3
+    duration_score = min(trip_days / settings.CITY2GRAPH_MIN_DAYS, 2.0) * 3
+    multi_city_score = 2.0 if places_count > 1 else 0.0
+    semantic_score = min(places_count / settings.CITY2GRAPH_SEMANTIC_TYPES_THRESHOLD, 1.0)
+    spread_score = 1.0 if places_count > 1 else 0.0
+    return places_score + duration_score + multi_city_score + semantic_score + spread_score
+
 async def should_use_city2graph(request: ItineraryRequest) -> Dict[str, Any]:
     """
     🧠 Algoritmo inteligente para decidir qué optimizador usar
@@ -97,6 +134,28 @@ async def should_use_city2graph(request: ItineraryRequest) -> Dict[str, Any]:
             "factors": {}
         }
     
+    overhead_start = time_module.perf_counter()
+    
+    # ⚡ Fast path: solo si ni con los demás factores al máximo se alcanza el umbral
+    trip_days = count_trip_days(request.start_date, request.end_date)
+    if _city2graph_score_upper_bound(len(request.places), trip_days) < settings.CITY2GRAPH_COMPLEXITY_THRESHOLD:
+        city2graph_decision_cache.record_fast_path()
+        city2graph_decision_cache.record_overhead(overhead_start)
+        return dict(_TRIVIAL_CITY2GRAPH_DECISION)
+    
+    # 🗃️ Cache de decisiones (misma key que el decision engine OR-Tools)
+    decision_engine = await get_decision_engine()
+    cache_key = decision_engine._generate_cache_key({
+        "places": request.places,
+        "start_date": request.start_date,
+        "end_date": request.end_date,
+        "transport_mode": getattr(request.transport_mode, "value", request.transport_mode)
+    })
+    cached_decision = city2graph_decision_cache.get(cache_key)
+    if cached_decision is not None:
+        city2graph_decision_cache.record_overhead(overhead_start)
+        return dict(cached_decision)
+    
     # 📊 Calcular factores de complejidad
     complexity_factors = {}
     
@@ -161,13 +220,16 @@ async def should_use_city2graph(request: ItineraryRequest) -> Dict[str, Any]:
                     "description": "Ciudades detectadas no están en lista habilitada"
                 }
     
-    return {
+    decision = {
         "use_city2graph": use_city2graph,
         "complexity_score": round(total_score, 2),
         "factors": complexity_factors,
         "reasoning": _generate_decision_reasoning(complexity_factors, total_score, use_city2graph),
         "timestamp": datetime.now().isoformat()
     }
+    city2graph_decision_cache.put(cache_key, decision)
+    city2graph_decision_cache.record_overhead(overhead_start)
+    return dict(decision)
 
 def _count_semantic_place_types(places: List[Dict]) -> List[str]:
     """Contar tipos de lugares semánticamente ricos que se benefician de City2Graph"""
@@ -225,22 +287,19 @@ async def _detect_multiple_cities_from_places(places: List[Dict]) -> List[str]:
     except Exception as e:
         logger.warning(f"⚠️ Error en clustering automático, usando método legacy: {e}")
         
-        # Fallback al método anterior
-        cities = set()
+        # Fallback al método anterior: un lugar representativo por celda H3 (misma respuesta)
+        geocode_cache = get_reverse_geocode_cache()
+        representatives = {}
         for place in places:
-            city = await _extract_city_from_place(place)
-            if city:
-                cities.add(city.lower())
+            lat, lon = _place_coordinates(place)
+            key = geocode_cache.cell_for(float(lat), float(lon)) if lat is not None and lon is not None else id(place)
+            representatives.setdefault(key, place)
         
-        return list(cities)
+        detected = await asyncio.gather(*(_extract_city_from_place(p) for p in representatives.values()))
+        return list({city.lower() for city in detected if city})
 
-async def _extract_city_from_place(place: Dict) -> Optional[str]:
-    """Extraer ciudad de un lugar usando reverse geocoding automático"""
-    
-    # Extraer coordenadas del lugar
-    lat = lon = None
-    
-    # Método 1: Coordenadas directas
+def _place_coordinates(place) -> tuple:
+    """(lat, lon) de un lugar dict u objeto; (None, None) si no tiene coordenadas"""
     if isinstance(place, dict):
         lat = place.get('lat')
         lon = place.get('lon')
@@ -248,14 +307,25 @@ async def _extract_city_from_place(place: Dict) -> Optional[str]:
             lat = place.get('latitude')
         if lon is None:
             lon = place.get('longitude')
-    else:
-        lat = getattr(place, 'lat', None)
-        lon = getattr(place, 'lon', None)
+        return lat, lon
+    return getattr(place, 'lat', None), getattr(place, 'lon', None)
+
+async def _extract_city_from_place(place: Dict) -> Optional[str]:
+    """Extraer ciudad de un lugar usando reverse geocoding automático"""
+    
+    # Método 1: Coordenadas directas
+    lat, lon = _place_coordinates(place)
     
     if lat is None or lon is None:
         logger.debug(f"⚠️ No se pudieron extraer coordenadas del lugar")
         return None
     
+    # Método 1b: Límites administrativos offline (sin red)
+    offline_city = get_city_resolver().city_name(float(lat), float(lon))
+    if offline_city:
+        logger.debug(f"🗺️ Ciudad detectada offline: {offline_city} ({lat:.4f}, {lon:.4f})")
+        return offline_city.lower()
+    
     try:
         # Método 2a: Si viene de Google Places, usar Place ID para detalles completos
         google_place_id = None
@@ -521,6 +591,10 @@ async def get_city2graph_stats():
             "complexity_threshold": settings.CITY2GRAPH_COMPLEXITY_THRESHOLD,
             "circuit_breaker_enabled": True
         },
+        "decision_overhead": {
+            "city2graph": city2graph_decision_cache.get_stats(),
+            "ortools": (await get_decision_engine()).decision_cache.get_stats()
+        },
         "next_phase": "Integration Testing & Performance Benchmarks"
     }
 
@@ -571,6 +645,18 @@ async def get_circuit_breaker_status():
 
 # ========================================================================
 
+async def _preload_city_graphs():
+    """Precargar grafos en un hilo aparte (la construcción con OSMnx es bloqueante)"""
+    try:
+        from services.city2graph_service import City2GraphService
+    except ImportError as e:
+        logger.warning(f"⚠️ Precarga de grafos omitida, dependencia no disponible: {e}")
+        return
+    try:
+        await asyncio.to_thread(asyncio.run, City2GraphService().preload_chile_cities())
+    except Exception as e:
+        logger.error(f"❌ Error en la precarga de grafos: {e}")
+
 @app.on_event("startup")
 async def startup_event():
     """Inicializar servicios básicos al startup de la API"""
@@ -578,6 +664,55 @@ async def startup_event():
     logger.info("🚀 API iniciada - Servicio híbrido se cargará on-demand")
     # No cargar el servicio híbrido al startup para mantener inicio rápido
     hybrid_routing_service = None
+    # Pools HTTP compartidos para Google / OSRM / OpenRoute
+    await get_http_registry().start()
+    # Evicción por tamaño del caché de Places (fuera del request path)
+    app.state.places_cache_eviction_task = asyncio.create_task(get_cache_manager().run_eviction_loop())
+    # Índice de demanda H3: restaurar el último snapshot y persistir periódicamente
+    if settings.DEMAND_INDEX_ENABLED:
+        get_demand_index().load_snapshot()
+        app.state.demand_index_snapshot_task = asyncio.create_task(get_demand_index().run_snapshot_loop())
+    # Precarga de grafos de ciudades chilenas (prioridad alta o con demanda en el snapshot restaurado)
+    if settings.GRAPH_PRELOAD_ENABLED:
+        app.state.graph_preload_task = asyncio.create_task(_preload_city_graphs())
+    # Pre-warming del caché de Places en horario valle
+    if settings.PLACES_PREWARM_ENABLED:
+        app.state.places_prewarm_task = asyncio.create_task(get_prewarm_service().run_forever())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Cerrar conexiones HTTP compartidas y tareas de fondo"""
+    for task_name in ("places_prewarm_task", "places_cache_eviction_task", "demand_index_snapshot_task",
+                      "graph_preload_task"):
+        task = getattr(app.state, task_name, None)
+        if task is not None:
+            task.cancel()
+    if settings.DEMAND_INDEX_ENABLED:
+        try:
+            get_demand_index().save_snapshot()
+        except Exception as e:
+            logger.error(f"❌ Error guardando snapshot de demanda: {e}")
+    await get_http_registry().close()
+    # Pool de procesos del solver jerárquico (solo existe si se usó)
+    from services.hierarchical_solver import shutdown_executor
+    await asyncio.to_thread(shutdown_executor)
+
+@app.get("/http/pools")
+async def get_http_pool_metrics():
+    """🌐 Saturación de los pools HTTP por proveedor"""
+    return {
+        **get_http_registry().get_metrics(),
+        "rate_limiters": get_rate_limiter_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/quota/places")
+async def get_places_quota_metrics():
+    """💰 Cuota diaria de Google Places: presupuesto restante y llamadas recortadas por prioridad"""
+    return {
+        **get_quota_manager().get_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
 
 def get_or_initialize_hybrid_service():
     """Obtiene o inicializa el servicio híbrido (lazy loading)"""
@@ -864,6 +999,13 @@ async def get_cache_stats():
         return {
             "success": True,
             "cache_stats": stats,
+            "eviction": stats['cache_storage']['eviction'],
+            "place_details": get_place_details_cache().get_stats(),
+            "reverse_geocode": get_reverse_geocode_cache().get_stats(),
+            "shared_caches": get_shared_cache_stats(),
+            "intercity_od_table": get_intercity_od_table().get_stats(),
+            "hotel_index": get_hotel_index().get_stats(),
+            "place_labels": get_place_name_cache().get_stats(),
             "recommendations": [
                 f"Hit rate actual: {stats['cache_performance']['hit_rate_percentage']}%",
                 f"Costo ahorrado: ${stats['cache_performance']['estimated_cost_saved_usd']:.3f} USD",
@@ -879,6 +1021,31 @@ async def get_cache_stats():
             "cache_stats": None
         }
 
+@app.get("/cache/prewarm", tags=["Cache Management"])
+async def get_prewarm_status(dry_run: bool = False, cities: Optional[str] = None):
+    """🔥 Estado del pre-warming de Places; con dry_run=true estima llamadas y hit rate actual"""
+    prewarm_service = get_prewarm_service()
+    status = prewarm_service.get_status()
+    if dry_run:
+        status["estimate"] = await prewarm_service.run(
+            cities=cities.split(',') if cities else None, dry_run=True
+        )
+    return status
+
+@app.get("/demand/hotspots", tags=["Cache Management"])
+async def get_demand_hotspots(resolution: int = 7, limit: int = 20, metric: Optional[str] = None):
+    """📈 Celdas H3 con más demanda (lugares, tramos de ruteo y búsquedas de Places)"""
+    demand_index = get_demand_index()
+    try:
+        hotspots = demand_index.hot_cells(resolution=resolution, limit=limit, metric=metric)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "hotspots": hotspots,
+        "stats": demand_index.get_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
 @app.post("/cache/clear", tags=["Cache Management"])
 async def clear_cache(older_than_hours: float = 24.0):
     """Limpiar caché manualmente"""
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Generador de la tabla OD intercity (data/intercity_od_table.npz)
+Precalcula distancia y tiempo (auto y bus) entre todos los pares de ciudades:
+- Motor de ruteo local: servidor OSRM car (services/osrm_service.py), una consulta /table
+- Sin OSRM disponible: estimación geodésica con los mismos parámetros que InterCityService
+
+Uso:
+    python generate_intercity_od_table.py                      # Chile + ciudades regionales por defecto
+    python generate_intercity_od_table.py --cities santiago,valparaiso,la_serena
+    python generate_intercity_od_table.py --no-osrm            # Forzar estimación geodésica
+"""
+
+import argparse
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from settings import settings
+from utils.city_resolver import CHILE_BOUNDARIES_PATH, WORLD_CITIES_PATH, city_key
+from utils.geo_utils import haversine_matrix_km
+from utils.intercity_od_table import (
+    SOURCE_ROUTING_ENGINE, SOURCE_GEODESIC_ESTIMATE, save_od_table
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Ciudades fuera de Chile conectadas por carretera (pasos cordilleranos)
+DEFAULT_REGIONAL_CITIES = ('mendoza', 'buenos_aires')
+
+# Estimación sin motor de ruteo (mismos valores que InterCityService)
+ROAD_FACTOR = 1.3
+FALLBACK_SPEED_KMH = 80.0
+
+# Bus interurbano: más lento que el auto + llegada/espera en terminal
+BUS_TIME_FACTOR = 1.2
+BUS_TERMINAL_HOURS = 0.5
+
+def load_candidate_cities() -> Dict[str, Tuple[str, float, float]]:
+    """city_key → (nombre, lat, lon) de todas las localidades con centro conocido"""
+    cities = {}
+    for path in (CHILE_BOUNDARIES_PATH, WORLD_CITIES_PATH):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        for locality in data["localities"]:
+            if locality.get("center"):
+                key = locality.get("key") or city_key(locality["name"])
+                cities[key] = (locality["name"], *locality["center"])
+    return cities
+
+def default_city_keys(candidates: Dict[str, Tuple[str, float, float]]) -> List[str]:
+    with open(CHILE_BOUNDARIES_PATH, encoding="utf-8") as f:
+        chile = json.load(f)
+    keys = [locality.get("key") or city_key(locality["name"]) for locality in chile["localities"]]
+    return keys + [key for key in DEFAULT_REGIONAL_CITIES if key in candidates]
+
+def route_with_osrm(centers: np.ndarray):
+    """Matriz (km, horas) del servidor OSRM local, o None si no responde"""
+    from services.osrm_service import OSRMFactory
+
+    osrm = OSRMFactory.create_car_service()
+    if not osrm.health_check():
+        logger.warning("⚠️ Servidor OSRM local no disponible")
+        return None
+
+    table = osrm.distance_matrix([tuple(center) for center in centers.tolist()])
+    if not table:
+        return None
+    distances = np.array([[np.nan if d is None else d for d in row] for row in table["distances"]], dtype=float)
+    durations = np.array([[np.nan if d is None else d for d in row] for row in table["durations"]], dtype=float)
+    return distances / 1000, durations / 3600
+
+def build_table(keys: List[str], candidates: Dict[str, Tuple[str, float, float]],
+                use_osrm: bool = True) -> Dict:
+    names = [candidates[key][0] for key in keys]
+    centers = np.array([candidates[key][1:] for key in keys], dtype=float)
+
+    drive_km = haversine_matrix_km(centers) * ROAD_FACTOR
+    drive_hours = drive_km / FALLBACK_SPEED_KMH
+    source = np.full(drive_km.shape, SOURCE_GEODESIC_ESTIMATE, dtype=np.uint8)
+    engine = "geodesic_estimate"
+
+    routed = route_with_osrm(centers) if use_osrm else None
+    if routed is not None:
+        osrm_km, osrm_hours = routed
+        ok = ~np.isnan(osrm_km) & ~np.isnan(osrm_hours)
+        drive_km[ok] = osrm_km[ok]
+        drive_hours[ok] = osrm_hours[ok]
+        source[ok] = SOURCE_ROUTING_ENGINE
+        engine = "osrm_car"
+        logger.info(f"🚗 OSRM: {int(ok.sum())}/{ok.size} pares ruteados")
+
+    bus_hours = drive_hours * BUS_TIME_FACTOR + BUS_TERMINAL_HOURS
+    np.fill_diagonal(bus_hours, 0.0)
+
+    return dict(
+        keys=keys, names=names, centers=centers,
+        drive_km=drive_km, drive_hours=drive_hours, bus_hours=bus_hours, source=source,
+        metadata={
+            "version": "1.0",
+            "built_at": datetime.now().isoformat(timespec="seconds"),
+            "engine": engine,
+            "cities": len(keys),
+            "road_factor": ROAD_FACTOR,
+            "fallback_speed_kmh": FALLBACK_SPEED_KMH,
+            "bus_time_factor": BUS_TIME_FACTOR,
+            "bus_terminal_hours": BUS_TERMINAL_HOURS
+        }
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera la tabla OD intercity precalculada")
+    parser.add_argument("--cities", help="city_keys separados por coma (por defecto: Chile + regionales)")
+    parser.add_argument("--output", default=settings.INTERCITY_OD_TABLE_PATH)
+    parser.add_argument("--no-osrm", action="store_true", help="No consultar el servidor OSRM local")
+    args = parser.parse_args()
+
+    candidates = load_candidate_cities()
+    keys = [k.strip() for k in args.cities.split(",")] if args.cities else default_city_keys(candidates)
+    unknown = [key for key in keys if key not in candidates]
+    if unknown:
+        raise SystemExit(f"❌ Ciudades sin centro conocido: {', '.join(unknown)}")
+
+    table = build_table(keys, candidates, use_osrm=not args.no_osrm)
+    output = Path(args.output)
+    save_od_table(output, **table)
+    logger.info(f"✅ Tabla OD guardada: {output} ({len(keys)} ciudades, {output.stat().st_size / 1024:.1f} KB, "
+                f"motor: {table['metadata']['engine']})")
+
+if __name__ == "__main__":
+    main()
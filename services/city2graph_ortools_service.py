@@ -22,6 +22,8 @@ from typing import Dict, List, Any, Optional, Union, Tuple
 from dataclasses import dataclass
 
 from services.ortools_professional_optimizer import ProfessionalItineraryOptimizer
+from settings import settings
+from utils.city_resolver import get_city_resolver
 
 # OSRM imports for distance matrix
 try:
@@ -403,26 +405,101 @@ class City2GraphORToolsService:
         end_date = request.get("end_date", "2024-11-15")
         preferences = request.get("preferences", {})
         
+        start_time = f"{preferences.get('daily_start_hour', 9):02d}:00"
+        
+        # Nodos del modelo VRPTW: el hotel (si hay) es el depósito en el nodo 0
+        model_pois, depot_offset = self._model_pois(places, accommodations)
+        
         # Obtener matriz de distancias
-        logger.info(f"🗺️ Getting distance matrix for {len(places)} places")
-        distance_matrix = await self.get_distance_matrix(places)
+        logger.info(f"🗺️ Getting distance matrix for {len(model_pois)} nodes")
+        distance_matrix = await self.get_distance_matrix(model_pois)
+        
+        # 🎯 Viajes grandes de una sola ciudad: mismo modelo con variantes de búsqueda concurrentes
+        if self._use_portfolio(places):
+            portfolio_result = await self._optimize_portfolio(model_pois, distance_matrix, start_time, preferences)
+            if portfolio_result:
+                return self._strip_depot(portfolio_result, places, depot_offset)
+            logger.warning("⚠️ Portfolio sin solución, usando optimización OR-Tools estándar")
         
         # Ejecutar optimización con parámetros correctos
         logger.info(f"🧮 Executing OR-Tools optimization with pois={len(places)}, accommodations={len(accommodations)}")
         result = self.ortools_optimizer.optimize_itinerary_advanced(
-            pois=places,  # Parámetro correcto: pois, no places
-            accommodations=accommodations,  # ✅ AÑADIDO: accommodations
+            pois=model_pois,  # Parámetro correcto: pois, no places
             distance_matrix=distance_matrix,  # Matriz de distancias requerida
             use_time_windows=True,
-            start_time=f"{preferences.get('daily_start_hour', 9):02d}:00"
+            start_time=start_time
         )
         
         if not result:
             raise Exception("OR-Tools returned empty result")
         
         logger.info(f"✅ OR-Tools optimization completed successfully")
+        return self._strip_depot(result, places, depot_offset)
+    
+    def _model_pois(self, places: List[Dict], accommodations: List[Dict]) -> Tuple[List[Dict], int]:
+        """Nodos del modelo: (hotel como depósito +) lugares, y el offset de los lugares"""
+        hotel = next((a for a in accommodations or []
+                      if a.get("lat", a.get("latitude")) is not None
+                      and a.get("lon", a.get("longitude")) is not None), None)
+        if hotel is None:
+            return places, 0
+        depot = {
+            "name": hotel.get("name", "Hotel"),
+            "lat": hotel.get("lat", hotel.get("latitude")),
+            "lon": hotel.get("lon", hotel.get("longitude")),
+            "duration_minutes": 0,
+            "opening_hour": 0,
+            "closing_hour": 24,
+            "is_mandatory": True
+        }
+        return [depot] + places, 1
+    
+    def _strip_depot(self, result: Dict[str, Any], places: List[Dict], depot_offset: int) -> Dict[str, Any]:
+        """Quitar el nodo del hotel y llevar los índices de la ruta a la lista de lugares"""
+        if not depot_offset or not result.get("success"):
+            return result
+        route = [i - depot_offset for i in result["optimized_route"] if i >= depot_offset]
+        result["optimized_route"] = route
+        result["optimized_pois"] = [places[i] for i in route]
+        result["dropped_pois"] = [i - depot_offset for i in result.get("dropped_pois") or [] if i >= depot_offset]
+        if "performance_metrics" in result:
+            result["performance_metrics"]["pois_optimized"] = len(route)
+            result["performance_metrics"]["efficiency_gain"] = f"{len(places) - len(result['dropped_pois'])}/{len(places)}"
         return result
     
+    def _use_portfolio(self, places: List[Dict]) -> bool:
+        """Portfolio solo para itinerarios de una ciudad con ORTOOLS_PORTFOLIO_MIN_PLACES+ lugares"""
+        if not settings.ORTOOLS_PORTFOLIO_ENABLED or len(places) < settings.ORTOOLS_PORTFOLIO_MIN_PLACES:
+            return False
+        coords = [(p.get("lat", p.get("latitude", 0)), p.get("lon", p.get("longitude", 0))) for p in places]
+        cities = {loc.city_key for loc in get_city_resolver().resolve_many(coords) if loc and loc.city_key}
+        return len(cities) <= 1
+    
+    async def _optimize_portfolio(self, model_pois: List[Dict], distance_matrix: Dict,
+                                  start_time: str, preferences: Dict) -> Optional[Dict[str, Any]]:
+        """
+        Resolver el mismo VRPTW (matriz, ventanas, depósito) con el modo portfolio
+        y devolver el formato de optimize_itinerary_advanced
+        """
+        # Import perezoso: el pool de procesos solo se crea si se usa el portfolio
+        from services.ortools_parallel_optimizer import optimize_portfolio
+        
+        logger.info(f"🎯 Portfolio OR-Tools para {len(model_pois)} nodos de una ciudad")
+        result = await optimize_portfolio(model_pois, preferences, distance_matrix=distance_matrix,
+                                          start_time=start_time)
+        if not result.success:
+            return None
+        
+        data = dict(result.result_data)
+        portfolio = {
+            'winning_variant': data.pop('winning_variant', None),
+            'problem_class': data.pop('problem_class', None),
+            'variants': data.pop('variants', [])
+        }
+        data['algorithm_used'] = f"ortools_portfolio:{portfolio['winning_variant']}:{data.get('algorithm_used')}"
+        data['portfolio'] = portfolio
+        return data
+    
     def _generate_metrics(self, result: Dict, execution_time: float, request: Dict) -> ORToolsMetrics:
         """Generar métricas de performance vs benchmarks"""
         
@@ -14,6 +14,9 @@ import os
 from pathlib import Path
 import hashlib
 
+from settings import settings
+from services.h3_demand_index import get_demand_index
+
 # Configurar OSMnx
 ox.settings.log_console = False
 ox.settings.use_cache = True
@@ -249,13 +252,21 @@ class City2GraphService:
         except:
             return 0.0
     
+    def cities_by_demand(self) -> List[Tuple[str, float]]:
+        """📈 Ciudades ordenadas por demanda observada en su bbox (índice H3, res 5)"""
+        demand_index = get_demand_index()
+        scored = [(city_name, demand_index.score_bbox(config['bbox'], resolution=5))
+                  for city_name, config in self.chile_cities.items()]
+        return sorted(scored, key=lambda item: item[1], reverse=True)
+    
     async def preload_chile_cities(self):
-        """🇨🇱 Precargar ciudades principales de Chile"""
+        """🇨🇱 Precargar ciudades principales de Chile (prioridad alta o con demanda observada)"""
         self.logger.info("🇨🇱 Precargando ciudades principales de Chile...")
         
-        for city_name, config in self.chile_cities.items():
-            if config['priority'] == 'high':
-                self.logger.info(f"📍 Precargando {city_name}...")
+        for city_name, demand in self.cities_by_demand():
+            config = self.chile_cities[city_name]
+            if config['priority'] == 'high' or demand >= settings.GRAPH_PRELOAD_DEMAND_MIN_SCORE:
+                self.logger.info(f"📍 Precargando {city_name} (demanda {demand:.0f})...")
                 
                 try:
                     graph = await self.get_city_graph(city_name=city_name)
@@ -2,26 +2,33 @@
 """
 🏙️ City Clustering Service - Clustering inteligente de POIs por ciudades
 Versión especializada para arquitectura multi-ciudad con detección automática
-Usa H3, geocoding y machine learning para clustering preciso
+Un único DBSCAN haversine global (BallTree) + nombres offline / caché de geocoding
 """
 
 import logging
 from typing import List, Dict, Tuple, Optional, Set
-from dataclasses import dataclass, field
-from collections import defaultdict, Counter
+from dataclasses import dataclass, field, astuple
+from collections import Counter
 import math
 import json
 from pathlib import Path
 import numpy as np
-from geopy.distance import geodesic
-from sklearn.cluster import DBSCAN
-from sklearn.preprocessing import StandardScaler
 
-from .h3_spatial_partitioner import H3SpatialPartitioner
+from utils.city_resolver import get_city_resolver
+from utils.geo_utils import haversine_matrix_km
+from utils.poi_clustering import get_poi_clustering_engine
+from utils.reverse_geocode_cache import get_reverse_geocode_cache
+from utils.shared_cache import get_shared_cache, poi_fingerprint
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _distances_to_center_km(center: Tuple[float, float], pois: List[Dict]) -> np.ndarray:
+    """Distancias haversine (km) de cada POI al centro, vectorizadas"""
+    coords = np.fromiter((c for poi in pois for c in (poi['lat'], poi['lon'])),
+                         dtype=float, count=2 * len(pois)).reshape(-1, 2)
+    return haversine_matrix_km(np.asarray(center, dtype=float), coords)[0]
+
 @dataclass
 class CityCluster:
     """Representa un cluster de ciudad detectado"""
@@ -52,13 +59,7 @@ class CityCluster:
         if len(self.pois) < 2:
             return 0.0
         
-        distances = []
-        for poi in self.pois:
-            poi_coord = (poi['lat'], poi['lon'])
-            distance = geodesic(self.coordinates, poi_coord).kilometers
-            distances.append(distance)
-        
-        return max(distances) if distances else 0.0
+        return float(_distances_to_center_km(self.coordinates, self.pois).max())
     
     def get_poi_density(self) -> float:
         """Calcula densidad POIs/km²"""
@@ -72,10 +73,7 @@ class CityCluster:
 @dataclass
 class ClusteringConfig:
     """Configuración para clustering de ciudades"""
-    # H3 parameters
-    h3_resolution: int = 7  # ~5km hexágonos
-    
-    # DBSCAN parameters  
+    # DBSCAN parameters (haversine global)
     eps_km: float = 25.0  # Radio máximo para cluster (25km)
     min_samples: int = 2  # Mínimo POIs por cluster
     
@@ -93,9 +91,8 @@ class CityClusteringService:
     Servicio avanzado de clustering de POIs por ciudades
     
     Combina múltiples técnicas:
-    - H3 spatial indexing para primera aproximación
-    - DBSCAN clustering para refinamiento
-    - Geocoding reverso para validación de nombres
+    - DBSCAN haversine global sobre todos los POIs (BallTree, sin cortes por celda)
+    - Resolver offline + caché de geocoding reverso para nombres de ciudad
     - ML features para scoring de confianza
     """
     
@@ -107,10 +104,10 @@ class CityClusteringService:
             config: Configuración personalizada (opcional)
         """
         self.config = config or ClusteringConfig()
-        self.h3_partitioner = H3SpatialPartitioner()
+        self.clustering_engine = get_poi_clustering_engine()
         
-        # Cache de resultados
-        self.clustering_cache: Dict[str, List[CityCluster]] = {}
+        # Cache de resultados compartida por todas las instancias (TTL + LRU)
+        self.clustering_cache = get_shared_cache('city_clustering')
         
         logger.info("🏙️ CityClusteringService inicializado")
     
@@ -129,19 +126,16 @@ class CityClusteringService:
         if not pois:
             return []
         
-        # Generar cache key
-        cache_key = self._generate_cache_key(pois)
-        if cache_key in self.clustering_cache:
+        # Generar cache key (huella canónica de los POIs + configuración)
+        cache_key, order = poi_fingerprint(pois, astuple(self.config))
+        cached = self.clustering_cache.get(cache_key)
+        if cached is not None:
             logger.info("💾 Resultado obtenido desde cache")
-            return self.clustering_cache[cache_key]
+            return self._restore_clusters(cached, pois, order)
         
-        # Paso 1: Clustering inicial con H3
-        h3_clusters = self._h3_initial_clustering(pois)
-        logger.info(f"📐 H3 clustering: {len(h3_clusters)} clusters iniciales")
-        
-        # Paso 2: Refinamiento con DBSCAN
-        refined_clusters = self._dbscan_refinement(h3_clusters)
-        logger.info(f"🎯 DBSCAN refinement: {len(refined_clusters)} clusters refinados")
+        # Paso 1-2: DBSCAN haversine global (una pasada sobre todos los POIs)
+        refined_clusters = self._global_dbscan_clustering(pois)
+        logger.info(f"🎯 DBSCAN global: {len(refined_clusters)} clusters")
         
         # Paso 3: Validación y naming
         validated_clusters = self._validate_and_name_clusters(refined_clusters)
@@ -159,94 +153,78 @@ class CityClusteringService:
         logger.info(f"🏆 Clustering completado: {len(quality_clusters)} ciudades de calidad")
         
         # Cache resultado
-        self.clustering_cache[cache_key] = quality_clusters
+        self.clustering_cache.set(cache_key, self._serialize_clusters(quality_clusters, pois, order))
         
         return quality_clusters
     
-    def _generate_cache_key(self, pois: List[Dict]) -> str:
-        """Genera clave de cache para POIs"""
-        import hashlib
-        
-        # Crear string único basado en coordenadas
-        coords_str = ";".join([
-            f"{poi['lat']:.4f},{poi['lon']:.4f}" 
-            for poi in sorted(pois, key=lambda x: (x['lat'], x['lon']))
-        ])
-        
-        return hashlib.md5(coords_str.encode()).hexdigest()[:16]
+    @staticmethod
+    def _serialize_clusters(clusters: List[CityCluster], pois: List[Dict], order: List[int]) -> List[Dict]:
+        """Clusters → dicts JSON con miembros como posiciones canónicas (sin copiar los POIs)"""
+        canonical_position = {id(pois[i]): k for k, i in enumerate(order)}
+        return [
+            {
+                'cluster_id': cluster.cluster_id,
+                'name': cluster.name,
+                'country': cluster.country,
+                'center_lat': cluster.center_lat,
+                'center_lon': cluster.center_lon,
+                'confidence': cluster.confidence,
+                'members': [canonical_position[id(poi)] for poi in cluster.pois]
+            }
+            for cluster in clusters
+        ]
     
-    def _h3_initial_clustering(self, pois: List[Dict]) -> Dict[str, List[Dict]]:
-        """Clustering inicial usando H3 spatial indexing"""
-        clusters = defaultdict(list)
-        
-        for poi in pois:
-            h3_id = self.h3_partitioner.coordinate_to_h3(
-                poi['lat'], poi['lon']
+    @staticmethod
+    def _restore_clusters(cached: List[Dict], pois: List[Dict], order: List[int]) -> List[CityCluster]:
+        """Reconstruir clusters cacheados sobre los dicts de POI del request actual"""
+        return [
+            CityCluster(
+                cluster_id=entry['cluster_id'],
+                name=entry['name'],
+                country=entry['country'],
+                center_lat=entry['center_lat'],
+                center_lon=entry['center_lon'],
+                pois=[pois[order[k]] for k in entry['members']],
+                confidence=entry['confidence']
             )
-            clusters[h3_id].append(poi)
-        
-        return dict(clusters)
+            for entry in cached
+        ]
     
-    def _dbscan_refinement(self, h3_clusters: Dict[str, List[Dict]]) -> List[List[Dict]]:
-        """Refinamiento con DBSCAN para detectar sub-clusters"""
-        refined_clusters = []
-        
-        for h3_id, cluster_pois in h3_clusters.items():
-            if len(cluster_pois) < 2:
-                # Clusters pequeños pasan directo
-                refined_clusters.append(cluster_pois)
-                continue
-            
-            # Preparar datos para DBSCAN
-            coordinates = np.array([[poi['lat'], poi['lon']] for poi in cluster_pois])
-            
-            # Convertir eps de km a grados (aproximado)
-            eps_degrees = self.config.eps_km / 111.0  # 1 grado ≈ 111km
-            
-            # DBSCAN clustering
-            dbscan = DBSCAN(
-                eps=eps_degrees,
-                min_samples=self.config.min_samples,
-                metric='euclidean'
-            )
-            
-            cluster_labels = dbscan.fit_predict(coordinates)
-            
-            # Agrupar por labels
-            dbscan_groups = defaultdict(list)
-            for i, label in enumerate(cluster_labels):
-                if label != -1:  # No es ruido
-                    dbscan_groups[label].append(cluster_pois[i])
-                else:
-                    # POIs de ruido van como clusters individuales
-                    refined_clusters.append([cluster_pois[i]])
-            
-            # Añadir grupos válidos
-            for group_pois in dbscan_groups.values():
-                if len(group_pois) >= self.config.min_pois_per_city:
-                    refined_clusters.append(group_pois)
+    def _global_dbscan_clustering(self, pois: List[Dict]) -> List[Tuple[List[Dict], Tuple[float, float], float]]:
+        """
+        DBSCAN haversine sobre todos los POIs a la vez
+        
+        Returns:
+            Lista de (pois, (centro_lat, centro_lon), radio_km); el ruido va como clusters individuales
+        """
+        coordinates = np.fromiter((c for poi in pois for c in (poi['lat'], poi['lon'])),
+                                  dtype=float, count=2 * len(pois)).reshape(-1, 2)
+        result = self.clustering_engine.fit(coordinates, self.config.eps_km, self.config.min_samples)
+        
+        clusters = []
+        for label, indices in result.groups_in_input_order():
+            group_pois = [pois[i] for i in indices.tolist()]
+            if isinstance(label, str):
+                # POIs de ruido van como clusters individuales
+                clusters.append((group_pois, (float(coordinates[indices[0], 0]), float(coordinates[indices[0], 1])), 0.0))
+            elif len(group_pois) >= self.config.min_pois_per_city:
+                clusters.append((group_pois, result.centroid(label), result.radius_km(label)))
         
-        return refined_clusters
+        return clusters
     
-    def _validate_and_name_clusters(self, clusters: List[List[Dict]]) -> List[CityCluster]:
-        """Valida clusters y asigna nombres de ciudad"""
+    def _validate_and_name_clusters(self, clusters: List[Tuple[List[Dict], Tuple[float, float], float]]) -> List[CityCluster]:
+        """Valida clusters (con centro y radio ya calculados) y asigna nombres de ciudad"""
         validated_clusters = []
         
-        logger.info(f"🔍 Validando {len(clusters)} clusters de entrada:")
-        for i, cluster_pois in enumerate(clusters):
-            logger.info(f"   Cluster {i}: {len(cluster_pois)} POIs - {[poi.get('name', 'Unknown') for poi in cluster_pois]}")
+        logger.info(f"🔍 Validando {len(clusters)} clusters de entrada")
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, (cluster_pois, _, _) in enumerate(clusters):
+                logger.debug(f"   Cluster {i}: {len(cluster_pois)} POIs - {[poi.get('name', 'Unknown') for poi in cluster_pois]}")
         
-        for i, cluster_pois in enumerate(clusters):
+        for i, (cluster_pois, (center_lat, center_lon), radius_km) in enumerate(clusters):
             if not cluster_pois:
                 continue
             
-            # Calcular centro del cluster
-            center_lat = sum(poi['lat'] for poi in cluster_pois) / len(cluster_pois)
-            center_lon = sum(poi['lon'] for poi in cluster_pois) / len(cluster_pois)
-            
-            # Calcular radio del cluster
-            radius_km = self._calculate_cluster_radius(cluster_pois, center_lat, center_lon)
-            
             # Validar tamaño del cluster (permitir clusters de 1 POI)
             if len(cluster_pois) == 1:
                 # Clusters de 1 POI siempre son válidos
@@ -259,8 +237,9 @@ class CityClusteringService:
                 logger.info(f"✅ Cluster {i} validado - {len(cluster_pois)} POIs, radio: {radius_km:.1f}km")
             
             # Determinar nombre y país
-            city_name = self._determine_cluster_name(cluster_pois)
-            country = self._determine_cluster_country(cluster_pois)
+            location = self._lookup_location(center_lat, center_lon)
+            city_name = self._determine_cluster_name(cluster_pois, location)
+            country = self._determine_cluster_country(cluster_pois, location)
             
             logger.info(f"🏙️ Cluster {i}: '{city_name}', {country} - Centro: ({center_lat:.4f}, {center_lon:.4f})")
             
@@ -285,17 +264,24 @@ class CityClusteringService:
         if not pois:
             return 0.0
         
-        center = (center_lat, center_lon)
-        max_distance = 0.0
+        return float(_distances_to_center_km((center_lat, center_lon), pois).max())
+    
+    def _lookup_location(self, lat: float, lon: float) -> Optional[Dict]:
+        """
+        Ciudad/país del centro del cluster sin llamar a Google:
+        resolver offline y, si no cubre el punto, caché de reverse geocoding por celda H3
+        """
+        resolved = get_city_resolver().resolve(lat, lon)
+        if resolved is not None and resolved.city:
+            return resolved.to_geocode_dict()
         
-        for poi in pois:
-            poi_coord = (poi['lat'], poi['lon'])
-            distance = geodesic(center, poi_coord).kilometers
-            max_distance = max(max_distance, distance)
+        cached = get_reverse_geocode_cache().get(lat, lon)
+        if cached and cached.get('city'):
+            return cached
         
-        return max_distance
+        return resolved.to_geocode_dict() if resolved is not None else None
     
-    def _determine_cluster_name(self, pois: List[Dict]) -> str:
+    def _determine_cluster_name(self, pois: List[Dict], location: Optional[Dict] = None) -> str:
         """Determina el nombre más representativo del cluster"""
         
         # Buscar nombres de ciudades explícitos
@@ -324,6 +310,10 @@ class CityClusteringService:
             most_common = Counter(city_names).most_common(1)
             return most_common[0][0]
         
+        # Ciudad del centro del cluster (offline / caché de geocoding)
+        if location and location.get('city'):
+            return location['city']
+        
         # Fallback: usar el POI más representativo
         # Priorizar POIs con nombres de lugares conocidos
         landmark_keywords = ['tower', 'museum', 'cathedral', 'palace', 'bridge', 'square']
@@ -389,7 +379,7 @@ class CityClusteringService:
         
         return None
     
-    def _determine_cluster_country(self, pois: List[Dict]) -> str:
+    def _determine_cluster_country(self, pois: List[Dict], location: Optional[Dict] = None) -> str:
         """Determina el país del cluster"""
         countries = []
         
@@ -411,6 +401,9 @@ class CityClusteringService:
             most_common = Counter(countries).most_common(1)
             return most_common[0][0]
         
+        if location and location.get('country'):
+            return location['country']
+        
         return "Unknown"
     
     def _extract_country_from_address_string(self, address: str) -> Optional[str]:
@@ -517,20 +510,8 @@ class CityClusteringService:
         if cluster.poi_count < 2:
             return 1.0
         
-        # Calcular varianza de distancias al centro
-        distances = []
-        for poi in cluster.pois:
-            poi_coord = (poi['lat'], poi['lon'])
-            distance = geodesic(cluster.coordinates, poi_coord).kilometers
-            distances.append(distance)
-        
-        if not distances:
-            return 1.0
-        
-        # Consistencia basada en desviación estándar
-        mean_distance = sum(distances) / len(distances)
-        variance = sum((d - mean_distance) ** 2 for d in distances) / len(distances)
-        std_dev = math.sqrt(variance)
+        # Consistencia basada en desviación estándar de distancias al centro
+        std_dev = float(np.std(_distances_to_center_km(cluster.coordinates, cluster.pois)))
         
         # Normalizar: std_dev pequeño = alta consistencia
         consistency = max(0.1, 1.0 - (std_dev / 50.0))  # 50km como referencia
@@ -0,0 +1,178 @@
+"""
+🧺 Free Block Suggestion Planner - Sugerencias de bloques libres en batch
+Agrupa los bloques libres de todo el itinerario en celdas H3, hace una sola
+búsqueda de Places por celda (concurrente) y reparte los resultados entre
+los bloques con variedad por día.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Any, Optional
+
+import h3
+
+from settings import settings
+from utils.geo_utils import haversine_km
+from utils.places_quota_manager import quota_priority, QuotaPriority
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class FreeBlockRequest:
+    """Bloque libre que necesita sugerencias"""
+    key: Any
+    lat: float
+    lon: float
+    types: List[str]
+    day_number: int = 1
+    limit: int = 3
+
+@dataclass
+class SearchCell:
+    """Celda H3 de búsqueda compartida por varios bloques"""
+    cell_id: str
+    center: Tuple[float, float]
+    types: List[str]
+    requests: List[FreeBlockRequest] = field(default_factory=list)
+
+class FreeBlockSuggestionPlanner:
+    """
+    🧺 Planificador batch de sugerencias para bloques libres
+
+    Uso:
+        planner = FreeBlockSuggestionPlanner(places_service)
+        suggestions = await planner.plan(requests)  # {request.key: [lugares]}
+        planner.last_stats["api_calls_saved_by_batching"]
+    """
+
+    def __init__(self, places_service, h3_resolution: Optional[int] = None,
+                 radius_m: Optional[int] = None, exclude_chains: bool = True):
+        self.places_service = places_service
+        self.h3_resolution = h3_resolution if h3_resolution is not None else settings.FREE_BLOCK_BATCH_H3_RES
+        self.radius_m = radius_m or settings.FREE_DAY_SUGGESTIONS_RADIUS_M
+        self.exclude_chains = exclude_chains
+        self.last_stats: Dict[str, Any] = {}
+
+    def group_into_cells(self, requests: List[FreeBlockRequest]) -> List[SearchCell]:
+        """Agrupar bloques cercanos en celdas H3 (tipos = unión de los tipos de cada bloque)"""
+        cells: Dict[str, SearchCell] = {}
+        for request in requests:
+            cell_id = h3.latlng_to_cell(request.lat, request.lon, self.h3_resolution)
+            cell = cells.get(cell_id)
+            if cell is None:
+                cell = SearchCell(cell_id=cell_id, center=h3.cell_to_latlng(cell_id), types=[])
+                cells[cell_id] = cell
+            cell.requests.append(request)
+            for place_type in request.types:
+                if place_type not in cell.types:
+                    cell.types.append(place_type)
+        return list(cells.values())
+
+    async def plan(self, requests: List[FreeBlockRequest]) -> Dict[Any, List[Dict]]:
+        """
+        Resolver sugerencias para todos los bloques
+
+        Returns:
+            Dict key del bloque → lugares (distancia/ETA relativas al bloque)
+        """
+        start = time.time()
+        if not requests:
+            self.last_stats = {"blocks": 0, "cells": 0, "api_calls_naive": 0, "cell_searches": 0,
+                               "api_calls_saved_by_batching": 0, "cache_hits": 0, "api_calls_made": 0}
+            return {}
+
+        cells = self.group_into_cells(requests)
+        # Contadores propios de este plan (el servicio de Places se comparte entre requests)
+        cell_stats = [{'cache_hits': 0, 'api_calls': 0} for _ in cells]
+
+        # Una búsqueda (pool por tipo) por celda, todas en paralelo; con cuota baja, solo caché
+        with quota_priority(QuotaPriority.FREE_BLOCK):
+            pools = await asyncio.gather(
+                *(self.places_service.search_nearby_pool(
+                    lat=cell.center[0], lon=cell.center[1], radius_m=self.radius_m,
+                    types=cell.types, exclude_chains=self.exclude_chains, stats=stats
+                ) for cell, stats in zip(cells, cell_stats)),
+                return_exceptions=True
+            )
+
+        results: Dict[Any, List[Dict]] = {}
+        used_place_ids = set()
+        for cell, pool in zip(cells, pools):
+            if isinstance(pool, Exception):
+                logger.warning(f"⚠️ Búsqueda de celda {cell.cell_id} falló: {pool}")
+                pool = {}
+            for request in sorted(cell.requests, key=lambda r: r.day_number):
+                results[request.key] = self._allocate(request, pool, used_place_ids)
+
+        # Búsquedas por tipo: una por bloque sin batch vs una por celda agrupada;
+        # de las de celda, las cubiertas por caché no llegan a la API
+        api_calls_naive = sum(len(r.types) for r in requests)
+        cell_searches = sum(len(cell.types) for cell in cells)
+        cache_hits = sum(stats['cache_hits'] for stats in cell_stats)
+        api_calls_made = sum(stats['api_calls'] for stats in cell_stats)
+        self.last_stats = {
+            "blocks": len(requests),
+            "cells": len(cells),
+            "h3_resolution": self.h3_resolution,
+            "api_calls_naive": api_calls_naive,
+            "cell_searches": cell_searches,
+            "api_calls_saved_by_batching": api_calls_naive - cell_searches,
+            "cache_hits": cache_hits,
+            "api_calls_made": api_calls_made,
+            "planning_time_ms": round((time.time() - start) * 1000, 1)
+        }
+        logger.info(f"🧺 Sugerencias batch: {len(requests)} bloques en {len(cells)} celdas H3, "
+                    f"{api_calls_made} llamadas API ({api_calls_naive - cell_searches} ahorradas por batch, "
+                    f"{cache_hits} desde caché)")
+        return results
+
+    def _allocate(self, request: FreeBlockRequest, pool: Dict[str, List[Dict]],
+                  used_place_ids: set) -> List[Dict]:
+        """
+        Repartir candidatos de la celda a un bloque: atracciones turísticas primero
+        (máx 2), luego variedad; evita repetir lugares ya sugeridos en otros días
+        """
+        tourist, others = [], []
+        seen = set()
+        for place_type in request.types:
+            for place in pool.get(place_type, []):
+                place_id = place.get('place_id') or place.get('name')
+                if place_id in seen:
+                    continue
+                seen.add(place_id)
+                candidate = self._relative_to_block(place, request)
+                if candidate['distance_km'] > 5:
+                    continue
+                (tourist if place_type == 'tourist_attraction' else others).append(candidate)
+
+        rng = random.Random(request.day_number * 42)
+        def ranking(place):
+            return (-place.get('rating', 0) + rng.uniform(-0.1, 0.1), place['eta_minutes'])
+
+        def pick(candidates: List[Dict], slots: int) -> List[Dict]:
+            fresh = [p for p in candidates if (p.get('place_id') or p.get('name')) not in used_place_ids]
+            return sorted(fresh, key=ranking)[:max(slots, 0)]
+
+        selected = pick(tourist, 2)
+        selected += pick(others, request.limit - len(selected))
+        if not selected:
+            # Sin lugares nuevos en la celda: repetir antes que dejar el bloque vacío
+            selected = sorted(tourist + others, key=ranking)[:request.limit]
+
+        for place in selected:
+            used_place_ids.add(place.get('place_id') or place.get('name'))
+        return selected[:request.limit]
+
+    @staticmethod
+    def _relative_to_block(place: Dict, request: FreeBlockRequest) -> Dict:
+        """Recalcular distancia y ETA desde la ubicación del bloque"""
+        distance_km = haversine_km(request.lat, request.lon, place['lat'], place['lon'])
+        eta_minutes = int(distance_km * 1000 / 83.33)  # 5 km/h caminando
+        candidate = dict(place)
+        candidate['distance_km'] = distance_km
+        candidate['eta_minutes'] = eta_minutes
+        candidate['reason'] = f"Google Places: {place.get('rating', 4.0)}⭐, {eta_minutes}min caminando"
+        return candidate
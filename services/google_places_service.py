@@ -2,7 +2,13 @@ from typing import List, Dict, Optional, Any
 import logging
 import asyncio
 from utils.google_maps_client import GoogleMapsClient
+from utils.http_client_registry import get_http_client
+from utils.rate_limiter import get_api_rate_limiter
+from utils.places_quota_manager import get_quota_manager, QuotaExceededError
 from utils.geographic_cache_manager import get_cache_manager
+from utils.place_details_cache import get_place_details_cache
+from utils.city_resolver import get_city_resolver
+from services.h3_demand_index import get_demand_index
 from settings import settings
 
 class GooglePlacesService:
@@ -16,6 +22,7 @@ class GooglePlacesService:
         self.cache_hits = 0
         self.cache_misses = 0
         self.api_calls_saved = 0
+        self.nearby_api_calls = 0  # Nearby Search realmente enviadas a Google
     
     async def search_nearby(
         self, 
@@ -30,6 +37,7 @@ class GooglePlacesService:
         🔍 Búsqueda robusta de lugares cercanos con manejo de errores
         SIN CACHÉ - Siempre genera sugerencias frescas
         """
+        get_demand_index().record_lookup(lat, lon)
         try:
             # Usar tipos por defecto si no se proporcionan
             if types is None:
@@ -62,6 +70,9 @@ class GooglePlacesService:
                         self.logger.warning(f"🤖 Método search_nearby_places no disponible, usando sintéticas para {lat:.3f},{lon:.3f}")
                         return self._generate_synthetic_suggestions(lat, lon, types, limit)
                         
+                except QuotaExceededError:
+                    self.logger.info("💰 Cuota Places reservada para prioridades mayores - sugerencias sintéticas")
+                    return self._generate_synthetic_suggestions(lat, lon, types, limit)
                 except Exception as e:
                     if attempt == 0:
                         self.logger.warning(f"Primer intento de búsqueda falló: {e}")
@@ -176,35 +187,8 @@ class GooglePlacesService:
         return synthetic_places
     
     def _infer_city_name(self, lat: float, lon: float) -> str:
-        """Inferir nombre de ciudad basándose en coordenadas aproximadas de Chile"""
-        # Ciudades principales de Chile con sus coordenadas aproximadas
-        cities = [
-            (-33.4489, -70.6693, "Santiago"),
-            (-23.6509, -70.3975, "Antofagasta"), 
-            (-29.9027, -71.2519, "La Serena"),
-            (-36.8201, -73.0444, "Concepción"),
-            (-39.8142, -73.2459, "Valdivia"),
-            (-20.2141, -70.1522, "Iquique"),
-            (-27.3668, -70.4037, "Copiapó"),
-            (-22.4908, -68.9016, "Calama"),
-            (-18.4783, -70.3146, "Arica"),
-            (-41.4693, -72.9424, "Puerto Montt"),
-            (-53.1638, -70.9171, "Punta Arenas")
-        ]
-        
-        min_distance = float('inf')
-        closest_city = ""
-        
-        for city_lat, city_lon, city_name in cities:
-            distance = ((lat - city_lat) ** 2 + (lon - city_lon) ** 2) ** 0.5
-            if distance < min_distance:
-                min_distance = distance
-                closest_city = city_name
-        
-        # Solo devolver ciudad si está relativamente cerca (< 1 grado ~ 100km)
-        if min_distance < 1.0:
-            return closest_city
-        return ""
+        """Inferir nombre de ciudad basándose en coordenadas (resolver offline)"""
+        return get_city_resolver().city_name(lat, lon) or ""
     
     async def search_nearby_real(
         self,
@@ -220,6 +204,7 @@ class GooglePlacesService:
         Buscar lugares reales cercanos usando Google Places API con variedad por día
         Con caché inteligente para reducir llamadas API
         """
+        get_demand_index().record_lookup(lat, lon)
         try:
             # 🎯 PASO 1: INTENTAR CACHE PRIMERO
             place_types = self._get_types_for_day(types, day_offset)
@@ -263,34 +248,44 @@ class GooglePlacesService:
             # 🎯 GARANTIZAR ATRACCIONES TURÍSTICAS PRIMERO
             tourist_places = []
             other_places = []
+            seen_place_ids = set()
+            
+            # Fan-out concurrente: todas las Nearby Search en un solo round trip
+            search_results = await asyncio.gather(
+                *(self._google_nearby_search(
+                    lat=lat,
+                    lon=lon,
+                    radius=radius_m,
+                    type=place_type,
+                    limit=8  # Buscar más para poder filtrar y variar
+                ) for place_type in place_types),
+                return_exceptions=True
+            )
             
-            for place_type in place_types:
-                try:
-                    # Llamada a Google Places Nearby Search
-                    places_result = await self._google_nearby_search(
-                        lat=lat,
-                        lon=lon,
-                        radius=radius_m,
-                        type=place_type,
-                        limit=8  # Buscar más para poder filtrar y variar
-                    )
+            for place_type, places_result in zip(place_types, search_results):
+                if isinstance(places_result, Exception):
+                    self.logger.warning(f"Error searching {place_type}: {places_result}")
+                    continue
+                
+                if places_result and places_result.get('results'):
+                    # Usar day_offset para seleccionar diferentes resultados por día
+                    start_idx = (day_offset - 1) % min(len(places_result['results']), 3)
                     
-                    if places_result and 'results' in places_result:
-                        # Usar day_offset para seleccionar diferentes resultados por día
-                        start_idx = (day_offset - 1) % min(len(places_result['results']), 3)
+                    for place in places_result['results'][start_idx:]:
+                        # Deduplicar entre tipos por place_id
+                        place_id = place.get('place_id')
+                        if place_id in seen_place_ids:
+                            continue
                         
-                        for i, place in enumerate(places_result['results'][start_idx:]):
-                            processed_place = self._process_google_place(place, lat, lon)
-                            if processed_place and self._is_valid_suggestion(processed_place, exclude_chains):
-                                # 🎯 Separar por tipo para garantizar atracciones turísticas
-                                if place_type == 'tourist_attraction':
-                                    tourist_places.append(processed_place)
-                                else:
-                                    other_places.append(processed_place)
-                                
-                except Exception as e:
-                    self.logger.warning(f"Error searching {place_type}: {e}")
-                    continue
+                        processed_place = self._process_google_place(place, lat, lon)
+                        if processed_place and self._is_valid_suggestion(processed_place, exclude_chains):
+                            if place_id:
+                                seen_place_ids.add(place_id)
+                            # 🎯 Separar por tipo para garantizar atracciones turísticas
+                            if place_type == 'tourist_attraction':
+                                tourist_places.append(processed_place)
+                            else:
+                                other_places.append(processed_place)
             
             # 🎯 COMBINAR RESULTADOS: PRIORIZAR ATRACCIONES TURÍSTICAS
             final_places = []
@@ -332,6 +327,77 @@ class GooglePlacesService:
             self.logger.error(f"❌ Error en búsqueda nearby real: {e}")
             return []  # En caso de error, no devolver sugerencias para mantener calidad
 
+    async def search_nearby_pool(
+        self,
+        lat: float,
+        lon: float,
+        radius_m: int,
+        types: List[str],
+        exclude_chains: bool = True,
+        force_refresh: bool = False,
+        stats: Optional[Dict[str, int]] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Pool de candidatos de calidad por tipo alrededor de un punto (celda H3)
+        Una Nearby Search por tipo no cacheado, todas concurrentes
+        (force_refresh ignora el caché y lo reescribe, usado por el pre-warming;
+        stats, si se pasa, acumula 'cache_hits' y 'api_calls' de esta llamada)
+        """
+        pool: Dict[str, List[Dict[str, Any]]] = {}
+        missing_types = []
+        if not force_refresh:
+            get_demand_index().record_lookup(lat, lon)
+        
+        for place_type in types:
+            if force_refresh:
+                missing_types.append(place_type)
+                continue
+            cached = self.cache_manager.get_cached_places(
+                lat=lat, lon=lon, radius=radius_m, place_types=[place_type]
+            )
+            if cached:
+                self.cache_hits += 1
+                self.api_calls_saved += 1
+                if stats is not None:
+                    stats['cache_hits'] = stats.get('cache_hits', 0) + 1
+                pool[place_type] = cached
+            else:
+                missing_types.append(place_type)
+        
+        if not missing_types:
+            return pool
+        
+        self.cache_misses += 1
+        if not self.api_key:
+            self.logger.warning("🔑 No hay API key de Google Places - pool sin resultados nuevos")
+            return pool
+        
+        search_results = await asyncio.gather(
+            *(self._google_nearby_search(lat=lat, lon=lon, radius=radius_m, type=place_type, stats=stats)
+              for place_type in missing_types),
+            return_exceptions=True
+        )
+        
+        for place_type, places_result in zip(missing_types, search_results):
+            if isinstance(places_result, Exception) or not places_result:
+                pool[place_type] = []
+                continue
+            
+            valid_places = []
+            for place in places_result.get('results', []):
+                processed_place = self._process_google_place(place, lat, lon)
+                if processed_place and self._is_valid_suggestion(processed_place, exclude_chains):
+                    valid_places.append(processed_place)
+            pool[place_type] = valid_places
+            
+            if valid_places:
+                self.cache_manager.cache_places(
+                    lat=lat, lon=lon, radius=radius_m,
+                    place_types=[place_type], places_data=valid_places
+                )
+        
+        return pool
+    
     async def _google_nearby_search(
         self,
         lat: float,
@@ -339,12 +405,11 @@ class GooglePlacesService:
         radius: int,
         types: Optional[List[str]] = None,
         type: Optional[str] = None,  # Mantener compatibilidad con versión anterior
-        limit: int = 10
+        limit: int = 10,
+        stats: Optional[Dict[str, int]] = None
     ) -> Optional[Dict[str, Any]]:
         """Llamada real a Google Places Nearby Search API"""
         try:
-            import aiohttp
-            
             # Determinar el tipo a usar
             search_type = type if type else (types[0] if types and len(types) > 0 else 'tourist_attraction')
             
@@ -357,20 +422,31 @@ class GooglePlacesService:
                 'language': 'es'
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get('status') == 'OK':
-                            self.logger.info(f"✅ Google Places: {len(data.get('results', []))} lugares encontrados para {search_type}")
-                            return data
-                        else:
-                            self.logger.warning(f"Google Places status: {data.get('status')} para {search_type}")
-                            return None
+            # Cuota diaria por prioridad, rate limit global por API key + pool keep-alive compartido
+            get_quota_manager().consume('nearby_search')
+            await get_api_rate_limiter(self.api_key).acquire()
+            self.nearby_api_calls += 1
+            if stats is not None:
+                stats['api_calls'] = stats.get('api_calls', 0) + 1
+            
+            async with get_http_client("google_maps").get(url, params=params) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    if data.get('status') == 'OK':
+                        self.logger.info(f"✅ Google Places: {len(data.get('results', []))} lugares encontrados para {search_type}")
+                        # Los resultados también alimentan la caché de detalles por place_id
+                        get_place_details_cache().merge_nearby_results(data.get('results', []))
+                        return data
                     else:
-                        self.logger.warning(f"Google Places HTTP error: {response.status}")
+                        self.logger.warning(f"Google Places status: {data.get('status')} para {search_type}")
                         return None
-                        
+                else:
+                    self.logger.warning(f"Google Places HTTP error: {response.status}")
+                    return None
+        
+        except QuotaExceededError:
+            # Degradado a solo-caché: el llamador ya consultó el caché antes de llegar aquí
+            return None
         except Exception as e:
             self.logger.error(f"Error en Google Places API: {e}")
             return None
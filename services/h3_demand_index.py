@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+📈 H3 Demand Index - Dónde se concentran los requests
+Agregación en proceso de la demanda por celda H3 a varias resoluciones
+(5 ≈ región urbana, 7 ≈ barrio, 9 ≈ manzana):
+
+- places:  lugares pedidos en itinerarios
+- legs:    tramos de ruteo (origen y destino)
+- lookups: búsquedas de Places hechas por requests (no por el pre-warming)
+
+Lo leen el pre-warming de Places (qué celdas calentar) y el precargador de
+grafos (qué ciudades mantener en memoria). Snapshots periódicos a disco (.npz)
+con decaimiento exponencial para que la demanda antigua pierda peso.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Any
+
+import h3
+import numpy as np
+
+from settings import settings
+from services.h3_spatial_partitioner import H3SpatialPartitioner
+
+logger = logging.getLogger(__name__)
+
+DEMAND_RESOLUTIONS = (5, 7, 9)
+METRICS = ('places', 'legs', 'lookups')
+
+class H3DemandIndex:
+    """
+    📈 Contadores de demanda por celda H3 y resolución
+
+    Uso:
+        index = get_demand_index()
+        index.record_places(coords)                 # (N, 2) lat/lon
+        index.record_legs(origins, destinations)
+        index.record_lookup(lat, lon)
+        index.hot_cells(resolution=7, limit=20)
+    """
+
+    def __init__(self, snapshot_path: Optional[Path] = None, half_life_days: Optional[float] = None):
+        self.snapshot_path = Path(snapshot_path or settings.DEMAND_INDEX_SNAPSHOT_PATH)
+        self.half_life_s = (half_life_days if half_life_days is not None
+                            else settings.DEMAND_INDEX_HALF_LIFE_DAYS) * 24 * 3600
+        self.finest_resolution = max(DEMAND_RESOLUTIONS)
+        # Los puntos se convierten por lote a la resolución más fina; las demás son padres.
+        # Un particionador por resolución para la cobertura memoizada de bboxes
+        self.partitioners = {res: H3SpatialPartitioner(resolution=res) for res in DEMAND_RESOLUTIONS}
+
+        self._lock = threading.Lock()
+        # resolución → celda → [places, legs, lookups]
+        self._counts: Dict[int, Dict[str, List[float]]] = {res: {} for res in DEMAND_RESOLUTIONS}
+        self._last_decay = time.time()
+        self.last_snapshot_at: Optional[float] = None
+
+    # ========================================================================
+    # REGISTRO
+    # ========================================================================
+
+    def _record(self, coords: np.ndarray, metric: str):
+        points = np.asarray(coords, dtype=float).reshape(-1, 2)
+        if not settings.DEMAND_INDEX_ENABLED or len(points) == 0:
+            return
+        column = METRICS.index(metric)
+        finest_cells = self.partitioners[self.finest_resolution].cells_for(points)
+        cells, counts = np.unique(finest_cells.astype(str), return_counts=True)
+
+        with self._lock:
+            for cell, count in zip(cells.tolist(), counts.tolist()):
+                for res in DEMAND_RESOLUTIONS:
+                    key = cell if res == self.finest_resolution else h3.cell_to_parent(cell, res)
+                    row = self._counts[res].get(key)
+                    if row is None:
+                        row = self._counts[res][key] = [0.0, 0.0, 0.0]
+                    row[column] += count
+
+    def record_places(self, coords: Sequence[Sequence[float]]):
+        """Lugares de un itinerario"""
+        self._record(coords, 'places')
+
+    def record_legs(self, origins: Sequence[Sequence[float]], destinations: Sequence[Sequence[float]]):
+        """Tramos de ruteo: cuentan en la celda de origen y en la de destino"""
+        self._record(np.concatenate([np.asarray(origins, dtype=float).reshape(-1, 2),
+                                     np.asarray(destinations, dtype=float).reshape(-1, 2)]), 'legs')
+
+    def record_lookup(self, lat: float, lon: float):
+        """Búsqueda de Places originada por un request"""
+        self._record(np.array([[lat, lon]]), 'lookups')
+
+    # ========================================================================
+    # CONSULTA
+    # ========================================================================
+
+    def hot_cells(self, resolution: int = 7, limit: int = 20, metric: Optional[str] = None,
+                  min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        Celdas con más demanda a una resolución
+
+        Args:
+            metric: 'places' | 'legs' | 'lookups' (None = suma de las tres)
+        """
+        if resolution not in self._counts:
+            raise ValueError(f"Resolución {resolution} no indexada (disponibles: {DEMAND_RESOLUTIONS})")
+        if metric is not None and metric not in METRICS:
+            raise ValueError(f"Métrica desconocida: {metric} (disponibles: {METRICS})")
+        with self._lock:
+            rows = [(cell, tuple(values)) for cell, values in self._counts[resolution].items()]
+
+        def score(values: Tuple[float, ...]) -> float:
+            return values[METRICS.index(metric)] if metric else sum(values)
+
+        ranked = sorted(((score(values), cell, values) for cell, values in rows), reverse=True)
+        hot = []
+        for value, cell, values in ranked[:limit]:
+            if value <= min_score:
+                break
+            lat, lon = h3.cell_to_latlng(cell)
+            hot.append({
+                'cell': cell,
+                'resolution': resolution,
+                'lat': lat,
+                'lon': lon,
+                'score': round(value, 2),
+                **{name: round(v, 2) for name, v in zip(METRICS, values)}
+            })
+        return hot
+
+    def score_cells(self, cells: Sequence[str], metric: Optional[str] = None) -> float:
+        """Demanda total de un conjunto de celdas (misma resolución)"""
+        if not cells:
+            return 0.0
+        resolution = h3.get_resolution(cells[0])
+        column = METRICS.index(metric) if metric else None
+        with self._lock:
+            table = self._counts.get(resolution, {})
+            total = 0.0
+            for cell in cells:
+                values = table.get(cell)
+                if values:
+                    total += values[column] if column is not None else sum(values)
+        return total
+
+    def score_bbox(self, bbox: Tuple[float, float, float, float], resolution: int = 5,
+                   metric: Optional[str] = None) -> float:
+        """Demanda dentro de un bbox (north, south, east, west) usando la cobertura memoizada"""
+        if resolution not in self.partitioners:
+            raise ValueError(f"Resolución {resolution} no indexada (disponibles: {DEMAND_RESOLUTIONS})")
+        return self.score_cells(self.partitioners[resolution].polyfill_bbox(bbox), metric)
+
+    # ========================================================================
+    # SNAPSHOTS
+    # ========================================================================
+
+    def _decay(self, now: float):
+        """Decaimiento exponencial desde el último snapshot; descarta celdas casi vacías"""
+        if self.half_life_s <= 0:
+            return
+        factor = 0.5 ** ((now - self._last_decay) / self.half_life_s)
+        self._last_decay = now
+        for table in self._counts.values():
+            for cell in list(table):
+                values = table[cell]
+                for i in range(len(values)):
+                    values[i] *= factor
+                if sum(values) < 0.01:
+                    del table[cell]
+
+    def save_snapshot(self) -> int:
+        """Guardar los contadores (con decaimiento aplicado) en .npz"""
+        now = time.time()
+        with self._lock:
+            self._decay(now)
+            arrays = {}
+            for res, table in self._counts.items():
+                arrays[f'cells_{res}'] = np.array(list(table.keys()), dtype=str)
+                arrays[f'counts_{res}'] = np.array(list(table.values()), dtype=np.float32).reshape(-1, len(METRICS))
+            total_cells = sum(len(table) for table in self._counts.values())
+
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.snapshot_path.with_name(self.snapshot_path.stem + '.tmp.npz')
+        np.savez_compressed(tmp_path, metadata=np.array(json.dumps({'saved_at': now, 'metrics': METRICS})),
+                            **arrays)
+        tmp_path.replace(self.snapshot_path)
+        self.last_snapshot_at = now
+        logger.debug(f"📈 Snapshot de demanda guardado: {total_cells} celdas")
+        return total_cells
+
+    def load_snapshot(self) -> int:
+        """Cargar el último snapshot si existe (decaído por el tiempo transcurrido desde su fecha)"""
+        if not self.snapshot_path.exists():
+            return 0
+        try:
+            with np.load(self.snapshot_path, allow_pickle=False) as data:
+                metadata = json.loads(str(data['metadata']))
+                loaded = {res: dict(zip(data[f'cells_{res}'].tolist(), data[f'counts_{res}'].tolist()))
+                          for res in DEMAND_RESOLUTIONS if f'cells_{res}' in data}
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo cargar snapshot de demanda: {e}")
+            return 0
+
+        # Decaer solo lo cargado: los contadores registrados desde el arranque no envejecen
+        elapsed_s = max(0.0, time.time() - metadata.get('saved_at', time.time()))
+        factor = 0.5 ** (elapsed_s / self.half_life_s) if self.half_life_s > 0 else 1.0
+        with self._lock:
+            for res, table in loaded.items():
+                target = self._counts[res]
+                for cell, values in table.items():
+                    if sum(values) * factor < 0.01:
+                        continue
+                    row = target.setdefault(cell, [0.0, 0.0, 0.0])
+                    for i, value in enumerate(values):
+                        row[i] += value * factor
+            total_cells = sum(len(table) for table in self._counts.values())
+        logger.info(f"📈 Índice de demanda cargado: {total_cells} celdas")
+        return total_cells
+
+    async def run_snapshot_loop(self):
+        """Snapshot periódico en background (sin bloquear el event loop)"""
+        interval_s = settings.DEMAND_INDEX_SNAPSHOT_INTERVAL_S
+        while True:
+            await asyncio.sleep(interval_s)
+            try:
+                await asyncio.to_thread(self.save_snapshot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Error guardando snapshot de demanda: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_resolution = {
+                str(res): {
+                    'cells': len(table),
+                    **{name: round(sum(values[i] for values in table.values()), 1)
+                       for i, name in enumerate(METRICS)}
+                }
+                for res, table in self._counts.items()
+            }
+        return {
+            'enabled': settings.DEMAND_INDEX_ENABLED,
+            'resolutions': by_resolution,
+            'half_life_days': self.half_life_s / 86400,
+            'last_snapshot_at': self.last_snapshot_at,
+            'snapshot_path': str(self.snapshot_path)
+        }
+
+# Instancia global
+_demand_index: Optional[H3DemandIndex] = None
+
+def get_demand_index() -> H3DemandIndex:
+    """Obtener el índice de demanda global"""
+    global _demand_index
+    if _demand_index is None:
+        _demand_index = H3DemandIndex()
+    return _demand_index
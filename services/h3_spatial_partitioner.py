@@ -5,19 +5,44 @@ Implementa clustering automático y bounding boxes según recomendaciones
 """
 
 import h3
+import h3.api.basic_int as h3_int
 import numpy as np
 import pandas as pd
 from typing import List, Dict, Tuple, Set, Optional
-from dataclasses import dataclass
-from collections import defaultdict
+from dataclasses import dataclass, fields
+from functools import lru_cache
 import logging
 from pathlib import Path
 import json
-import pickle
+
+from utils.city_resolver import get_city_resolver
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+BBOX_DECIMALS = 6           # Redondeo de bbox para memoizar su cobertura
+BBOX_COVERAGE_CACHE_SIZE = 512
+
+@lru_cache(maxsize=BBOX_COVERAGE_CACHE_SIZE)
+def _polyfill_bbox_cached(north: float, south: float, east: float, west: float, resolution: int) -> Tuple[str, ...]:
+    """Celdas H3 que intersectan el bbox (memoizado a nivel de proceso)"""
+    polygon = h3.LatLngPoly([(north, west), (north, east), (south, east), (south, west)])
+    return tuple(sorted(h3.polygon_to_cells_experimental(polygon, resolution, contain='overlap')))
+
+def _group_by_cell(cells: np.ndarray) -> Tuple[np.ndarray, np.ndarray, List[np.ndarray]]:
+    """
+    Agrupar índices por celda en orden de primera aparición
+
+    Returns:
+        (celdas únicas, conteos, índices de cada celda)
+    """
+    unique, first_seen, inverse, counts = np.unique(cells, return_index=True, return_inverse=True,
+                                                    return_counts=True)
+    appearance = np.argsort(first_seen, kind="stable")
+    members = np.argsort(inverse, kind="stable")
+    groups = np.split(members, np.cumsum(counts)[:-1])
+    return unique[appearance], counts[appearance], [groups[k] for k in appearance]
+
 @dataclass
 class H3Cluster:
     """Representa un cluster H3 con metadatos"""
@@ -33,6 +58,8 @@ class H3Cluster:
     region_name: Optional[str] = None
     area_km2: Optional[float] = None
 
+_H3_CLUSTER_STR_FIELDS = ('h3_id', 'city_name', 'region_name')
+
 @dataclass
 class RoutingSession:
     """Sesión de routing con cluster automático"""
@@ -59,7 +86,7 @@ class H3SpatialPartitioner:
         self.resolution = resolution
         self.clusters: Dict[str, H3Cluster] = {}
         self.city_mappings: Dict[str, str] = {}  # h3_id -> city_name
-        self.cache_file = Path(__file__).parent.parent / "cache" / "h3_clusters_cache.pkl"
+        self.cache_file = Path(__file__).parent.parent / "cache" / "h3_clusters_cache.npz"
         
         logger.info(f"🗺️ H3Partitioner iniciado - Resolución: {resolution}")
         
@@ -79,6 +106,58 @@ class H3SpatialPartitioner:
         """
         return h3.latlng_to_cell(lat, lon, self.resolution)
     
+    def cells_for(self, coords: np.ndarray) -> np.ndarray:
+        """
+        Convierte un array completo de coordenadas a celdas H3
+        
+        Args:
+            coords: Array (N, 2) de (lat, lon)
+            
+        Returns:
+            Array (N,) de IDs H3 (str), alineado con coords
+        """
+        points = np.asarray(coords, dtype=float).reshape(-1, 2)
+        if len(points) == 0:
+            return np.empty(0, dtype=object)
+        
+        resolution = self.resolution
+        cell_ints = np.fromiter((h3_int.latlng_to_cell(lat, lon, resolution) for lat, lon in points.tolist()),
+                                dtype=np.uint64, count=len(points))
+        # Solo las celdas distintas se formatean como string
+        unique, inverse = np.unique(cell_ints, return_inverse=True)
+        unique_str = np.array([h3.int_to_str(int(cell)) for cell in unique], dtype=object)
+        return unique_str[inverse]
+    
+    def polyfill_bbox(self, bbox: Tuple[float, float, float, float]) -> Tuple[str, ...]:
+        """
+        Celdas H3 que intersectan un bounding box (cobertura memoizada)
+        
+        Args:
+            bbox: (north, south, east, west)
+            
+        Returns:
+            Tupla ordenada de IDs H3
+        """
+        north, south, east, west = (round(float(v), BBOX_DECIMALS) for v in bbox)
+        return _polyfill_bbox_cached(north, south, east, west, self.resolution)
+    
+    def group_pois_by_cell(self, pois: List[Dict]) -> Dict[str, List[Dict]]:
+        """
+        Agrupa POIs por celda H3 en un solo lote
+        
+        Returns:
+            {h3_id: [pois]} en orden de primera aparición
+        """
+        if not pois:
+            return {}
+        cells, _, groups = _group_by_cell(self.cells_for(self._coords_array(pois)))
+        return {h3_id: [pois[i] for i in indices.tolist()] for h3_id, indices in zip(cells.tolist(), groups)}
+    
+    @staticmethod
+    def _coords_array(pois: List[Dict]) -> np.ndarray:
+        return np.fromiter((c for poi in pois for c in (poi['lat'], poi['lon'])),
+                           dtype=float, count=2 * len(pois)).reshape(-1, 2)
+    
     def h3_to_coordinate(self, h3_id: str) -> Tuple[float, float]:
         """
         Convierte ID H3 a coordenadas del centro
@@ -129,23 +208,19 @@ class H3SpatialPartitioner:
         
         logger.info(f"🔍 Clustering automático de {len(pois)} POIs...")
         
-        # Convertir POIs a H3
-        poi_h3_map = {}
-        h3_counter = defaultdict(list)
-        
-        for i, poi in enumerate(pois):
-            h3_id = self.coordinate_to_h3(poi['lat'], poi['lon'])
-            poi_h3_map[i] = h3_id
-            h3_counter[h3_id].append(i)
+        # Convertir POIs a H3 (un solo lote)
+        coords = self._coords_array(pois)
+        cells, counts, _ = _group_by_cell(self.cells_for(coords))
         
-        # Encontrar cluster principal (más POIs)
-        main_cluster = max(h3_counter.keys(), key=lambda x: len(h3_counter[x]))
-        main_cluster_pois = len(h3_counter[main_cluster])
+        # Encontrar cluster principal (más POIs; empate → primera aparición)
+        main_index = int(np.argmax(counts))
+        main_cluster = cells[main_index]
+        main_cluster_pois = int(counts[main_index])
         
         logger.info(f"🎯 Cluster principal: {main_cluster} ({main_cluster_pois} POIs)")
         
         # Obtener clusters vecinos si es necesario
-        all_clusters = set(h3_counter.keys())
+        all_clusters = set(cells.tolist())
         
         if len(all_clusters) > 1:
             # Expandir con vecinos del cluster principal
@@ -156,15 +231,8 @@ class H3SpatialPartitioner:
             relevant_clusters = all_clusters
         
         # Calcular bounding box total
-        all_lats = [poi['lat'] for poi in pois]
-        all_lons = [poi['lon'] for poi in pois]
-        
-        bbox = (
-            max(all_lats),  # north
-            min(all_lats),  # south
-            max(all_lons),  # east
-            min(all_lons)   # west
-        )
+        (south, west), (north, east) = coords.min(axis=0), coords.max(axis=0)
+        bbox = (float(north), float(south), float(east), float(west))
         
         # Estimar área
         lat_diff = bbox[0] - bbox[1]
@@ -199,35 +267,39 @@ class H3SpatialPartitioner:
         """
         logger.info(f"🏙️ Detectando ciudades desde {len(pois)} POIs...")
         
-        # Agrupar por H3
-        h3_groups = defaultdict(list)
-        for poi in pois:
-            h3_id = self.coordinate_to_h3(poi['lat'], poi['lon'])
-            h3_groups[h3_id].append(poi)
+        if not pois:
+            return {}
+        
+        # Agrupar por H3 (un solo lote)
+        coords = self._coords_array(pois)
+        cells, counts, groups = _group_by_cell(self.cells_for(coords))
         
         # Detectar ciudades principales (>= 3 POIs por cluster)
         cities = {}
         city_counter = 1
         
-        for h3_id, poi_group in h3_groups.items():
-            if len(poi_group) >= 3:  # Mínimo POIs para considerar "ciudad"
-                # Estimar nombre de ciudad basándose en coordenadas
-                center_lat, center_lon = self.h3_to_coordinate(h3_id)
-                city_name = self._estimate_city_name(center_lat, center_lon)
-                
-                if not city_name:
-                    city_name = f"Cluster_{city_counter}"
-                    city_counter += 1
-                
-                cities[city_name] = poi_group
-                
-                logger.info(f"   📍 {city_name}: {len(poi_group)} POIs ({center_lat:.4f}, {center_lon:.4f})")
+        # Mínimo POIs para considerar "ciudad"; nombres resueltos en un solo lote
+        main_groups = [(h3_id, [pois[i] for i in indices.tolist()])
+                       for h3_id, count, indices in zip(cells.tolist(), counts, groups) if count >= 3]
+        centers = [tuple(map(float, coords[indices].mean(axis=0)))
+                   for count, indices in zip(counts, groups) if count >= 3]
+        locations = get_city_resolver().resolve_many(centers)
+        
+        for (h3_id, poi_group), (center_lat, center_lon), location in zip(main_groups, centers, locations):
+            city_name = location.city if location else None
+            
+            if not city_name:
+                city_name = f"Cluster_{city_counter}"
+                city_counter += 1
+            
+            # Varias celdas pueden caer en la misma ciudad
+            cities.setdefault(city_name, []).extend(poi_group)
+            
+            logger.info(f"   📍 {city_name}: {len(poi_group)} POIs ({center_lat:.4f}, {center_lon:.4f})")
         
         # POIs restantes van a "Other"
-        remaining_pois = []
-        for h3_id, poi_group in h3_groups.items():
-            if len(poi_group) < 3:
-                remaining_pois.extend(poi_group)
+        remaining_pois = [pois[i] for count, indices in zip(counts, groups) if count < 3
+                          for i in indices.tolist()]
         
         if remaining_pois:
             cities["Other"] = remaining_pois
@@ -237,7 +309,7 @@ class H3SpatialPartitioner:
     
     def _estimate_city_name(self, lat: float, lon: float) -> Optional[str]:
         """
-        Estima nombre de ciudad basándose en coordenadas (mapping básico Chile)
+        Estima nombre de ciudad basándose en coordenadas (resolver offline)
         
         Args:
             lat: Latitud
@@ -246,28 +318,7 @@ class H3SpatialPartitioner:
         Returns:
             Nombre estimado de ciudad o None
         """
-        # Mapping básico de ciudades principales de Chile
-        chile_cities = [
-            ("Santiago", -33.4489, -70.6693, 0.5),
-            ("Valparaíso", -33.0472, -71.6127, 0.3),
-            ("Concepción", -36.8201, -73.0444, 0.3),
-            ("La Serena", -29.9027, -71.2519, 0.2),
-            ("Antofagasta", -23.6509, -70.3975, 0.2),
-            ("Temuco", -38.7359, -72.5904, 0.2),
-            ("Valdivia", -39.8142, -73.2459, 0.2),
-            ("Puerto Montt", -41.4693, -72.9424, 0.2),
-            ("Punta Arenas", -53.1638, -70.9171, 0.3),
-            ("Iquique", -20.2307, -70.1355, 0.2),
-            ("Calama", -22.4667, -68.9167, 0.2),
-            ("Copiapó", -27.3668, -70.3323, 0.2),
-        ]
-        
-        for city_name, city_lat, city_lon, radius in chile_cities:
-            distance = ((lat - city_lat) ** 2 + (lon - city_lon) ** 2) ** 0.5
-            if distance <= radius:
-                return city_name
-        
-        return None
+        return get_city_resolver().city_name(lat, lon)
     
     def create_cluster_metadata(self, h3_id: str, pois: List[Dict]) -> H3Cluster:
         """
@@ -315,31 +366,29 @@ class H3SpatialPartitioner:
         Returns:
             Lista de IDs H3 que intersectan el área
         """
-        north, south, east, west = bbox
-        
-        # Crear polígono del bbox
-        bbox_polygon = [
-            [north, west],  # noroeste
-            [north, east],  # noreste
-            [south, east],  # sureste
-            [south, west],  # suroeste
-        ]
-        
-        # Obtener celdas H3 que cubren el polígono
-        h3_cells = h3.polygon_to_cells(bbox_polygon, self.resolution)
-        
-        return list(h3_cells)
+        return list(self.polyfill_bbox(bbox))
     
     def _save_cache(self):
-        """Guarda clusters en cache para reutilización"""
+        """Guarda clusters en cache (.npz columnar, sin pickle) para reutilización"""
         try:
             self.cache_file.parent.mkdir(exist_ok=True)
-            with open(self.cache_file, 'wb') as f:
-                pickle.dump({
-                    'clusters': self.clusters,
-                    'city_mappings': self.city_mappings,
-                    'resolution': self.resolution
-                }, f)
+            clusters = list(self.clusters.values())
+            columns = {}
+            for column in fields(H3Cluster):
+                values = [getattr(cluster, column.name) for cluster in clusters]
+                if column.name in _H3_CLUSTER_STR_FIELDS:
+                    columns[column.name] = np.array(['' if v is None else v for v in values], dtype=str)
+                elif column.name == 'poi_count':
+                    columns[column.name] = np.array(values, dtype=np.int64)
+                else:
+                    columns[column.name] = np.array([np.nan if v is None else v for v in values], dtype=float)
+            np.savez_compressed(
+                self.cache_file,
+                resolution=np.array(self.resolution),
+                mapping_cells=np.array(list(self.city_mappings.keys()), dtype=str),
+                mapping_cities=np.array(list(self.city_mappings.values()), dtype=str),
+                **columns
+            )
             logger.info(f"💾 Cache H3 guardado: {len(self.clusters)} clusters")
         except Exception as e:
             logger.warning(f"⚠️ No se pudo guardar cache H3: {e}")
@@ -348,15 +397,22 @@ class H3SpatialPartitioner:
         """Carga clusters desde cache si existe"""
         try:
             if self.cache_file.exists():
-                with open(self.cache_file, 'rb') as f:
-                    cache_data = pickle.load(f)
+                with np.load(self.cache_file, allow_pickle=False) as data:
+                    if int(data['resolution']) != self.resolution:
+                        logger.warning("⚠️ Cache H3 con resolución diferente, ignorando")
+                        return
+                    
+                    columns = {column.name: data[column.name].tolist() for column in fields(H3Cluster)}
+                    self.city_mappings = dict(zip(data['mapping_cells'].tolist(), data['mapping_cities'].tolist()))
                 
-                if cache_data.get('resolution') == self.resolution:
-                    self.clusters = cache_data.get('clusters', {})
-                    self.city_mappings = cache_data.get('city_mappings', {})
-                    logger.info(f"💾 Cache H3 cargado: {len(self.clusters)} clusters")
-                else:
-                    logger.warning("⚠️ Cache H3 con resolución diferente, ignorando")
+                for row in zip(*columns.values()):
+                    values = dict(zip(columns.keys(), row))
+                    for name, value in values.items():
+                        if (name in _H3_CLUSTER_STR_FIELDS and value == '' and name != 'h3_id') or \
+                                (isinstance(value, float) and np.isnan(value)):
+                            values[name] = None
+                    self.clusters[values['h3_id']] = H3Cluster(**values)
+                logger.info(f"💾 Cache H3 cargado: {len(self.clusters)} clusters")
         except Exception as e:
             logger.warning(f"⚠️ No se pudo cargar cache H3: {e}")
 
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+🧩 Hierarchical Decomposition Solver - itinerarios con cientos de lugares
+Divide el problema en clusters (DBSCAN + H3), ordena los clusters por sus
+centroides y resuelve las rutas internas en paralelo, uniendo los tramos
+con un refinamiento 2-opt en las fronteras entre clusters.
+"""
+
+import time
+import logging
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Tuple, Any
+
+import h3
+import numpy as np
+from sklearn.cluster import DBSCAN
+
+from settings import settings
+from utils.geo_utils import haversine_matrix_km, EARTH_RADIUS_KM
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+@dataclass
+class HierarchicalCluster:
+    """Cluster del nivel superior con índices a la lista original de lugares"""
+    label: int
+    centroid: Tuple[float, float]
+    place_indices: List[int]
+
+@dataclass
+class HierarchicalSolution:
+    """Resultado de la resolución jerárquica"""
+    route: List[int]                          # Orden de visita (índices de places)
+    cluster_sequence: List[HierarchicalCluster]
+    total_distance_km: float
+    execution_time_ms: float
+    stage_times_ms: Dict[str, float] = field(default_factory=dict)
+    boundary_improvement_km: float = 0.0
+
+def _solve_open_path(coords: np.ndarray,
+                     start: Optional[int] = None,
+                     end: Optional[int] = None,
+                     time_limit_ms: int = 500,
+                     use_metaheuristic: bool = False) -> List[int]:
+    """
+    Camino abierto mínimo sobre coordenadas con extremos opcionales fijos.
+    Se ejecuta en procesos worker, por eso es una función de módulo.
+
+    Args:
+        coords: Array (N, 2) de (lat, lon)
+        start: Índice de inicio fijo (None = libre)
+        end: Índice de término fijo (None = libre)
+        time_limit_ms: Límite de tiempo del solver
+        use_metaheuristic: GLS con límite de tiempo en vez de descenso greedy
+
+    Returns:
+        Orden de visita como índices locales
+    """
+    from ortools.constraint_solver import routing_enums_pb2
+    from ortools.constraint_solver import pywrapcp
+
+    n = len(coords)
+    if n <= 2:
+        order = list(range(n))
+        if (start is not None and order and order[0] != start) or \
+           (start is None and end is not None and order and order[-1] != end):
+            order.reverse()
+        return order
+
+    meters = (haversine_matrix_km(coords) * 1000).round().astype(np.int64)
+
+    # Nodo ficticio con costo 0 para los extremos libres
+    needs_dummy = start is None or end is None
+    size = n + 1 if needs_dummy else n
+    dummy = n
+    if needs_dummy:
+        matrix = np.zeros((size, size), dtype=np.int64)
+        matrix[:n, :n] = meters
+    else:
+        matrix = meters
+    matrix_list = matrix.tolist()
+
+    start_node = dummy if start is None else start
+    end_node = dummy if end is None else end
+    manager = pywrapcp.RoutingIndexManager(size, 1, [start_node], [end_node])
+    routing = pywrapcp.RoutingModel(manager)
+
+    def distance_callback(from_index, to_index):
+        return matrix_list[manager.IndexToNode(from_index)][manager.IndexToNode(to_index)]
+
+    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = (
+        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+    )
+    if use_metaheuristic:
+        search_parameters.local_search_metaheuristic = (
+            routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+        )
+    search_parameters.time_limit.FromMilliseconds(max(50, int(time_limit_ms)))
+
+    solution = routing.SolveWithParameters(search_parameters)
+    if not solution:
+        return list(range(n))
+
+    order = []
+    index = routing.Start(0)
+    while not routing.IsEnd(index):
+        node = manager.IndexToNode(index)
+        if node != dummy or not needs_dummy:
+            order.append(node)
+        index = solution.Value(routing.NextVar(index))
+    if end is not None and (not order or order[-1] != end):
+        order.append(end)
+    return order
+
+# Pool de procesos compartido entre solves (crear workers por request es caro)
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Obtener el pool de procesos global (se crea en el primer uso)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=settings.HIERARCHICAL_MAX_WORKERS)
+        return _executor
+
+def _discard_executor(broken: ProcessPoolExecutor):
+    """Descartar un pool roto para que el siguiente solve cree uno nuevo"""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_executor():
+    """Cerrar el pool de procesos compartido (shutdown de la aplicación)"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def _route_length_km(coords: np.ndarray, route: List[int]) -> float:
+    """Longitud de una ruta secuencial en km"""
+    if len(route) < 2:
+        return 0.0
+    path = coords[route]
+    lat1, lon1 = np.radians(path[:-1, 0]), np.radians(path[:-1, 1])
+    lat2, lon2 = np.radians(path[1:, 0]), np.radians(path[1:, 1])
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return float(np.sum(2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))))
+
+class HierarchicalItinerarySolver:
+    """
+    🧩 Solver jerárquico para listas grandes de lugares (200-500+)
+
+    Etapas:
+    1. Partición: DBSCAN haversine; clusters sobredimensionados se dividen por celdas H3
+    2. Secuencia de clusters: camino abierto sobre centroides
+    3. Rutas internas: caminos con entrada/salida fijas, resueltos en paralelo
+    4. Unión + refinamiento 2-opt en ventanas alrededor de cada frontera
+    """
+
+    def __init__(self,
+                 max_cluster_size: Optional[int] = None,
+                 eps_km: Optional[float] = None,
+                 max_workers: Optional[int] = None,
+                 boundary_window: int = 4):
+        self.max_cluster_size = max_cluster_size or settings.HIERARCHICAL_MAX_CLUSTER_SIZE
+        self.eps_km = eps_km or settings.HIERARCHICAL_EPS_KM
+        self.max_workers = max_workers or settings.HIERARCHICAL_MAX_WORKERS
+        self.boundary_window = boundary_window
+
+    # ========================================================================
+    # 1. PARTICIÓN
+    # ========================================================================
+
+    def partition(self, coords: np.ndarray) -> List[HierarchicalCluster]:
+        """Particionar coordenadas en clusters de tamaño acotado"""
+        clustering = DBSCAN(
+            eps=self.eps_km / EARTH_RADIUS_KM,
+            min_samples=1,
+            metric='haversine',
+            algorithm='ball_tree'
+        ).fit(np.radians(coords))
+
+        groups = defaultdict(list)
+        for i, label in enumerate(clustering.labels_):
+            groups[label].append(i)
+
+        parts: List[List[int]] = []
+        for indices in groups.values():
+            if len(indices) <= self.max_cluster_size:
+                parts.append(indices)
+            else:
+                parts.extend(self._split_with_h3(coords, indices))
+
+        return [
+            HierarchicalCluster(
+                label=label,
+                centroid=tuple(coords[indices].mean(axis=0)),
+                place_indices=indices
+            )
+            for label, indices in enumerate(parts)
+        ]
+
+    def _split_with_h3(self, coords: np.ndarray, indices: List[int]) -> List[List[int]]:
+        """
+        Dividir un cluster grande agrupando celdas H3 contiguas hasta el tamaño máximo
+        """
+        cells = {}
+        for resolution in range(7, 11):
+            cells = defaultdict(list)
+            for i in indices:
+                cells[h3.latlng_to_cell(coords[i, 0], coords[i, 1], resolution)].append(i)
+            if max(len(v) for v in cells.values()) <= self.max_cluster_size:
+                break
+
+        # Crecer regiones por vecindad H3 (BFS) empezando por la celda más al oeste
+        remaining = set(cells.keys())
+        parts = []
+        while remaining:
+            seed = min(remaining, key=lambda c: h3.cell_to_latlng(c)[1])
+            queue = deque([seed])
+            remaining.discard(seed)
+            chunk: List[int] = []
+            while queue:
+                cell = queue.popleft()
+                members = cells[cell]
+                if chunk and len(chunk) + len(members) > self.max_cluster_size:
+                    remaining.add(cell)
+                    continue
+                chunk.extend(members)
+                for neighbor in h3.grid_disk(cell, 1):
+                    if neighbor in remaining:
+                        remaining.discard(neighbor)
+                        queue.append(neighbor)
+            # Celdas individuales aún demasiado grandes se cortan en trozos
+            for offset in range(0, len(chunk), self.max_cluster_size):
+                parts.append(chunk[offset:offset + self.max_cluster_size])
+        return parts
+
+    # ========================================================================
+    # 2-4. SECUENCIA, RUTAS INTERNAS Y UNIÓN
+    # ========================================================================
+
+    def solve(self, places: List[Dict], start_location: Optional[Tuple[float, float]] = None) -> HierarchicalSolution:
+        """
+        Resolver el orden de visita de una lista grande de lugares
+
+        Args:
+            places: Lugares con lat/lon
+            start_location: Punto de partida opcional (ej: hotel)
+
+        Returns:
+            Solución jerárquica con ruta y métricas por etapa
+        """
+        start_time = time.time()
+        stage_times = {}
+        coords = np.array([[p['lat'], p['lon']] for p in places], dtype=float)
+
+        if len(places) <= 2:
+            route = list(range(len(places)))
+            return HierarchicalSolution(route, [], _route_length_km(coords, route) if route else 0.0,
+                                        (time.time() - start_time) * 1000)
+
+        t0 = time.time()
+        clusters = self.partition(coords)
+        stage_times["partition_ms"] = (time.time() - t0) * 1000
+
+        # Secuencia de clusters sobre centroides
+        t0 = time.time()
+        centroids = np.array([c.centroid for c in clusters])
+        first_cluster = None
+        if start_location is not None:
+            first_cluster = int(np.argmin(haversine_matrix_km(np.array([start_location]), centroids)[0]))
+        cluster_order = _solve_open_path(
+            centroids, start=first_cluster, time_limit_ms=settings.HIERARCHICAL_SEQUENCE_TIME_LIMIT_MS,
+            use_metaheuristic=len(clusters) > 3
+        )
+        sequence = [clusters[i] for i in cluster_order]
+        stage_times["cluster_sequence_ms"] = (time.time() - t0) * 1000
+
+        # Entradas/salidas: lugar más cercano al cluster anterior/siguiente.
+        # El primer cluster parte desde el punto de inicio como depósito fijo
+        # (nodo extra al final de sus coordenadas locales, quitado de la ruta).
+        t0 = time.time()
+        jobs = []
+        for pos, cluster in enumerate(sequence):
+            local = coords[cluster.place_indices]
+            n_local = len(cluster.place_indices)
+            if pos == 0 and start_location is not None:
+                entry = n_local
+                job_coords = np.vstack([local, np.array([start_location], dtype=float)])
+            elif pos > 0:
+                anchor = np.array([sequence[pos - 1].centroid])
+                entry = int(np.argmin(haversine_matrix_km(anchor, local)[0]))
+                job_coords = local
+            else:
+                entry = None
+                job_coords = local
+
+            exit_ = None
+            if pos < len(sequence) - 1 and n_local > 1:
+                to_next = haversine_matrix_km(np.array([sequence[pos + 1].centroid]), local)[0]
+                if entry is not None and entry < n_local:
+                    to_next[entry] = np.inf
+                exit_ = int(np.argmin(to_next))
+            jobs.append((job_coords, entry, exit_))
+
+        local_routes = self._solve_intra_cluster_routes(jobs)
+        if start_location is not None and local_routes:
+            depot = len(sequence[0].place_indices)
+            local_routes[0] = [i for i in local_routes[0] if i != depot]
+        stage_times["intra_cluster_ms"] = (time.time() - t0) * 1000
+
+        # Unión y refinamiento en fronteras
+        t0 = time.time()
+        route: List[int] = []
+        boundaries = []
+        for cluster, local_route in zip(sequence, local_routes):
+            if route:
+                boundaries.append(len(route))
+            route.extend(cluster.place_indices[i] for i in local_route)
+
+        before_km = _route_length_km(coords, route)
+        route = self._refine_boundaries(coords, route, boundaries, fixed_start=start_location is not None)
+        total_km = _route_length_km(coords, route)
+        stage_times["boundary_refinement_ms"] = (time.time() - t0) * 1000
+
+        execution_time = (time.time() - start_time) * 1000
+        logger.info(f"🧩 Hierarchical solve: {len(places)} lugares, {len(clusters)} clusters, "
+                    f"{total_km:.1f}km, {execution_time:.0f}ms")
+
+        return HierarchicalSolution(
+            route=route,
+            cluster_sequence=sequence,
+            total_distance_km=total_km,
+            execution_time_ms=execution_time,
+            stage_times_ms={k: round(v, 1) for k, v in stage_times.items()},
+            boundary_improvement_km=round(before_km - total_km, 3)
+        )
+
+    def _solve_intra_cluster_routes(self, jobs: List[Tuple[np.ndarray, Optional[int], Optional[int]]]) -> List[List[int]]:
+        """Resolver rutas internas en paralelo (procesos) o en línea si no vale la pena"""
+        time_limit_ms = settings.HIERARCHICAL_INTRA_TIME_LIMIT_MS
+        args = (
+            [job[0] for job in jobs],
+            [job[1] for job in jobs],
+            [job[2] for job in jobs],
+            [time_limit_ms] * len(jobs)
+        )
+
+        if self.max_workers > 1 and len(jobs) > 1:
+            executor = None
+            try:
+                executor = _get_executor()
+                return list(executor.map(_solve_open_path, *args, chunksize=max(1, len(jobs) // (4 * self.max_workers))))
+            except BrokenProcessPool as e:
+                logger.warning(f"⚠️ Pool de procesos roto ({e}) - se recreará; resolviendo en línea")
+                _discard_executor(executor)
+            except Exception as e:
+                logger.warning(f"⚠️ Pool de procesos no disponible ({e}) - resolviendo en línea")
+
+        return [_solve_open_path(*job_args) for job_args in zip(*args)]
+
+    def _refine_boundaries(self, coords: np.ndarray, route: List[int],
+                           boundaries: List[int], fixed_start: bool) -> List[int]:
+        """2-opt restringido a ventanas alrededor de cada unión entre clusters"""
+        n = len(route)
+        w = self.boundary_window
+
+        def dist(i: int, j: int) -> float:
+            return float(haversine_matrix_km(coords[[i]], coords[[j]])[0, 0])
+
+        for boundary in boundaries:
+            lo = max(1 if fixed_start else 0, boundary - w)
+            hi = min(n - 1, boundary + w - 1)
+            improved = True
+            while improved:
+                improved = False
+                for a in range(lo, hi):
+                    for b in range(a + 1, hi + 1):
+                        before = ((dist(route[a - 1], route[a]) if a > 0 else 0.0) +
+                                  (dist(route[b], route[b + 1]) if b < n - 1 else 0.0))
+                        after = ((dist(route[a - 1], route[b]) if a > 0 else 0.0) +
+                                 (dist(route[a], route[b + 1]) if b < n - 1 else 0.0))
+                        if after < before - 1e-6:
+                            route[a:b + 1] = route[a:b + 1][::-1]
+                            improved = True
+        return route
+
+    # ========================================================================
+    # BENCHMARK VS SOLVE PLANO
+    # ========================================================================
+
+    def solve_flat(self, places: List[Dict], time_limit_s: float = 10.0) -> Dict[str, Any]:
+        """Resolver el problema completo en un único modelo OR-Tools (referencia)"""
+        start_time = time.time()
+        coords = np.array([[p['lat'], p['lon']] for p in places], dtype=float)
+        route = _solve_open_path(coords, time_limit_ms=int(time_limit_s * 1000), use_metaheuristic=True)
+        return {
+            "route": route,
+            "total_distance_km": _route_length_km(coords, route),
+            "execution_time_ms": (time.time() - start_time) * 1000
+        }
+
+    def benchmark_against_flat(self, places: List[Dict], flat_time_limit_s: float = 10.0) -> Dict[str, Any]:
+        """Comparar calidad y latencia del solve jerárquico contra el plano"""
+        hierarchical = self.solve(places)
+        flat = self.solve_flat(places, flat_time_limit_s)
+        gap_pct = (
+            (hierarchical.total_distance_km - flat["total_distance_km"]) / flat["total_distance_km"] * 100
+            if flat["total_distance_km"] > 0 else 0.0
+        )
+        return {
+            "places": len(places),
+            "clusters": len(hierarchical.cluster_sequence),
+            "hierarchical": {
+                "total_distance_km": round(hierarchical.total_distance_km, 2),
+                "execution_time_ms": round(hierarchical.execution_time_ms, 1),
+                "stage_times_ms": hierarchical.stage_times_ms
+            },
+            "flat": {
+                "total_distance_km": round(flat["total_distance_km"], 2),
+                "execution_time_ms": round(flat["execution_time_ms"], 1)
+            },
+            "distance_gap_pct": round(gap_pct, 2),
+            "speedup": round(flat["execution_time_ms"] / max(hierarchical.execution_time_ms, 1e-3), 2)
+        }
+
+if __name__ == "__main__":
+    """Benchmark jerárquico vs plano con lugares sintéticos en Santiago"""
+
+    print("🧩 TESTING HIERARCHICAL SOLVER")
+    print("=" * 50)
+
+    rng = np.random.default_rng(42)
+    solver = HierarchicalItinerarySolver()
+
+    for n_places in (200, 500):
+        # Varios barrios con dispersión urbana
+        centers = rng.uniform([-33.55, -70.75], [-33.35, -70.50], size=(12, 2))
+        picks = centers[rng.integers(0, len(centers), n_places)]
+        points = picks + rng.normal(0, 0.01, size=(n_places, 2))
+        test_places = [{"name": f"POI_{i}", "lat": lat, "lon": lon} for i, (lat, lon) in enumerate(points)]
+
+        report = solver.benchmark_against_flat(test_places, flat_time_limit_s=10.0)
+        print(f"\n📍 {n_places} lugares / {report['clusters']} clusters")
+        print(f"   Jerárquico: {report['hierarchical']['total_distance_km']}km en {report['hierarchical']['execution_time_ms']}ms")
+        print(f"   Plano:      {report['flat']['total_distance_km']}km en {report['flat']['execution_time_ms']}ms")
+        print(f"   Gap: {report['distance_gap_pct']}%  Speedup: {report['speedup']}x")
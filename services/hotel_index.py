@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+🏨 Hotel Index - Índice espacial de hoteles por ciudad
+- Base local de hoteles (HOTEL_DATABASE) agrupada por city_key
+- Hoteles de Google Places cacheados por place_id (con TTL y tope de tamaño), asignados a su ciudad
+- Centros de las Nearby Search ya hechas (con TTL): solo un área ya buscada reutiliza la caché
+- Por ciudad: arrays (N, 2) de coordenadas, ratings y rangos de precio listos para
+  scoring vectorizado; BallTree haversine global para consultas por radio / vecino más cercano
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from settings import settings
+from utils.city_resolver import get_city_resolver
+from utils.geo_utils import haversine_km
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+
+# Base local de hoteles por city_key
+HOTEL_DATABASE: Dict[str, List[Dict[str, Any]]] = {
+    "santiago": [
+        {
+            "name": "Hotel Sheraton Santiago",
+            "lat": -33.4172,
+            "lon": -70.6060,
+            "address": "Av. Santa María 1742, Providencia",
+            "rating": 4.6,
+            "price_range": "high"
+        },
+        {
+            "name": "W Santiago",
+            "lat": -33.4150,
+            "lon": -70.6100,
+            "address": "Isidora Goyenechea 3000, Las Condes",
+            "rating": 4.7,
+            "price_range": "high"
+        },
+        {
+            "name": "Hotel Plaza San Francisco",
+            "lat": -33.4372,
+            "lon": -70.6506,
+            "address": "Alameda 816, Santiago Centro",
+            "rating": 4.5,
+            "price_range": "medium"
+        },
+        {
+            "name": "Hotel Carrera",
+            "lat": -33.4378,
+            "lon": -70.6511,
+            "address": "Teatinos 180, Santiago Centro",
+            "rating": 4.2,
+            "price_range": "medium"
+        },
+        {
+            "name": "Ibis Santiago Providencia",
+            "lat": -33.4372,
+            "lon": -70.6172,
+            "address": "Eliodoro Yáñez 1800, Providencia",
+            "rating": 4.0,
+            "price_range": "low"
+        },
+        {
+            "name": "Hotel Director Vitacura",
+            "lat": -33.3890,
+            "lon": -70.5950,
+            "address": "Av. Vitacura 3600, Vitacura",
+            "rating": 4.4,
+            "price_range": "high"
+        },
+        {
+            "name": "Hotel Magnolia Santiago Centro",
+            "lat": -33.4389,
+            "lon": -70.6507,
+            "address": "Huérfanos 539, Santiago Centro",
+            "rating": 4.1,
+            "price_range": "medium"
+        },
+        {
+            "name": "Best Western Los Condes",
+            "lat": -33.4089,
+            "lon": -70.5950,
+            "address": "Vitacura 4873, Las Condes",
+            "rating": 4.0,
+            "price_range": "medium"
+        },
+        {
+            "name": "Hotel Boutique Castillo Rojo",
+            "lat": -33.4262,
+            "lon": -70.6344,
+            "address": "Constitución 195, Bellavista",
+            "rating": 4.3,
+            "price_range": "medium"
+        },
+        {
+            "name": "Hotel NH Ciudad de Santiago",
+            "lat": -33.4350,
+            "lon": -70.6450,
+            "address": "Av. O'Higgins 136, Santiago Centro",
+            "rating": 4.2,
+            "price_range": "medium"
+        }
+    ],
+    "antofagasta": [
+        {
+            "name": "Hotel Terrado Antofagasta",
+            "lat": -23.646929,
+            "lon": -70.4031467,
+            "address": "Avenida Balmaceda 2575, Antofagasta",
+            "rating": 4.5,
+            "price_range": "high"
+        },
+        {
+            "name": "Hotel Antofagasta",
+            "lat": -23.6500,
+            "lon": -70.3977,
+            "address": "Av. Grecia 1490, Antofagasta",
+            "rating": 4.3,
+            "price_range": "medium"
+        },
+        {
+            "name": "Ibis Antofagasta",
+            "lat": -23.6435,
+            "lon": -70.3955,
+            "address": "Av. Grecia 1171, Antofagasta",
+            "rating": 4.0,
+            "price_range": "low"
+        }
+    ],
+    "calama": [
+        {
+            "name": "Hotel Diego de Almagro Calama",
+            "lat": -22.4583,
+            "lon": -68.9204,
+            "address": "Av. Granaderos 3452, Calama",
+            "rating": 4.2,
+            "price_range": "medium"
+        },
+        {
+            "name": "Park Plaza Calama",
+            "lat": -22.4595,
+            "lon": -68.9215,
+            "address": "Av. Balmaceda 2634, Calama",
+            "rating": 4.1,
+            "price_range": "medium"
+        }
+    ],
+    # Ciudades europeas para multi-ciudad
+    "paris": [
+        {
+            "name": "Hotel Le Meurice",
+            "lat": 48.8656,
+            "lon": 2.3279,
+            "address": "228 Rue de Rivoli, Paris",
+            "rating": 4.8,
+            "price_range": "high"
+        },
+        {
+            "name": "Hotel des Grands Boulevards",
+            "lat": 48.8719,
+            "lon": 2.3432,
+            "address": "17 Boulevard Poissonnière, Paris",
+            "rating": 4.5,
+            "price_range": "high"
+        },
+        {
+            "name": "Hotel Malte Opera",
+            "lat": 48.8719,
+            "lon": 2.3432,
+            "address": "63 Rue de Richelieu, Paris",
+            "rating": 4.2,
+            "price_range": "medium"
+        },
+        {
+            "name": "Hotel ibis Paris Centre",
+            "lat": 48.8566,
+            "lon": 2.3522,
+            "address": "35 Boulevard Saint-Marcel, Paris",
+            "rating": 4.0,
+            "price_range": "medium"
+        }
+    ],
+    "amsterdam": [
+        {
+            "name": "Waldorf Astoria Amsterdam",
+            "lat": 52.3676,
+            "lon": 4.9041,
+            "address": "Herengracht 542-556, Amsterdam",
+            "rating": 4.7,
+            "price_range": "high"
+        },
+        {
+            "name": "Hotel V Nesplein",
+            "lat": 52.3654,
+            "lon": 4.8944,
+            "address": "Nesplein 49, Amsterdam",
+            "rating": 4.4,
+            "price_range": "medium"
+        },
+        {
+            "name": "Hotel NH Amsterdam Centre",
+            "lat": 52.3702,
+            "lon": 4.8952,
+            "address": "Stadhouderskade 7, Amsterdam",
+            "rating": 4.2,
+            "price_range": "medium"
+        }
+    ],
+    "berlin": [
+        {
+            "name": "Hotel Adlon Kempinski Berlin",
+            "lat": 52.5163,
+            "lon": 13.3777,
+            "address": "Unter den Linden 77, Berlin",
+            "rating": 4.8,
+            "price_range": "high"
+        },
+        {
+            "name": "Meininger Hotel Berlin Mitte",
+            "lat": 52.5200,
+            "lon": 13.4050,
+            "address": "Hallesches Ufer 30, Berlin",
+            "rating": 4.1,
+            "price_range": "low"
+        },
+        {
+            "name": "Hotel Hackescher Hof",
+            "lat": 52.5243,
+            "lon": 13.4015,
+            "address": "Große Präsidentenstraße 8, Berlin",
+            "rating": 4.3,
+            "price_range": "medium"
+        }
+    ],
+    "rome": [
+        {
+            "name": "Hotel de Russie",
+            "lat": 41.9109,
+            "lon": 12.4776,
+            "address": "Via del Babuino 9, Rome",
+            "rating": 4.7,
+            "price_range": "high"
+        },
+        {
+            "name": "Hotel Artemide",
+            "lat": 41.9028,
+            "lon": 12.4964,
+            "address": "Via Nazionale 22, Rome",
+            "rating": 4.4,
+            "price_range": "medium"
+        }
+    ],
+    "barcelona": [
+        {
+            "name": "Hotel Casa Fuster",
+            "lat": 41.4036,
+            "lon": 2.1540,
+            "address": "Passeig de Gràcia 132, Barcelona",
+            "rating": 4.6,
+            "price_range": "high"
+        },
+        {
+            "name": "Hotel Barcelona Gothic",
+            "lat": 41.3851,
+            "lon": 2.1734,
+            "address": "Carrer Jaume I, 14, Barcelona",
+            "rating": 4.2,
+            "price_range": "medium"
+        }
+    ]
+}
+
+@dataclass(frozen=True)
+class HotelCandidates:
+    """Hoteles de un bucket como arrays alineados (sin copiar los dicts)"""
+    hotels: List[Dict[str, Any]]
+    coords: np.ndarray        # (N, 2) lat, lon
+    ratings: np.ndarray       # (N,)
+    price_ranges: np.ndarray  # (N,) str
+
+    def __len__(self) -> int:
+        return len(self.hotels)
+
+    def filter_price(self, price_preference: str) -> "HotelCandidates":
+        """Subconjunto por rango de precio ("any" devuelve el mismo objeto)"""
+        if price_preference == "any":
+            return self
+        mask = self.price_ranges == price_preference
+        return HotelCandidates(
+            hotels=[hotel for hotel, keep in zip(self.hotels, mask.tolist()) if keep],
+            coords=self.coords[mask],
+            ratings=self.ratings[mask],
+            price_ranges=self.price_ranges[mask]
+        )
+
+def _build_candidates(hotels: List[Dict[str, Any]]) -> HotelCandidates:
+    return HotelCandidates(
+        hotels=hotels,
+        coords=np.array([(h['lat'], h['lon']) for h in hotels], dtype=float).reshape(-1, 2),
+        ratings=np.array([h.get('rating', 3.0) for h in hotels], dtype=float),
+        price_ranges=np.array([h.get('price_range', 'medium') for h in hotels], dtype=str)
+    )
+
+class HotelIndex:
+    """
+    🏨 Índice de hoteles (base local + Google Places por place_id)
+
+    Uso:
+        index = get_hotel_index()
+        candidates = index.city_candidates('santiago')         # HotelCandidates o None
+        index.add_google_hotels(hotels)                          # cachear resultados de Places
+        index.add_google_search(lat, lon)                        # registrar el área buscada
+        if index.google_search_covers(lat, lon, max_distance_km=2.5):
+            cached = index.google_hotels_near(lat, lon, radius_km=5)
+        hotel, distance_km = index.nearest(lat, lon)
+    """
+
+    def __init__(self, hotel_database: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        self.google_ttl_s = settings.HOTEL_INDEX_GOOGLE_TTL_H * 3600
+        self._lock = threading.Lock()
+        self._static: Dict[str, List[Dict[str, Any]]] = {
+            city_key: list(hotels) for city_key, hotels in (hotel_database or HOTEL_DATABASE).items()
+        }
+        # place_id → (hotel, city_key, expires_at), en orden de inserción (el más antiguo se descarta primero)
+        self._google: Dict[str, Tuple[Dict[str, Any], Optional[str], float]] = {}
+        # Centros de Nearby Search ya hechas: (lat, lon, expires_at), en orden de inserción
+        self._google_searches: List[Tuple[float, float, float]] = []
+        self._candidates: Dict[str, HotelCandidates] = {}
+        self._all_hotels: List[Dict[str, Any]] = []
+        self._tree: Optional[BallTree] = None
+        self._dirty = True
+        # Primer vencimiento de un hotel de Google: pasado este instante se reconstruye
+        self._next_expiry = float('inf')
+        self.stats = {'google_hits': 0, 'google_misses': 0, 'google_stored': 0, 'google_evicted': 0}
+
+    # ========================================================================
+    # CONSTRUCCIÓN
+    # ========================================================================
+
+    def _rebuild(self):
+        """Reconstruir buckets y BallTree (solo tras cambios; N es pequeño)"""
+        now = time.time()
+        expired = [place_id for place_id, (_, _, expires_at) in self._google.items() if expires_at < now]
+        for place_id in expired:
+            del self._google[place_id]
+
+        buckets: Dict[str, List[Dict[str, Any]]] = {key: list(hotels) for key, hotels in self._static.items()}
+        for hotel, city_key, _ in self._google.values():
+            if city_key:
+                buckets.setdefault(city_key, []).append(hotel)
+
+        self._next_expiry = min((expires_at for _, _, expires_at in self._google.values()), default=float('inf'))
+        self._candidates = {key: _build_candidates(hotels) for key, hotels in buckets.items() if hotels}
+        self._all_hotels = [hotel for hotels in self._static.values() for hotel in hotels]
+        self._all_hotels += [hotel for hotel, _, _ in self._google.values()]
+        if self._all_hotels:
+            coords = np.array([(h['lat'], h['lon']) for h in self._all_hotels], dtype=float)
+            self._tree = BallTree(np.radians(coords), metric='haversine')
+        else:
+            self._tree = None
+        self._dirty = False
+
+    def _ensure_built(self):
+        """Reconstruir si hubo cambios o venció algún hotel de Google (ninguna lectura ve hoteles expirados)"""
+        if self._dirty or time.time() >= self._next_expiry:
+            self._rebuild()
+
+    def add_google_hotels(self, hotels: List[Dict[str, Any]]) -> int:
+        """Cachear hoteles de Google Places por place_id (se asignan a su ciudad con el resolver)"""
+        expires_at = time.time() + self.google_ttl_s
+        resolver = get_city_resolver()
+        stored = 0
+        with self._lock:
+            for hotel in hotels:
+                place_id = hotel.get('google_place_id')
+                if not place_id:
+                    continue
+                location = resolver.resolve(hotel['lat'], hotel['lon'])
+                self._google.pop(place_id, None)
+                self._google[place_id] = (dict(hotel), location.city_key if location else None, expires_at)
+                stored += 1
+            if stored:
+                overflow = len(self._google) - settings.HOTEL_INDEX_GOOGLE_MAX_HOTELS
+                for place_id in list(self._google)[:max(0, overflow)]:
+                    del self._google[place_id]
+                self.stats['google_stored'] += stored
+                self.stats['google_evicted'] += max(0, overflow)
+                self._dirty = True
+        return stored
+
+    def add_google_search(self, lat: float, lon: float):
+        """Registrar el centro de una Nearby Search hecha (aunque no haya devuelto hoteles)"""
+        now = time.time()
+        with self._lock:
+            searches = [search for search in self._google_searches if search[2] >= now]
+            searches.append((lat, lon, now + self.google_ttl_s))
+            self._google_searches = searches[-settings.HOTEL_INDEX_GOOGLE_MAX_SEARCHES:]
+
+    # ========================================================================
+    # CONSULTAS
+    # ========================================================================
+
+    def __contains__(self, city_key: Optional[str]) -> bool:
+        return city_key is not None and city_key in self._static
+
+    def city_hotels(self, city_key: str) -> List[Dict[str, Any]]:
+        """Hoteles de la base local de una ciudad"""
+        return self._static.get(city_key, [])
+
+    def city_candidates(self, city_key: Optional[str]) -> Optional[HotelCandidates]:
+        """Hoteles de una ciudad (base local + Google cacheados) como arrays"""
+        with self._lock:
+            self._ensure_built()
+            return self._candidates.get(city_key) if city_key else None
+
+    def within_radius(self, lat: float, lon: float, radius_km: float) -> List[Tuple[Dict[str, Any], float]]:
+        """Hoteles a menos de radius_km, ordenados por distancia"""
+        with self._lock:
+            self._ensure_built()
+            if self._tree is None:
+                return []
+            indices, distances = self._tree.query_radius(
+                np.radians([[lat, lon]]), r=radius_km / EARTH_RADIUS_KM,
+                return_distance=True, sort_results=True
+            )
+            return [(self._all_hotels[i], float(d) * EARTH_RADIUS_KM)
+                    for i, d in zip(indices[0].tolist(), distances[0].tolist())]
+
+    def nearest(self, lat: float, lon: float) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Hotel más cercano (base local o Google cacheado) y su distancia en km"""
+        with self._lock:
+            self._ensure_built()
+            if self._tree is None:
+                return None
+            distances, indices = self._tree.query(np.radians([[lat, lon]]), k=1)
+            return self._all_hotels[int(indices[0, 0])], float(distances[0, 0]) * EARTH_RADIUS_KM
+
+    def google_search_covers(self, lat: float, lon: float, max_distance_km: float) -> bool:
+        """True si una Nearby Search vigente se hizo a menos de max_distance_km del punto"""
+        now = time.time()
+        with self._lock:
+            covered = any(
+                expires_at >= now and haversine_km(lat, lon, search_lat, search_lon) <= max_distance_km
+                for search_lat, search_lon, expires_at in self._google_searches
+            )
+            self.stats['google_hits' if covered else 'google_misses'] += 1
+        return covered
+
+    def google_hotels_near(self, lat: float, lon: float, radius_km: float) -> List[Dict[str, Any]]:
+        """Hoteles de Google cacheados alrededor de un punto"""
+        return [hotel for hotel, _ in self.within_radius(lat, lon, radius_km) if hotel.get('google_place_id')]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._ensure_built()
+            return {
+                **self.stats,
+                'cities': len(self._candidates),
+                'static_hotels': sum(len(hotels) for hotels in self._static.values()),
+                'google_hotels': len(self._google),
+                'google_searches': len(self._google_searches),
+                'google_ttl_h': settings.HOTEL_INDEX_GOOGLE_TTL_H
+            }
+
+# Instancia global
+_hotel_index: Optional[HotelIndex] = None
+
+def get_hotel_index() -> HotelIndex:
+    """Obtener el índice de hoteles global"""
+    global _hotel_index
+    if _hotel_index is None:
+        _hotel_index = HotelIndex()
+    return _hotel_index
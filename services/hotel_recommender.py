@@ -4,6 +4,7 @@ Recomienda hoteles para viajes multi-ciudad con scheduling inteligente
 Soporta intercity travel, multi-day stays, y accommodation orchestration
 """
 
+import asyncio
 import logging
 from typing import List, Dict, Tuple, Optional, Set
 from dataclasses import dataclass, field
@@ -11,6 +12,23 @@ import math
 from datetime import datetime, timedelta
 from geopy.distance import geodesic
 
+import numpy as np
+
+from services.hotel_index import HOTEL_DATABASE, HotelCandidates, get_hotel_index
+from utils.city_resolver import get_city_resolver
+from utils.geo_utils import haversine_matrix_km
+from utils.places_quota_manager import quota_priority, QuotaPriority
+
+# Radio de la Nearby Search de alojamiento (los hoteles cacheados se reutilizan dentro de él)
+GOOGLE_HOTEL_SEARCH_RADIUS_KM = 5.0
+# Centroides a menos de esta distancia comparten una misma búsqueda
+GOOGLE_HOTEL_AREA_MERGE_KM = GOOGLE_HOTEL_SEARCH_RADIUS_KM / 2
+
+# Planificador multi-ciudad: candidatos por ciudad y peso de los traslados entre hoteles
+MULTI_CITY_MAX_CANDIDATES = 50
+MULTI_CITY_HOTEL_RADIUS_KM = 15.0  # Ciudades fuera de la base local: hoteles indexados alrededor del centro
+ACCOMMODATION_TRANSFER_KM_PER_COST = 25.0  # 25 km extra de traslado = 1 noche en el peor hotel
+
 @dataclass
 class HotelRecommendation:
     name: str
@@ -39,6 +57,8 @@ class MultiCityAccommodationPlan:
     total_cities: int = 0
     estimated_cost: float = 0.0
     intercity_optimization: Dict = field(default_factory=dict)
+    # Candidatos precalculados por ciudad (permiten re-optimizar al cambiar la secuencia)
+    candidate_tables: Dict[str, "CityHotelCandidates"] = field(default_factory=dict, repr=False)
     
     def add_city_accommodation(self, city: str, hotel: HotelRecommendation, 
                              nights: int, check_in_day: int):
@@ -56,262 +76,67 @@ class MultiCityAccommodationPlan:
         """Retorna secuencia de ciudades con accommodations"""
         return [acc['city'] for acc in sorted(self.accommodations, key=lambda x: x['check_in_day'])]
 
+@dataclass
+class CityHotelCandidates:
+    """Candidatos de una ciudad para el planificador multi-ciudad (ordenados por conveniencia)"""
+    city: str
+    coordinates: Optional[Tuple[float, float]]
+    hotels: List[HotelRecommendation]
+    coords: np.ndarray      # (K, 2) lat, lon
+    intra_cost: np.ndarray  # (K,) coste por noche = 1 - conveniencia
+
+def viterbi_accommodation_sequence(intra_costs: List[np.ndarray], coords: List[np.ndarray],
+                                   km_per_cost: float = ACCOMMODATION_TRANSFER_KM_PER_COST) -> Tuple[List[int], float]:
+    """
+    Un hotel por ciudad minimizando Σ coste intra-ciudad + Σ traslados entre hoteles consecutivos
+    
+    Programación dinámica tipo Viterbi sobre la secuencia de ciudades: O(C·K²) con una
+    matriz de distancias K×K por transición (10 ciudades × 50 candidatos < 1ms)
+    
+    Returns:
+        (índice del hotel elegido en cada ciudad, coste total)
+    """
+    if not intra_costs:
+        return [], 0.0
+    
+    cost = np.asarray(intra_costs[0], dtype=float)
+    backpointers = []
+    for t in range(1, len(intra_costs)):
+        total = cost[:, None] + haversine_matrix_km(coords[t - 1], coords[t]) / km_per_cost
+        best_prev = total.argmin(axis=0)
+        backpointers.append(best_prev)
+        cost = total[best_prev, np.arange(total.shape[1])] + intra_costs[t]
+    
+    choice = [int(cost.argmin())]
+    total_cost = float(cost[choice[0]])
+    for best_prev in reversed(backpointers):
+        choice.append(int(best_prev[choice[-1]]))
+    return choice[::-1], total_cost
+
+def convenience_scores(distance_to_centroid: np.ndarray, weighted_avg_distance: np.ndarray,
+                       ratings: np.ndarray) -> np.ndarray:
+    """
+    Score de conveniencia vectorizado (admite broadcasting: (N,) o (N, G))
+    
+    - 30% distancia al centroide (normalizada a 10km)
+    - 40% distancia promedio ponderada por prioridad a los lugares (normalizada a 8km)
+    - 20% rating del hotel
+    - 10% bonus por zona central (< 2km: 0.2, < 5km: 0.1)
+    """
+    centroid_score = np.maximum(0, 1 - distance_to_centroid / 10)
+    distance_score = np.maximum(0, 1 - weighted_avg_distance / 8)
+    rating_score = ratings / 5.0
+    centro_bonus = np.where(distance_to_centroid < 2, 0.2, np.where(distance_to_centroid < 5, 0.1, 0.0))
+    return np.minimum(1.0, centroid_score * 0.3 + distance_score * 0.4 + rating_score * 0.2 + centro_bonus * 0.1)
+
 class HotelRecommender:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         
         # Base de datos de hoteles por ciudad (expandida para multi-ciudad)
-        self.hotel_database = {
-            "santiago": [
-                {
-                    "name": "Hotel Sheraton Santiago",
-                    "lat": -33.4172,
-                    "lon": -70.6060,
-                    "address": "Av. Santa María 1742, Providencia",
-                    "rating": 4.6,
-                    "price_range": "high"
-                },
-            {
-                "name": "W Santiago",
-                "lat": -33.4150,
-                "lon": -70.6100,
-                "address": "Isidora Goyenechea 3000, Las Condes",
-                "rating": 4.7,
-                "price_range": "high"
-            },
-            {
-                "name": "Hotel Plaza San Francisco",
-                "lat": -33.4372,
-                "lon": -70.6506,
-                "address": "Alameda 816, Santiago Centro",
-                "rating": 4.5,
-                "price_range": "medium"
-            },
-            {
-                "name": "Hotel Carrera",
-                "lat": -33.4378,
-                "lon": -70.6511,
-                "address": "Teatinos 180, Santiago Centro",
-                "rating": 4.2,
-                "price_range": "medium"
-            },
-            {
-                "name": "Ibis Santiago Providencia",
-                "lat": -33.4372,
-                "lon": -70.6172,
-                "address": "Eliodoro Yáñez 1800, Providencia",
-                "rating": 4.0,
-                "price_range": "low"
-            },
-            {
-                "name": "Hotel Director Vitacura",
-                "lat": -33.3890,
-                "lon": -70.5950,
-                "address": "Av. Vitacura 3600, Vitacura",
-                "rating": 4.4,
-                "price_range": "high"
-            },
-            {
-                "name": "Hotel Magnolia Santiago Centro",
-                "lat": -33.4389,
-                "lon": -70.6507,
-                "address": "Huérfanos 539, Santiago Centro",
-                "rating": 4.1,
-                "price_range": "medium"
-            },
-            {
-                "name": "Best Western Los Condes",
-                "lat": -33.4089,
-                "lon": -70.5950,
-                "address": "Vitacura 4873, Las Condes",
-                "rating": 4.0,
-                "price_range": "medium"
-            },
-            {
-                "name": "Hotel Boutique Castillo Rojo",
-                "lat": -33.4262,
-                "lon": -70.6344,
-                "address": "Constitución 195, Bellavista",
-                "rating": 4.3,
-                "price_range": "medium"
-            },
-            {
-                "name": "Hotel NH Ciudad de Santiago",
-                "lat": -33.4350,
-                "lon": -70.6450,
-                "address": "Av. O'Higgins 136, Santiago Centro",
-                "rating": 4.2,
-                "price_range": "medium"
-            }
-        ],
-        "antofagasta": [
-            {
-                "name": "Hotel Terrado Antofagasta",
-                "lat": -23.646929,
-                "lon": -70.4031467,
-                "address": "Avenida Balmaceda 2575, Antofagasta",
-                "rating": 4.5,
-                "price_range": "high"
-            },
-            {
-                "name": "Hotel Antofagasta",
-                "lat": -23.6500,
-                "lon": -70.3977,
-                "address": "Av. Grecia 1490, Antofagasta",
-                "rating": 4.3,
-                "price_range": "medium"
-            },
-            {
-                "name": "Ibis Antofagasta",
-                "lat": -23.6435,
-                "lon": -70.3955,
-                "address": "Av. Grecia 1171, Antofagasta",
-                "rating": 4.0,
-                "price_range": "low"
-            }
-        ],
-        "calama": [
-            {
-                "name": "Hotel Diego de Almagro Calama",
-                "lat": -22.4583,
-                "lon": -68.9204,
-                "address": "Av. Granaderos 3452, Calama",
-                "rating": 4.2,
-                "price_range": "medium"
-            },
-            {
-                "name": "Park Plaza Calama",
-                "lat": -22.4595,
-                "lon": -68.9215,
-                "address": "Av. Balmaceda 2634, Calama",
-                "rating": 4.1,
-                "price_range": "medium"
-            }
-        ],
-        # Ciudades europeas para multi-ciudad
-        "paris": [
-            {
-                "name": "Hotel Le Meurice",
-                "lat": 48.8656,
-                "lon": 2.3279,
-                "address": "228 Rue de Rivoli, Paris",
-                "rating": 4.8,
-                "price_range": "high"
-            },
-            {
-                "name": "Hotel des Grands Boulevards",
-                "lat": 48.8719,
-                "lon": 2.3432,
-                "address": "17 Boulevard Poissonnière, Paris",
-                "rating": 4.5,
-                "price_range": "high"
-            },
-            {
-                "name": "Hotel Malte Opera",
-                "lat": 48.8719,
-                "lon": 2.3432,
-                "address": "63 Rue de Richelieu, Paris",
-                "rating": 4.2,
-                "price_range": "medium"
-            },
-            {
-                "name": "Hotel ibis Paris Centre",
-                "lat": 48.8566,
-                "lon": 2.3522,
-                "address": "35 Boulevard Saint-Marcel, Paris",
-                "rating": 4.0,
-                "price_range": "medium"
-            }
-        ],
-        "amsterdam": [
-            {
-                "name": "Waldorf Astoria Amsterdam",
-                "lat": 52.3676,
-                "lon": 4.9041,
-                "address": "Herengracht 542-556, Amsterdam",
-                "rating": 4.7,
-                "price_range": "high"
-            },
-            {
-                "name": "Hotel V Nesplein",
-                "lat": 52.3654,
-                "lon": 4.8944,
-                "address": "Nesplein 49, Amsterdam",
-                "rating": 4.4,
-                "price_range": "medium"
-            },
-            {
-                "name": "Hotel NH Amsterdam Centre",
-                "lat": 52.3702,
-                "lon": 4.8952,
-                "address": "Stadhouderskade 7, Amsterdam",
-                "rating": 4.2,
-                "price_range": "medium"
-            }
-        ],
-        "berlin": [
-            {
-                "name": "Hotel Adlon Kempinski Berlin",
-                "lat": 52.5163,
-                "lon": 13.3777,
-                "address": "Unter den Linden 77, Berlin",
-                "rating": 4.8,
-                "price_range": "high"
-            },
-            {
-                "name": "Meininger Hotel Berlin Mitte",
-                "lat": 52.5200,
-                "lon": 13.4050,
-                "address": "Hallesches Ufer 30, Berlin",
-                "rating": 4.1,
-                "price_range": "low"
-            },
-            {
-                "name": "Hotel Hackescher Hof",
-                "lat": 52.5243,
-                "lon": 13.4015,
-                "address": "Große Präsidentenstraße 8, Berlin",
-                "rating": 4.3,
-                "price_range": "medium"
-            }
-        ],
-        "rome": [
-            {
-                "name": "Hotel de Russie",
-                "lat": 41.9109,
-                "lon": 12.4776,
-                "address": "Via del Babuino 9, Rome",
-                "rating": 4.7,
-                "price_range": "high"
-            },
-            {
-                "name": "Hotel Artemide",
-                "lat": 41.9028,
-                "lon": 12.4964,
-                "address": "Via Nazionale 22, Rome",
-                "rating": 4.4,
-                "price_range": "medium"
-            }
-        ],
-        "barcelona": [
-            {
-                "name": "Hotel Casa Fuster",
-                "lat": 41.4036,
-                "lon": 2.1540,
-                "address": "Passeig de Gràcia 132, Barcelona",
-                "rating": 4.6,
-                "price_range": "high"
-            },
-            {
-                "name": "Hotel Barcelona Gothic",
-                "lat": 41.3851,
-                "lon": 2.1734,
-                "address": "Carrer Jaume I, 14, Barcelona",
-                "rating": 4.2,
-                "price_range": "medium"
-            }
-        ]
-    }
+        # Base local por ciudad (compatibilidad) e índice espacial con los hoteles de Google cacheados
+        self.hotel_database = HOTEL_DATABASE
+        self.hotel_index = get_hotel_index()
     
     def haversine_km(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """Calcular distancia usando fórmula de Haversine"""
@@ -350,55 +175,46 @@ class HotelRecommender:
         self.logger.info(f"🎯 Centroide calculado: ({centroid_lat:.4f}, {centroid_lon:.4f})")
         return centroid_lat, centroid_lon
     
-    def calculate_convenience_score(self, hotel: Dict, places: List[Dict], centroid: Tuple[float, float]) -> float:
-        """Calcular score de conveniencia para un hotel"""
-        hotel_lat, hotel_lon = hotel['lat'], hotel['lon']
-        centroid_lat, centroid_lon = centroid
+    def score_candidates(self, candidates: HotelCandidates, places: List[Dict],
+                         centroid: Tuple[float, float]) -> Dict[str, np.ndarray]:
+        """
+        Scores de conveniencia de todos los hoteles en una pasada (matriz hoteles × lugares)
         
-        # 1. Distancia al centroide (30% del score)
-        distance_to_centroid = self.haversine_km(hotel_lat, hotel_lon, centroid_lat, centroid_lon)
-        centroid_score = max(0, 1 - (distance_to_centroid / 10))  # Normalizar a 10km max
+        Returns:
+            Arrays (N,) alineados con candidates: distance_to_centroid_km,
+            avg_distance_to_places_km y convenience_score
+        """
+        distance_to_centroid = haversine_matrix_km(candidates.coords, np.asarray(centroid, dtype=float))[:, 0]
+        
+        if places:
+            place_coords = np.array([(p['lat'], p['lon']) for p in places], dtype=float)
+            weights = np.array([p.get('priority', 5) for p in places], dtype=float) / 10  # Normalizar prioridad
+            distances = haversine_matrix_km(candidates.coords, place_coords)
+            avg_distance = distances.mean(axis=1)
+            weighted_avg_distance = distances @ weights / len(places)
+        else:
+            avg_distance = weighted_avg_distance = np.zeros(len(candidates))
         
-        # 2. Distancia promedio a todos los lugares (40% del score)
-        total_distance = 0
-        for place in places:
-            distance = self.haversine_km(hotel_lat, hotel_lon, place['lat'], place['lon'])
-            weight = place.get('priority', 5) / 10  # Normalizar prioridad
-            total_distance += distance * weight
-        
-        avg_distance = total_distance / len(places) if places else 0
-        distance_score = max(0, 1 - (avg_distance / 8))  # Normalizar a 8km max
-        
-        # 3. Rating del hotel (20% del score)
-        rating_score = hotel.get('rating', 3.0) / 5.0
-        
-        # 4. Bonus por estar en zona central (10% del score)
-        centro_bonus = 0
-        if distance_to_centroid < 2:  # Muy cerca del centroide
-            centro_bonus = 0.2
-        elif distance_to_centroid < 5:  # Relativamente cerca
-            centro_bonus = 0.1
-        
-        # Calcular score final
-        final_score = (
-            centroid_score * 0.3 + 
-            distance_score * 0.4 + 
-            rating_score * 0.2 + 
-            centro_bonus * 0.1
+        return {
+            'distance_to_centroid_km': distance_to_centroid,
+            'avg_distance_to_places_km': avg_distance,
+            'convenience_score': convenience_scores(distance_to_centroid, weighted_avg_distance, candidates.ratings)
+        }
+    
+    def calculate_convenience_score(self, hotel: Dict, places: List[Dict], centroid: Tuple[float, float]) -> float:
+        """Calcular score de conveniencia para un hotel"""
+        candidates = HotelCandidates(
+            hotels=[hotel],
+            coords=np.array([[hotel['lat'], hotel['lon']]], dtype=float),
+            ratings=np.array([hotel.get('rating', 3.0)], dtype=float),
+            price_ranges=np.array([hotel.get('price_range', 'medium')])
         )
-        
-        return min(1.0, final_score)
-    
-    def determine_city(self, lat: float) -> str:
-        """Determinar ciudad basado en la latitud"""
-        if -23.7 <= lat <= -23.5:  # Antofagasta
-            return "antofagasta"
-        elif -22.5 <= lat <= -22.4:  # Calama
-            return "calama"
-        elif -35.0 <= lat <= -32.0:  # Santiago y alrededores
-            return "santiago"
-        else:  # Para ubicaciones internacionales, devolver None
-            return None
+        return float(self.score_candidates(candidates, places, centroid)['convenience_score'][0])
+    
+    def determine_city(self, lat: float, lon: float) -> Optional[str]:
+        """Determinar ciudad (clave de hotel_database) basado en coordenadas"""
+        location = get_city_resolver().resolve(lat, lon)
+        return location.city_key if location else None
     
     def _generate_synthetic_hotels(self, centroid: Tuple[float, float], places: List[Dict], price_preference: str = "medium") -> List[Dict]:
         """Generar hoteles sintéticos ubicados estratégicamente cerca del centroide de POIs"""
@@ -480,7 +296,7 @@ class HotelRecommender:
             places_data = await places_service._google_nearby_search(
                 lat=lat,
                 lon=lon,
-                radius=5000,  # 5km radius
+                radius=int(GOOGLE_HOTEL_SEARCH_RADIUS_KM * 1000),
                 types=['lodging'],
                 type='lodging',
                 limit=10
@@ -498,6 +314,7 @@ class HotelRecommender:
                 )
             
             hotels = []
+            found_hotels = []
             if places_data and places_data.get('results'):
                 self.logger.info(f"🏨 Google Places devolvió {len(places_data['results'])} hoteles")
                 for place in places_data['results'][:5]:  # Máximo 5 hoteles
@@ -512,13 +329,6 @@ class HotelRecommender:
                     hotel_name = place.get('name', 'Hotel')
                     self.logger.info(f"   📍 {hotel_name} - Price level: {google_price_level} -> {price_range}")
                     
-                    # Filtrar por preferencia de precio si se especifica
-                    if price_preference != "any" and price_range != price_preference:
-                        self.logger.info(f"   ❌ {hotel_name} filtrado por precio (quiere: {price_preference}, tiene: {price_range})")
-                        continue
-                    
-                    self.logger.info(f"   ✅ {hotel_name} incluido")
-                    
                     hotel = {
                         "name": place.get('name', 'Hotel'),
                         "lat": place_lat,
@@ -530,8 +340,21 @@ class HotelRecommender:
                         "synthetic": False,  # Es un hotel real de Google Places
                         "source": "google_places"
                     }
+                    found_hotels.append(hotel)
+                    
+                    # Filtrar por preferencia de precio si se especifica
+                    if price_preference != "any" and price_range != price_preference:
+                        self.logger.info(f"   ❌ {hotel_name} filtrado por precio (quiere: {price_preference}, tiene: {price_range})")
+                        continue
+                    
+                    self.logger.info(f"   ✅ {hotel_name} incluido")
                     hotels.append(hotel)
             
+            # Cachear todos los resultados por place_id (cualquier rango de precio) y el área buscada
+            self.hotel_index.add_google_hotels(found_hotels)
+            if places_data is not None:
+                self.hotel_index.add_google_search(lat, lon)
+            
             if hotels:
                 self.logger.info(f"✅ Google Places encontró {len(hotels)} hoteles")
                 return hotels
@@ -543,6 +366,20 @@ class HotelRecommender:
             self.logger.error(f"Error buscando hoteles con Google Places: {e}")
             return []
     
+    def _cached_google_hotels(self, centroid: Tuple[float, float], price_preference: str = "any") -> Optional[List[Dict]]:
+        """
+        Hoteles de Google ya cacheados cerca del centroide, solo si una Nearby Search
+        vigente cubrió esta área (a la distancia con la que se agrupan centroides).
+        None si no: hay que consultar la API; lista vacía si la búsqueda no dejó
+        hoteles que cumplan el precio
+        """
+        if not self.hotel_index.google_search_covers(centroid[0], centroid[1], GOOGLE_HOTEL_AREA_MERGE_KM):
+            return None
+        cached = self.hotel_index.google_hotels_near(centroid[0], centroid[1], GOOGLE_HOTEL_SEARCH_RADIUS_KM)
+        if price_preference != "any":
+            cached = [h for h in cached if h['price_range'] == price_preference]
+        return [dict(h) for h in cached[:5]]
+    
     def _map_google_price_to_range(self, price_level: int) -> str:
         """Mapear price_level de Google Places (0-4) a nuestros rangos"""
         if price_level <= 1:
@@ -554,42 +391,7 @@ class HotelRecommender:
     
     def _infer_international_city(self, lat: float, lon: float) -> str:
         """Inferir ciudad internacional basándose en coordenadas"""
-        # Ciudades conocidas con hoteles realistas
-        international_cities = [
-            # Estados Unidos - Florida
-            (28.5383, -81.3792, "Orlando"),
-            (25.7617, -80.1918, "Miami"),
-            
-            # Estados Unidos - Otras ciudades principales
-            (40.7128, -74.0060, "Nueva York"),
-            (34.0522, -118.2437, "Los Ángeles"),
-            (41.8781, -87.6298, "Chicago"),
-            
-            # México
-            (19.4326, -99.1332, "Ciudad de México"),
-            (20.6597, -103.3496, "Guadalajara"),
-            
-            # Brasil
-            (-23.5505, -46.6333, "São Paulo"),
-            (-22.9068, -43.1729, "Río de Janeiro"),
-            
-            # Argentina
-            (-34.6118, -58.3960, "Buenos Aires"),
-            
-            # Perú
-            (-12.0464, -77.0428, "Lima")
-        ]
-        
-        min_distance = float('inf')
-        closest_city = "Ciudad Internacional"
-        
-        for city_lat, city_lon, city_name in international_cities:
-            distance = ((lat - city_lat) ** 2 + (lon - city_lon) ** 2) ** 0.5
-            if distance < min_distance:
-                min_distance = distance
-                closest_city = city_name
-        
-        return closest_city
+        return get_city_resolver().city_name(lat, lon) or "Ciudad Internacional"
     
     def _get_realistic_hotels_for_city(self, city_name: str) -> List[Tuple[str, str]]:
         """Obtener nombres de hoteles realistas por ciudad"""
@@ -646,57 +448,144 @@ class HotelRecommender:
             self.logger.warning("No hay lugares para recomendar hoteles")
             return []
         
-        # Calcular centroide geográfico
-        centroid = self.calculate_geographic_centroid(places)
+        recommendations = await self.recommend_hotels_batch([places], max_recommendations, price_preference)
+        return recommendations[0]
+    
+    async def recommend_hotels_batch(self, place_groups: List[List[Dict]], max_recommendations: int = 5,
+                                     price_preference: str = "any") -> List[List[HotelRecommendation]]:
+        """
+        Recomendar hoteles para varios grupos de lugares (clusters de un itinerario) a la vez
         
-        # Determinar ciudad basado en el centroide
-        city = self.determine_city(centroid[0])
+        - Ciudades del índice: hoteles locales + Google cacheados, sin llamadas a la API
+        - Resto: una Nearby Search concurrente por área distinta (centroides cercanos comparten búsqueda)
+        - Scoring de todos los grupos contra el pool compartido en una sola pasada vectorizada
         
-        # Verificar si tenemos hoteles para esta ciudad
-        if city in self.hotel_database:
-            # Filtrar hoteles por preferencia de precio
-            available_hotels = self.hotel_database[city]
-            if price_preference != "any":
-                available_hotels = [h for h in available_hotels if h['price_range'] == price_preference]
-        else:
-            # Para ubicaciones internacionales, usar Google Places API primero
-            try:
-                self.logger.info("🔍 Intentando buscar hoteles con Google Places...")
-                # Ahora podemos usar await correctamente
-                google_hotels = await self._search_hotels_with_google_places(centroid, price_preference)
-                if google_hotels:
-                    self.logger.info(f"✅ Google Places encontró {len(google_hotels)} hoteles")
-                    available_hotels = google_hotels
-                else:
-                    self.logger.info("⚠️ Google Places no encontró hoteles, generando hoteles sintéticos...")
-                    # Fallback a hoteles sintéticos si Google Places falla
-                    available_hotels = self._generate_synthetic_hotels(centroid, places, price_preference)
-                    self.logger.info(f"🤖 Generados {len(available_hotels)} hoteles sintéticos")
-            except Exception as e:
-                self.logger.warning(f"Error buscando hoteles con Google Places: {e}")
+        Returns:
+            Recomendaciones por grupo, alineadas con place_groups
+        """
+        results: List[List[HotelRecommendation]] = [[] for _ in place_groups]
+        active = [g for g, places in enumerate(place_groups) if places]
+        if not active:
+            return results
+        
+        centroids = {g: self.calculate_geographic_centroid(place_groups[g]) for g in active}
+        candidates_by_group: Dict[int, List[Dict]] = {}
+        city_groups: Set[int] = set()
+        to_search: List[int] = []
+        
+        for g in active:
+            city = self.determine_city(*centroids[g])
+            city_candidates = self.hotel_index.city_candidates(city) if city in self.hotel_index else None
+            if city_candidates is not None:
+                candidates_by_group[g] = city_candidates.filter_price(price_preference).hotels
+                city_groups.add(g)
+                continue
+            cached = self._cached_google_hotels(centroids[g], price_preference)
+            if cached is not None:
+                self.logger.info(f"🎯 {len(cached)} hoteles de Google Places desde el índice")
+                candidates_by_group[g] = cached
+            else:
+                to_search.append(g)
+        
+        if to_search:
+            # Una búsqueda por área distinta, todas concurrentes (sin filtro de precio: se cachea todo)
+            areas = self._dedupe_search_areas([centroids[g] for g in to_search])
+            self.logger.info(f"🔍 Buscando hoteles con Google Places: {len(areas)} áreas para {len(to_search)} grupos")
+            with quota_priority(QuotaPriority.HOTEL):
+                found = await asyncio.gather(
+                    *(self._search_hotels_with_google_places(center, "any") for center, _ in areas),
+                    return_exceptions=True
+                )
+            for (_, members), hotels in zip(areas, found):
+                if isinstance(hotels, Exception):
+                    self.logger.warning(f"Error buscando hoteles con Google Places: {hotels}")
+                    hotels = []
+                for k in members:
+                    candidates_by_group[to_search[k]] = [
+                        dict(h) for h in hotels if price_preference == "any" or h['price_range'] == price_preference
+                    ]
+        
+        # Fuera de las ciudades del índice y sin resultados de Google: hoteles sintéticos
+        for g in active:
+            if g not in city_groups and not candidates_by_group.get(g):
                 self.logger.info("🤖 Fallback: Generando hoteles sintéticos...")
-                # Fallback a hoteles sintéticos
-                available_hotels = self._generate_synthetic_hotels(centroid, places, price_preference)
-                self.logger.info(f"🤖 Generados {len(available_hotels)} hoteles sintéticos como fallback")
+                candidates_by_group[g] = self._generate_synthetic_hotels(centroids[g], place_groups[g], price_preference)
+        
+        # Pool compartido (un hotel presente en varios grupos se evalúa una sola vez)
+        pool: List[Dict] = []
+        pool_position: Dict[Tuple, int] = {}
+        eligible: Dict[int, np.ndarray] = {}
+        for g in active:
+            positions = []
+            for hotel in candidates_by_group[g]:
+                key = (hotel['name'], round(hotel['lat'], 6), round(hotel['lon'], 6))
+                if key not in pool_position:
+                    pool_position[key] = len(pool)
+                    pool.append(hotel)
+                positions.append(pool_position[key])
+            eligible[g] = np.array(positions, dtype=int)
+        
+        if pool:
+            scores = self._score_groups(pool, [place_groups[g] for g in active], [centroids[g] for g in active])
+            for column, g in enumerate(active):
+                results[g] = self._top_recommendations(pool, scores, column, eligible[g], max_recommendations)
+        
+        self.logger.info(f"🏨 Generadas {sum(len(r) for r in results)} recomendaciones de hoteles "
+                         f"para {len(active)} grupos")
+        return results
+    
+    def _dedupe_search_areas(self, centroids: List[Tuple[float, float]]) -> List[Tuple[Tuple[float, float], List[int]]]:
+        """Agrupar centroides cuyas áreas de búsqueda se solapan: (centro del área, índices de los grupos)"""
+        distances = haversine_matrix_km(np.asarray(centroids, dtype=float))
+        assigned = np.full(len(centroids), -1)
+        areas = []
+        for i in range(len(centroids)):
+            if assigned[i] >= 0:
+                continue
+            members = np.flatnonzero((assigned < 0) & (distances[i] <= GOOGLE_HOTEL_AREA_MERGE_KM))
+            assigned[members] = len(areas)
+            areas.append((centroids[i], members.tolist()))
+        return areas
+    
+    def _score_groups(self, pool: List[Dict], groups: List[List[Dict]],
+                      centroids: List[Tuple[float, float]]) -> Dict[str, np.ndarray]:
+        """
+        Scores (H, G) de cada hotel del pool para cada grupo en una pasada:
+        una matriz hoteles × lugares (todos los grupos) reducida por grupo con un producto matricial
+        """
+        pool_coords = np.array([(h['lat'], h['lon']) for h in pool], dtype=float)
+        ratings = np.array([h['rating'] for h in pool], dtype=float)
+        place_coords = np.array([(p['lat'], p['lon']) for places in groups for p in places], dtype=float)
+        weights = np.array([p.get('priority', 5) for places in groups for p in places], dtype=float) / 10
+        
+        # mean_matrix[p, g] = 1 / n_g si el lugar p pertenece al grupo g
+        sizes = np.array([len(places) for places in groups])
+        group_of_place = np.repeat(np.arange(len(groups)), sizes)
+        mean_matrix = np.zeros((len(place_coords), len(groups)))
+        mean_matrix[np.arange(len(place_coords)), group_of_place] = 1.0 / sizes[group_of_place]
+        
+        distances = haversine_matrix_km(pool_coords, place_coords)
+        distance_to_centroid = haversine_matrix_km(pool_coords, np.asarray(centroids, dtype=float))
+        weighted_avg_distance = distances @ (mean_matrix * weights[:, None])
+        return {
+            'distance_to_centroid_km': distance_to_centroid,
+            'avg_distance_to_places_km': distances @ mean_matrix,
+            'convenience_score': np.round(
+                convenience_scores(distance_to_centroid, weighted_avg_distance, ratings[:, None]), 3
+            )
+        }
+    
+    def _top_recommendations(self, pool: List[Dict], scores: Dict[str, np.ndarray], column: int,
+                             eligible: np.ndarray, max_recommendations: int) -> List[HotelRecommendation]:
+        """Materializar solo el top-N de un grupo (orden estable por score descendente)"""
+        convenience = scores['convenience_score'][eligible, column]
+        top = eligible[np.argsort(-convenience, kind='stable')[:max_recommendations]]
         
-        # Calcular scores para cada hotel
         recommendations = []
-        
-        for hotel in available_hotels:
-            # Calcular métricas
-            distance_to_centroid = self.haversine_km(
-                hotel['lat'], hotel['lon'], centroid[0], centroid[1]
-            )
-            
-            # Calcular distancia promedio a lugares
-            total_distance = 0
-            for place in places:
-                distance = self.haversine_km(hotel['lat'], hotel['lon'], place['lat'], place['lon'])
-                total_distance += distance
-            avg_distance_to_places = total_distance / len(places)
-            
-            # Calcular convenience score
-            convenience_score = self.calculate_convenience_score(hotel, places, centroid)
+        for i in top.tolist():
+            hotel = pool[i]
+            distance_to_centroid = float(scores['distance_to_centroid_km'][i, column])
+            avg_distance_to_places = float(scores['avg_distance_to_places_km'][i, column])
             
             # Generar reasoning
             reasoning_parts = []
@@ -715,8 +604,7 @@ class HotelRecommender:
             
             reasoning = " • ".join(reasoning_parts) if reasoning_parts else "Opción disponible en la zona"
             
-            # Crear recomendación
-            recommendation = HotelRecommendation(
+            recommendations.append(HotelRecommendation(
                 name=hotel['name'],
                 lat=hotel['lat'],
                 lon=hotel['lon'],
@@ -726,20 +614,9 @@ class HotelRecommender:
                 price_range=hotel['price_range'],
                 distance_to_centroid_km=round(distance_to_centroid, 2),
                 avg_distance_to_places_km=round(avg_distance_to_places, 2),
-                convenience_score=round(convenience_score, 3),
+                convenience_score=float(scores['convenience_score'][i, column]),
                 reasoning=reasoning
-            )
-            
-            recommendations.append(recommendation)
-        
-        # Ordenar por convenience score (descendente)
-        recommendations.sort(key=lambda x: x.convenience_score, reverse=True)
-        
-        # Limitar número de recomendaciones
-        recommendations = recommendations[:max_recommendations]
-        
-        self.logger.info(f"🏨 Generadas {len(recommendations)} recomendaciones de hoteles")
-        
+            ))
         return recommendations
     
     def format_recommendations_for_api(self, recommendations: List[HotelRecommendation]) -> List[Dict]:
@@ -775,13 +652,18 @@ class HotelRecommender:
     # ===== MULTI-CIUDAD ENHANCEMENTS =====
     
     def plan_multi_city_accommodations(self, cities: List[Dict], 
-                                     days_per_city: Dict[str, int]) -> MultiCityAccommodationPlan:
+                                     days_per_city: Dict[str, int],
+                                     max_candidates: int = MULTI_CITY_MAX_CANDIDATES) -> MultiCityAccommodationPlan:
         """
         Planifica accommodations para viaje multi-ciudad
         
+        Elige un hotel por ciudad para toda la secuencia a la vez (Viterbi): conveniencia
+        dentro de cada ciudad ponderada por noches + traslados entre hoteles consecutivos.
+        
         Args:
             cities: Lista de ciudades con info [{'name': str, 'pois': List[Dict], 'coordinates': Tuple}]
             days_per_city: Días por ciudad {'city_name': days}
+            max_candidates: Hoteles candidatos por ciudad
             
         Returns:
             Plan completo de accommodations multi-ciudad
@@ -789,52 +671,121 @@ class HotelRecommender:
         self.logger.info(f"🏨 Planificando accommodations para {len(cities)} ciudades")
         
         plan = MultiCityAccommodationPlan()
+        stays = []  # (ciudad, noches, día de check-in)
         current_day = 1
         
         for city_info in cities:
             city_name = city_info['name']
-            city_pois = city_info.get('pois', [])
             city_days = days_per_city.get(city_name, 1)
             
-            if city_days <= 1:
-                # Solo 1 día, no necesita accommodation overnight
-                continue
-            
-            # Encontrar mejor hotel para esta ciudad
-            # Por ahora, usar búsqueda directa por ciudad para mejor precisión
-            hotels = self.find_hotels_by_city_name(city_name, max_recommendations=3)
-            
-            if hotels:
-                best_hotel = hotels[0]  # El mejor-rankeado
-                
-                # Mejorar información del hotel para multi-ciudad
-                best_hotel.city = city_name
-                best_hotel.intercity_accessibility = self._calculate_intercity_accessibility(
-                    best_hotel, city_info['coordinates']
-                )
-                
-                # Añadir al plan
-                plan.add_city_accommodation(
-                    city=city_name,
-                    hotel=best_hotel,
-                    nights=city_days - 1,  # -1 porque el último día se viaja
-                    check_in_day=current_day
-                )
-                
-                self.logger.info(f"🏨 {city_name}: {best_hotel.name} por {city_days-1} noches (días {current_day}-{current_day + city_days - 2})")
+            # Solo 1 día, no necesita accommodation overnight
+            if city_days > 1:
+                plan.candidate_tables[city_name] = self._city_hotel_candidates(city_info, max_candidates)
+                stays.append((city_name, city_days - 1, current_day))  # -1 porque el último día se viaja
             
             current_day += city_days
         
+        dp_info = self._assign_accommodations(plan, stays)
+        
+        for acc in plan.accommodations:
+            self.logger.info(f"🏨 {acc['city']}: {acc['hotel'].name} por {acc['nights']} noches "
+                             f"(días {acc['check_in_day']}-{acc['check_out_day'] - 1})")
+        
         # Calcular estadísticas del plan
         plan.total_nights = sum(acc['nights'] for acc in plan.accommodations)
         plan.total_cities = len(plan.accommodations)
         plan.estimated_cost = self._estimate_accommodation_costs(plan)
-        plan.intercity_optimization = self._analyze_intercity_logistics(plan)
+        plan.intercity_optimization = {**self._analyze_intercity_logistics(plan), **dp_info}
         
         self.logger.info(f"✅ Plan multi-ciudad: {plan.total_nights} noches en {plan.total_cities} ciudades")
         
         return plan
     
+    def _city_hotel_candidates(self, city_info: Dict, max_candidates: int) -> CityHotelCandidates:
+        """Candidatos de una ciudad con su coste intra-ciudad (una pasada vectorizada)"""
+        city_name = city_info['name']
+        city_pois = city_info.get('pois', [])
+        coordinates = city_info.get('coordinates')
+        city_key = city_name.lower().replace(' ', '_')
+        
+        candidates = self.hotel_index.city_candidates(city_key) if city_key in self.hotel_index else None
+        if not candidates and coordinates:
+            nearby = [hotel for hotel, _ in self.hotel_index.within_radius(
+                coordinates[0], coordinates[1], MULTI_CITY_HOTEL_RADIUS_KM)]
+            if nearby:
+                candidates = HotelCandidates(
+                    hotels=nearby,
+                    coords=np.array([(h['lat'], h['lon']) for h in nearby], dtype=float),
+                    ratings=np.array([h.get('rating', 3.0) for h in nearby], dtype=float),
+                    price_ranges=np.array([h.get('price_range', 'medium') for h in nearby], dtype=str)
+                )
+        
+        if not candidates:
+            hotels = self._generate_synthetic_hotel_for_city(city_name)
+            if coordinates and (hotels[0].lat, hotels[0].lon) == (0.0, 0.0):
+                hotels[0].lat, hotels[0].lon = coordinates
+            return CityHotelCandidates(
+                city=city_name,
+                coordinates=coordinates,
+                hotels=hotels,
+                coords=np.array([(h.lat, h.lon) for h in hotels], dtype=float),
+                intra_cost=np.array([1.0 - h.convenience_score for h in hotels])
+            )
+        
+        if city_pois:
+            centroid = self.calculate_geographic_centroid(city_pois)
+            convenience = self.score_candidates(candidates, city_pois, centroid)['convenience_score']
+            reasoning = f"Mejor equilibrio en {city_name} entre cercanía a tus actividades y traslados entre ciudades"
+        else:
+            # Sin POIs: el rating normalizado es la conveniencia
+            convenience = candidates.ratings / 5.0
+            reasoning = f"Hotel encontrado por búsqueda de ciudad: {city_name}"
+        
+        top = np.argsort(-convenience, kind='stable')[:max_candidates]
+        hotels = [
+            HotelRecommendation(
+                name=candidates.hotels[i]['name'],
+                lat=candidates.hotels[i]['lat'],
+                lon=candidates.hotels[i]['lon'],
+                address=candidates.hotels[i].get('address', ''),
+                rating=candidates.hotels[i].get('rating', 0.0),
+                price_range=candidates.hotels[i].get('price_range', 'medium'),
+                city=city_name,
+                convenience_score=round(float(convenience[i]), 3),
+                reasoning=reasoning
+            )
+            for i in top.tolist()
+        ]
+        return CityHotelCandidates(
+            city=city_name,
+            coordinates=coordinates,
+            hotels=hotels,
+            coords=candidates.coords[top],
+            intra_cost=1.0 - convenience[top]
+        )
+    
+    def _assign_accommodations(self, plan: MultiCityAccommodationPlan,
+                               stays: List[Tuple[str, int, int]]) -> Dict:
+        """Resolver el Viterbi sobre las estadías y cargar los hoteles elegidos en el plan"""
+        tables = [plan.candidate_tables[city] for city, _, _ in stays]
+        choice, total_cost = viterbi_accommodation_sequence(
+            [table.intra_cost * nights for table, (_, nights, _) in zip(tables, stays)],
+            [table.coords for table in tables]
+        )
+        
+        plan.accommodations = []
+        for table, index, (city, nights, check_in_day) in zip(tables, choice, stays):
+            hotel = table.hotels[index]
+            if table.coordinates:
+                hotel.intercity_accessibility = self._calculate_intercity_accessibility(hotel, table.coordinates)
+            plan.add_city_accommodation(city=city, hotel=hotel, nights=nights, check_in_day=check_in_day)
+        
+        return {
+            'algorithm': 'viterbi_dp',
+            'objective_cost': round(total_cost, 3),
+            'candidates_per_city': {table.city: len(table.hotels) for table in tables}
+        }
+    
     def find_hotels_by_city_name(self, city_name: str, max_recommendations: int = 5) -> List[HotelRecommendation]:
         """
         Encuentra hoteles por nombre de ciudad (para ciudades sin POIs específicos)
@@ -849,8 +800,8 @@ class HotelRecommender:
         city_key = city_name.lower().replace(' ', '_')
         
         # Buscar en database local
-        if city_key in self.hotel_database:
-            hotels = self.hotel_database[city_key][:max_recommendations]
+        if city_key in self.hotel_index:
+            hotels = self.hotel_index.city_hotels(city_key)[:max_recommendations]
             
             recommendations = []
             for hotel in hotels:
@@ -903,9 +854,18 @@ class HotelRecommender:
             accommodations=optimized_accommodations,
             total_nights=plan.total_nights,
             total_cities=plan.total_cities,
-            estimated_cost=plan.estimated_cost
+            estimated_cost=plan.estimated_cost,
+            candidate_tables=plan.candidate_tables
         )
         
+        # Con la nueva adyacencia entre ciudades, re-elegir hoteles sobre los mismos candidatos
+        if optimized_accommodations and all(acc['city'] in plan.candidate_tables for acc in optimized_accommodations):
+            dp_info = self._assign_accommodations(optimized_plan, [
+                (acc['city'], acc['nights'], acc['check_in_day']) for acc in optimized_accommodations
+            ])
+            optimized_plan.estimated_cost = self._estimate_accommodation_costs(optimized_plan)
+            optimized_plan.intercity_optimization = {**self._analyze_intercity_logistics(optimized_plan), **dp_info}
+        
         return optimized_plan
     
     def _calculate_intercity_accessibility(self, hotel: HotelRecommendation, 
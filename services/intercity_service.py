@@ -2,19 +2,25 @@
 """
 🌍 InterCity Service - Motor de ruteo intercity profesional
 Implementación MVP-A para arquitectura multi-ciudad
-Maneja routing entre ciudades con OSRM + clustering inteligente
+Maneja routing entre ciudades con tabla OD precalculada + OSRM + clustering inteligente
 """
 
 import logging
+import time
 from typing import List, Dict, Tuple, Optional, Set
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from geopy.distance import geodesic
 import math
 import json
 from pathlib import Path
 
+import numpy as np
+
 from .osrm_service import OSRMFactory, OSRMService
 from .h3_spatial_partitioner import H3SpatialPartitioner
+from settings import settings
+from utils.intercity_od_table import get_intercity_od_table
+from utils.shared_cache import get_shared_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -53,6 +59,7 @@ class InterCityRoute:
     distance_km: float
     travel_time_hours: float
     transport_mode: str = "car"
+    bus_travel_time_hours: Optional[float] = None  # Estimación bus interurbano (tabla OD)
     
     @property
     def is_long_distance(self) -> bool:
@@ -64,6 +71,19 @@ class InterCityRoute:
         """True si requiere pernoctar en el camino"""
         return self.travel_time_hours > 10
 
+@dataclass
+class CitySequencePlan:
+    """Secuencia de ciudades optimizada con métricas vs greedy"""
+    sequence: List[City]
+    total_distance_km: float
+    total_travel_hours: float
+    solver: str  # 'trivial', 'held_karp', 'ortools_2opt'
+    solve_time_ms: float
+    extra_travel_days: int = 0
+    total_days: Optional[int] = None
+    feasible: bool = True
+    vs_greedy: Dict[str, float] = field(default_factory=dict)
+
 class InterCityService:
     """
     Servicio principal para optimización intercity
@@ -87,14 +107,25 @@ class InterCityService:
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
         
-        # Cache de ciudades y rutas
-        self.cities_cache: Dict[str, City] = {}
-        self.routes_cache: Dict[Tuple[str, str], InterCityRoute] = {}
+        # Cache de ciudades y rutas compartida por todas las instancias (TTL + LRU)
+        self.cities_cache = get_shared_cache('intercity_cities')
+        self.routes_cache = get_shared_cache('intercity_routes')
+        self.fallback_route_ttl_s = 3600        # Estimaciones geodésicas: reintentar OSRM pronto
+        
+        # Tabla OD precalculada: pares de ciudades conocidas sin ruteo en vivo
+        self.od_table = get_intercity_od_table() if settings.INTERCITY_OD_TABLE_ENABLED else None
         
         # Configuraciones
         self.city_clustering_threshold_km = 50  # Radio máximo para considerar misma ciudad
         self.max_intercity_distance_km = 2000   # Distancia máxima permitida intercity
         
+        # Solver de secuencia de ciudades
+        self.exact_solver_max_cities = 12       # Held-Karp hasta 12 ciudades, OR-Tools + 2-opt sobre eso
+        self.max_daily_travel_hours = 8.0       # Tramos más largos consumen un día extra de viaje
+        self.fallback_road_factor = 1.3         # Distancia por carretera ≈ geodésica × factor
+        self.fallback_speed_kmh = 80.0          # Velocidad media intercity sin OSRM
+        self.last_sequence_plan: Optional[CitySequencePlan] = None
+        
         logger.info("🌍 InterCityService inicializado")
     
     def cluster_pois_by_cities(self, pois: List[Dict]) -> List[City]:
@@ -112,20 +143,9 @@ class InterCityService:
         if not pois:
             return []
         
-        # Extraer coordenadas para clustering
-        coordinates = [(poi['lat'], poi['lon']) for poi in pois]
-        
-        # Usar H3 para clustering inicial
-        routing_session = self.h3_partitioner.cluster_pois_auto(pois)
-        
         cities = []
-        # Agrupar POIs por clusters H3
-        from collections import defaultdict
-        cluster_groups = defaultdict(list)
-        
-        for poi in pois:
-            h3_id = self.h3_partitioner.coordinate_to_h3(poi['lat'], poi['lon'])
-            cluster_groups[h3_id].append(poi)
+        # Agrupar POIs por clusters H3 (conversión vectorizada en un solo lote)
+        cluster_groups = self.h3_partitioner.group_pois_by_cell(pois)
         
         for h3_id, cluster_pois in cluster_groups.items():
             if not cluster_pois:
@@ -150,8 +170,14 @@ class InterCityService:
             
             cities.append(city)
             
-            # Cachear ciudad
-            self.cities_cache[city.name] = city
+            # Cachear ciudad (resumen, sin POIs)
+            self.cities_cache.set(city.name, {
+                "name": city.name,
+                "center_lat": city.center_lat,
+                "center_lon": city.center_lon,
+                "country": city.country,
+                "pois_count": len(city.pois)
+            })
         
         logger.info(f"✅ Clustering completado: {len(cities)} ciudades identificadas")
         return cities
@@ -224,6 +250,7 @@ class InterCityService:
         logger.info(f"🛣️  Calculando rutas entre {len(cities)} ciudades...")
         
         routes = []
+        table_keys = self._table_keys(cities)
         
         # Calcular todas las combinaciones ciudad-ciudad
         for i, origin_city in enumerate(cities):
@@ -231,10 +258,11 @@ class InterCityService:
                 if i == j:
                     continue
                 
-                # Verificar cache
-                cache_key = (origin_city.name, dest_city.name)
-                if cache_key in self.routes_cache:
-                    routes.append(self.routes_cache[cache_key])
+                # Verificar tabla OD precalculada y cache
+                known_route = (self._table_route(origin_city, dest_city, table_keys[i], table_keys[j])
+                               or self._cached_route(origin_city, dest_city))
+                if known_route is not None:
+                    routes.append(known_route)
                     continue
                 
                 # Calcular distancia geodésica
@@ -263,7 +291,7 @@ class InterCityService:
                     )
                     
                     routes.append(intercity_route)
-                    self.routes_cache[cache_key] = intercity_route
+                    self._store_route(intercity_route, source="osrm")
                     
                     logger.debug(f"✅ Ruta: {origin_city.name} -> {dest_city.name} "
                                f"({real_distance_km:.0f}km, {travel_time_hours:.1f}h)")
@@ -273,50 +301,373 @@ class InterCityService:
         logger.info(f"✅ {len(routes)} rutas intercity calculadas")
         return routes
     
+    def get_intercity_matrix(self, cities: List[City]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Matriz intercity de distancias (km) y tiempos (horas), cacheada por par
+        
+        Usa la tabla OD precalculada y las rutas ya cacheadas, completa los pares
+        faltantes con una sola consulta de tabla OSRM y, si OSRM no responde, con
+        una estimación geodésica. Los pares calculados quedan en la caché compartida.
+        
+        Args:
+            cities: Lista de ciudades
+            
+        Returns:
+            (distancias_km, tiempos_horas) como arrays NxN
+        """
+        n = len(cities)
+        distance_km = np.zeros((n, n))
+        time_hours = np.zeros((n, n))
+        routes: Dict[Tuple[int, int], InterCityRoute] = {}
+        missing = []
+        table_keys = self._table_keys(cities)
+        for i in range(n):
+            for j in range(n):
+                if i == j:
+                    continue
+                route = (self._table_route(cities[i], cities[j], table_keys[i], table_keys[j])
+                         or self._cached_route(cities[i], cities[j]))
+                if route is None:
+                    missing.append((i, j))
+                else:
+                    routes[(i, j)] = route
+        
+        table = None
+        if missing:
+            table = self.osrm.distance_matrix([city.coordinates for city in cities])
+        
+        for i, j in missing:
+            origin, dest = cities[i], cities[j]
+            if table and table["distances"][i][j] is not None:
+                dist = table["distances"][i][j] / 1000
+                hours = table["durations"][i][j] / 3600
+                source = "osrm"
+            else:
+                dist = origin.distance_to(dest) * self.fallback_road_factor
+                hours = dist / self.fallback_speed_kmh
+                source = "geodesic"
+            routes[(i, j)] = InterCityRoute(
+                origin_city=origin,
+                destination_city=dest,
+                distance_km=dist,
+                travel_time_hours=hours
+            )
+            self._store_route(routes[(i, j)], source=source)
+        
+        for (i, j), route in routes.items():
+            distance_km[i, j] = route.distance_km
+            time_hours[i, j] = route.travel_time_hours
+        
+        return distance_km, time_hours
+    
+    def _table_keys(self, cities: List[City]) -> List[Optional[str]]:
+        """city_key de la tabla OD para cada ciudad (None si no está en la tabla)"""
+        if self.od_table is None:
+            return [None] * len(cities)
+        return [self.od_table.key_for(city.center_lat, city.center_lon) for city in cities]
+    
+    def _table_route(self, origin: City, dest: City,
+                     origin_key: Optional[str], dest_key: Optional[str]) -> Optional[InterCityRoute]:
+        """
+        Ruta desde la tabla OD precalculada (O(1))
+        
+        La tabla decide qué pares entrega: los del motor de ruteo siempre y las
+        estimaciones geodésicas según INTERCITY_OD_TRUST_ESTIMATES. Lo que no entrega
+        sigue el camino normal (caché → OSRM → estimación en vivo).
+        """
+        if origin_key is None or dest_key is None:
+            return None
+        entry = self.od_table.lookup(origin_key, dest_key)
+        if entry is None:
+            return None
+        return InterCityRoute(
+            origin_city=origin,
+            destination_city=dest,
+            distance_km=entry.distance_km,
+            travel_time_hours=entry.hours('drive'),
+            bus_travel_time_hours=entry.hours('bus')
+        )
+    
+    @staticmethod
+    def _route_key(origin: City, dest: City, transport_mode: str = "car") -> str:
+        """Clave de ruta por centros de ciudad (~100m) y modo, no por nombre"""
+        return (f"{origin.center_lat:.3f},{origin.center_lon:.3f}->"
+                f"{dest.center_lat:.3f},{dest.center_lon:.3f}:{transport_mode}")
+    
+    def _cached_route(self, origin: City, dest: City) -> Optional[InterCityRoute]:
+        """Ruta desde la caché compartida, ligada a las ciudades del request actual"""
+        cached = self.routes_cache.get(self._route_key(origin, dest))
+        if cached is None:
+            return None
+        return InterCityRoute(
+            origin_city=origin,
+            destination_city=dest,
+            distance_km=cached["distance_km"],
+            travel_time_hours=cached["travel_time_hours"],
+            transport_mode=cached["transport_mode"],
+            bus_travel_time_hours=cached.get("bus_travel_time_hours")
+        )
+    
+    def _store_route(self, route: InterCityRoute, source: str):
+        self.routes_cache.set(
+            self._route_key(route.origin_city, route.destination_city, route.transport_mode),
+            {
+                "origin": route.origin_city.name,
+                "destination": route.destination_city.name,
+                "distance_km": route.distance_km,
+                "travel_time_hours": route.travel_time_hours,
+                "transport_mode": route.transport_mode,
+                "bus_travel_time_hours": route.bus_travel_time_hours,
+                "source": source
+            },
+            ttl_s=self.fallback_route_ttl_s if source == "geodesic" else None
+        )
+    
     def find_optimal_city_sequence(self, cities: List[City], 
-                                 start_city: Optional[str] = None) -> List[City]:
+                                 start_city: Optional[str] = None,
+                                 end_city: Optional[str] = None,
+                                 days_per_city: Optional[Dict[str, int]] = None,
+                                 trip_days: Optional[int] = None) -> List[City]:
+        """
+        Encuentra secuencia óptima de ciudades (camino abierto)
+        
+        Args:
+            cities: Lista de ciudades a visitar
+            start_city: Nombre de ciudad inicial fija (opcional)
+            end_city: Nombre de ciudad final fija (opcional)
+            days_per_city: Días presupuestados por ciudad (opcional)
+            trip_days: Duración total del viaje para validar factibilidad (opcional)
+            
+        Returns:
+            Secuencia optimizada de ciudades (el plan completo queda en last_sequence_plan)
+        """
+        plan = self.solve_city_sequence(cities, start_city, end_city, days_per_city, trip_days)
+        return plan.sequence
+    
+    def solve_city_sequence(self, cities: List[City],
+                            start_city: Optional[str] = None,
+                            end_city: Optional[str] = None,
+                            days_per_city: Optional[Dict[str, int]] = None,
+                            trip_days: Optional[int] = None) -> CitySequencePlan:
         """
-        Encuentra secuencia óptima de ciudades (TSP simplificado)
+        Resuelve la secuencia de ciudades minimizando tiempo de viaje
+        
+        Held-Karp exacto hasta exact_solver_max_cities, OR-Tools + 2-opt sobre
+        eso. Tramos que exceden max_daily_travel_hours cuentan como un día
+        extra de viaje y se penalizan en el objetivo.
         
         Args:
             cities: Lista de ciudades a visitar
-            start_city: Nombre de ciudad inicial (opcional)
+            start_city: Nombre de ciudad inicial fija (opcional)
+            end_city: Nombre de ciudad final fija (opcional)
+            days_per_city: Días presupuestados por ciudad (opcional)
+            trip_days: Duración total del viaje (opcional)
             
         Returns:
-            Secuencia optimizada de ciudades
+            Plan con secuencia, métricas y comparación vs greedy
         """
         logger.info(f"🎯 Optimizando secuencia de {len(cities)} ciudades...")
+        start_time = time.time()
         
         if len(cities) <= 1:
-            return cities
-        
-        # Implementación greedy simple (mejorar con OR-Tools más adelante)
-        if start_city:
-            current_city = next((c for c in cities if c.name == start_city), cities[0])
+            plan = CitySequencePlan(list(cities), 0.0, 0.0, "trivial", 0.0)
+            self.last_sequence_plan = plan
+            return plan
+        
+        distance_km, time_hours = self.get_intercity_matrix(cities)
+        # Costo: horas de viaje + un día completo (24h) por cada tramo que excede el máximo diario
+        cost = time_hours + 24.0 * np.floor(time_hours / self.max_daily_travel_hours)
+        
+        names = [city.name for city in cities]
+        start_idx = names.index(start_city) if start_city in names else None
+        end_idx = names.index(end_city) if end_city in names and end_city != start_city else None
+        
+        matrix_ms = (time.time() - start_time) * 1000
+        solve_start = time.time()
+        if len(cities) <= self.exact_solver_max_cities:
+            order = self._held_karp_path(cost, start_idx, end_idx)
+            solver = "held_karp"
         else:
-            current_city = cities[0]
-        
-        remaining_cities = [c for c in cities if c.name != current_city.name]
-        sequence = [current_city]
+            order = self._ortools_path(cost, start_idx, end_idx)
+            order = self._two_opt_path(order, cost, start_idx is not None, end_idx is not None)
+            solver = "ortools_2opt"
+        solve_ms = (time.time() - solve_start) * 1000
+        
+        greedy_start = time.time()
+        greedy_order = self._greedy_path(distance_km, start_idx if start_idx is not None else 0, end_idx)
+        greedy_ms = (time.time() - greedy_start) * 1000
+        
+        plan = self._build_sequence_plan(cities, order, distance_km, time_hours, solver,
+                                         matrix_ms + solve_ms, days_per_city, trip_days)
+        greedy_km = self._path_cost(greedy_order, distance_km)
+        greedy_hours = self._path_cost(greedy_order, time_hours)
+        plan.vs_greedy = {
+            "greedy_distance_km": round(greedy_km, 1),
+            "greedy_travel_hours": round(greedy_hours, 2),
+            "distance_saved_km": round(greedy_km - plan.total_distance_km, 1),
+            "travel_hours_saved": round(greedy_hours - plan.total_travel_hours, 2),
+            "greedy_solve_time_ms": round(greedy_ms, 2),
+            "solver_time_ms": round(solve_ms, 2)
+        }
+        self.last_sequence_plan = plan
         
-        while remaining_cities:
-            # Encontrar ciudad más cercana
-            distances = [(city, current_city.distance_to(city)) 
-                        for city in remaining_cities]
-            nearest_city, _ = min(distances, key=lambda x: x[1])
-            
-            sequence.append(nearest_city)
-            remaining_cities.remove(nearest_city)
-            current_city = nearest_city
-        
-        total_distance = sum(
-            seq_cities[i].distance_to(seq_cities[i+1])
-            for i, seq_cities in enumerate([sequence]) 
-            for i in range(len(sequence)-1)
+        logger.info(f"✅ Secuencia optimizada ({solver}) - {plan.total_distance_km:.0f}km, "
+                    f"{plan.total_travel_hours:.1f}h vs greedy {greedy_km:.0f}km, {greedy_hours:.1f}h "
+                    f"({solve_ms:.1f}ms vs {greedy_ms:.1f}ms)")
+        return plan
+    
+    def _build_sequence_plan(self, cities: List[City], order: List[int],
+                             distance_km: np.ndarray, time_hours: np.ndarray,
+                             solver: str, solve_time_ms: float,
+                             days_per_city: Optional[Dict[str, int]],
+                             trip_days: Optional[int]) -> CitySequencePlan:
+        """Construir plan con días de viaje extra y factibilidad vs presupuesto"""
+        legs = [time_hours[a, b] for a, b in zip(order, order[1:])]
+        extra_travel_days = int(sum(leg // self.max_daily_travel_hours for leg in legs))
+        
+        total_days = None
+        feasible = True
+        if days_per_city:
+            total_days = sum(days_per_city.get(cities[i].name, 1) for i in order) + extra_travel_days
+            if trip_days is not None:
+                feasible = total_days <= trip_days
+        
+        return CitySequencePlan(
+            sequence=[cities[i] for i in order],
+            total_distance_km=self._path_cost(order, distance_km),
+            total_travel_hours=self._path_cost(order, time_hours),
+            solver=solver,
+            solve_time_ms=solve_time_ms,
+            extra_travel_days=extra_travel_days,
+            total_days=total_days,
+            feasible=feasible
         )
-        
-        logger.info(f"✅ Secuencia optimizada - Distancia total: {total_distance:.0f}km")
-        return sequence
+    
+    @staticmethod
+    def _path_cost(order: List[int], matrix: np.ndarray) -> float:
+        """Costo de un camino abierto"""
+        return float(sum(matrix[a, b] for a, b in zip(order, order[1:])))
+    
+    @staticmethod
+    def _greedy_path(matrix: np.ndarray, start: int, end: Optional[int] = None) -> List[int]:
+        """Vecino más cercano (línea base para comparar)"""
+        n = len(matrix)
+        remaining = set(range(n)) - {start}
+        if end is not None:
+            remaining.discard(end)
+        order = [start]
+        while remaining:
+            current = order[-1]
+            nearest = min(remaining, key=lambda j: matrix[current, j])
+            order.append(nearest)
+            remaining.remove(nearest)
+        if end is not None:
+            order.append(end)
+        return order
+    
+    @staticmethod
+    def _held_karp_path(cost: np.ndarray, start: Optional[int] = None,
+                        end: Optional[int] = None) -> List[int]:
+        """
+        Held-Karp exacto para camino abierto con extremos opcionales fijos
+        Vectorizado por máscara: O(2^n · n) operaciones NumPy
+        """
+        n = len(cost)
+        full = (1 << n) - 1
+        dp = np.full((1 << n, n), np.inf)
+        parent = np.full((1 << n, n), -1, dtype=np.int64)
+        
+        starts = [start] if start is not None else [i for i in range(n) if i != end]
+        for i in starts:
+            dp[1 << i, i] = 0.0
+        
+        bits = 1 << np.arange(n)
+        for mask in range(1, full + 1):
+            row = dp[mask]
+            if not np.isfinite(row).any():
+                continue
+            # Candidatos: extender desde cada último nodo i hacia cada j fuera de la máscara
+            candidates = row[:, None] + cost
+            best_prev = np.argmin(candidates, axis=0)
+            best_val = candidates[best_prev, np.arange(n)]
+            for j in np.nonzero((mask & bits) == 0)[0]:
+                if end is not None and j == end and (mask | bits[j]) != full:
+                    continue  # El final fijo solo puede ser el último nodo
+                new_mask = mask | int(bits[j])
+                if best_val[j] < dp[new_mask, j]:
+                    dp[new_mask, j] = best_val[j]
+                    parent[new_mask, j] = best_prev[j]
+        
+        last = end if end is not None else int(np.argmin(dp[full]))
+        order = []
+        mask = full
+        while last != -1:
+            order.append(int(last))
+            prev = parent[mask, last]
+            mask ^= 1 << int(last)
+            last = prev
+        return order[::-1]
+    
+    @staticmethod
+    def _ortools_path(cost: np.ndarray, start: Optional[int] = None,
+                      end: Optional[int] = None, time_limit_s: float = 1.0) -> List[int]:
+        """Camino abierto con OR-Tools (nodo ficticio para extremos libres)"""
+        from ortools.constraint_solver import routing_enums_pb2, pywrapcp
+        
+        n = len(cost)
+        needs_dummy = start is None or end is None
+        size = n + 1 if needs_dummy else n
+        scaled = np.zeros((size, size), dtype=np.int64)
+        scaled[:n, :n] = np.round(cost * 3600).astype(np.int64)  # horas → segundos
+        matrix = scaled.tolist()
+        
+        manager = pywrapcp.RoutingIndexManager(
+            size, 1, [n if start is None else start], [n if end is None else end]
+        )
+        routing = pywrapcp.RoutingModel(manager)
+        callback = routing.RegisterTransitCallback(
+            lambda a, b: matrix[manager.IndexToNode(a)][manager.IndexToNode(b)]
+        )
+        routing.SetArcCostEvaluatorOfAllVehicles(callback)
+        
+        params = pywrapcp.DefaultRoutingSearchParameters()
+        params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+        params.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+        params.time_limit.FromMilliseconds(int(time_limit_s * 1000))
+        
+        solution = routing.SolveWithParameters(params)
+        if not solution:
+            return list(range(n))
+        
+        order = []
+        index = routing.Start(0)
+        while True:
+            node = manager.IndexToNode(index)
+            if node < n:
+                order.append(node)
+            if routing.IsEnd(index):
+                break
+            index = solution.Value(routing.NextVar(index))
+        return order
+    
+    def _two_opt_path(self, order: List[int], cost: np.ndarray,
+                      fixed_start: bool, fixed_end: bool) -> List[int]:
+        """2-opt sobre camino abierto (costo completo por admitir matrices asimétricas)"""
+        best = list(order)
+        best_cost = self._path_cost(best, cost)
+        lo = 1 if fixed_start else 0
+        hi = len(best) - (1 if fixed_end else 0)
+        improved = True
+        while improved:
+            improved = False
+            for a in range(lo, hi - 1):
+                for b in range(a + 1, hi):
+                    candidate = best[:a] + best[a:b + 1][::-1] + best[b + 1:]
+                    candidate_cost = self._path_cost(candidate, cost)
+                    if candidate_cost < best_cost - 1e-9:
+                        best, best_cost = candidate, candidate_cost
+                        improved = True
+        return best
     
     def analyze_multi_city_complexity(self, cities: List[City]) -> Dict:
         """
@@ -399,23 +750,14 @@ class InterCityService:
         
         # Convertir cache a formato serializable
         cache_data = {
-            "cities": {
-                name: {
-                    "name": city.name,
-                    "center_lat": city.center_lat,
-                    "center_lon": city.center_lon,
-                    "country": city.country,
-                    "pois_count": len(city.pois)
-                }
-                for name, city in self.cities_cache.items()
-            },
+            "cities": dict(self.cities_cache.items()),
             "routes": {
-                f"{key[0]}->{key[1]}": {
-                    "distance_km": route.distance_km,
-                    "travel_time_hours": route.travel_time_hours,
-                    "transport_mode": route.transport_mode
+                f"{route['origin']}->{route['destination']}": {
+                    "distance_km": route["distance_km"],
+                    "travel_time_hours": route["travel_time_hours"],
+                    "transport_mode": route["transport_mode"]
                 }
-                for key, route in self.routes_cache.items()
+                for _, route in self.routes_cache.items()
             }
         }
         
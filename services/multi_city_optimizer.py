@@ -249,17 +249,17 @@ class MultiCityOptimizer:
         """
         logger.info(f"🌆 Optimización intercity híbrida para {len(cities)} ciudades")
         
-        # Paso 1: Optimizar secuencia de ciudades (TSP intercity)
+        # Paso 1: Distribuir días entre ciudades (presupuesto para el solver de secuencia)
+        days_per_city = self._distribute_days_among_cities(cities, days)
+        
+        # Paso 2: Optimizar secuencia de ciudades (Held-Karp / OR-Tools intercity)
         optimal_sequence = self.intercity_service.find_optimal_city_sequence(
-            cities, start_city
+            cities, start_city, days_per_city=days_per_city, trip_days=days
         )
         
-        # Paso 2: Calcular rutas intercity
+        # Paso 3: Calcular rutas intercity
         intercity_routes = self.intercity_service.calculate_intercity_routes(optimal_sequence)
         
-        # Paso 3: Distribuir días entre ciudades
-        days_per_city = self._distribute_days_among_cities(cities, days)
-        
         # Paso 4: Optimizar cada ciudad individualmente con OR-Tools
         daily_schedules = {}
         current_day = 1
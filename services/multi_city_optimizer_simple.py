@@ -177,14 +177,14 @@ class MultiCityOptimizerSimple:
         """Optimización híbrida intercity simplificada"""
         logger.info(f"🌆 Optimización intercity híbrida para {len(cities)} ciudades")
         
+        # Distribuir días entre ciudades
+        days_per_city = self._distribute_days_among_cities(cities, days)
+        
         # Optimizar secuencia de ciudades
         optimal_sequence = self.intercity_service.find_optimal_city_sequence(
-            cities, start_city
+            cities, start_city, days_per_city=days_per_city, trip_days=days
         )
         
-        # Distribuir días entre ciudades
-        days_per_city = self._distribute_days_among_cities(optimal_sequence, days)
-        
         # Crear schedule simple
         daily_schedules = {}
         current_day = 1
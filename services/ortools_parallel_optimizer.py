@@ -7,6 +7,7 @@ Optimiza performance mediante paralelización inteligente de optimizaciones OR-T
 import logging
 import asyncio
 import time
+import random
 from typing import List, Dict, Optional, Any, Tuple, Union
 from dataclasses import dataclass
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
@@ -14,6 +15,8 @@ import json
 from datetime import datetime
 import multiprocessing as mp
 
+import numpy as np
+
 from settings import settings
 
 logging.basicConfig(level=logging.INFO)
@@ -44,6 +47,24 @@ class OptimizationResult:
     worker_id: str
     source: str  # 'parallel', 'sequential', 'cached'
 
+@dataclass
+class PortfolioVariant:
+    """Variante de búsqueda OR-Tools para el modo portfolio"""
+    variant_id: str
+    first_solution_strategy: str = "PATH_CHEAPEST_ARC"
+    local_search_metaheuristic: str = "GUIDED_LOCAL_SEARCH"
+    seed: int = 0  # 0 = orden original; otro valor permuta los nodos para diversificar
+
+# Portfolio por defecto: estrategias complementarias ordenadas por desempeño esperado
+DEFAULT_PORTFOLIO_VARIANTS = [
+    PortfolioVariant("pca_gls", "PATH_CHEAPEST_ARC", "GUIDED_LOCAL_SEARCH"),
+    PortfolioVariant("savings_sa", "SAVINGS", "SIMULATED_ANNEALING"),
+    PortfolioVariant("christofides_tabu", "CHRISTOFIDES", "TABU_SEARCH"),
+    PortfolioVariant("pca_gls_s17", "PATH_CHEAPEST_ARC", "GUIDED_LOCAL_SEARCH", seed=17),
+    PortfolioVariant("lci_gls", "LOCAL_CHEAPEST_INSERTION", "GUIDED_LOCAL_SEARCH"),
+    PortfolioVariant("parallel_ci_sa_s42", "PARALLEL_CHEAPEST_INSERTION", "SIMULATED_ANNEALING", seed=42),
+]
+
 class ORToolsParallelOptimizer:
     """
     🧮 Optimizador paralelo OR-Tools para máximo performance
@@ -77,6 +98,15 @@ class ORToolsParallelOptimizer:
         # Circuit breaker por worker
         self.worker_health = {}
         
+        # Portfolio mode: victorias y ejecuciones por clase de problema {problem_class: {variant_id: n}}
+        self.portfolio_wins: Dict[str, Dict[str, int]] = {}
+        self.portfolio_runs: Dict[str, Dict[str, int]] = {}
+        self.portfolio_stats = {
+            "portfolio_runs": 0,
+            "deadline_hits": 0,
+            "failed_runs": 0
+        }
+        
         self._initialize_workers()
         logger.info(f"🚀 ORToolsParallelOptimizer initialized - {self.max_workers} workers")
     
@@ -335,6 +365,243 @@ class ORToolsParallelOptimizer:
         
         return results
     
+    # ========================================================================
+    # 🎯 PORTFOLIO MODE - multi-start sobre el mismo problema
+    # ========================================================================
+    
+    @staticmethod
+    def _classify_problem(n_places: int) -> str:
+        """Clase de problema por tamaño, usada para aprender la variante ganadora"""
+        if n_places < settings.ORTOOLS_PORTFOLIO_MIN_PLACES:
+            return "small"
+        if n_places < 50:
+            return "medium_30_49"
+        if n_places < 100:
+            return "large_50_99"
+        return "xlarge_100_plus"
+    
+    @staticmethod
+    def _build_haversine_matrix(places: List[Dict]) -> Dict[str, List[List[float]]]:
+        """Matriz haversine en el formato de OSRM: distancias (m) y duraciones (s) a 50 km/h"""
+        coords = np.array([
+            (p.get("lat", p.get("latitude", 0.0)), p.get("lon", p.get("longitude", 0.0)))
+            for p in places
+        ], dtype=float)
+        lat = np.radians(coords[:, 0])[:, None]
+        lon = np.radians(coords[:, 1])[:, None]
+        dlat = lat - lat.T
+        dlon = lon - lon.T
+        a = np.sin(dlat / 2) ** 2 + np.cos(lat) * np.cos(lat.T) * np.sin(dlon / 2) ** 2
+        meters = 2 * 6371000.0 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+        return {
+            "distances": meters.round().tolist(),
+            "durations": (meters / (50000 / 3600)).round().tolist()
+        }
+    
+    def get_preferred_variants(self, problem_class: str, k: Optional[int] = None) -> List[PortfolioVariant]:
+        """
+        Variantes a ejecutar para la clase de problema: las k-1 con mejor tasa de
+        victorias (suavizada, las no probadas valen 0.5) más un cupo de exploración
+        para la variante restante con menos ejecuciones, así todas acumulan muestras.
+        Con k=1 solo se explota; los empates conservan el orden por defecto.
+        """
+        wins = self.portfolio_wins.get(problem_class, {})
+        runs = self.portfolio_runs.get(problem_class, {})
+        ranked = sorted(
+            DEFAULT_PORTFOLIO_VARIANTS,
+            key=lambda v: -(wins.get(v.variant_id, 0) + 1) / (runs.get(v.variant_id, 0) + 2)
+        )
+        k = max(1, k or settings.ORTOOLS_PORTFOLIO_SIZE)
+        if k == 1 or k >= len(ranked):
+            return ranked[:k]
+        exploit = ranked[:k - 1]
+        explore = min(ranked[k - 1:], key=lambda v: runs.get(v.variant_id, 0))
+        return exploit + [explore]
+    
+    @staticmethod
+    def _solve_portfolio_variant(places: List[Dict],
+                                 distance_matrix: Dict[str, List[List[float]]],
+                                 start_time: str,
+                                 variant: PortfolioVariant,
+                                 time_limit_s: float) -> Dict[str, Any]:
+        """
+        Resolver una variante del portfolio sobre el VRPTW estándar
+        (optimize_itinerary_advanced: misma matriz, ventanas horarias y depósito en el nodo 0)
+        Esta función se ejecuta en el proceso worker
+        """
+        from services.ortools_professional_optimizer import ProfessionalItineraryOptimizer
+        
+        start = time.time()
+        n = len(places)
+        
+        # Diversificación por semilla: permutar nodos (el depósito queda fijo)
+        order = list(range(n))
+        if variant.seed and n > 2:
+            rest = order[1:]
+            random.Random(variant.seed).shuffle(rest)
+            order = [0] + rest
+        permuted_matrix = {
+            key: [[distance_matrix[key][i][j] for j in order] for i in order]
+            for key in ("distances", "durations")
+        }
+        
+        result = ProfessionalItineraryOptimizer().optimize_itinerary_advanced(
+            [places[i] for i in order],
+            permuted_matrix,
+            use_time_windows=True,
+            start_time=start_time,
+            search={
+                "first_solution_strategy": variant.first_solution_strategy,
+                "local_search_metaheuristic": variant.local_search_metaheuristic,
+                "time_limit_s": time_limit_s
+            }
+        )
+        execution_time = (time.time() - start) * 1000
+        
+        if not result.get("success"):
+            return {
+                "variant_id": variant.variant_id,
+                "success": False,
+                "execution_time_ms": execution_time
+            }
+        
+        # Volver a los índices originales
+        result["optimized_route"] = [order[i] for i in result["optimized_route"]]
+        result["optimized_pois"] = [places[i] for i in result["optimized_route"]]
+        result["dropped_pois"] = [order[i] for i in result.get("dropped_pois") or []]
+        return {
+            "variant_id": variant.variant_id,
+            "success": True,
+            "result": result,
+            # Primero visitar todos los lugares posibles, luego la menor distancia
+            "cost": (len(result["dropped_pois"]), result["total_distance_km"]),
+            "execution_time_ms": execution_time
+        }
+    
+    async def optimize_portfolio(self,
+                                 task: OptimizationTask,
+                                 distance_matrix: Optional[Dict[str, List[List[float]]]] = None,
+                                 variants: Optional[List[PortfolioVariant]] = None,
+                                 deadline_s: Optional[float] = None,
+                                 start_time: Optional[str] = None) -> OptimizationResult:
+        """
+        🎯 Resolver un mismo problema con K variantes concurrentes
+        
+        Cada variante (estrategia inicial, metaheurística o semilla) corre en
+        un worker distinto; al llegar el deadline se devuelve la mejor solución
+        disponible y se registra la variante ganadora por clase de problema.
+        
+        Args:
+            task: Tarea con places/preferences
+            distance_matrix: Distancias (m) y duraciones (s) como OSRM (haversine si no se entrega)
+            variants: Variantes a ejecutar (por defecto las preferidas para la clase)
+            deadline_s: Tiempo máximo total (por defecto task.timeout_seconds)
+            start_time: Hora de inicio "HH:MM" del VRPTW (por defecto daily_start_hour)
+            
+        Returns:
+            Resultado con la mejor ruta y el detalle de cada variante
+        """
+        started_at = time.time()
+        places = task.places
+        start_time = start_time or f"{task.preferences.get('daily_start_hour', 9):02d}:00"
+        problem_class = self._classify_problem(len(places))
+        variants = variants or self.get_preferred_variants(problem_class)
+        deadline_s = deadline_s or min(task.timeout_seconds, settings.ORTOOLS_PORTFOLIO_DEADLINE_S)
+        
+        if len(places) < 2:
+            return OptimizationResult(
+                task_id=task.task_id,
+                success=True,
+                result_data={"optimized_route": list(range(len(places))), "optimized_pois": places},
+                error_message=None,
+                execution_time_ms=0.0,
+                worker_id="main_thread",
+                source="portfolio"
+            )
+        
+        if distance_matrix is None:
+            distance_matrix = self._build_haversine_matrix(places)
+        
+        # Margen para serializar la respuesta antes del deadline; si hay más
+        # variantes que workers, el presupuesto se reparte entre las tandas
+        waves = -(-len(variants) // max(1, self.max_workers))
+        solver_limit_s = max(0.1, deadline_s * 0.8 / waves)
+        loop = asyncio.get_event_loop()
+        
+        # Sin pool de procesos (paralelo deshabilitado) se usa el pool de hilos por defecto
+        futures = {
+            loop.run_in_executor(
+                self.executor, self._solve_portfolio_variant,
+                places, distance_matrix, start_time, variant, solver_limit_s
+            ): variant.variant_id
+            for variant in variants
+        }
+        
+        done, pending = await asyncio.wait(futures.keys(), timeout=deadline_s)
+        for future in pending:
+            future.cancel()
+        if pending:
+            self.portfolio_stats["deadline_hits"] += 1
+            logger.warning(f"⏱️ Portfolio deadline reached with {len(pending)} variants pending")
+        
+        variant_results = []
+        for future in done:
+            try:
+                variant_results.append(future.result())
+            except Exception as e:
+                logger.warning(f"⚠️ Portfolio variant {futures[future]} failed: {e}")
+        
+        successful = [r for r in variant_results if r.get("success")]
+        execution_time = (time.time() - started_at) * 1000
+        self.portfolio_stats["portfolio_runs"] += 1
+        class_runs = self.portfolio_runs.setdefault(problem_class, {})
+        for variant in variants:
+            class_runs[variant.variant_id] = class_runs.get(variant.variant_id, 0) + 1
+        
+        if not successful:
+            self.portfolio_stats["failed_runs"] += 1
+            return OptimizationResult(
+                task_id=task.task_id,
+                success=False,
+                result_data=None,
+                error_message="No portfolio variant produced a solution before the deadline",
+                execution_time_ms=execution_time,
+                worker_id="portfolio",
+                source="portfolio"
+            )
+        
+        best = min(successful, key=lambda r: r["cost"])
+        class_wins = self.portfolio_wins.setdefault(problem_class, {})
+        class_wins[best["variant_id"]] = class_wins.get(best["variant_id"], 0) + 1
+        
+        logger.info(f"🎯 Portfolio {task.task_id}: {best['variant_id']} won "
+                    f"({len(successful)}/{len(variants)} variants, class={problem_class}, "
+                    f"{execution_time:.0f}ms)")
+        
+        return OptimizationResult(
+            task_id=task.task_id,
+            success=True,
+            result_data={
+                **best["result"],
+                "winning_variant": best["variant_id"],
+                "problem_class": problem_class,
+                "variants": [
+                    {
+                        "variant_id": r["variant_id"],
+                        "success": r.get("success", False),
+                        "dropped_pois": r["cost"][0] if r.get("success") else None,
+                        "total_distance_km": r["cost"][1] if r.get("success") else None,
+                        "execution_time_ms": round(r["execution_time_ms"], 1)
+                    }
+                    for r in variant_results
+                ]
+            },
+            error_message=None,
+            execution_time_ms=execution_time,
+            worker_id=best["variant_id"],
+            source="portfolio"
+        )
+    
     def _update_global_stats(self, results: List[OptimizationResult], total_time_ms: float):
         """Actualizar estadísticas globales de performance"""
         self.stats["total_optimizations"] += len(results)
@@ -434,6 +701,15 @@ class ORToolsParallelOptimizer:
                 "workers_detail": self.worker_stats,
                 "worker_health": self.worker_health
             },
+            "portfolio": {
+                **self.portfolio_stats,
+                "wins_by_problem_class": self.portfolio_wins,
+                "runs_by_problem_class": self.portfolio_runs,
+                "preferred_defaults": {
+                    problem_class: self.get_preferred_variants(problem_class, 1)[0].variant_id
+                    for problem_class in self.portfolio_wins
+                }
+            },
             "performance_analysis": {
                 "parallel_efficiency": self._calculate_parallel_efficiency(),
                 "bottlenecks": self._identify_bottlenecks(),
@@ -525,6 +801,34 @@ async def optimize_parallel_batch(requests: List[Dict[str, Any]]) -> List[Optimi
     
     return await ortools_parallel_optimizer.optimize_parallel(tasks)
 
+async def optimize_portfolio(places: List[Dict[str, Any]],
+                             preferences: Optional[Dict[str, Any]] = None,
+                             distance_matrix: Optional[Dict[str, List[List[float]]]] = None,
+                             deadline_s: Optional[float] = None,
+                             start_time: Optional[str] = None) -> OptimizationResult:
+    """
+    Resolver un itinerario grande en modo portfolio (K variantes concurrentes)
+    
+    Args:
+        places: Lugares a ordenar (el primero actúa como depósito)
+        preferences: Preferencias del usuario
+        distance_matrix: Distancias (m) y duraciones (s) como OSRM, opcional
+        deadline_s: Tiempo máximo total
+        start_time: Hora de inicio "HH:MM" del VRPTW
+        
+    Returns:
+        Mejor resultado encontrado antes del deadline
+    """
+    task = OptimizationTask(
+        task_id=f"portfolio_{int(time.time() * 1000)}",
+        places=places,
+        preferences=preferences or {},
+        timeout_seconds=settings.ORTOOLS_PORTFOLIO_DEADLINE_S
+    )
+    return await ortools_parallel_optimizer.optimize_portfolio(
+        task, distance_matrix=distance_matrix, deadline_s=deadline_s, start_time=start_time
+    )
+
 def get_parallel_optimizer_stats() -> Dict[str, Any]:
     """Obtener estadísticas del optimizador paralelo"""
     return ortools_parallel_optimizer.get_performance_stats()
@@ -58,6 +58,23 @@ class OptimizationResult:
     constraints_satisfied: bool
     dropped_pois: List[int] = None  # POIs que no se pudieron incluir
     
+def _search_parameters(search: Optional[Dict[str, Any]], default_time_limit_s: float):
+    """
+    Parámetros de búsqueda OR-Tools; search permite variar estrategia inicial,
+    metaheurística y límite de tiempo (modo portfolio) sin tocar el modelo
+    """
+    search = search or {}
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = getattr(
+        routing_enums_pb2.FirstSolutionStrategy, search.get('first_solution_strategy', 'PATH_CHEAPEST_ARC')
+    )
+    search_parameters.local_search_metaheuristic = getattr(
+        routing_enums_pb2.LocalSearchMetaheuristic, search.get('local_search_metaheuristic', 'GUIDED_LOCAL_SEARCH')
+    )
+    time_limit_s = search.get('time_limit_s', default_time_limit_s)
+    search_parameters.time_limit.FromMilliseconds(max(100, int(time_limit_s * 1000)))
+    return search_parameters
+
 class ORToolsTSPSolver:
     """
     Solver TSP/VRP profesional usando OR-Tools
@@ -71,12 +88,14 @@ class ORToolsTSPSolver:
         self.routing = None
         self.solution = None
     
-    def solve_tsp_basic(self, distance_matrix: List[List[float]]) -> OptimizationResult:
+    def solve_tsp_basic(self, distance_matrix: List[List[float]],
+                        search: Optional[Dict[str, Any]] = None) -> OptimizationResult:
         """
         Resuelve TSP básico sin restricciones temporales
         
         Args:
             distance_matrix: Matriz NxN de distancias en metros
+            search: Estrategia/metaheurística/límite de tiempo opcionales
             
         Returns:
             Resultado de optimización
@@ -104,15 +123,8 @@ class ORToolsTSPSolver:
             transit_callback_index = self.routing.RegisterTransitCallback(distance_callback)
             self.routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
             
-            # Configurar parámetros de búsqueda
-            search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-            search_parameters.first_solution_strategy = (
-                routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-            )
-            search_parameters.local_search_metaheuristic = (
-                routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
-            )
-            search_parameters.time_limit.FromSeconds(1)  # Límite 1 segundo (ultrarrápido)
+            # Configurar parámetros de búsqueda (1 segundo por defecto, ultrarrápido)
+            search_parameters = _search_parameters(search, default_time_limit_s=1)
             
             # Resolver
             solution = self.routing.SolveWithParameters(search_parameters)
@@ -148,7 +160,8 @@ class ORToolsTSPSolver:
                     distance_matrix: List[List[float]], 
                     time_matrix: List[List[float]],
                     pois: List[POI],
-                    start_time_minutes: int = 540) -> OptimizationResult:
+                    start_time_minutes: int = 540,
+                    search: Optional[Dict[str, Any]] = None) -> OptimizationResult:
         """
         Resuelve VRPTW (Vehicle Routing with Time Windows)
         
@@ -157,6 +170,7 @@ class ORToolsTSPSolver:
             time_matrix: Matriz de tiempos (minutos)
             pois: Lista de POIs con restricciones temporales
             start_time_minutes: Hora inicio del tour (540 = 9:00 AM)
+            search: Estrategia/metaheurística/límite de tiempo opcionales
             
         Returns:
             Resultado de optimización avanzada
@@ -222,15 +236,8 @@ class ORToolsTSPSolver:
                 if poi.is_mandatory and poi_idx > 0:  # No aplicar al depósito
                     self.routing.AddDisjunction([self.manager.NodeToIndex(poi_idx)], 10000)
             
-            # Configurar búsqueda
-            search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-            search_parameters.first_solution_strategy = (
-                routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-            )
-            search_parameters.local_search_metaheuristic = (
-                routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
-            )
-            search_parameters.time_limit.FromSeconds(2)  # 2 segundos límite (ultrarrápido)
+            # Configurar búsqueda (2 segundos por defecto, ultrarrápido)
+            search_parameters = _search_parameters(search, default_time_limit_s=2)
             
             # Resolver
             solution = self.routing.SolveWithParameters(search_parameters)
@@ -241,12 +248,12 @@ class ORToolsTSPSolver:
             else:
                 logger.warning("⚠️ VRPTW no encontró solución, fallback a TSP básico")
                 # Fallback a TSP básico
-                return self.solve_tsp_basic(distance_matrix)
+                return self.solve_tsp_basic(distance_matrix, search)
                 
         except Exception as e:
             logger.error(f"❌ Error en VRPTW: {e}")
             # Fallback a TSP básico
-            return self.solve_tsp_basic(distance_matrix)
+            return self.solve_tsp_basic(distance_matrix, search)
     
     def _extract_solution_basic(self, 
                                solution, 
@@ -351,15 +358,17 @@ class ProfessionalItineraryOptimizer:
                                    pois: List[Dict],
                                    distance_matrix: Dict,
                                    use_time_windows: bool = False,
-                                   start_time: str = "09:00") -> Dict:
+                                   start_time: str = "09:00",
+                                   search: Optional[Dict[str, Any]] = None) -> Dict:
         """
         Optimización avanzada de itinerario
         
         Args:
-            pois: Lista de POIs con metadatos
+            pois: Lista de POIs con metadatos (el primero es el depósito)
             distance_matrix: Resultado de OSRM con distancias/tiempos
             use_time_windows: Usar restricciones horarias VRPTW
             start_time: Hora inicio en formato "HH:MM"
+            search: Estrategia/metaheurística/límite de tiempo opcionales (portfolio)
             
         Returns:
             Itinerario optimizado con OR-Tools
@@ -396,11 +405,11 @@ class ProfessionalItineraryOptimizer:
             # VRPTW con restricciones temporales
             start_minutes = self._parse_time_to_minutes(start_time)
             result = self.tsp_solver.solve_vrptw(
-                distances, time_matrix_minutes, structured_pois, start_minutes
+                distances, time_matrix_minutes, structured_pois, start_minutes, search
             )
         else:
             # TSP básico (más rápido)
-            result = self.tsp_solver.solve_tsp_basic(distances)
+            result = self.tsp_solver.solve_tsp_basic(distances, search)
         
         # Procesar resultado
         if result.success:
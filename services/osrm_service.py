@@ -4,7 +4,6 @@
 Implementación según recomendaciones de stack de producción
 """
 
-import requests
 import subprocess
 import time
 import logging
@@ -12,6 +11,8 @@ from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 import json
 
+from utils.http_client_registry import get_http_client
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -35,6 +36,8 @@ class OSRMService:
         self.container_name = f"osrm_{profile}"
         self.data_dir = Path(__file__).parent.parent / "osrm_data"
         self.processed_dir = self.data_dir / f"processed_{profile}"
+        # Sesión keep-alive compartida del registro HTTP
+        self.http = get_http_client("osrm_local").sync_session
         
         logger.info(f"🚗 OSRMService iniciado - Perfil: {profile}, Puerto: {port}")
     
@@ -155,7 +158,7 @@ class OSRMService:
             # Esperar que el servidor esté listo
             for i in range(30):  # 30 segundos máximo
                 try:
-                    response = requests.get(f"{self.base_url}/health", timeout=1)
+                    response = self.http.get(f"{self.base_url}/health", timeout=1)
                     if response.status_code == 200:
                         logger.info(f"✅ Servidor OSRM listo en {self.base_url}")
                         return True
@@ -195,7 +198,7 @@ class OSRMService:
             
             # Realizar consulta
             start_time = time.time()
-            response = requests.get(url, params=params, timeout=5)
+            response = self.http.get(url, params=params, timeout=5)
             query_time = time.time() - start_time
             
             if response.status_code != 200:
@@ -243,7 +246,7 @@ class OSRMService:
             }
             
             start_time = time.time()
-            response = requests.get(url, params=params, timeout=10)
+            response = self.http.get(url, params=params, timeout=10)
             query_time = time.time() - start_time
             
             if response.status_code != 200:
@@ -278,7 +281,7 @@ class OSRMService:
         try:
             # Usar ruta de prueba simple en lugar de /health
             test_url = f"{self.base_url}/route/v1/{self.profile}/-70.6693,-33.4489;-71.6127,-33.0472"
-            response = requests.get(test_url, timeout=2)
+            response = self.http.get(test_url, timeout=2)
             return response.status_code == 200 and "Ok" in response.text
         except:
             return False
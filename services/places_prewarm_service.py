@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+🔥 Places Prewarm Service - Pre-calentamiento del caché geográfico de Places
+Recorre las celdas H3 de las ciudades objetivo y llena el GeographicCacheManager
+con un pool por tipo (mismas claves que usa el planner de bloques libres), dentro
+de un presupuesto de llamadas. En horario valle refresca las entradas por expirar.
+
+Uso CLI:
+    python -m services.places_prewarm_service --dry-run
+    python -m services.places_prewarm_service --cities santiago,valparaiso --budget 200
+"""
+
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import h3
+
+from settings import settings
+from services.google_places_service import GooglePlacesService
+from services.h3_demand_index import get_demand_index, DEMAND_RESOLUTIONS
+from utils.geo_utils import haversine_km
+from utils.places_quota_manager import get_quota_manager, quota_priority, QuotaPriority
+
+logger = logging.getLogger(__name__)
+
+# Costo de referencia de Nearby Search (USD por llamada)
+NEARBY_SEARCH_COST_USD = 0.032
+
+@dataclass
+class PrewarmCity:
+    """Ciudad objetivo del pre-warming"""
+    name: str
+    lat: float
+    lon: float
+    radius_km: float
+
+PREWARM_CITIES = {
+    'santiago': PrewarmCity('Santiago', -33.4489, -70.6693, 8.0),
+    'valparaiso': PrewarmCity('Valparaíso', -33.0472, -71.6127, 4.0),
+    'san_pedro_atacama': PrewarmCity('San Pedro de Atacama', -22.9087, -68.1997, 2.0),
+    'antofagasta': PrewarmCity('Antofagasta', -23.6509, -70.3975, 5.0),
+}
+
+# Pseudo-ciudad: celdas con más demanda según el índice H3 (fuera o dentro de las ciudades)
+DEMAND_HOTSPOTS = 'demand_hotspots'
+
+@dataclass
+class PrewarmTask:
+    """Una Nearby Search pendiente (celda, tipo)"""
+    city: str
+    cell_id: str
+    lat: float
+    lon: float
+    place_type: str
+    reason: str                       # "missing" | "expiring"
+    ttl_remaining_s: Optional[float] = None
+    ring: int = 0                     # Distancia en celdas al centro de la ciudad
+    demand: float = 0.0               # Demanda observada en la celda (índice H3)
+
+class PlacesPrewarmService:
+    """
+    🔥 Pre-warming del caché de Places por celdas H3
+
+    - plan(): qué (celda, tipo) faltan o están por expirar
+    - run(): ejecuta el plan dentro del presupuesto (o lo estima con dry_run)
+    - run_forever(): tarea de fondo que corre una vez por día en horario valle
+    """
+
+    def __init__(self,
+                 places_service: Optional[GooglePlacesService] = None,
+                 h3_resolution: Optional[int] = None,
+                 radius_m: Optional[int] = None):
+        self.places_service = places_service or GooglePlacesService()
+        self.cache_manager = self.places_service.cache_manager
+        # Misma resolución y radio que las búsquedas de bloques libres → mismas claves de caché
+        self.h3_resolution = h3_resolution if h3_resolution is not None else settings.FREE_BLOCK_BATCH_H3_RES
+        self.radius_m = radius_m or settings.FREE_DAY_SUGGESTIONS_RADIUS_M
+        self.place_types = list(self.cache_manager.ttl_by_type.keys())
+
+        # (celda, tipo) sin resultados de calidad: no se cachean, evitar repetir la llamada
+        self._empty_until: Dict[Tuple[str, str], float] = {}
+        self.last_report: Dict[str, Any] = {}
+        self._last_offpeak_run_date: Optional[str] = None
+
+    # ========================================================================
+    # PLANIFICACIÓN
+    # ========================================================================
+
+    def resolve_cities(self, cities: Optional[List[str]] = None) -> List[str]:
+        """Ciudades configuradas (o las pedidas) que existen en PREWARM_CITIES"""
+        if cities is None:
+            cities = [c.strip() for c in settings.PLACES_PREWARM_CITIES.split(',') if c.strip()]
+            if settings.PLACES_PREWARM_DEMAND_CELLS > 0:
+                cities.append(DEMAND_HOTSPOTS)
+        known = set(PREWARM_CITIES) | {DEMAND_HOTSPOTS}
+        unknown = [c for c in cities if c not in known]
+        if unknown:
+            logger.warning(f"⚠️ Ciudades sin configuración de pre-warming: {unknown}")
+        return [c for c in cities if c in known]
+
+    def demand_cells(self) -> List[Tuple[str, int]]:
+        """Celdas más demandadas a la resolución del pre-warming (anillo 0: prioridad de centro)"""
+        if self.h3_resolution not in DEMAND_RESOLUTIONS:
+            return []
+        hot = get_demand_index().hot_cells(resolution=self.h3_resolution,
+                                           limit=settings.PLACES_PREWARM_DEMAND_CELLS)
+        return [(cell['cell'], 0) for cell in hot]
+
+    def city_cells(self, city_key: str) -> List[Tuple[str, int]]:
+        """Celdas H3 cuyo centro cae dentro del radio de la ciudad, con su anillo"""
+        if city_key == DEMAND_HOTSPOTS:
+            return self.demand_cells()
+        city = PREWARM_CITIES[city_key]
+        center_cell = h3.latlng_to_cell(city.lat, city.lon, self.h3_resolution)
+        spacing_km = h3.average_hexagon_edge_length(self.h3_resolution, unit='km') * math.sqrt(3)
+        k = max(0, math.ceil(city.radius_km / spacing_km))
+
+        cells = []
+        for cell_id in h3.grid_disk(center_cell, k):
+            cell_lat, cell_lon = h3.cell_to_latlng(cell_id)
+            if haversine_km(city.lat, city.lon, cell_lat, cell_lon) <= city.radius_km or cell_id == center_cell:
+                cells.append((cell_id, h3.grid_distance(center_cell, cell_id)))
+        cells.sort(key=lambda c: c[1])
+        return cells
+
+    def plan(self,
+             cities: Optional[List[str]] = None,
+             place_types: Optional[List[str]] = None,
+             refresh_window_s: Optional[float] = None,
+             refresh_only: bool = False) -> List[PrewarmTask]:
+        """
+        Tareas pendientes: primero celdas sin caché (de centro a periferia y,
+        dentro de cada anillo, por demanda observada), luego entradas que
+        expiran dentro de la ventana de refresco
+        """
+        place_types = place_types or self.place_types
+        if refresh_window_s is None:
+            refresh_window_s = settings.PLACES_PREWARM_REFRESH_WINDOW_H * 3600
+        now = time.time()
+        demand_index = get_demand_index() if self.h3_resolution in DEMAND_RESOLUTIONS else None
+
+        missing, expiring = [], []
+        seen_cells = set()
+        for city_key in self.resolve_cities(cities):
+            for cell_id, ring in self.city_cells(city_key):
+                if cell_id in seen_cells:
+                    continue
+                seen_cells.add(cell_id)
+                demand = demand_index.score_cells([cell_id]) if demand_index else 0.0
+                lat, lon = h3.cell_to_latlng(cell_id)
+                for place_type in place_types:
+                    entry = self.cache_manager.get_entry(lat, lon, self.radius_m, [place_type])
+                    if entry is None:
+                        if refresh_only or self._empty_until.get((cell_id, place_type), 0) > now:
+                            continue
+                        missing.append(PrewarmTask(city_key, cell_id, lat, lon, place_type, "missing", None,
+                                                   ring, demand))
+                        continue
+                    remaining = self.cache_manager.ttl_remaining(entry)
+                    if remaining <= refresh_window_s:
+                        expiring.append(PrewarmTask(city_key, cell_id, lat, lon, place_type, "expiring",
+                                                    remaining, ring, demand))
+
+        missing.sort(key=lambda t: (t.ring, -t.demand))
+        expiring.sort(key=lambda t: t.ttl_remaining_s)
+        return missing + expiring
+
+    def coverage_hit_rate(self,
+                          cities: Optional[List[str]] = None,
+                          place_types: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Hit rate esperado: fracción de búsquedas (centro de celda × tipo) que
+        el caché respondería sin llamar a Google
+        """
+        place_types = place_types or self.place_types
+        by_city = {}
+        total_hits = total_probes = 0
+        for city_key in self.resolve_cities(cities):
+            hits = probes = 0
+            for cell_id, _ in self.city_cells(city_key):
+                lat, lon = h3.cell_to_latlng(cell_id)
+                for place_type in place_types:
+                    probes += 1
+                    hits += self.cache_manager.would_hit(lat, lon, self.radius_m, [place_type])
+            by_city[city_key] = round(hits / probes * 100, 1) if probes else 0.0
+            total_hits += hits
+            total_probes += probes
+        return {
+            "hit_rate_percentage": round(total_hits / total_probes * 100, 1) if total_probes else 0.0,
+            "probes": total_probes,
+            "by_city": by_city
+        }
+
+    # ========================================================================
+    # EJECUCIÓN
+    # ========================================================================
+
+    async def run(self,
+                  cities: Optional[List[str]] = None,
+                  place_types: Optional[List[str]] = None,
+                  budget: Optional[int] = None,
+                  dry_run: bool = False,
+                  refresh_only: bool = False,
+                  max_concurrent_cells: int = 4) -> Dict[str, Any]:
+        """
+        Ejecutar (o estimar) el pre-warming
+
+        Returns:
+            Reporte con llamadas estimadas/realizadas y hit rate antes/después
+        """
+        start = time.time()
+        budget = settings.PLACES_PREWARM_BUDGET if budget is None else budget
+        cities = self.resolve_cities(cities)
+        tasks = self.plan(cities, place_types, refresh_only=refresh_only)
+        selected = tasks[:max(budget, 0)]
+        hit_rate_before = self.coverage_hit_rate(cities, place_types)
+
+        report = {
+            "dry_run": dry_run,
+            "cities": cities,
+            "cells": sum(len(self.city_cells(c)) for c in cities),
+            "h3_resolution": self.h3_resolution,
+            "radius_m": self.radius_m,
+            "budget": budget,
+            "tasks_missing": sum(1 for t in tasks if t.reason == "missing"),
+            "tasks_expiring": sum(1 for t in tasks if t.reason == "expiring"),
+            "estimated_api_calls": len(selected),
+            "estimated_cost_usd": round(len(selected) * NEARBY_SEARCH_COST_USD, 2),
+            "deferred_over_budget": len(tasks) - len(selected),
+            "hit_rate_before": hit_rate_before
+        }
+
+        if dry_run or not selected:
+            report["api_calls_made"] = 0
+            report["hit_rate_after"] = hit_rate_before
+        else:
+            # Agrupar por celda: una llamada concurrente por tipo dentro de cada celda
+            by_cell: Dict[str, List[PrewarmTask]] = {}
+            for task in selected:
+                by_cell.setdefault(task.cell_id, []).append(task)
+
+            calls_before = self.places_service.nearby_api_calls
+            semaphore = asyncio.Semaphore(max_concurrent_cells)
+            empty_ttl = settings.PLACES_PREWARM_REFRESH_WINDOW_H * 3600
+
+            async def warm_cell(cell_tasks: List[PrewarmTask]) -> int:
+                async with semaphore:
+                    # El pre-warming es la prioridad más baja: con cuota baja no gasta
+                    if not get_quota_manager().allows('nearby_search'):
+                        return 0
+                    first = cell_tasks[0]
+                    pool = await self.places_service.search_nearby_pool(
+                        lat=first.lat, lon=first.lon, radius_m=self.radius_m,
+                        types=[t.place_type for t in cell_tasks], force_refresh=True
+                    )
+                    warmed = 0
+                    for task in cell_tasks:
+                        if pool.get(task.place_type):
+                            warmed += 1
+                        else:
+                            self._empty_until[(task.cell_id, task.place_type)] = time.time() + empty_ttl
+                    return warmed
+
+            with quota_priority(QuotaPriority.LAZY):
+                results = await asyncio.gather(*(warm_cell(t) for t in by_cell.values()), return_exceptions=True)
+            errors = [r for r in results if isinstance(r, Exception)]
+            for error in errors[:3]:
+                logger.warning(f"⚠️ Error en pre-warming de celda: {error}")
+
+            report["api_calls_made"] = self.places_service.nearby_api_calls - calls_before
+            report["entries_warmed"] = sum(r for r in results if not isinstance(r, Exception))
+            report["cell_errors"] = len(errors)
+            report["hit_rate_after"] = self.coverage_hit_rate(cities, place_types)
+
+        report["elapsed_s"] = round(time.time() - start, 2)
+        report["timestamp"] = datetime.now().isoformat()
+        self.last_report = report
+
+        logger.info(f"🔥 Pre-warming {'(dry-run) ' if dry_run else ''}{cities}: "
+                    f"{report['estimated_api_calls']} llamadas estimadas, {report['api_calls_made']} realizadas, "
+                    f"hit rate {hit_rate_before['hit_rate_percentage']}% → "
+                    f"{report['hit_rate_after']['hit_rate_percentage']}%")
+        return report
+
+    # ========================================================================
+    # TAREA DE FONDO (HORARIO VALLE)
+    # ========================================================================
+
+    def is_off_peak(self, now: Optional[datetime] = None) -> bool:
+        """¿La hora local está dentro de PLACES_PREWARM_OFFPEAK_HOURS? (ej. "3-6", admite cruzar medianoche)"""
+        now = now or datetime.now(ZoneInfo(settings.PLACES_PREWARM_TIMEZONE))
+        start_hour, end_hour = (int(h) for h in settings.PLACES_PREWARM_OFFPEAK_HOURS.split('-'))
+        if start_hour <= end_hour:
+            return start_hour <= now.hour < end_hour
+        return now.hour >= start_hour or now.hour < end_hour
+
+    async def run_forever(self):
+        """Una corrida por día dentro del horario valle (llenar faltantes + refrescar por expirar)"""
+        interval_s = settings.PLACES_PREWARM_CHECK_INTERVAL_MIN * 60
+        logger.info(f"🔥 Pre-warming de Places activo (valle {settings.PLACES_PREWARM_OFFPEAK_HOURS}h "
+                    f"{settings.PLACES_PREWARM_TIMEZONE}, presupuesto {settings.PLACES_PREWARM_BUDGET})")
+        while True:
+            try:
+                now = datetime.now(ZoneInfo(settings.PLACES_PREWARM_TIMEZONE))
+                today = now.date().isoformat()
+                if self.is_off_peak(now) and self._last_offpeak_run_date != today:
+                    self._last_offpeak_run_date = today
+                    await self.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Error en pre-warming de Places: {e}")
+            await asyncio.sleep(interval_s)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.PLACES_PREWARM_ENABLED,
+            "off_peak_hours": settings.PLACES_PREWARM_OFFPEAK_HOURS,
+            "timezone": settings.PLACES_PREWARM_TIMEZONE,
+            "is_off_peak": self.is_off_peak(),
+            "last_offpeak_run_date": self._last_offpeak_run_date,
+            "last_report": self.last_report
+        }
+
+# Instancia global
+_prewarm_service: Optional[PlacesPrewarmService] = None
+
+def get_prewarm_service() -> PlacesPrewarmService:
+    """Obtener el servicio global de pre-warming"""
+    global _prewarm_service
+    if _prewarm_service is None:
+        _prewarm_service = PlacesPrewarmService()
+    return _prewarm_service
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="🔥 Pre-warming del caché de Google Places por celdas H3")
+    parser.add_argument("--cities", help=f"Ciudades separadas por coma ({', '.join([*PREWARM_CITIES, DEMAND_HOTSPOTS])})")
+    parser.add_argument("--types", help="Tipos separados por coma (por defecto todos los de ttl_by_type)")
+    parser.add_argument("--budget", type=int, default=None, help="Máximo de Nearby Search en esta corrida")
+    parser.add_argument("--dry-run", action="store_true", help="Solo estimar llamadas y costo")
+    parser.add_argument("--refresh-only", action="store_true", help="Solo refrescar entradas por expirar")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        get_demand_index().load_snapshot()
+        service = PlacesPrewarmService()
+        report = await service.run(
+            cities=args.cities.split(',') if args.cities else None,
+            place_types=args.types.split(',') if args.types else None,
+            budget=args.budget,
+            dry_run=args.dry_run,
+            refresh_only=args.refresh_only
+        )
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    asyncio.run(main())
@@ -34,6 +34,17 @@ class Settings(BaseSettings):
     GOOGLE_PLACES_API_KEY: Optional[str] = os.getenv("GOOGLE_PLACES_API_KEY")
     OPENAI_API_KEY: Optional[str] = None
     ENABLE_REAL_PLACES: bool = os.getenv("ENABLE_REAL_PLACES", "true").lower() == "true"
+    GOOGLE_PLACES_QPS: float = float(os.getenv("GOOGLE_PLACES_QPS", "10"))        # Token bucket por API key
+    GOOGLE_PLACES_BURST: int = int(os.getenv("GOOGLE_PLACES_BURST", "20"))
+    GOOGLE_HTTP_POOL_SIZE: int = int(os.getenv("GOOGLE_HTTP_POOL_SIZE", "20"))    # Conexiones keep-alive compartidas
+    
+    # Cuota diaria de Places (unidades ≈ USD/1000 requests; ventana móvil de 24h por proceso)
+    PLACES_QUOTA_ENABLED: bool = os.getenv("PLACES_QUOTA_ENABLED", "true").lower() == "true"
+    PLACES_DAILY_QUOTA_UNITS: float = float(os.getenv("PLACES_DAILY_QUOTA_UNITS", "200000"))
+    # Fracción del presupuesto reservada a prioridades superiores: bajo este umbral la prioridad se degrada
+    PLACES_QUOTA_RESERVE_HOTEL: float = float(os.getenv("PLACES_QUOTA_RESERVE_HOTEL", "0.10"))
+    PLACES_QUOTA_RESERVE_FREE_BLOCK: float = float(os.getenv("PLACES_QUOTA_RESERVE_FREE_BLOCK", "0.30"))
+    PLACES_QUOTA_RESERVE_LAZY: float = float(os.getenv("PLACES_QUOTA_RESERVE_LAZY", "0.50"))
     
     # Free Routing APIs (alternativas gratuitas a Google Directions)
     OPENROUTE_API_KEY: Optional[str] = os.getenv('OPENROUTE_API_KEY', None)  # Obtener clave gratuita en openrouteservice.org
@@ -98,7 +109,63 @@ class Settings(BaseSettings):
     # Sugerencias para días libres
     FREE_DAY_SUGGESTIONS_RADIUS_M: int = 3000
     FREE_DAY_SUGGESTIONS_LIMIT: int = 3  # Reducido de 6 a 3 para mejor UX
-    
+    FREE_BLOCK_BATCH_SUGGESTIONS: bool = os.getenv("FREE_BLOCK_BATCH_SUGGESTIONS", "true").lower() == "true"
+    FREE_BLOCK_BATCH_H3_RES: int = int(os.getenv("FREE_BLOCK_BATCH_H3_RES", "7"))  # ~1.2km de arista por celda
+    
+    # Pre-warming del caché geográfico de Places (consume cuota de Google: apagado por defecto)
+    PLACES_PREWARM_ENABLED: bool = os.getenv("PLACES_PREWARM_ENABLED", "false").lower() == "true"
+    PLACES_PREWARM_CITIES: str = os.getenv("PLACES_PREWARM_CITIES", "santiago,valparaiso,san_pedro_atacama,antofagasta")
+    PLACES_PREWARM_BUDGET: int = int(os.getenv("PLACES_PREWARM_BUDGET", "500"))           # Nearby Search por corrida
+    PLACES_PREWARM_REFRESH_WINDOW_H: float = float(os.getenv("PLACES_PREWARM_REFRESH_WINDOW_H", "12"))  # Refrescar si expira antes
+    PLACES_PREWARM_OFFPEAK_HOURS: str = os.getenv("PLACES_PREWARM_OFFPEAK_HOURS", "3-6")   # Hora local inicio-fin
+    PLACES_PREWARM_TIMEZONE: str = os.getenv("PLACES_PREWARM_TIMEZONE", "America/Santiago")
+    PLACES_PREWARM_CHECK_INTERVAL_MIN: int = int(os.getenv("PLACES_PREWARM_CHECK_INTERVAL_MIN", "30"))
+    
+    # Límite de tamaño del caché geográfico de Places (memoria + disco) y evicción en background
+    PLACES_CACHE_MAX_SIZE_MB: int = int(os.getenv("PLACES_CACHE_MAX_SIZE_MB", "100"))
+    PLACES_CACHE_EVICTION_INTERVAL_S: int = int(os.getenv("PLACES_CACHE_EVICTION_INTERVAL_S", "60"))
+    PLACES_CACHE_EVICTION_BATCH: int = int(os.getenv("PLACES_CACHE_EVICTION_BATCH", "200"))  # Entradas por paso
+    
+    # Caché persistente de Place Details por place_id (TTL por campo)
+    PLACE_DETAILS_CACHE_PATH: str = os.getenv("PLACE_DETAILS_CACHE_PATH", "cache_places/place_details.sqlite3")
+    PLACE_DETAILS_CACHE_MEMORY_ENTRIES: int = int(os.getenv("PLACE_DETAILS_CACHE_MEMORY_ENTRIES", "5000"))
+    
+    # Reverse geocoding: un resultado por celda H3, persistido en SQLite
+    REVERSE_GEOCODE_H3_RES: int = int(os.getenv("REVERSE_GEOCODE_H3_RES", "7"))
+    REVERSE_GEOCODE_CACHE_PATH: str = os.getenv("REVERSE_GEOCODE_CACHE_PATH", "cache_places/reverse_geocode.sqlite3")
+    REVERSE_GEOCODE_TTL_DAYS: int = int(os.getenv("REVERSE_GEOCODE_TTL_DAYS", "30"))
+
+    # Etiquetas de transfers: nombre por coordenada redondeada, persistido en SQLite
+    PLACE_LABEL_CACHE_PATH: str = os.getenv("PLACE_LABEL_CACHE_PATH", "cache_places/place_labels.sqlite3")
+    PLACE_LABEL_TTL_DAYS: int = int(os.getenv("PLACE_LABEL_TTL_DAYS", "30"))
+    PLACE_LABEL_COORD_DECIMALS: int = int(os.getenv("PLACE_LABEL_COORD_DECIMALS", "4"))  # ~11 m
+
+    # Cachés compartidas del proceso (clustering de ciudades y rutas intercity: TTL + LRU)
+    CLUSTERING_CACHE_MAX_ENTRIES: int = int(os.getenv("CLUSTERING_CACHE_MAX_ENTRIES", "256"))
+    CLUSTERING_CACHE_TTL_S: int = int(os.getenv("CLUSTERING_CACHE_TTL_S", "3600"))
+    INTERCITY_ROUTES_CACHE_MAX_ENTRIES: int = int(os.getenv("INTERCITY_ROUTES_CACHE_MAX_ENTRIES", "20000"))
+    INTERCITY_ROUTES_CACHE_TTL_S: int = int(os.getenv("INTERCITY_ROUTES_CACHE_TTL_S", "604800"))  # 7 días
+    SHARED_CACHE_DISK_PATH: str = os.getenv("SHARED_CACHE_DISK_PATH", "")  # Vacío = solo memoria
+
+    # Tabla OD intercity precalculada (generate_intercity_od_table.py)
+    INTERCITY_OD_TABLE_ENABLED: bool = os.getenv("INTERCITY_OD_TABLE_ENABLED", "true").lower() == "true"
+    INTERCITY_OD_TABLE_PATH: str = os.getenv("INTERCITY_OD_TABLE_PATH", "data/intercity_od_table.npz")
+    INTERCITY_OD_TRUST_ESTIMATES: bool = os.getenv("INTERCITY_OD_TRUST_ESTIMATES", "true").lower() == "true"  # Usar pares geodésicos
+
+    # Índice de demanda H3 (lugares, tramos y búsquedas por celda a res 5/7/9)
+    DEMAND_INDEX_ENABLED: bool = os.getenv("DEMAND_INDEX_ENABLED", "true").lower() == "true"
+    DEMAND_INDEX_SNAPSHOT_PATH: str = os.getenv("DEMAND_INDEX_SNAPSHOT_PATH", "cache/demand_index.npz")
+    DEMAND_INDEX_SNAPSHOT_INTERVAL_S: int = int(os.getenv("DEMAND_INDEX_SNAPSHOT_INTERVAL_S", "300"))
+    DEMAND_INDEX_HALF_LIFE_DAYS: float = float(os.getenv("DEMAND_INDEX_HALF_LIFE_DAYS", "7"))
+    PLACES_PREWARM_DEMAND_CELLS: int = int(os.getenv("PLACES_PREWARM_DEMAND_CELLS", "20"))  # Celdas calientes extra
+    GRAPH_PRELOAD_ENABLED: bool = os.getenv("GRAPH_PRELOAD_ENABLED", "false").lower() == "true"  # Precarga al startup
+    GRAPH_PRELOAD_DEMAND_MIN_SCORE: float = float(os.getenv("GRAPH_PRELOAD_DEMAND_MIN_SCORE", "50"))
+
+    # Índice de hoteles: hoteles de Google Places reutilizados por place_id
+    HOTEL_INDEX_GOOGLE_TTL_H: float = float(os.getenv("HOTEL_INDEX_GOOGLE_TTL_H", "72"))
+    HOTEL_INDEX_GOOGLE_MAX_HOTELS: int = int(os.getenv("HOTEL_INDEX_GOOGLE_MAX_HOTELS", "5000"))
+    HOTEL_INDEX_GOOGLE_MAX_SEARCHES: int = int(os.getenv("HOTEL_INDEX_GOOGLE_MAX_SEARCHES", "2000"))
+
     # ========================================================================
     # 🧠 CITY2GRAPH CONFIGURATION - FASE 1 (FEATURE FLAGS)
     # ========================================================================
@@ -163,6 +230,10 @@ class Settings(BaseSettings):
     ORTOOLS_USER_PERCENTAGE: int = int(os.getenv("ORTOOLS_USER_PERCENTAGE", "50"))        # Escalar a 50% usuarios tras validación
     ORTOOLS_TRACK_PERFORMANCE: bool = os.getenv("ORTOOLS_TRACK_PERFORMANCE", "true").lower() == "true"
     
+    # Decision engine: cache acotado de decisiones (el fast path se deriva de las reglas)
+    DECISION_CACHE_MAX_ENTRIES: int = int(os.getenv("DECISION_CACHE_MAX_ENTRIES", "512"))
+    DECISION_CACHE_TTL_S: int = int(os.getenv("DECISION_CACHE_TTL_S", "600"))
+    
     # Configuración avanzada OR-Tools (WEEK 4 - Advanced Constraints)
     ORTOOLS_ENABLE_TIME_WINDOWS: bool = os.getenv("ORTOOLS_ENABLE_TIME_WINDOWS", "true").lower() == "true"
     ORTOOLS_ENABLE_VEHICLE_ROUTING: bool = os.getenv("ORTOOLS_ENABLE_VEHICLE_ROUTING", "true").lower() == "true"
@@ -175,11 +246,30 @@ class Settings(BaseSettings):
     ORTOOLS_DISTANCE_CACHE_TTL: int = int(os.getenv("ORTOOLS_DISTANCE_CACHE_TTL", "3600"))  # 1 hora
     ORTOOLS_MAX_PARALLEL_REQUESTS: int = int(os.getenv("ORTOOLS_MAX_PARALLEL_REQUESTS", "3"))
     
+    # Portfolio mode: K variantes concurrentes del mismo problema (itinerarios grandes de una ciudad)
+    ORTOOLS_PORTFOLIO_ENABLED: bool = os.getenv("ORTOOLS_PORTFOLIO_ENABLED", "true").lower() == "true"
+    ORTOOLS_PORTFOLIO_MIN_PLACES: int = int(os.getenv("ORTOOLS_PORTFOLIO_MIN_PLACES", "30"))
+    ORTOOLS_PORTFOLIO_SIZE: int = int(os.getenv("ORTOOLS_PORTFOLIO_SIZE", "3"))
+    ORTOOLS_PORTFOLIO_DEADLINE_S: float = float(os.getenv("ORTOOLS_PORTFOLIO_DEADLINE_S", "5.0"))
+    
     # Multi-City Integration (WEEK 4)
     ORTOOLS_ENABLE_MULTI_CITY: bool = os.getenv("ORTOOLS_ENABLE_MULTI_CITY", "true").lower() == "true"
     ORTOOLS_MULTI_CITY_THRESHOLD_KM: int = int(os.getenv("ORTOOLS_MULTI_CITY_THRESHOLD_KM", "100"))  # Distancia para considerar multi-ciudad
     ORTOOLS_ACCOMMODATE_MULTI_CITY: bool = os.getenv("ORTOOLS_ACCOMMODATE_MULTI_CITY", "true").lower() == "true"
     
+    # Hierarchical decomposition (listas grandes de lugares)
+    ENABLE_HIERARCHICAL_SOLVER: bool = os.getenv("ENABLE_HIERARCHICAL_SOLVER", "true").lower() == "true"
+    HIERARCHICAL_MIN_PLACES: int = int(os.getenv("HIERARCHICAL_MIN_PLACES", "50"))
+    HIERARCHICAL_MAX_CLUSTER_SIZE: int = int(os.getenv("HIERARCHICAL_MAX_CLUSTER_SIZE", "20"))
+    HIERARCHICAL_EPS_KM: float = float(os.getenv("HIERARCHICAL_EPS_KM", "1.5"))
+    HIERARCHICAL_MAX_WORKERS: int = int(os.getenv("HIERARCHICAL_MAX_WORKERS", "3"))
+    HIERARCHICAL_SEQUENCE_TIME_LIMIT_MS: int = int(os.getenv("HIERARCHICAL_SEQUENCE_TIME_LIMIT_MS", "500"))
+    HIERARCHICAL_INTRA_TIME_LIMIT_MS: int = int(os.getenv("HIERARCHICAL_INTRA_TIME_LIMIT_MS", "200"))
+    
+    # Local search intra-cluster (2-opt / Or-opt) en el router legacy
+    ENABLE_INTRA_CLUSTER_LOCAL_SEARCH: bool = os.getenv("ENABLE_INTRA_CLUSTER_LOCAL_SEARCH", "true").lower() == "true"
+    INTRA_CLUSTER_LOCAL_SEARCH_MIN_STOPS: int = int(os.getenv("INTRA_CLUSTER_LOCAL_SEARCH_MIN_STOPS", "3"))
+    
     # Fallback strategy
     ORTOOLS_FALLBACK_TO_LEGACY: bool = os.getenv("ORTOOLS_FALLBACK_TO_LEGACY", "true").lower() == "true"
     ORTOOLS_FALLBACK_ON_SLOW: bool = os.getenv("ORTOOLS_FALLBACK_ON_SLOW", "false").lower() == "true"  # No fallar por lentitud
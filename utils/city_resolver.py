@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+🗺️ City Resolver - Ciudad y región offline por coordenadas
+Resolución única para todo el sistema sobre los límites incluidos en el repo:
+- data/chile_admin_boundaries.json: regiones y áreas urbanas de Chile
+- data/world_cities.json: áreas urbanas de ciudades internacionales frecuentes
+
+Índice H3 (polyfill): las celdas interiores de un área responden con un lookup
+de diccionario; solo las celdas de borde hacen point-in-polygon sobre sus candidatos.
+"""
+
+import json
+import logging
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple, Any, Sequence
+
+import h3
+import numpy as np
+
+from utils.geo_utils import haversine_km
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+CHILE_BOUNDARIES_PATH = DATA_DIR / "chile_admin_boundaries.json"
+WORLD_CITIES_PATH = DATA_DIR / "world_cities.json"
+
+# Resoluciones del índice: regiones (~250km² por celda) y localidades (~5km² por celda)
+REGION_H3_RES = 5
+LOCALITY_H3_RES = 7
+
+Polygon = List[Tuple[float, float]]  # [(lat, lon), ...]
+
+def city_key(name: str) -> str:
+    """Clave normalizada de ciudad: 'Viña del Mar' → 'vina_del_mar'"""
+    ascii_name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    return '_'.join(ascii_name.lower().replace('-', ' ').split())
+
+def point_in_polygon(lat: float, lon: float, polygon: Polygon) -> bool:
+    """Ray casting (par-impar) sobre un anillo [(lat, lon), ...]"""
+    inside = False
+    n = len(polygon)
+    j = n - 1
+    for i in range(n):
+        lat_i, lon_i = polygon[i]
+        lat_j, lon_j = polygon[j]
+        if (lat_i > lat) != (lat_j > lat):
+            cross_lon = lon_i + (lat - lat_i) * (lon_j - lon_i) / (lat_j - lat_i)
+            if lon < cross_lon:
+                inside = not inside
+        j = i
+    return inside
+
+@dataclass
+class AdminArea:
+    """Región o localidad con sus polígonos y bounding box"""
+    name: str
+    key: str
+    polygons: List[Polygon]
+    bbox: Tuple[float, float, float, float]  # (min_lat, min_lon, max_lat, max_lon)
+    region_code: Optional[str] = None
+    country: Optional[str] = None
+    country_code: Optional[str] = None
+    center: Optional[Tuple[float, float]] = None
+
+    def contains(self, lat: float, lon: float) -> bool:
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+            return False
+        return any(point_in_polygon(lat, lon, polygon) for polygon in self.polygons)
+
+@dataclass(frozen=True)
+class ResolvedLocation:
+    """Resultado de resolver un punto"""
+    city: Optional[str]
+    city_key: Optional[str]
+    region: Optional[str]
+    region_code: Optional[str]
+    country: Optional[str]
+    country_code: Optional[str]
+
+    def to_geocode_dict(self) -> Dict[str, Any]:
+        """Formato de GoogleMapsClient.reverse_geocode_city"""
+        parts = [p for p in (self.city, self.region, self.country) if p]
+        return {
+            'city': self.city,
+            'state': self.region,
+            'region_code': self.region_code,
+            'country': self.country,
+            'country_code': self.country_code,
+            'formatted_address': ', '.join(parts),
+            'source': 'offline_admin'
+        }
+
+class _PolyfillIndex:
+    """Celda H3 → área exacta (interior) o candidatos (borde / solapamiento)"""
+
+    def __init__(self, areas: List[AdminArea], resolution: int):
+        self.areas = areas
+        self.resolution = resolution
+        self.exact: Dict[str, int] = {}
+        self.candidates: Dict[str, Tuple[int, ...]] = {}
+        self._build()
+
+    def _boundary_cells(self, area: AdminArea) -> set:
+        """Celdas tocadas por los bordes del área, dilatadas un anillo"""
+        step_km = h3.average_hexagon_edge_length(self.resolution, unit='km') / 2
+        touched = set()
+        for ring in area.polygons:
+            for (lat1, lon1), (lat2, lon2) in zip(ring, ring[1:] + ring[:1]):
+                samples = max(1, int(haversine_km(lat1, lon1, lat2, lon2) / step_km) + 1)
+                for s in range(samples + 1):
+                    t = s / samples
+                    touched.add(h3.latlng_to_cell(lat1 + (lat2 - lat1) * t, lon1 + (lon2 - lon1) * t,
+                                                  self.resolution))
+        return {neighbor for cell in touched for neighbor in h3.grid_disk(cell, 1)}
+
+    def _build(self):
+        entries: Dict[str, Dict[int, bool]] = defaultdict(dict)
+        for idx, area in enumerate(self.areas):
+            filled = set()
+            for ring in area.polygons:
+                filled.update(h3.polygon_to_cells(h3.LatLngPoly(ring), self.resolution))
+            boundary = self._boundary_cells(area)
+            for cell in filled - boundary:
+                entries[cell][idx] = True
+            for cell in boundary:
+                entries[cell].setdefault(idx, False)
+
+        for cell, found in entries.items():
+            if len(found) == 1 and all(found.values()):
+                self.exact[cell] = next(iter(found))
+            else:
+                self.candidates[cell] = tuple(found)
+
+    def lookup(self, cell: str, lat: float, lon: float) -> Optional[AdminArea]:
+        idx = self.exact.get(cell)
+        if idx is not None:
+            return self.areas[idx]
+        candidates = self.candidates.get(cell)
+        if not candidates:
+            return None
+        matches = [self.areas[i] for i in candidates if self.areas[i].contains(lat, lon)]
+        if len(matches) > 1 and all(a.center for a in matches):
+            # Áreas superpuestas (ej. Valparaíso / Viña del Mar): la de centro más cercano
+            return min(matches, key=lambda a: haversine_km(lat, lon, *a.center))
+        return matches[0] if matches else None
+
+    @property
+    def size(self) -> int:
+        return len(self.exact) + len(self.candidates)
+
+def _to_area(raw: Dict[str, Any], **extra) -> AdminArea:
+    polygons = [[(float(lat), float(lon)) for lat, lon in ring] for ring in raw["polygons"]]
+    lats = [lat for ring in polygons for lat, _ in ring]
+    lons = [lon for ring in polygons for _, lon in ring]
+    return AdminArea(
+        name=raw["name"],
+        key=raw.get("key") or city_key(raw["name"]),
+        polygons=polygons,
+        bbox=(min(lats), min(lons), max(lats), max(lons)),
+        center=tuple(raw["center"]) if raw.get("center") else None,
+        **extra
+    )
+
+class CityResolver:
+    """
+    🗺️ Resolver de ciudad/región offline con índice H3
+
+    Uso:
+        resolver = get_city_resolver()
+        location = resolver.resolve(-33.45, -70.66)      # ResolvedLocation o None
+        locations = resolver.resolve_many(coords)         # lista alineada con coords
+    """
+
+    def __init__(self, chile_path: Path = CHILE_BOUNDARIES_PATH, world_path: Path = WORLD_CITIES_PATH):
+        with open(chile_path, encoding="utf-8") as f:
+            chile = json.load(f)
+        with open(world_path, encoding="utf-8") as f:
+            world = json.load(f)
+
+        regions = [_to_area(r, region_code=r["code"], country=chile["country"],
+                            country_code=chile["country_code"]) for r in chile["regions"]]
+        localities = [_to_area(l, region_code=l["region_code"], country=chile["country"],
+                               country_code=chile["country_code"]) for l in chile["localities"]]
+        localities += [_to_area(l, country=l["country"], country_code=l["country_code"])
+                       for l in world["localities"]]
+
+        self._region_names = {r.region_code: r.name for r in regions}
+        self.region_index = _PolyfillIndex(regions, REGION_H3_RES)
+        self.locality_index = _PolyfillIndex(localities, LOCALITY_H3_RES)
+        logger.info(f"🗺️ City resolver listo: {len(regions)} regiones, {len(localities)} localidades, "
+                    f"{self.region_index.size + self.locality_index.size} celdas H3 indexadas")
+
+    def resolve(self, lat: float, lon: float) -> Optional[ResolvedLocation]:
+        """Ciudad/región de un punto (None si no cae en ningún área conocida)"""
+        cell = h3.latlng_to_cell(lat, lon, LOCALITY_H3_RES)
+        locality = self.locality_index.lookup(cell, lat, lon)
+        region = self.region_index.lookup(h3.cell_to_parent(cell, REGION_H3_RES), lat, lon)
+
+        if locality is None and region is None:
+            return None
+        if locality is not None and locality.region_code is None:
+            # Ciudad internacional: sin región administrativa en el dataset
+            return ResolvedLocation(locality.name, locality.key, None, None,
+                                    locality.country, locality.country_code)
+
+        source = region or locality
+        region_code = region.region_code if region else locality.region_code
+        return ResolvedLocation(
+            city=locality.name if locality else None,
+            city_key=locality.key if locality else None,
+            region=self._region_names.get(region_code),
+            region_code=region_code,
+            country=source.country,
+            country_code=source.country_code
+        )
+
+    def resolve_many(self, coords: Sequence[Sequence[float]]) -> List[Optional[ResolvedLocation]]:
+        """
+        Resolver varios puntos de una vez
+
+        Args:
+            coords: Secuencia o array (N, 2) de (lat, lon)
+
+        Returns:
+            Lista alineada con coords; los puntos de una misma celda interior
+            comparten la respuesta sin volver a consultar el índice
+        """
+        points = np.asarray(coords, dtype=float).reshape(-1, 2)
+        results: List[Optional[ResolvedLocation]] = []
+        by_exact_cell: Dict[str, Optional[ResolvedLocation]] = {}
+        for lat, lon in points.tolist():
+            cell = h3.latlng_to_cell(lat, lon, LOCALITY_H3_RES)
+            if cell in by_exact_cell:
+                results.append(by_exact_cell[cell])
+                continue
+            location = self.resolve(lat, lon)
+            if self._is_exact(cell):
+                by_exact_cell[cell] = location
+            results.append(location)
+        return results
+
+    def _is_exact(self, cell: str) -> bool:
+        """La celda responde igual para cualquier punto dentro de ella"""
+        if cell in self.locality_index.candidates:
+            return False
+        return h3.cell_to_parent(cell, REGION_H3_RES) not in self.region_index.candidates
+
+    def city_name(self, lat: float, lon: float) -> Optional[str]:
+        location = self.resolve(lat, lon)
+        return location.city if location else None
+
+# Instancia global
+_city_resolver: Optional[CityResolver] = None
+
+def get_city_resolver() -> CityResolver:
+    """Obtener el resolver global (el índice se construye en el primer uso)"""
+    global _city_resolver
+    if _city_resolver is None:
+        _city_resolver = CityResolver()
+    return _city_resolver
+
+# Localidades a ambos lados de la frontera: (nombre, lat, lon, región esperada o None si no es Chile)
+BORDER_CHECKS = [
+    ("Arica", -18.4783, -70.3126, "CL-AP"),
+    ("Visviri", -17.5950, -69.4783, "CL-AP"),
+    ("Tacna (PE)", -18.0066, -70.2463, None),
+    ("Balmaceda", -45.9167, -71.6900, "CL-AI"),
+    ("Chile Chico", -46.5400, -71.7200, "CL-AI"),
+    ("Villa O'Higgins", -48.4680, -72.5600, "CL-AI"),
+    ("Los Antiguos (AR)", -46.5500, -71.6300, None),
+    ("El Chaltén (AR)", -49.3315, -72.8863, None),
+    ("Cerro Castillo", -51.2640, -72.4800, "CL-MA"),
+    ("Puerto Natales", -51.7236, -72.4875, "CL-MA"),
+    ("Punta Arenas", -53.1638, -70.9171, "CL-MA"),
+    ("Cerro Sombrero", -52.7800, -69.2900, "CL-MA"),
+    ("Porvenir", -53.2950, -70.3700, "CL-MA"),
+    ("Puerto Williams", -54.9333, -67.6167, "CL-MA"),
+    ("Río Turbio (AR)", -51.5333, -72.3400, None),
+    ("28 de Noviembre (AR)", -51.5800, -72.2100, None),
+    ("Río Gallegos (AR)", -51.6230, -69.2168, None),
+    ("Río Grande (AR)", -53.7877, -67.7095, None),
+    ("Ushuaia (AR)", -54.8019, -68.3030, None),
+]
+
+if __name__ == "__main__":
+    """Chequeo de fronteras: localidades a ambos lados deben resolver al país correcto"""
+    import sys
+
+    print("🗺️ CITY RESOLVER - CHEQUEO DE FRONTERAS")
+    print("=" * 50)
+    resolver = CityResolver()
+    failures = 0
+    for name, lat, lon, expected_region in BORDER_CHECKS:
+        location = resolver.resolve(lat, lon)
+        is_chile = location is not None and location.country_code == "CL"
+        region_code = location.region_code if is_chile else None
+        ok = region_code == expected_region
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {name:<22} → {region_code or (location.country if location else 'sin resolver')}")
+    print("=" * 50)
+    print(f"{len(BORDER_CHECKS) - failures}/{len(BORDER_CHECKS)} OK")
+    sys.exit(1 if failures else 0)
@@ -1,5 +1,6 @@
 import math
-from typing import Tuple, Literal, List, Dict, Any
+from typing import Tuple, Literal, List, Dict, Any, Optional
+import numpy as np
 from settings import settings
 
 # Constantes para mejor legibilidad
@@ -39,6 +40,27 @@ def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     
     return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
 
+def haversine_matrix_km(coords_a: np.ndarray, coords_b: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Matriz de distancias Haversine vectorizada.
+    
+    Args:
+        coords_a: Array (N, 2) de (lat, lon) en grados
+        coords_b: Array (M, 2) de (lat, lon); si es None se usa coords_a
+        
+    Returns:
+        Array (N, M) de distancias en kilómetros
+    """
+    a = np.radians(np.asarray(coords_a, dtype=float).reshape(-1, 2))
+    b = a if coords_b is None else np.radians(np.asarray(coords_b, dtype=float).reshape(-1, 2))
+    
+    dlat = a[:, 0][:, None] - b[:, 0][None, :]
+    dlon = a[:, 1][:, None] - b[:, 1][None, :]
+    h = (np.sin(dlat / 2) ** 2 +
+         np.cos(a[:, 0])[:, None] * np.cos(b[:, 0])[None, :] * np.sin(dlon / 2) ** 2)
+    
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
 def estimate_travel_minutes(
     lat1: float, 
     lon1: float, 
@@ -6,11 +6,14 @@ Sistema de caché inteligente para reducir llamadas a Google Places API
 Características:
 - Cache por ciudad/región con TTL inteligente
 - Clustering geográfico para optimizar búsquedas
-- Persistencia en disco para mantener datos entre reinicios
+- Persistencia en disco (un solo archivo SQLite indexado por clave y celda H3)
 - Compresión de datos para optimizar espacio
+- Carga perezosa: solo se leen del disco las celdas y payloads consultados
 - Invalidación inteligente basada en tiempo y uso
+- Límite de tamaño (memoria + disco) con evicción LFU/LRU incremental en background
 """
 
+import asyncio
 import os
 import json
 import time
@@ -23,12 +26,40 @@ from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass, asdict
 from pathlib import Path
 
+import h3
+
+from settings import settings
+from utils.places_cache_store import PlacesCacheStore, store_cell
+
 logger = logging.getLogger(__name__)
 
+# Archivo único del store dentro de cache_dir
+STORE_FILENAME = "places_cache.sqlite3"
+
+# Segundos antes de volver a consultar una celda del store (ver escrituras de otros workers)
+CELL_RESCAN_S = 60
+
+# Evicción: se libera hasta bajar de esta fracción del límite (histéresis)
+EVICTION_LOW_WATERMARK = 0.9
+# Vida media de la recencia en el score de evicción
+RECENCY_HALF_LIFE_S = 6 * 3600
+
+def eviction_score(access_count: int, last_accessed: float, created_at: float,
+                   ttl: float, now: float) -> float:
+    """
+    Valor de conservar una entrada (menor = se evicta antes)
+    Frecuencia (LFU) × recencia (LRU) × fracción de TTL restante
+    (la frecuencia parte de log(2): una entrada nueva o precalentada sin accesos no vale 0)
+    """
+    frequency = math.log1p(max(access_count, 0) + 1)
+    recency = 0.5 ** (max(now - last_accessed, 0) / RECENCY_HALF_LIFE_S)
+    ttl_left = min(max((ttl - (now - created_at)) / ttl, 0.0), 1.0) if ttl > 0 else 0.0
+    return frequency * (0.5 + recency) * ttl_left
+
 @dataclass
 class CacheEntry:
     """Entrada del caché con metadata"""
-    data: List[Dict[str, Any]]
+    data: Optional[List[Dict[str, Any]]]  # None = payload aún en el store (carga perezosa)
     created_at: float
     last_accessed: float
     access_count: int
@@ -61,9 +92,26 @@ class GeographicCacheManager:
         self.max_cache_size = max_cache_size_mb * 1024 * 1024  # Convertir a bytes
         self.compression = compression
         
-        # Cache en memoria para acceso rápido
+        # Cache en memoria para acceso rápido (entradas hidratadas desde el store)
         self.memory_cache: Dict[str, CacheEntry] = {}
         
+        # Store persistente de un solo archivo + celdas ya hidratadas
+        self.store = PlacesCacheStore(self.cache_dir / STORE_FILENAME, compression=compression)
+        self._loaded_cells: Dict[str, float] = {}
+        self._dirty_access: Dict[str, Tuple[float, int]] = {}
+        
+        # Bytes (JSON) de los payloads hidratados en memoria
+        self._memory_bytes: Dict[str, int] = {}
+        self.eviction_stats = {
+            'runs': 0,
+            'entries_evicted': 0,
+            'payloads_dropped': 0,
+            'bytes_freed': 0,
+            'last_run_at': None,
+            'last_run_ms': 0.0,
+            'over_limit': False
+        }
+        
         # TTL específico por tipo de lugar
         self.ttl_by_type = {
             'tourist_attraction': 7 * 24 * 3600,    # 7 días (no cambian frecuentemente)
@@ -79,15 +127,15 @@ class GeographicCacheManager:
             'point_of_interest': 3 * 24 * 3600      # 3 días (genérico)
         }
         
-        # Cargar caché existente
+        # Importar archivos .json.gz legacy al store (una vez por archivo)
         self._load_from_disk()
         
         # Limpiar caché expirado
         self._cleanup_expired()
         
         logger.info(f"✅ GeographicCacheManager inicializado")
-        logger.info(f"   📁 Cache dir: {self.cache_dir}")
-        logger.info(f"   🧠 Entries en memoria: {len(self.memory_cache)}")
+        logger.info(f"   📁 Cache store: {self.store.db_path}")
+        logger.info(f"   🗄️ Entries en store: {self.store.get_stats()['entries']}")
         
     def _calculate_ttl(self, place_types: List[str]) -> float:
         """Calcular TTL óptimo basado en los tipos de lugares"""
@@ -113,11 +161,6 @@ class GeographicCacheManager:
         # Generar hash corto pero único
         return hashlib.md5(cache_string.encode()).hexdigest()[:16]
     
-    def _get_file_path(self, cache_key: str) -> Path:
-        """Obtener ruta del archivo de caché"""
-        extension = ".json.gz" if self.compression else ".json"
-        return self.cache_dir / f"{cache_key}{extension}"
-    
     def _is_within_radius(self, center_lat: float, center_lon: float, 
                          cache_lat: float, cache_lon: float, 
                          search_radius: float, cache_radius: float) -> bool:
@@ -174,24 +217,18 @@ class GeographicCacheManager:
         current_time = time.time()
         
         # Buscar en caché en memoria primero
-        for cache_key, entry in self.memory_cache.items():
-            # Verificar si la entrada cubre nuestra búsqueda
-            if not self._is_within_radius(lat, lon, entry.location[0], entry.location[1], 
-                                        radius, entry.radius):
-                continue
-                
-            # Verificar si los tipos coinciden (al menos parcialmente)
-            if not any(ptype in entry.place_types for ptype in place_types):
-                continue
-                
-            # Verificar TTL
-            if current_time - entry.created_at > entry.ttl:
-                logger.debug(f"🗑️ Cache expirado para {cache_key}")
-                continue
-                
+        for cache_key, entry in self._iter_valid_entries(lat, lon, radius, place_types, current_time):
             # ✅ Cache válido encontrado
+            if entry.data is None:
+                entry.data = self.store.load_payload(cache_key)
+                if entry.data is None:
+                    # Eliminada por otro worker
+                    self.memory_cache.pop(cache_key, None)
+                    continue
+                self._memory_bytes[cache_key] = self._estimate_bytes(entry.data)
             entry.last_accessed = current_time
             entry.access_count += 1
+            self._dirty_access[cache_key] = (entry.last_accessed, entry.access_count)
             
             # Filtrar resultados por tipos solicitados y radio
             filtered_results = self._filter_cached_results(
@@ -208,6 +245,77 @@ class GeographicCacheManager:
         logger.debug(f"❌ Cache MISS para {lat:.3f},{lon:.3f} r={radius}m")
         return None
     
+    def _iter_valid_entries(self, lat: float, lon: float, radius: float,
+                            place_types: List[str], current_time: float):
+        """Entradas vigentes que cubren la búsqueda (ubicación, tipos y TTL)"""
+        self._ensure_cells_loaded(lat, lon, current_time)
+        for cache_key, entry in list(self.memory_cache.items()):
+            # Verificar si la entrada cubre nuestra búsqueda
+            if not self._is_within_radius(lat, lon, entry.location[0], entry.location[1], 
+                                        radius, entry.radius):
+                continue
+                
+            # Verificar si los tipos coinciden (al menos parcialmente)
+            if not any(ptype in entry.place_types for ptype in place_types):
+                continue
+                
+            # Verificar TTL
+            if current_time - entry.created_at > entry.ttl:
+                logger.debug(f"🗑️ Cache expirado para {cache_key}")
+                continue
+            
+            yield cache_key, entry
+    
+    def would_hit(self, lat: float, lon: float, radius: float, place_types: List[str]) -> bool:
+        """¿get_cached_places respondería desde caché? (sin tocar estadísticas de acceso)"""
+        return next(self._iter_valid_entries(lat, lon, radius, place_types, time.time()), None) is not None
+    
+    def get_entry(self, lat: float, lon: float, radius: float, place_types: List[str]) -> Optional[CacheEntry]:
+        """Entrada exacta para estos parámetros (aunque esté expirada)"""
+        cache_key = self._generate_cache_key(lat, lon, radius, place_types)
+        entry = self.memory_cache.get(cache_key)
+        if entry is None:
+            meta = self.store.get_meta(cache_key)
+            if meta is not None:
+                entry = self._hydrate(meta)
+        return entry
+    
+    def _ensure_cells_loaded(self, lat: float, lon: float, current_time: float) -> None:
+        """Hidratar (solo metadata) las entradas del store en las celdas vecinas a la búsqueda"""
+        stale_cells = [
+            cell for cell in h3.grid_disk(store_cell(lat, lon), 1)
+            if current_time - self._loaded_cells.get(cell, 0) > CELL_RESCAN_S
+        ]
+        if not stale_cells:
+            return
+        for meta in self.store.get_meta_in_cells(stale_cells):
+            self._hydrate(meta)
+        for cell in stale_cells:
+            self._loaded_cells[cell] = current_time
+    
+    def _hydrate(self, meta: Dict[str, Any]) -> CacheEntry:
+        """Crear (o actualizar si el store tiene una versión más nueva) la entrada en memoria"""
+        entry = self.memory_cache.get(meta['key'])
+        if entry is not None and entry.created_at >= meta['created_at']:
+            return entry
+        self._memory_bytes.pop(meta['key'], None)
+        entry = CacheEntry(
+            data=None,
+            created_at=meta['created_at'],
+            last_accessed=meta['last_accessed'],
+            access_count=meta['access_count'],
+            location=(meta['lat'], meta['lon']),
+            radius=meta['radius'],
+            place_types=meta['place_types'],
+            ttl=meta['ttl']
+        )
+        self.memory_cache[meta['key']] = entry
+        return entry
+    
+    def ttl_remaining(self, entry: CacheEntry) -> float:
+        """Segundos de vida restantes de una entrada (negativo si expiró)"""
+        return entry.ttl - (time.time() - entry.created_at)
+    
     def _filter_cached_results(self, 
                               cached_data: List[Dict[str, Any]], 
                               search_lat: float, 
@@ -282,6 +390,7 @@ class GeographicCacheManager:
         
         # Guardar en memoria
         self.memory_cache[cache_key] = cache_entry
+        self._memory_bytes[cache_key] = self._estimate_bytes(places_data)
         
         # Guardar en disco de manera asíncrona
         try:
@@ -294,45 +403,45 @@ class GeographicCacheManager:
             logger.error(f"Error guardando cache: {e}")
     
     def _save_to_disk(self, cache_key: str, entry: CacheEntry) -> None:
-        """Guardar entrada de caché en disco"""
-        file_path = self._get_file_path(cache_key)
-        
-        # Preparar datos para serialización
-        cache_data = {
-            'entry': asdict(entry),
-            'metadata': {
-                'version': '1.0',
-                'saved_at': time.time(),
-                'compression': self.compression
-            }
-        }
-        
+        """Guardar entrada de caché en el store (transaccional)"""
         try:
-            # Serializar a JSON
-            json_data = json.dumps(cache_data, separators=(',', ':'))
-            
-            if self.compression:
-                # Guardar comprimido
-                with gzip.open(file_path, 'wt', encoding='utf-8') as f:
-                    f.write(json_data)
-            else:
-                # Guardar normal
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(json_data)
-                    
+            self.store.put(cache_key, asdict(entry))
+            self.flush_access_stats()
         except Exception as e:
             logger.error(f"Error escribiendo cache a disco: {e}")
     
+    def flush_access_stats(self) -> None:
+        """Persistir last_accessed/access_count acumulados en memoria"""
+        if not self._dirty_access:
+            return
+        pending, self._dirty_access = self._dirty_access, {}
+        try:
+            self.store.touch_many(pending)
+        except Exception as e:
+            logger.warning(f"Error guardando estadísticas de acceso: {e}")
+    
     def _load_from_disk(self) -> None:
-        """Cargar caché existente desde disco"""
+        """
+        Importar archivos legacy (.json.gz por entrada) al store
+        
+        Los archivos no se borran (pueden estar versionados): cada uno se registra
+        con su mtime en el store y solo se vuelve a leer si cambia.
+        """
         if not self.cache_dir.exists():
             return
-            
-        loaded_count = 0
         
-        for file_path in self.cache_dir.glob("*"):
+        already_imported = self.store.legacy_imports()
+        migrated = {}
+        imported_files = {}
+        
+        for file_path in self.cache_dir.glob("*.json*"):
             if not file_path.is_file():
                 continue
+            
+            mtime = file_path.stat().st_mtime
+            if already_imported.get(file_path.name) == mtime:
+                continue
+            imported_files[file_path.name] = mtime
                 
             try:
                 cache_key = file_path.stem.replace('.json', '')
@@ -345,90 +454,64 @@ class GeographicCacheManager:
                     with open(file_path, 'r', encoding='utf-8') as f:
                         cache_data = json.load(f)
                 
-                # Recrear entrada de caché
-                entry_dict = cache_data['entry']
-                entry = CacheEntry(
-                    data=entry_dict['data'],
-                    created_at=entry_dict['created_at'],
-                    last_accessed=entry_dict['last_accessed'],
-                    access_count=entry_dict['access_count'],
-                    location=tuple(entry_dict['location']),
-                    radius=entry_dict['radius'],
-                    place_types=entry_dict['place_types'],
-                    ttl=entry_dict['ttl']
-                )
-                
-                self.memory_cache[cache_key] = entry
-                loaded_count += 1
+                migrated[cache_key] = cache_data['entry']
                 
             except Exception as e:
+                # Archivo corrupto: queda registrado para no reintentarlo en cada arranque
                 logger.warning(f"Error cargando cache {file_path}: {e}")
-                # Eliminar archivo corrupto
-                try:
-                    file_path.unlink()
-                except:
-                    pass
         
-        if loaded_count > 0:
-            logger.info(f"📚 Cargadas {loaded_count} entradas de caché desde disco")
+        if not imported_files:
+            return
+        
+        try:
+            self.store.import_legacy(migrated, imported_files)
+        except Exception as e:
+            logger.error(f"Error migrando cache legacy al store: {e}")
+            return
+        
+        logger.info(f"📚 Migradas {len(migrated)} entradas de caché legacy al store")
     
     def _cleanup_expired(self) -> None:
         """Limpiar entradas de caché expiradas"""
         current_time = time.time()
-        expired_keys = []
         
-        for cache_key, entry in self.memory_cache.items():
-            if current_time - entry.created_at > entry.ttl:
-                expired_keys.append(cache_key)
+        try:
+            expired_keys = set(self.store.delete_expired(current_time))
+        except Exception as e:
+            logger.warning(f"Error eliminando cache expirado del store: {e}")
+            expired_keys = set()
         
-        for key in expired_keys:
-            # Eliminar de memoria
-            del self.memory_cache[key]
-            
-            # Eliminar archivo
-            file_path = self._get_file_path(key)
-            try:
-                if file_path.exists():
-                    file_path.unlink()
-            except Exception as e:
-                logger.warning(f"Error eliminando cache expirado {file_path}: {e}")
+        for cache_key, entry in list(self.memory_cache.items()):
+            if current_time - entry.created_at > entry.ttl:
+                expired_keys.add(cache_key)
+                # Eliminar de memoria
+                del self.memory_cache[cache_key]
+                self._memory_bytes.pop(cache_key, None)
         
         if expired_keys:
             logger.info(f"🗑️ Limpiadas {len(expired_keys)} entradas expiradas")
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """Obtener estadísticas del caché"""
-        current_time = time.time()
-        
-        total_entries = len(self.memory_cache)
-        total_places = sum(len(entry.data) for entry in self.memory_cache.values())
-        
-        # Calcular tamaño del caché en disco
-        cache_size = 0
-        if self.cache_dir.exists():
-            for file_path in self.cache_dir.glob("*"):
-                if file_path.is_file():
-                    cache_size += file_path.stat().st_size
-        
-        # Estadísticas de acceso
-        access_counts = [entry.access_count for entry in self.memory_cache.values()]
-        avg_access = sum(access_counts) / len(access_counts) if access_counts else 0
+        self.flush_access_stats()
+        store_stats = self.store.get_stats()
         
-        # TTL promedio restante
-        ttl_remaining = []
-        for entry in self.memory_cache.values():
-            remaining = entry.ttl - (current_time - entry.created_at)
-            ttl_remaining.append(max(0, remaining))
-        
-        avg_ttl_remaining = sum(ttl_remaining) / len(ttl_remaining) if ttl_remaining else 0
+        total_entries = store_stats['entries']
+        total_places = store_stats['places']
         
         return {
             'total_entries': total_entries,
             'total_places_cached': total_places,
-            'cache_size_mb': cache_size / (1024 * 1024),
+            'cache_size_mb': self.store.file_size_bytes() / (1024 * 1024),
             'avg_places_per_entry': total_places / total_entries if total_entries > 0 else 0,
-            'avg_access_count': avg_access,
-            'avg_ttl_remaining_hours': avg_ttl_remaining / 3600,
+            'avg_access_count': store_stats['avg_access'],
+            'avg_ttl_remaining_hours': store_stats['avg_ttl_remaining'] / 3600,
+            'entries_in_memory': len(self.memory_cache),
+            'payloads_in_memory': sum(1 for entry in self.memory_cache.values() if entry.data is not None),
+            'memory_payload_mb': sum(self._memory_bytes.values()) / (1024 * 1024),
+            'disk_payload_mb': store_stats['payload_bytes'] / (1024 * 1024),
+            'max_cache_size_mb': self.max_cache_size / (1024 * 1024),
+            'eviction': dict(self.eviction_stats),
             'hit_rate_potential': '80-90%' if total_entries > 10 else 'Insufficient data'
         }
     
@@ -442,46 +525,150 @@ class GeographicCacheManager:
         Returns:
             Número de entradas eliminadas
         """
+        self._dirty_access.clear()
+        
         if older_than_hours is None:
             # Limpiar todo
-            count = len(self.memory_cache)
+            count = self.store.clear()
             self.memory_cache.clear()
-            
-            # Eliminar archivos
-            if self.cache_dir.exists():
-                for file_path in self.cache_dir.glob("*"):
-                    if file_path.is_file():
-                        try:
-                            file_path.unlink()
-                        except:
-                            pass
+            self._memory_bytes.clear()
+            self._loaded_cells.clear()
             
             logger.info(f"🧹 Cache completamente limpiado ({count} entradas)")
             return count
         
         else:
             # Limpiar entradas antiguas
-            current_time = time.time()
-            cutoff_time = older_than_hours * 3600
-            
-            keys_to_remove = []
-            for cache_key, entry in self.memory_cache.items():
-                if current_time - entry.created_at > cutoff_time:
-                    keys_to_remove.append(cache_key)
+            cutoff_created_at = time.time() - older_than_hours * 3600
             
+            keys_to_remove = self.store.delete_older_than(cutoff_created_at)
             for key in keys_to_remove:
-                del self.memory_cache[key]
-                
-                file_path = self._get_file_path(key)
-                try:
-                    if file_path.exists():
-                        file_path.unlink()
-                except:
-                    pass
+                self.memory_cache.pop(key, None)
+                self._memory_bytes.pop(key, None)
             
             logger.info(f"🧹 Limpiadas {len(keys_to_remove)} entradas > {older_than_hours}h")
             return len(keys_to_remove)
 
+    
+    # ========================================================================
+    # EVICCIÓN POR TAMAÑO
+    # ========================================================================
+    
+    @staticmethod
+    def _estimate_bytes(places_data: List[Dict[str, Any]]) -> int:
+        """Tamaño aproximado de un payload en memoria (JSON serializado)"""
+        return len(json.dumps(places_data, separators=(',', ':')))
+    
+    def _accounted_sizes(self, candidates: List[Dict[str, Any]]) -> Tuple[int, Dict[str, int]]:
+        """
+        Bytes contabilizados: cada entrada cuenta una sola vez
+        
+        Returns:
+            (bytes en disco, extra por entrada hidratada = tamaño en memoria - tamaño en disco)
+        """
+        disk_sizes = {c['key']: c['size_bytes'] for c in candidates}
+        memory_extra = {key: max(size - disk_sizes.get(key, 0), 0) for key, size in self._memory_bytes.items()}
+        return sum(disk_sizes.values()), memory_extra
+    
+    def current_size_bytes(self) -> int:
+        """Tamaño contabilizado: payloads en disco + exceso de los hidratados en memoria"""
+        disk_bytes, memory_extra = self._accounted_sizes(self.store.get_eviction_candidates())
+        return disk_bytes + sum(memory_extra.values())
+    
+    def evict_step(self, max_entries: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Un paso incremental de evicción si se supera max_cache_size
+        
+        Primero descarta payloads de memoria (siguen en disco) y luego elimina
+        entradas del store, en ambos casos de menor a mayor eviction_score,
+        hasta bajar del low watermark o agotar max_entries.
+        """
+        start = time.time()
+        max_entries = max_entries or settings.PLACES_CACHE_EVICTION_BATCH
+        self.flush_access_stats()
+        
+        candidates = self.store.get_eviction_candidates()
+        disk_bytes, memory_extra = self._accounted_sizes(candidates)
+        total_bytes = disk_bytes + sum(memory_extra.values())
+        target = self.max_cache_size * EVICTION_LOW_WATERMARK
+        over_limit = total_bytes > self.max_cache_size
+        
+        dropped = evicted = freed = 0
+        if over_limit:
+            now = time.time()
+            
+            # 1) Payloads en memoria de menor valor
+            in_memory = sorted(
+                self._memory_bytes.keys(),
+                key=lambda k: eviction_score(self.memory_cache[k].access_count, self.memory_cache[k].last_accessed,
+                                             self.memory_cache[k].created_at, self.memory_cache[k].ttl, now)
+            )
+            for cache_key in in_memory:
+                if total_bytes <= target or dropped >= max_entries:
+                    break
+                self._memory_bytes.pop(cache_key)
+                self.memory_cache[cache_key].data = None
+                size = memory_extra.pop(cache_key)
+                total_bytes -= size
+                freed += size
+                dropped += 1
+            
+            # 2) Entradas del store de menor valor
+            if total_bytes > target:
+                candidates = sorted(
+                    candidates,
+                    key=lambda c: eviction_score(c['access_count'], c['last_accessed'],
+                                                 c['created_at'], c['ttl'], now)
+                )
+                victims = []
+                for candidate in candidates[:max_entries]:
+                    if total_bytes <= target:
+                        break
+                    victims.append(candidate['key'])
+                    size = candidate['size_bytes'] + memory_extra.pop(candidate['key'], 0)
+                    self._memory_bytes.pop(candidate['key'], None)
+                    total_bytes -= size
+                    freed += size
+                self.store.delete_many(victims)
+                for cache_key in victims:
+                    self.memory_cache.pop(cache_key, None)
+                evicted = len(victims)
+        
+        stats = self.eviction_stats
+        stats['runs'] += 1
+        stats['entries_evicted'] += evicted
+        stats['payloads_dropped'] += dropped
+        stats['bytes_freed'] += freed
+        stats['last_run_at'] = datetime.now().isoformat()
+        stats['last_run_ms'] = round((time.time() - start) * 1000, 2)
+        stats['over_limit'] = total_bytes > self.max_cache_size
+        
+        if evicted or dropped:
+            logger.info(f"♻️ Evicción de caché: {evicted} entradas eliminadas, {dropped} payloads "
+                        f"descartados de memoria ({freed / 1024:.0f} KB)")
+        return {'entries_evicted': evicted, 'payloads_dropped': dropped, 'bytes_freed': freed}
+    
+    async def run_eviction_loop(self, interval_s: Optional[float] = None):
+        """
+        Tarea de fondo: expirados + evicción incremental fuera del request path
+        (corre en el event loop: memory_cache no es thread-safe)
+        """
+        interval_s = interval_s or settings.PLACES_CACHE_EVICTION_INTERVAL_S
+        while True:
+            await asyncio.sleep(interval_s)
+            try:
+                self._cleanup_expired()
+                # Pasos acotados mientras se siga sobre el límite, cediendo el loop entre pasos
+                while True:
+                    result = self.evict_step()
+                    if not self.eviction_stats['over_limit'] or not (result['entries_evicted'] or result['payloads_dropped']):
+                        break
+                    await asyncio.sleep(0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en evicción de caché: {e}")
+
 
 # Instancia global para uso en servicios
 _global_cache_manager = None
@@ -491,7 +678,7 @@ def get_cache_manager() -> GeographicCacheManager:
     global _global_cache_manager
     
     if _global_cache_manager is None:
-        _global_cache_manager = GeographicCacheManager()
+        _global_cache_manager = GeographicCacheManager(max_cache_size_mb=settings.PLACES_CACHE_MAX_SIZE_MB)
     
     return _global_cache_manager
 
@@ -4,18 +4,21 @@ Caché inteligente para reducir llamadas a Google APIs
 """
 
 import hashlib
+import inspect
 import json
 import time
+from collections import OrderedDict
 from typing import Dict, Any, Optional, List
 from functools import wraps
 import asyncio
 
 class GoogleAPICache:
-    """Caché en memoria para APIs de Google con TTL"""
+    """Caché en memoria para APIs de Google con TTL (LRU acotado)"""
     
-    def __init__(self, default_ttl: int = 1800):  # 30 minutos
-        self.cache: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, default_ttl: int = 1800, max_entries: int = 2000):  # 30 minutos
+        self.cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
         self.default_ttl = default_ttl
+        self.max_entries = max_entries
     
     def _hash_key(self, *args, **kwargs) -> str:
         """Generar hash único para parámetros"""
@@ -31,6 +34,7 @@ class GoogleAPICache:
         if key in self.cache:
             entry = self.cache[key]
             if not self._is_expired(entry):
+                self.cache.move_to_end(key)
                 return entry['data']
             else:
                 del self.cache[key]
@@ -44,6 +48,9 @@ class GoogleAPICache:
             'expires_at': time.time() + ttl,
             'created_at': time.time()
         }
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
     
     def clear_expired(self) -> int:
         """Limpiar entradas expiradas"""
@@ -71,10 +78,14 @@ google_cache = GoogleAPICache()
 def cache_google_api(ttl: int = 1800):
     """Decorador para cachear llamadas a Google APIs"""
     def decorator(func):
+        # En métodos, excluir self de la clave para compartir caché entre instancias
+        params = list(inspect.signature(func).parameters)
+        skip_self = 1 if params and params[0] == 'self' else 0
+        
         @wraps(func)
         async def wrapper(*args, **kwargs):
             # Generar clave de caché
-            cache_key = google_cache._hash_key(func.__name__, *args, **kwargs)
+            cache_key = google_cache._hash_key(func.__qualname__, *args[skip_self:], **kwargs)
             
             # Intentar obtener del caché
             cached_result = google_cache.get(cache_key)
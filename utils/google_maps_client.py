@@ -1,11 +1,42 @@
 import asyncio
-import aiohttp
 import logging
+import math
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta 
 import json
 from settings import settings
 from .google_cache import cache_google_api, parallel_google_calls
+from .place_details_cache import get_place_details_cache
+from .reverse_geocode_cache import get_reverse_geocode_cache
+from .city_resolver import get_city_resolver
+from .rate_limiter import get_api_rate_limiter
+from .places_quota_manager import get_quota_manager, QuotaExceededError
+from .http_client_registry import get_http_client
+
+# Lugares tomados de cada Nearby Search por tipo (diversidad entre tipos)
+NEARBY_PLACES_PER_TYPE = 2
+
+def merge_unique_places(results_by_type: List[List[Dict]], limit: Optional[int] = None) -> List[Dict]:
+    """Combinar resultados por tipo (en orden) eliminando duplicados por place_id"""
+    merged = []
+    seen_ids = set()
+    for places in results_by_type:
+        for place in places:
+            place_id = place.get('place_id')
+            if place_id:
+                if place_id in seen_ids:
+                    continue
+                seen_ids.add(place_id)
+            merged.append(place)
+            if limit is not None and len(merged) >= limit:
+                return merged
+    return merged
+
+# Campos de Place Details pedidos por cada método (la caché fusiona por campo)
+PLACE_DETAILS_FIELDS = ('name', 'formatted_address', 'geometry', 'opening_hours', 'rating',
+                        'price_level', 'types', 'photos', 'reviews')
+PLACE_DETAILS_BY_ID_FIELDS = ('address_components', 'formatted_address', 'geometry', 'name',
+                              'place_id', 'types', 'rating', 'user_ratings_total')
 
 class GoogleMapsClient:
     """Cliente inteligente para APIs de Google Maps"""
@@ -13,53 +44,62 @@ class GoogleMapsClient:
     def __init__(self):
         self.api_key = settings.GOOGLE_MAPS_API_KEY
         self.base_url = "https://maps.googleapis.com/maps/api"
-        self.session = None
+        # Cliente HTTP compartido (pool keep-alive del registro de la app)
+        self.http = get_http_client("google_maps")
+        # Detalles por place_id con TTL por campo (compartido entre instancias y reinicios)
+        self.details_cache = get_place_details_cache()
+        # Reverse geocoding por celda H3 (compartido entre instancias y reinicios)
+        self.geocode_cache = get_reverse_geocode_cache()
         
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
+        # El pool es de la aplicación: se cierra en el shutdown de FastAPI
+        pass
     
-    @cache_google_api(ttl=3600)  # 1 hora de caché
     async def get_place_details(self, place_name: str, lat: float, lon: float) -> Dict[str, Any]:
         """Obtener detalles completos de un lugar usando Places API"""
         try:
-            # 1. Buscar lugar cercano por nombre y coordenadas
-            search_url = f"{self.base_url}/place/nearbysearch/json"
-            search_params = {
-                'location': f"{lat},{lon}",
-                'radius': 1000,  # 1km radio
-                'keyword': place_name,
-                'key': self.api_key
-            }
-            
-            async with self.session.get(search_url, params=search_params) as response:
-                search_data = await response.json()
-            
-            if not search_data.get('results'):
-                # Fallback: buscar por texto
-                return await self._text_search_place(place_name, lat, lon)
-            
-            place = search_data['results'][0]
-            place_id = place.get('place_id')
-            
-            # 2. Obtener detalles completos
-            details_url = f"{self.base_url}/place/details/json"
-            details_params = {
-                'place_id': place_id,
-                'fields': 'name,formatted_address,geometry,opening_hours,rating,price_level,types,photos,reviews',
-                'key': self.api_key
-            }
-            
-            async with self.session.get(details_url, params=details_params) as response:
-                details_data = await response.json()
-            
-            if details_data.get('result'):
-                return self._format_place_details(details_data['result'], place_name, lat, lon)
-            
+            # 1. place_id conocido para este nombre + coordenadas, o buscar lugar cercano
+            place_id = self.details_cache.resolve_alias(place_name, lat, lon)
+            if not place_id:
+                search_url = f"{self.base_url}/place/nearbysearch/json"
+                search_params = {
+                    'location': f"{lat},{lon}",
+                    'radius': 1000,  # 1km radio
+                    'keyword': place_name,
+                    'key': self.api_key
+                }
+                
+                get_quota_manager().consume('nearby_search')
+                async with self.http.get(search_url, params=search_params) as response:
+                    search_data = await response.json()
+                
+                if not search_data.get('results'):
+                    # Fallback: buscar por texto
+                    return await self._text_search_place(place_name, lat, lon)
+                
+                place = search_data['results'][0]
+                place_id = place.get('place_id')
+                self.details_cache.merge_nearby_results([place])
+                if place_id:
+                    self.details_cache.remember_alias(place_name, lat, lon, place_id)
+            
+            # 2. Pedir a Details solo los campos que no están vigentes en caché
+            missing_fields = self.details_cache.missing_fields(place_id, PLACE_DETAILS_FIELDS)
+            if missing_fields:
+                try:
+                    await self._fetch_details_fields(place_id, missing_fields)
+                except QuotaExceededError:
+                    logging.debug(f"💰 Cuota Places baja: detalles de {place_name} solo desde caché")
+            
+            cached = self.details_cache.get(place_id, PLACE_DETAILS_FIELDS, allow_partial=True)
+            if cached:
+                return self._format_place_details(cached, place_name, lat, lon)
+            
+        except QuotaExceededError:
+            logging.debug(f"💰 Cuota Places baja: detalles básicos para {place_name}")
         except Exception as e:
             logging.error(f"Error obteniendo detalles de lugar {place_name}: {e}")
         
@@ -84,7 +124,8 @@ class GoogleMapsClient:
                 'key': self.api_key
             }
             
-            async with self.session.get(search_url, params=params) as response:
+            get_quota_manager().consume('text_search')
+            async with self.http.get(search_url, params=params) as response:
                 data = await response.json()
             
             if data.get('results'):
@@ -141,7 +182,7 @@ class GoogleMapsClient:
             if transport_mode == "driving" and departure_time:
                 params['departure_time'] = int(departure_time.timestamp())
             
-            async with self.session.get(url, params=params) as response:
+            async with self.http.get(url, params=params) as response:
                 data = await response.json()
             
             if data.get('status') == 'OK' and data.get('routes'):
@@ -170,7 +211,7 @@ class GoogleMapsClient:
                 'key': self.api_key
             }
             
-            async with self.session.get(url, params=params) as response:
+            async with self.http.get(url, params=params) as response:
                 data = await response.json()
             
             if data.get('status') == 'OK':
@@ -487,100 +528,137 @@ class GoogleMapsClient:
             return []
         
         try:
-            # Usar Places API Nearby Search
-            nearby_url = f"{self.base_url}/place/nearbysearch/json"
-            
-            all_places = []
-            
-            # Buscar por cada tipo de lugar para obtener mejor diversidad
-            for place_type in types:
-                params = {
-                    'key': self.api_key,
-                    'location': f"{lat},{lon}",
-                    'radius': min(radius_m, 50000),  # Máximo 50km según Google Places API
-                    'type': place_type,
-                    'language': 'es',  # Resultados en español
-                }
-                
-                if not self.session:
-                    self.session = aiohttp.ClientSession()
-                
-                async with self.session.get(nearby_url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        if data.get('status') == 'OK':
-                            places = data.get('results', [])
-                            
-                            for place in places[:2]:  # Max 2 por tipo para diversidad
-                                place_info = {
-                                    'name': place.get('name', 'Lugar sin nombre'),
-                                    'lat': place['geometry']['location']['lat'],
-                                    'lon': place['geometry']['location']['lng'],
-                                    'rating': place.get('rating', 4.0),
-                                    'user_ratings_total': place.get('user_ratings_total', 0),
-                                    'price_level': place.get('price_level', 0),
-                                    'types': place.get('types', []),
-                                    'place_id': place.get('place_id', ''),
-                                    'vicinity': place.get('vicinity', ''),
-                                    'address': place.get('vicinity', 'Dirección no disponible'),
-                                    'photo_reference': None,
-                                    'photo_url': '',
-                                    'opening_hours': {},
-                                    'website': '',
-                                    'phone': '',
-                                    'description': f"Lugar encontrado en Google Places con {place.get('rating', 4.0)}⭐ de rating",
-                                    'synthetic': False,
-                                    'google_places_verified': True
-                                }
-                                
-                                # Agregar foto si está disponible
-                                if 'photos' in place and len(place['photos']) > 0:
-                                    photo_ref = place['photos'][0].get('photo_reference')
-                                    if photo_ref:
-                                        place_info['photo_reference'] = photo_ref
-                                        place_info['photo_url'] = f"{self.base_url}/place/photo?photoreference={photo_ref}&sensor=false&maxheight=400&key={self.api_key}"
-                                
-                                # Información de horarios si está disponible
-                                if 'opening_hours' in place:
-                                    place_info['opening_hours'] = {
-                                        'open_now': place['opening_hours'].get('open_now', True),
-                                        'periods': place['opening_hours'].get('periods', [])
-                                    }
-                                
-                                all_places.append(place_info)
-                                
-                                # Limitar total de lugares
-                                if len(all_places) >= limit:
-                                    break
-                            
-                            logging.info(f"✅ Google Places: {len(places)} lugares encontrados para {place_type}")
-                        
-                        elif data.get('status') == 'ZERO_RESULTS':
-                            logging.info(f"🔍 Google Places: Sin resultados para {place_type} en {lat:.4f},{lon:.4f}")
-                        
-                        else:
-                            logging.warning(f"⚠️ Google Places API error: {data.get('status')} - {data.get('error_message', 'Sin mensaje')}")
-                    
-                    else:
-                        logging.error(f"❌ Error HTTP {response.status} consultando Google Places API")
-                
-                # Si ya tenemos suficientes lugares, salir del loop
-                if len(all_places) >= limit:
-                    break
-            
+            per_type = await self._fan_out_nearby_until_limit(lat, lon, types, radius_m, limit)
+            all_places = merge_unique_places(per_type, limit)
             logging.info(f"🎯 Google Places: Total {len(all_places)} lugares reales encontrados")
-            return all_places[:limit]
+            return all_places
             
+        except QuotaExceededError:
+            raise
         except Exception as e:
             logging.error(f"💥 Error en search_nearby_places: {e}")
             return []
     
-    @cache_google_api(ttl=7200)  # 2 horas de caché para geocoding
+    async def _fan_out_nearby_until_limit(self, lat: float, lon: float, types: List[str],
+                                          radius_m: int, limit: int) -> List[List[Dict]]:
+        """
+        Nearby Search por tipo en oleadas concurrentes hasta juntar limit lugares
+        
+        Cada oleada lanza solo los tipos que aún pueden hacer falta (NEARBY_PLACES_PER_TYPE
+        por tipo) y se consume en orden de tipos: apenas el prefijo alcanza limit, las
+        búsquedas pendientes se cancelan antes de gastar cuota.
+        """
+        per_type: List[List[Dict]] = []
+        next_type = 0
+        while next_type < len(types):
+            missing = limit - len(merge_unique_places(per_type, limit))
+            if missing <= 0:
+                break
+            wave = types[next_type:next_type + math.ceil(missing / NEARBY_PLACES_PER_TYPE)]
+            next_type += len(wave)
+            
+            tasks = [asyncio.create_task(self._nearby_search_type(lat, lon, place_type, radius_m))
+                     for place_type in wave]
+            try:
+                for place_type, task in zip(wave, tasks):
+                    try:
+                        per_type.append(await task)
+                    except QuotaExceededError:
+                        # Sin cachear el resultado vacío: otra prioridad sí puede consultar
+                        raise
+                    except Exception as e:
+                        logging.error(f"❌ Error consultando Google Places para {place_type}: {e}")
+                        continue
+                    if len(merge_unique_places(per_type, limit)) >= limit:
+                        break
+            finally:
+                pending = [task for task in tasks if not task.done()]
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.gather(*pending, return_exceptions=True)
+        return per_type
+    
+    async def _nearby_search_type(self, lat: float, lon: float, place_type: str, radius_m: int) -> List[Dict]:
+        """Nearby Search para un tipo usando la sesión compartida y el rate limiter de la API key"""
+        nearby_url = f"{self.base_url}/place/nearbysearch/json"
+        params = {
+            'key': self.api_key,
+            'location': f"{lat},{lon}",
+            'radius': min(radius_m, 50000),  # Máximo 50km según Google Places API
+            'type': place_type,
+            'language': 'es',  # Resultados en español
+        }
+        
+        get_quota_manager().consume('nearby_search')
+        await get_api_rate_limiter(self.api_key).acquire()
+        
+        async with self.http.get(nearby_url, params=params) as response:
+            if response.status != 200:
+                logging.error(f"❌ Error HTTP {response.status} consultando Google Places API")
+                return []
+            
+            data = await response.json()
+        
+        if data.get('status') == 'ZERO_RESULTS':
+            logging.info(f"🔍 Google Places: Sin resultados para {place_type} en {lat:.4f},{lon:.4f}")
+            return []
+        if data.get('status') != 'OK':
+            logging.warning(f"⚠️ Google Places API error: {data.get('status')} - {data.get('error_message', 'Sin mensaje')}")
+            return []
+        
+        places = data.get('results', [])
+        logging.info(f"✅ Google Places: {len(places)} lugares encontrados para {place_type}")
+        self.details_cache.merge_nearby_results(places)
+        
+        type_places = []
+        for place in places[:NEARBY_PLACES_PER_TYPE]:  # Máximo por tipo para diversidad
+            place_info = {
+                'name': place.get('name', 'Lugar sin nombre'),
+                'lat': place['geometry']['location']['lat'],
+                'lon': place['geometry']['location']['lng'],
+                'rating': place.get('rating', 4.0),
+                'user_ratings_total': place.get('user_ratings_total', 0),
+                'price_level': place.get('price_level', 0),
+                'types': place.get('types', []),
+                'place_id': place.get('place_id', ''),
+                'vicinity': place.get('vicinity', ''),
+                'address': place.get('vicinity', 'Dirección no disponible'),
+                'photo_reference': None,
+                'photo_url': '',
+                'opening_hours': {},
+                'website': '',
+                'phone': '',
+                'description': f"Lugar encontrado en Google Places con {place.get('rating', 4.0)}⭐ de rating",
+                'synthetic': False,
+                'google_places_verified': True
+            }
+            
+            # Agregar foto si está disponible
+            if 'photos' in place and len(place['photos']) > 0:
+                photo_ref = place['photos'][0].get('photo_reference')
+                if photo_ref:
+                    place_info['photo_reference'] = photo_ref
+                    place_info['photo_url'] = f"{self.base_url}/place/photo?photoreference={photo_ref}&sensor=false&maxheight=400&key={self.api_key}"
+            
+            # Información de horarios si está disponible
+            if 'opening_hours' in place:
+                place_info['opening_hours'] = {
+                    'open_now': place['opening_hours'].get('open_now', True),
+                    'periods': place['opening_hours'].get('periods', [])
+                }
+            
+            type_places.append(place_info)
+        
+        return type_places
+    
     async def reverse_geocode_city(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
         """
         🌍 Reverse geocoding para detectar ciudad automáticamente
         
+        Orden: caché por celda H3 (res 7) → límites offline de Chile → Google Geocoding.
+        El resultado se guarda para toda la celda, así los puntos vecinos no repiten la llamada.
+        
         Args:
             lat: Latitud
             lon: Longitud
@@ -588,10 +666,24 @@ class GoogleMapsClient:
         Returns:
             Dict con información de la ciudad o None si falla
         """
+        cached = self.geocode_cache.get(lat, lon)
+        if cached is not None:
+            return cached
+        
+        offline = get_city_resolver().resolve(lat, lon)
+        if offline and offline.city:
+            city_info = offline.to_geocode_dict()
+            self.geocode_cache.put(lat, lon, city_info, source='offline_admin')
+            return city_info
+        
+        city_info = await self._fetch_reverse_geocode(lat, lon)
+        if city_info:
+            self.geocode_cache.put(lat, lon, city_info, source='google')
+        return city_info
+    
+    async def _fetch_reverse_geocode(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        """Llamada a Google Geocoding API (sin caché)"""
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            
             url = f"{self.base_url}/geocode/json"
             params = {
                 'latlng': f"{lat},{lon}",
@@ -602,7 +694,8 @@ class GoogleMapsClient:
             
             logging.debug(f"🌍 Reverse geocoding para ({lat:.4f}, {lon:.4f})")
             
-            async with self.session.get(url, params=params) as response:
+            get_quota_manager().consume('geocode')
+            async with self.http.get(url, params=params) as response:
                 if response.status != 200:
                     logging.warning(f"⚠️ Google Geocoding API error: {response.status}")
                     return None
@@ -674,11 +767,13 @@ class GoogleMapsClient:
                 logging.debug("❓ No se pudo extraer información de ciudad del geocoding")
                 return None
                 
+        except QuotaExceededError:
+            logging.debug("💰 Cuota Places baja: reverse geocoding omitido")
+            return None
         except Exception as e:
             logging.error(f"💥 Error en reverse_geocode_city: {e}")
             return None
     
-    @cache_google_api(ttl=7200)  # 2 horas de caché para place details
     async def get_place_details_by_id(self, place_id: str) -> Optional[Dict[str, Any]]:
         """
         🎯 Obtener detalles completos de un lugar usando su Google Place ID
@@ -690,47 +785,63 @@ class GoogleMapsClient:
             Dict con detalles del lugar o None si falla
         """
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            
-            url = f"{self.base_url}/place/details/json"
-            params = {
-                'place_id': place_id,
-                'key': self.api_key,
-                'fields': 'address_components,formatted_address,geometry,name,place_id,types,rating,user_ratings_total',
-                'language': 'es'
+            missing_fields = self.details_cache.missing_fields(place_id, PLACE_DETAILS_BY_ID_FIELDS)
+            if missing_fields:
+                logging.debug(f"🎯 Obteniendo detalles para Place ID: {place_id} ({', '.join(missing_fields)})")
+                try:
+                    if not await self._fetch_details_fields(place_id, missing_fields):
+                        return None
+                except QuotaExceededError:
+                    # Degradar a lo que haya en caché
+                    if len(missing_fields) == len(PLACE_DETAILS_BY_ID_FIELDS):
+                        return None
+            else:
+                logging.debug(f"📇 Detalles desde caché para Place ID: {place_id}")
+            
+            result = self.details_cache.get(place_id, PLACE_DETAILS_BY_ID_FIELDS, allow_partial=True) or {}
+            
+            # Procesar y estructurar la respuesta
+            place_details = {
+                'place_id': result.get('place_id', place_id),
+                'name': result.get('name'),
+                'formatted_address': result.get('formatted_address'),
+                'address_components': result.get('address_components', []),
+                'types': result.get('types', []),
+                'rating': result.get('rating'),
+                'user_ratings_total': result.get('user_ratings_total'),
+                'geometry': result.get('geometry', {})
             }
             
-            logging.debug(f"🎯 Obteniendo detalles para Place ID: {place_id}")
-            
-            async with self.session.get(url, params=params) as response:
-                if response.status != 200:
-                    logging.warning(f"⚠️ Google Places Details API error: {response.status}")
-                    return None
-                
-                data = await response.json()
-                
-                if data.get('status') != 'OK' or not data.get('result'):
-                    logging.debug(f"❌ No se encontraron detalles para Place ID: {place_id}")
-                    return None
-                
-                result = data['result']
-                
-                # Procesar y estructurar la respuesta
-                place_details = {
-                    'place_id': result.get('place_id'),
-                    'name': result.get('name'),
-                    'formatted_address': result.get('formatted_address'),
-                    'address_components': result.get('address_components', []),
-                    'types': result.get('types', []),
-                    'rating': result.get('rating'),
-                    'user_ratings_total': result.get('user_ratings_total'),
-                    'geometry': result.get('geometry', {})
-                }
-                
-                logging.info(f"✅ Detalles obtenidos para: {place_details.get('name', place_id)}")
-                return place_details
+            if missing_fields:
+                logging.info(f"✅ Detalles obtenidos para: {place_details.get('name') or place_id}")
+            return place_details
                 
         except Exception as e:
             logging.error(f"💥 Error en get_place_details_by_id: {e}")
             return None
+    
+    async def _fetch_details_fields(self, place_id: str, fields: List[str]) -> bool:
+        """Place Details solo con los campos pedidos; fusiona la respuesta en la caché"""
+        url = f"{self.base_url}/place/details/json"
+        params = {
+            'place_id': place_id,
+            'key': self.api_key,
+            'fields': ','.join(fields),
+            'language': 'es'
+        }
+        
+        get_quota_manager().consume('place_details')
+        await get_api_rate_limiter(self.api_key).acquire()
+        
+        async with self.http.get(url, params=params) as response:
+            if response.status != 200:
+                logging.warning(f"⚠️ Google Places Details API error: {response.status}")
+                return False
+            data = await response.json()
+        
+        if data.get('status') != 'OK' or not data.get('result'):
+            logging.debug(f"❌ No se encontraron detalles para Place ID: {place_id}")
+            return False
+        
+        self.details_cache.merge(place_id, data['result'], source='details', fields=fields, complete=True)
+        return True
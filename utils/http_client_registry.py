@@ -0,0 +1,270 @@
+"""
+🌐 HTTP Client Registry - Clientes HTTP compartidos para proveedores externos
+Un pool de conexiones keep-alive por proveedor (Google, OSRM, OpenRoute...),
+con cache DNS, timeouts y tope de concurrencia propios, creado al startup
+de FastAPI y cerrado al shutdown.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ProviderConfig:
+    """Configuración de pool/timeout/concurrencia para un proveedor"""
+    name: str
+    timeout_s: float
+    max_connections: int
+    max_concurrency: int
+    keepalive_s: float = 30.0
+
+# Proveedores conocidos (se pueden sobreescribir con register_provider)
+DEFAULT_PROVIDERS = {
+    "google_maps": ProviderConfig("google_maps", timeout_s=10.0,
+                                  max_connections=settings.GOOGLE_HTTP_POOL_SIZE,
+                                  max_concurrency=settings.GOOGLE_HTTP_POOL_SIZE),
+    "osrm": ProviderConfig("osrm", timeout_s=5.0, max_connections=10, max_concurrency=10),
+    "osrm_local": ProviderConfig("osrm_local", timeout_s=10.0, max_connections=10, max_concurrency=20),
+    "openroute": ProviderConfig("openroute", timeout_s=10.0, max_connections=5, max_concurrency=5),
+}
+
+class ProviderClient:
+    """
+    Cliente HTTP de un proveedor: sesión aiohttp propia (pool por host) +
+    semáforo de concurrencia + métricas de saturación
+    """
+
+    def __init__(self, config: ProviderConfig):
+        self.config = config
+        # Una sesión aiohttp (y su semáforo) por event loop; se cierran todas en close()
+        self._sessions: Dict[asyncio.AbstractEventLoop, Tuple[aiohttp.ClientSession, asyncio.Semaphore]] = {}
+        self._closing: Set[asyncio.Task] = set()
+        self._sync_session: Optional[requests.Session] = None
+        self.stats = {
+            "requests": 0,
+            "errors": 0,
+            "in_flight": 0,
+            "peak_in_flight": 0,
+            "waiting": 0,
+            "peak_waiting": 0,
+            "total_wait_ms": 0.0,
+            "saturated_requests": 0
+        }
+
+    def _loop_session(self) -> Tuple[aiohttp.ClientSession, asyncio.Semaphore]:
+        """Sesión + semáforo del event loop actual (se crean en el primer uso del loop)"""
+        loop = asyncio.get_running_loop()
+        entry = self._sessions.get(loop)
+        if entry is None or entry[0].closed:
+            self._close_dead_loop_sessions(loop)
+            connector = aiohttp.TCPConnector(
+                limit=self.config.max_connections,
+                limit_per_host=self.config.max_connections,
+                ttl_dns_cache=300,
+                keepalive_timeout=self.config.keepalive_s
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.config.timeout_s)
+            )
+            entry = (session, asyncio.Semaphore(self.config.max_concurrency))
+            self._sessions[loop] = entry
+        return entry
+
+    def _close_dead_loop_sessions(self, current_loop: asyncio.AbstractEventLoop):
+        """Cerrar sesiones de loops ya cerrados (ej: asyncio.run en un thread) desde el loop actual"""
+        for loop in [l for l in self._sessions if l.is_closed()]:
+            session, _ = self._sessions.pop(loop)
+            if not session.closed:
+                # Con el loop dueño cerrado aiohttp no agenda nada en él: solo libera la sesión
+                task = current_loop.create_task(session.close())
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Sesión aiohttp del event loop actual"""
+        return self._loop_session()[0]
+
+    @property
+    def sync_session(self) -> requests.Session:
+        """requests.Session con pool keep-alive para llamadas síncronas"""
+        if self._sync_session is None:
+            self._sync_session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.config.max_connections)
+            self._sync_session.mount("http://", adapter)
+            self._sync_session.mount("https://", adapter)
+        return self._sync_session
+
+    @asynccontextmanager
+    async def request(self, method: str, url: str, **kwargs):
+        """
+        Request con tope de concurrencia del proveedor
+
+        Uso:
+            async with client.request("GET", url, params=params) as response:
+                data = await response.json()
+        """
+        session, semaphore = self._loop_session()
+        stats = self.stats
+
+        stats["waiting"] += 1
+        stats["peak_waiting"] = max(stats["peak_waiting"], stats["waiting"])
+        if semaphore.locked():
+            stats["saturated_requests"] += 1
+        wait_start = time.perf_counter()
+        try:
+            await semaphore.acquire()
+        finally:
+            stats["waiting"] -= 1
+        stats["total_wait_ms"] += (time.perf_counter() - wait_start) * 1000
+
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                yield response
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            stats["in_flight"] -= 1
+            semaphore.release()
+
+    def get(self, url: str, **kwargs):
+        """Atajo para GET"""
+        return self.request("GET", url, **kwargs)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Métricas de saturación del pool"""
+        open_connections = sum(
+            len(getattr(session.connector, "_acquired", ()))
+            for session, _ in self._sessions.values()
+            if not session.closed and session.connector is not None
+        )
+        return {
+            **self.stats,
+            "avg_wait_ms": round(self.stats["total_wait_ms"] / max(self.stats["requests"], 1), 2),
+            "max_concurrency": self.config.max_concurrency,
+            "max_connections": self.config.max_connections,
+            "connections_in_use": open_connections,
+            "sessions": len(self._sessions),
+            "pool_saturation": round(self.stats["in_flight"] / self.config.max_concurrency, 3),
+            "peak_saturation": round(self.stats["peak_in_flight"] / self.config.max_concurrency, 3),
+            "timeout_s": self.config.timeout_s
+        }
+
+    async def close(self):
+        """Cerrar las sesiones de todos los event loops y la sesión síncrona"""
+        sessions, self._sessions = self._sessions, {}
+        current_loop = asyncio.get_running_loop()
+        for loop, (session, _) in sessions.items():
+            if session.closed:
+                continue
+            try:
+                if loop is not current_loop and loop.is_running():
+                    # Sesión de otro thread: cerrarla dentro de su propio loop
+                    future = asyncio.run_coroutine_threadsafe(session.close(), loop)
+                    await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.config.timeout_s)
+                else:
+                    await session.close()
+            except Exception as e:
+                logger.warning(f"⚠️ Error cerrando sesión HTTP de {self.config.name}: {e}")
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        if self._sync_session is not None:
+            self._sync_session.close()
+            self._sync_session = None
+
+    async def close_when_idle(self):
+        """Cerrar cuando terminen los requests en curso (acotado por el timeout del proveedor)"""
+        deadline = time.monotonic() + self.config.timeout_s
+        while self.stats["in_flight"] and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await self.close()
+
+class HTTPClientRegistry:
+    """🌐 Registro de clientes HTTP por proveedor (scope de aplicación)"""
+
+    def __init__(self):
+        self._configs: Dict[str, ProviderConfig] = dict(DEFAULT_PROVIDERS)
+        self._clients: Dict[str, ProviderClient] = {}
+        # Clientes reemplazados por register_provider pendientes de cerrar
+        self._retired: List[ProviderClient] = []
+        self._closing: Set[asyncio.Task] = set()
+        self.started_at: Optional[float] = None
+
+    def register_provider(self, config: ProviderConfig):
+        """Registrar o reconfigurar un proveedor (el cliente anterior se cierra al quedar libre)"""
+        self._configs[config.name] = config
+        old_client = self._clients.pop(config.name, None)
+        if old_client is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Sin loop activo: se cierra en close()
+            self._retired.append(old_client)
+            return
+        task = loop.create_task(old_client.close_when_idle())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def client(self, provider: str) -> ProviderClient:
+        """Obtener el cliente de un proveedor (lazy si no se llamó start)"""
+        client = self._clients.get(provider)
+        if client is None:
+            config = self._configs.get(provider) or ProviderConfig(
+                provider, timeout_s=10.0, max_connections=10, max_concurrency=10
+            )
+            client = ProviderClient(config)
+            self._clients[provider] = client
+        return client
+
+    async def start(self):
+        """Crear las sesiones de todos los proveedores (startup de FastAPI)"""
+        for provider in self._configs:
+            _ = self.client(provider).session
+        self.started_at = time.time()
+        logger.info(f"🌐 HTTP client registry iniciado: {list(self._configs)}")
+
+    async def close(self):
+        """Cerrar todas las sesiones (shutdown de FastAPI)"""
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        retired, self._retired = self._retired, []
+        for client in [*retired, *self._clients.values()]:
+            await client.close()
+        logger.info("🌐 HTTP client registry cerrado")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "started": self.started_at is not None,
+            "providers": {name: client.get_metrics() for name, client in self._clients.items()}
+        }
+
+# Instancia global del registro
+_registry: Optional[HTTPClientRegistry] = None
+
+def get_http_registry() -> HTTPClientRegistry:
+    """Obtener el registro HTTP global"""
+    global _registry
+    if _registry is None:
+        _registry = HTTPClientRegistry()
+    return _registry
+
+def get_http_client(provider: str) -> ProviderClient:
+    """Atajo: cliente HTTP compartido de un proveedor"""
+    return get_http_registry().client(provider)
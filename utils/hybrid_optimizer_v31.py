@@ -21,15 +21,21 @@ from typing import List, Dict, Tuple, Optional, Any
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
 import numpy as np
-from sklearn.cluster import DBSCAN
 
 from utils.free_routing_service import FreeRoutingService
 from utils.hybrid_routing_service import HybridRoutingService
 from utils.geo_utils import haversine_km
+from utils.city_resolver import get_city_resolver
+from utils.route_local_search import build_time_matrix_minutes, optimize_stop_order
+from utils.poi_clustering import get_poi_clustering_engine
 from services.hotel_recommender import HotelRecommender
 from services.google_places_service import GooglePlacesService
+from services.free_block_suggestion_planner import FreeBlockSuggestionPlanner, FreeBlockRequest
+from utils.places_quota_manager import QuotaExceededError, QuotaPriority, quota_priority
 from utils.google_cache import cache_google_api, parallel_google_calls
 from services.ortools_monitoring import record_ortools_execution, record_legacy_execution
+from services.h3_demand_index import get_demand_index
+from utils.place_label_resolver import PlaceLabelResolver
 from settings import settings
 
 # 🧠 City2Graph Semantic Integration (Demo y REAL)
@@ -62,6 +68,15 @@ if not REAL_SEMANTIC_AVAILABLE:
             'recommendations': []
         }
 
+# Tipos sugeridos para días libres según destino (city_key del resolver de ciudades)
+TOURIST_DESTINATION_TYPES = {
+    'san_pedro_atacama': ['tourist_attraction', 'cafe', 'point_of_interest'],
+    'valparaiso': ['art_gallery', 'museum', 'tourist_attraction'],
+    'santiago': ['restaurant', 'museum', 'park'],
+    'antofagasta': ['tourist_attraction', 'restaurant', 'cafe'],
+    'calama': ['restaurant', 'shopping_mall', 'cafe'],
+}
+
 # =========================================================================
 # CUSTOM EXCEPTIONS FOR ROBUST ERROR HANDLING
 # =========================================================================
@@ -78,10 +93,6 @@ class GooglePlacesError(OptimizerError):
     """Google Places API related errors"""
     pass
 
-class QuotaExceededError(GooglePlacesError):
-    """API quota exceeded"""
-    pass
-
 class CircuitBreakerOpenError(OptimizerError):
     """Circuit breaker is open"""
     pass
@@ -151,6 +162,8 @@ class Cluster:
     home_base_source: str = "none"
     suggested_accommodations: List[Dict] = field(default_factory=list)
     additional_suggestions: List[Dict] = field(default_factory=list)  # 🌟 Sugerencias adicionales para clusters remotos
+    local_search_saved_minutes: float = 0.0  # 🔁 Minutos de viaje ahorrados por 2-opt/Or-opt
+    radius_km: float = 0.0  # Distancia máxima de un lugar al centroide
 
 @dataclass
 @dataclass
@@ -193,6 +206,7 @@ class FreeBlock:
     duration_minutes: int
     suggestions: List[Dict] = field(default_factory=list)
     note: str = ""
+    batch_key: Optional[int] = None  # Posición en el batch diferido (flush_free_block_batch)
 
 class HybridOptimizerV31:
     def __init__(self, use_hybrid_routing: bool = True, multimodal_router=None):
@@ -214,6 +228,16 @@ class HybridOptimizerV31:
         self.hotel_recommender = HotelRecommender()
         self.places_service = GooglePlacesService()
         
+        # 🏷️ Nombres de extremos de transfers (lugares conocidos → caché → Places)
+        self.label_resolver = PlaceLabelResolver(self.places_service)
+        
+        # 🧺 Sugerencias de bloques libres en batch (se resuelven al final del itinerario)
+        self._pending_free_blocks: Optional[List[Tuple[FreeBlockRequest, FreeBlock]]] = None
+        self.free_block_batch_stats: Dict[str, Any] = {}
+        
+        # 🗺️ Último resultado de clustering (centroides/radios vectorizados)
+        self.last_clustering = None
+        
         # 🛡️ Robustez: Circuit breakers para APIs externas
         self.routing_circuit_breaker = CircuitBreaker(failure_threshold=3, timeout=15, recovery_timeout=60)
         self.places_circuit_breaker = CircuitBreaker(failure_threshold=5, timeout=20, recovery_timeout=120)
@@ -586,6 +610,7 @@ class HybridOptimizerV31:
     
     async def routing_service_cached(self, origin: Tuple[float, float], destination: Tuple[float, float], mode: str = 'walk'):
         """🚀 Routing service con cache inteligente de distancias - ENHANCED con multi-modal"""
+        get_demand_index().record_legs([origin], [destination])
         cache_key = self._get_cache_key(origin[0], origin[1], destination[0], destination[1], mode)
         
         # Verificar cache
@@ -809,14 +834,15 @@ class HybridOptimizerV31:
             self.logger.info(f"🔄 Generando sugerencias completas para día {day_number}")
             
             try:
-                suggestions = await self.places_service_robust(
-                    lat=location[0],
-                    lon=location[1],
-                    types=['tourist_attraction', 'restaurant', 'point_of_interest'],
-                    radius_m=5000,
-                    limit=5,
-                    **kwargs
-                )
+                with quota_priority(QuotaPriority.LAZY):
+                    suggestions = await self.places_service_robust(
+                        lat=location[0],
+                        lon=location[1],
+                        types=['tourist_attraction', 'restaurant', 'point_of_interest'],
+                        radius_m=5000,
+                        limit=5,
+                        **kwargs
+                    )
                 
                 return {
                     "immediate_suggestions": suggestions[:3],  # Top 3 sugerencias inmediatas
@@ -902,13 +928,14 @@ class HybridOptimizerV31:
         
         try:
             # Generar sugerencias completas ahora que se necesitan
-            suggestions = await self.places_service_robust(
-                lat=location[0],
-                lon=location[1],
-                types=['tourist_attraction', 'restaurant', 'museum', 'park'],
-                radius_m=10000,  # Radio más amplio para días lejanos
-                limit=8
-            )
+            with quota_priority(QuotaPriority.LAZY):
+                suggestions = await self.places_service_robust(
+                    lat=location[0],
+                    lon=location[1],
+                    types=['tourist_attraction', 'restaurant', 'museum', 'park'],
+                    radius_m=10000,  # Radio más amplio para días lejanos
+                    limit=8
+                )
             
             # Actualizar estado del placeholder
             self.lazy_placeholders[placeholder_id]["status"] = "loaded"
@@ -1094,34 +1121,24 @@ class HybridOptimizerV31:
         
         self.logger.info(f"🗺️ Clustering {len(pois)} POIs")
         
-        coordinates = np.array([[p['lat'], p['lon']] for p in pois])
+        coordinates = np.fromiter(
+            (c for p in pois for c in (p['lat'], p['lon'])), dtype=float, count=2 * len(pois)
+        ).reshape(-1, 2)
         eps_km = self._choose_eps_km(coordinates)
-        eps_rad = eps_km / 6371.0
-        
-        clustering = DBSCAN(
-            eps=eps_rad,
-            min_samples=settings.CLUSTER_MIN_SAMPLES,
-            metric='haversine'
-        ).fit(np.radians(coordinates))
-        
-        clusters = {}
-        for i, label in enumerate(clustering.labels_):
-            if label == -1:
-                label = f"noise_{i}"
-            
-            if label not in clusters:
-                clusters[label] = []
-            clusters[label].append(pois[i])
+        
+        # BallTree + memoización por coordenadas/eps; create_clusters reutiliza el resultado
+        result = get_poi_clustering_engine().fit(coordinates, eps_km, settings.CLUSTER_MIN_SAMPLES)
+        self.last_clustering = result
         
         cluster_objects = []
-        for label, cluster_places in clusters.items():
-            centroid = self._calculate_centroid(cluster_places)
-            cluster_obj = Cluster(
+        for label, indices in result.groups_in_input_order():
+            is_noise = isinstance(label, str)
+            cluster_objects.append(Cluster(
                 label=label,
-                centroid=centroid,
-                places=cluster_places
-            )
-            cluster_objects.append(cluster_obj)
+                centroid=(float(coordinates[indices[0], 0]), float(coordinates[indices[0], 1])) if is_noise else result.centroid(label),
+                places=[pois[i] for i in indices.tolist()],
+                radius_km=0.0 if is_noise else result.radius_km(label)
+            ))
         
         # 🔒 GARANTÍA: Siempre al menos 1 cluster (no levantamos excepción)
         if not cluster_objects:
@@ -1137,6 +1154,46 @@ class HybridOptimizerV31:
         self.logger.info(f"✅ {len(cluster_objects)} clusters creados")
         return cluster_objects
     
+    def cluster_pois_hierarchical(self, places: List[Dict], hotel: Optional[Dict] = None) -> List[Cluster]:
+        """
+        🧩 Clustering + secuencia para listas grandes (HierarchicalItinerarySolver)
+        
+        Devuelve clusters en orden de visita, con los lugares ya ordenados y
+        cortados a tamaño de día para que la asignación a días conserve la ruta.
+        La ruta parte desde el hotel (el indicado o el primer alojamiento de places).
+        """
+        from services.hierarchical_solver import HierarchicalItinerarySolver
+        
+        pois = [p for p in places if p.get('type', '').lower() != 'accommodation']
+        if not pois:
+            self.logger.warning("No hay POIs para clustering")
+            return []
+        
+        if hotel is None:
+            hotel = next((p for p in places if p.get('type', '').lower() == 'accommodation'), None)
+        start_location = None
+        if hotel and hotel.get('lat') is not None and hotel.get('lon') is not None:
+            start_location = (float(hotel['lat']), float(hotel['lon']))
+        
+        solution = HierarchicalItinerarySolver().solve(pois, start_location=start_location)
+        self.logger.info(f"🧩 Solver jerárquico: {len(solution.cluster_sequence)} clusters, "
+                         f"{solution.total_distance_km:.1f}km, {solution.execution_time_ms:.0f}ms")
+        
+        position = {place_idx: pos for pos, place_idx in enumerate(solution.route)}
+        day_size = max(1, settings.MAX_ACTIVITIES_PER_DAY)
+        cluster_objects = []
+        for h_cluster in solution.cluster_sequence:
+            ordered = [pois[i] for i in sorted(h_cluster.place_indices, key=position.get)]
+            for offset in range(0, len(ordered), day_size):
+                chunk = ordered[offset:offset + day_size]
+                cluster_objects.append(Cluster(
+                    label=f"h{h_cluster.label}_{offset // day_size}",
+                    centroid=self._calculate_centroid(chunk),
+                    places=chunk
+                ))
+        
+        return cluster_objects
+    
     def create_clusters(self, places: List[Dict], hotel: Optional[Dict] = None) -> List[Cluster]:
         """🎯 Alias para cluster_pois - compatibilidad con tests y análisis"""
         self.logger.info(f"🎯 create_clusters llamado con {len(places)} lugares")
@@ -1147,9 +1204,8 @@ class HybridOptimizerV31:
         if len(coordinates) < 5:
             return settings.CLUSTER_EPS_KM_RURAL
         
-        lat_range = np.max(coordinates[:, 0]) - np.min(coordinates[:, 0])
-        lon_range = np.max(coordinates[:, 1]) - np.min(coordinates[:, 1])
-        total_span = math.sqrt(lat_range**2 + lon_range**2)
+        lat_range, lon_range = np.ptp(coordinates, axis=0)
+        total_span = math.hypot(lat_range, lon_range)
         
         return settings.CLUSTER_EPS_KM_RURAL if total_span > 0.5 else settings.CLUSTER_EPS_KM_URBAN
     
@@ -1227,15 +1283,18 @@ class HybridOptimizerV31:
             self.logger.info(f"🏨 Asignando accommodations del usuario a {len(clusters_without_base)} clusters")
             self._assign_user_hotels_to_clusters(clusters_without_base, accommodations)
         
-        # 3. Recomendar hoteles para clusters que aún no tienen base
+        # 3. Top-3 de hoteles para todos los clusters en una sola pasada (búsquedas deduplicadas)
+        recommendations = await self._batch_hotel_recommendations(clusters)
+        
+        # 4. Recomendar hoteles para clusters que aún no tienen base
         clusters_without_base = [c for c in clusters if not c.home_base]
         if clusters_without_base:
             self.logger.info(f"🤖 Recomendando hoteles para {len(clusters_without_base)} clusters sin accommodation")
-            await self._recommend_hotels_for_clusters(clusters_without_base)
+            await self._recommend_hotels_for_clusters(clusters_without_base, recommendations)
         
-        # 4. Generar sugerencias adicionales para cada cluster
+        # 5. Generar sugerencias adicionales para cada cluster
         for cluster in clusters:
-            await self._generate_accommodation_suggestions(cluster)
+            await self._generate_accommodation_suggestions(cluster, recommendations.get(id(cluster)))
         
         return clusters
     
@@ -1261,49 +1320,60 @@ class HybridOptimizerV31:
         
         return clusters
     
-    async def _recommend_hotels_for_clusters(self, clusters: List[Cluster]) -> List[Cluster]:
+    async def _batch_hotel_recommendations(self, clusters: List[Cluster],
+                                           max_recommendations: int = 3) -> Dict[int, List]:
+        """
+        🏨 Recomendaciones de hoteles para todos los clusters a la vez (id(cluster) → top-N);
+        None para un cluster si la recomendación falló
+        """
+        try:
+            batch = await self.hotel_recommender.recommend_hotels_batch(
+                [cluster.places for cluster in clusters], max_recommendations=max_recommendations,
+                price_preference="any"
+            )
+            return {id(cluster): recs for cluster, recs in zip(clusters, batch)}
+        except Exception as e:
+            self.logger.error(f"Error recomendando hoteles: {e}")
+            return {id(cluster): None for cluster in clusters}
+    
+    async def _recommend_hotels_for_clusters(self, clusters: List[Cluster],
+                                             recommendations: Optional[Dict[int, List]] = None) -> List[Cluster]:
         """
         🏨 RECOMENDACIÓN INTELIGENTE DE HOTELES:
         Para clusters lejanos, recomendar alojamiento local + sugerencias adicionales
         """
+        if recommendations is None:
+            recommendations = await self._batch_hotel_recommendations(clusters, max_recommendations=1)
+        
+        remote_searches = []
         for cluster in clusters:
-            try:
-                # Primero intentar con el hotel recommender
-                recommendations = await self.hotel_recommender.recommend_hotels(
-                    cluster.places, max_recommendations=1, price_preference="any"
-                )
-                
-                if recommendations:
-                    top_hotel = recommendations[0]
-                    cluster.home_base = {
-                        'name': top_hotel.name,
-                        'lat': top_hotel.lat,
-                        'lon': top_hotel.lon,
-                        'address': top_hotel.address,
-                        'rating': top_hotel.rating,
-                        'type': 'accommodation'
-                    }
-                    cluster.home_base_source = "recommended"
-                    
-                    # 🧠 LÓGICA INTELIGENTE: Si es cluster lejano, agregar sugerencias adicionales
-                    await self._enrich_remote_cluster_with_local_attractions(cluster)
-                    
-                else:
-                    # 🏨 PARA CLUSTERS REMOTOS: Buscar hoteles con Google Places
-                    is_remote = await self._is_remote_cluster(cluster)
-                    if is_remote:
-                        await self._find_hotel_for_remote_cluster(cluster)
-                    else:
-                        self._set_fallback_base(cluster)
-                    
-                    # 🧠 ENRIQUECER INCLUSO SIN HOTEL RECOMENDADO (para clusters remotos)
-                    await self._enrich_remote_cluster_with_local_attractions(cluster)
-                    
-            except Exception as e:
-                self.logger.error(f"Error recomendando hotel: {e}")
+            cluster_recommendations = recommendations.get(id(cluster))
+            if cluster_recommendations:
+                top_hotel = cluster_recommendations[0]
+                cluster.home_base = {
+                    'name': top_hotel.name,
+                    'lat': top_hotel.lat,
+                    'lon': top_hotel.lon,
+                    'address': top_hotel.address,
+                    'rating': top_hotel.rating,
+                    'type': 'accommodation'
+                }
+                cluster.home_base_source = "recommended"
+            elif cluster_recommendations is None:
+                self._set_fallback_base(cluster)
+            # 🏨 PARA CLUSTERS REMOTOS: Buscar hoteles con Google Places
+            elif await self._is_remote_cluster(cluster):
+                remote_searches.append(cluster)
+            else:
                 self._set_fallback_base(cluster)
-                # 🧠 ENRIQUECER INCLUSO CON ERROR
-                await self._enrich_remote_cluster_with_local_attractions(cluster)
+        
+        # Búsquedas de hoteles de clusters remotos concurrentes (están a > 50km entre sí)
+        if remote_searches:
+            await asyncio.gather(*(self._find_hotel_for_remote_cluster(c) for c in remote_searches))
+        
+        # 🧠 LÓGICA INTELIGENTE: Si es cluster lejano, agregar sugerencias adicionales
+        for cluster in clusters:
+            await self._enrich_remote_cluster_with_local_attractions(cluster)
         
         return clusters
     
@@ -1331,13 +1401,14 @@ class HybridOptimizerV31:
             
             for place_type in place_types_to_search:
                 # Usar Google Places robusto para encontrar atracciones locales
-                local_places = await self.places_service_robust(
-                    lat=search_location[0],
-                    lon=search_location[1],
-                    types=[place_type],
-                    radius_m=10000,  # 10km de radio para clusters remotos
-                    limit=3
-                )
+                with quota_priority(QuotaPriority.FREE_BLOCK):
+                    local_places = await self.places_service_robust(
+                        lat=search_location[0],
+                        lon=search_location[1],
+                        types=[place_type],
+                        radius_m=10000,  # 10km de radio para clusters remotos
+                        limit=3
+                    )
                 
                 # El servicio robusto siempre devuelve una lista (puede estar vacía o con fallbacks)
                 self.logger.info(f"🔍 Tipo: {place_type} - Encontrados: {len(local_places)} lugares")
@@ -1414,14 +1485,15 @@ class HybridOptimizerV31:
             self.logger.info(f"🏨 Buscando hoteles reales cerca de {search_location}")
             
             # Buscar hoteles usando Google Places API REAL robusto
-            hotels = await self.places_service_real_robust(
-                lat=search_location[0],
-                lon=search_location[1],
-                radius_m=15000,  # 15km de radio para áreas remotas
-                types=['lodging'],  # Tipo específico para hoteles
-                limit=5,
-                exclude_chains=False  # Incluir cadenas hoteleras
-            )
+            with quota_priority(QuotaPriority.HOTEL):
+                hotels = await self.places_service_real_robust(
+                    lat=search_location[0],
+                    lon=search_location[1],
+                    radius_m=15000,  # 15km de radio para áreas remotas
+                    types=['lodging'],  # Tipo específico para hoteles
+                    limit=5,
+                    exclude_chains=False  # Incluir cadenas hoteleras
+                )
             
             if hotels:
                 # Seleccionar el mejor hotel basado en rating
@@ -1449,12 +1521,13 @@ class HybridOptimizerV31:
             self.logger.error(f"❌ Error buscando hotel para cluster remoto: {e}")
             self._set_fallback_base(cluster)
     
-    async def _generate_accommodation_suggestions(self, cluster: Cluster):
-        """Generar Top-3 sugerencias de alojamiento por cluster"""
+    async def _generate_accommodation_suggestions(self, cluster: Cluster, suggestions: Optional[List] = None):
+        """Generar Top-3 sugerencias de alojamiento por cluster (reutiliza el batch si se entrega)"""
         try:
-            suggestions = await self.hotel_recommender.recommend_hotels(
-                cluster.places, max_recommendations=3, price_preference="any"
-            )
+            if suggestions is None:
+                suggestions = await self.hotel_recommender.recommend_hotels(
+                    cluster.places, max_recommendations=3, price_preference="any"
+                )
             
             cluster.suggested_accommodations = [
                 {
@@ -1934,6 +2007,13 @@ class HybridOptimizerV31:
             elif main_cluster.places:
                 current_location = (main_cluster.places[0]['lat'], main_cluster.places[0]['lon'])
         
+        # 🏷️ Nombres de todos los posibles orígenes de transfers del día en un solo lote
+        for cluster in assigned_clusters:
+            self.label_resolver.add_known(cluster.places + [cluster.home_base])
+        await self.label_resolver.prefetch(
+            [current_location] + [(p['lat'], p['lon']) for c in assigned_clusters for p in c.places]
+        )
+        
         # NUEVO: Para el primer día, agregar transfer inicial desde el hotel
         if day_number == 1 and current_location and assigned_clusters:
             # Crear objeto de actividad de check-in similar a IntercityActivity
@@ -2106,15 +2186,7 @@ class HybridOptimizerV31:
         )
         
         # Convertir objetos FreeBlock a diccionarios
-        free_blocks = []
-        for fb in free_blocks_objects:
-            free_blocks.append({
-                "start_time": fb.start_time,
-                "end_time": fb.end_time,
-                "duration_minutes": fb.duration_minutes,
-                "suggestions": fb.suggestions,
-                "note": fb.note
-            })
+        free_blocks = [self._free_block_to_dict(fb) for fb in free_blocks_objects]
         
         # Generar recomendaciones procesables
         actionable_recommendations = self._generate_actionable_recommendations(
@@ -2140,7 +2212,8 @@ class HybridOptimizerV31:
                 "walking_time_minutes": walking_time,
                 "transport_time_minutes": transport_time,
                 "intercity_transfers_count": intercity_transfers_count,
-                "intercity_total_minutes": intercity_total_minutes
+                "intercity_total_minutes": intercity_total_minutes,
+                "local_search_saved_minutes": round(sum(c.local_search_saved_minutes for c in assigned_clusters), 1)
             },
             "free_minutes": free_minutes,
             "end_location": current_location
@@ -2166,34 +2239,12 @@ class HybridOptimizerV31:
             self.logger.info(f"🚗 Distancia {eta_info['distance_km']:.1f}km > 30km: recalculando con drive")
             eta_info = await self.routing_service_robust(origin, destination, "drive")
         
-        # Determinar nombres reales (sin fallar) - MEJORADO
+        # Determinar nombres reales (sin fallar): lugares conocidos → caché → Places
         try:
-            # PRIMERO: Verificar si las coordenadas corresponden a un hotel conocido en nuestro sistema
-            from_place = await self._get_known_hotel_name(origin)
-            
-            if from_place:
-                self.logger.info(f"🏨 FROM lugar: Hotel conocido encontrado: {from_place}")
-            
-            # Si no es un hotel conocido, usar búsqueda de Google Places
+            from_place = await self.label_resolver.resolve(origin)
             if not from_place:
-                from_place = await self._get_nearest_named_place(origin)
-                self.logger.info(f"🌐 FROM lugar: Google Places devolvió: {from_place}")
-                
-                # MEJORA: Si no encontramos un nombre específico, intentar encontrar el hotel base más cercano
-                if from_place.startswith("Lat ") or "Lugar de interés" in from_place or not from_place:
-                    # Buscar hoteles cercanos como fallback
-                    nearby_hotels = await self.places_service.search_nearby(
-                        lat=origin[0], 
-                        lon=origin[1],
-                        types=['lodging', 'accommodation'],
-                        radius_m=500,  # Radio más pequeño para hoteles
-                        limit=1
-                    )
-                    if nearby_hotels:
-                        from_place = nearby_hotels[0].get('name', from_place)
-                    else:
-                        from_place = f"Ubicación ({origin[0]:.3f}, {origin[1]:.3f})"
-        except:
+                from_place = f"Ubicación ({origin[0]:.3f}, {origin[1]:.3f})"
+        except Exception:
             from_place = f"Ubicación ({origin[0]:.3f}, {origin[1]:.3f})"
             
         try:
@@ -2201,12 +2252,9 @@ class HybridOptimizerV31:
             if target_cluster.home_base:
                 to_place = target_cluster.home_base['name']
             else:
-                # SEGUNDO: Verificar si las coordenadas corresponden a un hotel conocido
-                to_place = await self._get_known_hotel_name(destination)
-                # TERCERO: Fallback a Google Places si no es un hotel conocido
-                if not to_place:
-                    to_place = await self._get_nearest_named_place(destination)
-        except:
+                to_place = (await self.label_resolver.resolve(destination)
+                            or f"Lat {destination[0]:.3f}, Lon {destination[1]:.3f}")
+        except Exception:
             to_place = f"Destino ({destination[0]:.3f}, {destination[1]:.3f})"
         
         # Aplicar política de transporte
@@ -2331,55 +2379,6 @@ class HybridOptimizerV31:
                     
                     self.logger.info(f"✅ Intercity transfer inyectado: {transfer_mode}, {int(eta_info['duration_minutes'])}min")
 
-    async def _get_known_hotel_name(self, location: Tuple[float, float]) -> str:
-        """Verificar si las coordenadas corresponden a un hotel conocido en nuestro sistema"""
-        try:
-            self.logger.info(f"🔍 Verificando hotel conocido en ({location[0]:.6f}, {location[1]:.6f})")
-            
-            # Importar el hotel recommender para acceder a la base de datos de hoteles
-            from services.hotel_recommender import HotelRecommender
-            recommender = HotelRecommender()
-            
-            # Verificar en todas las ciudades
-            for city_name, hotels in recommender.hotel_database.items():
-                for hotel in hotels:
-                    hotel_lat = hotel.get('lat', 0)
-                    hotel_lon = hotel.get('lon', 0)
-                    
-                    # Calcular distancia (usando aproximación simple)
-                    distance = ((location[0] - hotel_lat) ** 2 + (location[1] - hotel_lon) ** 2) ** 0.5
-                    
-                    # Si está muy cerca de un hotel conocido (< 0.01 grados ≈ 1km)
-                    if distance < 0.01:
-                        self.logger.info(f"🏨 Hotel conocido encontrado: {hotel['name']} (distancia: {distance:.6f})")
-                        return hotel['name']
-                        
-        except Exception as e:
-            self.logger.warning(f"Error verificando hoteles conocidos: {e}")
-        
-        self.logger.info(f"❌ No se encontró hotel conocido en ({location[0]:.6f}, {location[1]:.6f})")
-        return ""  # No encontrado
-
-    async def _get_nearest_named_place(self, location: Tuple[float, float]) -> str:
-        """Obtener el nombre del lugar más cercano"""
-        try:
-            # Usar búsqueda robusta de lugares cercanos
-            nearby_places = await self.places_service.search_nearby(
-                lat=location[0], 
-                lon=location[1],
-                types=['point_of_interest', 'establishment'],
-                radius_m=1000,
-                limit=1
-            )
-            
-            if nearby_places:
-                return nearby_places[0].get('name', f"Lat {location[0]:.3f}, Lon {location[1]:.3f}")
-            
-        except Exception as e:
-            self.logger.warning(f"No se pudo obtener nombre del lugar: {e}")
-        
-        return f"Lat {location[0]:.3f}, Lon {location[1]:.3f}"
-
     def _build_enhanced_base_info(self, cluster: Cluster, extra_info: Optional[Dict] = None) -> Dict:
         """Construir información completa del base incluyendo si fue recomendado automáticamente"""
         if not cluster.home_base:
@@ -2452,6 +2451,13 @@ class HybridOptimizerV31:
         # Filtrar lugares que NO son accommodation (ya que el hotel es la base, no una actividad)
         activity_places = [p for p in sorted_places if p.get('place_type') != 'accommodation' and p.get('type') != 'accommodation']
         
+        # 🔁 Mejorar el orden con local search respetando las ventanas preferidas
+        if (settings.ENABLE_INTRA_CLUSTER_LOCAL_SEARCH and
+                len(activity_places) >= settings.INTRA_CLUSTER_LOCAL_SEARCH_MIN_STOPS):
+            activity_places = self._improve_stop_order(
+                activity_places, hotel_location, start_time, daily_window, transport_mode, cluster
+            )
+        
         for place in activity_places:
             place_location = (place['lat'], place['lon'])
             
@@ -2560,6 +2566,39 @@ class HybridOptimizerV31:
         
         return activities, timeline
     
+    def _improve_stop_order(
+        self,
+        places: List[Dict],
+        hotel_location: Optional[Tuple[float, float]],
+        start_time: int,
+        daily_window: TimeWindow,
+        transport_mode: str,
+        cluster: Cluster
+    ) -> List[Dict]:
+        """🔁 2-opt / Or-opt / relocate sobre el orden por prioridad, sin empeorar time windows"""
+        coords = [(p['lat'], p['lon']) for p in places]
+        coords.append(hotel_location if hotel_location else coords[0])
+        matrix = build_time_matrix_minutes(np.array(coords, dtype=float), transport_mode)
+        if not hotel_location:
+            # Sin hotel el día parte en la primera parada: depot de costo 0
+            matrix[-1, :] = 0.0
+            matrix[:, -1] = 0.0
+        
+        durations = [self._estimate_activity_duration(p) for p in places]
+        windows = [
+            [(w.start, w.end) for w in self.get_preferred_time_window(p.get('type', ''), daily_window)]
+            for p in places
+        ]
+        
+        order, stats = optimize_stop_order(matrix, durations, windows, start_time, daily_window.end)
+        cluster.local_search_saved_minutes = stats['saved_minutes']
+        if stats['saved_minutes'] > 0:
+            self.logger.info(
+                f"🔁 Local search cluster {cluster.label}: -{stats['saved_minutes']:.0f}min de viaje "
+                f"({len(places)} paradas, {stats['elapsed_ms']:.1f}ms)"
+            )
+        return [places[i] for i in order]
+    
     def _sort_places_by_time_preference(self, places: List[Dict], current_time: int) -> List[Dict]:
         """Ordenar lugares priorizando time windows y prioridad"""
         def time_preference_score(place):
@@ -2632,36 +2671,46 @@ class HybridOptimizerV31:
             suggestions = []
             note = ""
             
+            if location and block_duration >= 60 and self._pending_free_blocks is not None:
+                # 🧺 Modo batch: registrar el bloque, las sugerencias se resuelven por celda H3
+                batch_key = len(self._pending_free_blocks)
+                free_block = FreeBlock(
+                    start_time=current_time,
+                    end_time=day_end,
+                    duration_minutes=block_duration,
+                    batch_key=batch_key
+                )
+                request = FreeBlockRequest(
+                    key=batch_key,
+                    lat=location[0],
+                    lon=location[1],
+                    types=self._select_types_by_duration_and_day(block_duration, day_number),
+                    day_number=day_number,
+                    limit=settings.FREE_DAY_SUGGESTIONS_LIMIT
+                )
+                self._pending_free_blocks.append((request, free_block))
+                return [free_block]
+            
             if location and block_duration >= 60:  # Al menos 1 hora libre
                 try:
                     # Seleccionar tipos según duración del bloque libre Y día
                     types = self._select_types_by_duration_and_day(block_duration, day_number)
                     
-                    # 🗺️ USAR GOOGLE PLACES API REAL con variedad por día
-                    raw_suggestions = await self.places_service.search_nearby_real(
-                        lat=location[0],
-                        lon=location[1], 
-                        types=types,
-                        radius_m=settings.FREE_DAY_SUGGESTIONS_RADIUS_M,
-                        limit=settings.FREE_DAY_SUGGESTIONS_LIMIT,
-                        exclude_chains=True,  # Excluir cadenas conocidas
-                        day_offset=day_number  # Nuevo parámetro para variedad
-                    )
+                    # 🗺️ USAR GOOGLE PLACES API REAL con variedad por día (solo caché si la cuota está baja)
+                    with quota_priority(QuotaPriority.FREE_BLOCK):
+                        raw_suggestions = await self.places_service.search_nearby_real(
+                            lat=location[0],
+                            lon=location[1], 
+                            types=types,
+                            radius_m=settings.FREE_DAY_SUGGESTIONS_RADIUS_M,
+                            limit=settings.FREE_DAY_SUGGESTIONS_LIMIT,
+                            exclude_chains=True,  # Excluir cadenas conocidas
+                            day_offset=day_number  # Nuevo parámetro para variedad
+                        )
                     
                     # Enriquecer sugerencias con ETAs y razones
                     suggestions = await self._enrich_suggestions_real(raw_suggestions, location, block_duration)
-                    
-                    if suggestions:
-                        real_count = sum(1 for s in suggestions if not s.get('synthetic', True))
-                        if real_count > 0:
-                            source_type = f"{real_count} lugares reales de alta calidad"
-                            note = f"Sugerencias para {block_duration//60}h de tiempo libre ({source_type})"
-                        else:
-                            # No hay lugares que cumplan los criterios de calidad
-                            suggestions = []
-                            note = "No hay lugares cercanos que cumplan nuestros estándares de calidad (4.5⭐, 20+ reseñas)"
-                    else:
-                        note = "No hay lugares cercanos que cumplan nuestros estándares de calidad (4.5⭐, 20+ reseñas)"
+                    suggestions, note = self._summarize_free_block_suggestions(suggestions, block_duration)
                         
                 except Exception as e:
                     self.logger.warning(f"Error generando sugerencias: {e}")
@@ -2679,6 +2728,72 @@ class HybridOptimizerV31:
         
         return free_blocks
     
+    def _free_block_to_dict(self, free_block: FreeBlock) -> Dict:
+        """FreeBlock → dict del día (con batch_key si sus sugerencias están diferidas)"""
+        block_dict = {
+            "start_time": free_block.start_time,
+            "end_time": free_block.end_time,
+            "duration_minutes": free_block.duration_minutes,
+            "suggestions": free_block.suggestions,
+            "note": free_block.note
+        }
+        if free_block.batch_key is not None:
+            block_dict["batch_key"] = free_block.batch_key
+        return block_dict
+    
+    def _summarize_free_block_suggestions(self, suggestions: List[Dict], block_duration: int) -> Tuple[List[Dict], str]:
+        """Nota del bloque libre según las sugerencias reales obtenidas"""
+        real_count = sum(1 for s in suggestions if not s.get('synthetic', True))
+        if real_count > 0:
+            source_type = f"{real_count} lugares reales de alta calidad"
+            return suggestions, f"Sugerencias para {block_duration//60}h de tiempo libre ({source_type})"
+        # No hay lugares que cumplan los criterios de calidad
+        return [], "No hay lugares cercanos que cumplan nuestros estándares de calidad (4.5⭐, 20+ reseñas)"
+    
+    def begin_free_block_batch(self):
+        """🧺 Diferir las sugerencias de bloques libres hasta flush_free_block_batch"""
+        if settings.FREE_BLOCK_BATCH_SUGGESTIONS:
+            self._pending_free_blocks = []
+    
+    async def flush_free_block_batch(self, days: List[Dict]):
+        """
+        🧺 Resolver sugerencias de todos los bloques libres diferidos:
+        una búsqueda por celda H3 y reparto con variedad por día
+        """
+        pending = self._pending_free_blocks or []
+        self._pending_free_blocks = None
+        if not pending:
+            return
+        
+        try:
+            planner = FreeBlockSuggestionPlanner(self.places_service)
+            planned = await planner.plan([request for request, _ in pending])
+            self.free_block_batch_stats = planner.last_stats
+        except Exception as e:
+            self.logger.warning(f"Error generando sugerencias batch: {e}")
+            planned = None
+        
+        blocks_by_key = {}
+        for request, free_block in pending:
+            if planned is None:
+                free_block.note = "Servicio de sugerencias temporalmente no disponible"
+            else:
+                enriched = await self._enrich_suggestions_real(
+                    planned.get(request.key, []), (request.lat, request.lon), free_block.duration_minutes
+                )
+                free_block.suggestions, free_block.note = self._summarize_free_block_suggestions(
+                    enriched, free_block.duration_minutes
+                )
+            blocks_by_key[request.key] = free_block
+        
+        # Cada dict de bloque libre diferido lleva su batch_key explícito
+        for day in days:
+            for block_dict in day.get('free_blocks', []):
+                free_block = blocks_by_key.get(block_dict.pop('batch_key', None))
+                if free_block is not None:
+                    block_dict['suggestions'] = free_block.suggestions
+                    block_dict['note'] = free_block.note
+    
     async def _generate_free_blocks(
         self, 
         start_time: int, 
@@ -2939,6 +3054,15 @@ class HybridOptimizerV31:
             for day in days
         )
         
+        # Minutos de viaje ahorrados por local search intra-cluster
+        local_search_saved_by_day = [
+            {
+                'date': day.get('date'),
+                'saved_minutes': day.get('travel_summary', {}).get('local_search_saved_minutes', 0)
+            }
+            for day in days
+        ]
+        
         # Score de eficiencia mejorado
         total_travel_minutes = total_walking_time + total_transport_time
         efficiency_base = 0.95
@@ -2986,7 +3110,9 @@ class HybridOptimizerV31:
             'long_transfers_detected': intercity_transfers_count,
             'intercity_transfers': intercity_transfers,
             'total_intercity_time_hours': intercity_total_minutes / 60,
-            'total_intercity_distance_km': sum(t['distance_km'] for t in intercity_transfers)
+            'total_intercity_distance_km': sum(t['distance_km'] for t in intercity_transfers),
+            'local_search_saved_minutes': round(sum(d['saved_minutes'] for d in local_search_saved_by_day), 1),
+            'local_search_saved_by_day': local_search_saved_by_day
         }
     
     # =========================================================================
@@ -3286,9 +3412,7 @@ class HybridOptimizerV31:
         """
         🆕 Generar días completamente libres con sugerencias automáticas
         """
-        from services.google_places_service import GooglePlacesService
-        
-        places_service = GooglePlacesService()
+        places_service = self.places_service
         
         # Calcular ubicación por defecto (centro de Chile para búsquedas generales)
         default_lat, default_lon = -33.4489, -70.6693  # Santiago como centro
@@ -3298,6 +3422,31 @@ class HybridOptimizerV31:
         
         logging.info(f"🏖️ Generando {total_days} días libres con sugerencias")
         
+        # 🎯 DETECTAR TIPO DE DESTINO para sugerir tipos relevantes
+        destination = get_city_resolver().resolve(default_lat, default_lon)
+        suggested_types = TOURIST_DESTINATION_TYPES.get(destination.city_key) if destination else None
+        if suggested_types:
+            logging.info(f"🏛️ Detectado destino turístico: {destination.city}")
+        
+        # Si no detectamos destino específico, usar variedad general
+        if not suggested_types:
+            suggested_types = ['tourist_attraction', 'restaurant', 'cafe', 'museum', 'park']
+        
+        # 🧺 Todos los días comparten ubicación: una sola búsqueda por tipo y reparto con variedad por día
+        planner = FreeBlockSuggestionPlanner(places_service)
+        try:
+            planned = await planner.plan([
+                FreeBlockRequest(
+                    key=day_number, lat=default_lat, lon=default_lon,
+                    types=suggested_types, day_number=day_number,
+                    limit=6  # Más sugerencias para días libres
+                )
+                for day_number in range(1, total_days + 1)
+            ])
+        except Exception as e:
+            logging.warning(f"Error generando sugerencias batch para días libres: {e}")
+            planned = {}
+        
         for i in range(total_days):
             current_date = start_date + timedelta(days=i)
             date_key = current_date.strftime('%Y-%m-%d')
@@ -3306,51 +3455,21 @@ class HybridOptimizerV31:
             # Tiempo total disponible por día
             daily_minutes = (daily_end_hour - daily_start_hour) * 60
             
-            # Generar sugerencias para este día con variedad inteligente
-            try:
-                # 🎯 DETECTAR TIPO DE DESTINO para sugerir tipos relevantes
-                tourist_destinations = {
-                    'san_pedro_atacama': (-22.91, -68.20, ['tourist_attraction', 'cafe', 'point_of_interest']),
-                    'valparaiso': (-33.05, -71.62, ['art_gallery', 'museum', 'tourist_attraction']),
-                    'santiago': (-33.45, -70.67, ['restaurant', 'museum', 'park']),
-                    'antofagasta': (-23.65, -70.40, ['tourist_attraction', 'restaurant', 'cafe']),
-                    'calama': (-22.49, -68.90, ['restaurant', 'shopping_mall', 'cafe']),
-                }
-                
-                # Determinar tipos según ubicación
-                suggested_types = None
-                for dest_name, (dest_lat, dest_lon, dest_types) in tourist_destinations.items():
-                    # Si estamos cerca de un destino conocido (dentro de ~50km)
-                    distance = ((default_lat - dest_lat)**2 + (default_lon - dest_lon)**2)**0.5
-                    if distance < 0.5:  # ~50km aproximadamente
-                        suggested_types = dest_types
-                        logging.info(f"🏛️ Detectado destino turístico: {dest_name.replace('_', ' ').title()}")
-                        break
-                
-                # Si no detectamos destino específico, usar variedad general
-                if not suggested_types:
-                    suggested_types = ['tourist_attraction', 'restaurant', 'cafe', 'museum', 'park']
-                
-                suggestions = await places_service.search_nearby_real(
-                    lat=default_lat,
-                    lon=default_lon,
-                    types=suggested_types,
-                    limit=6,  # Más sugerencias para días libres
-                    day_offset=day_number
-                )
-                
-                # Fallback a sugerencias sintéticas si no hay reales
-                if not suggestions:
-                    suggestions = await places_service.search_nearby(
-                        lat=default_lat,
-                        lon=default_lon,
-                        types=['restaurant', 'tourist_attraction', 'museum'],
-                        limit=3
-                    )
-                    
-            except Exception as e:
-                logging.warning(f"Error generando sugerencias para día {day_number}: {e}")
-                suggestions = []
+            suggestions = planned.get(day_number, [])
+            
+            # Fallback a sugerencias sintéticas si no hay reales
+            if not suggestions:
+                try:
+                    with quota_priority(QuotaPriority.FREE_BLOCK):
+                        suggestions = await places_service.search_nearby(
+                            lat=default_lat,
+                            lon=default_lon,
+                            types=['restaurant', 'tourist_attraction', 'museum'],
+                            limit=3
+                        )
+                except Exception as e:
+                    logging.warning(f"Error generando sugerencias para día {day_number}: {e}")
+                    suggestions = []
             
             # Crear bloque libre completo con sugerencias
             free_block = {
@@ -3390,7 +3509,8 @@ class HybridOptimizerV31:
                 "total_distance_km": 0,
                 "total_travel_time_minutes": 0,
                 "processing_time_seconds": 0.1,
-                "free_days_generated": total_days
+                "free_days_generated": total_days,
+                "free_block_suggestions": planner.last_stats
             }
         }
 
@@ -3464,6 +3584,12 @@ async def optimize_itinerary_hybrid_v31(
             f"   RECOMMENDATION: Enable OR-Tools immediately"
         )
     
+    # 📈 Demanda geográfica del request (índice H3 multi-resolución)
+    get_demand_index().record_places([
+        (p['lat'], p['lon']) for p in places
+        if isinstance(p, dict) and p.get('lat') is not None and p.get('lon') is not None
+    ])
+    
     # ========================================================================
     # 🧮 FASE 2.1: DECISIÓN INTELIGENTE DE SISTEMA (OR-TOOLS PRIORITY)
     # ========================================================================
@@ -3483,10 +3609,10 @@ async def optimize_itinerary_hybrid_v31(
     
     # 🧮 DECISIÓN OR-TOOLS (PRIORIDAD MÁXIMA)
     try:
-        from utils.ortools_decision_engine import ORToolsDecisionEngine
+        from utils.ortools_decision_engine import get_decision_engine
         
-        # Crear engine de decisión OR-Tools
-        decision_engine = ORToolsDecisionEngine()
+        # Engine de decisión OR-Tools (singleton: comparte cache de decisiones)
+        decision_engine = await get_decision_engine()
         ortools_decision = await decision_engine.should_use_ortools(request_data)
         
         # Log de decisión OR-Tools para debugging
@@ -3689,7 +3815,13 @@ async def _optimize_classic_method(
         logging.info("🔴 Sistema semántico City2Graph no disponible")
     
     # 1. Clustering POIs (ahora con información semántica)
-    clusters = optimizer.cluster_pois(places)
+    if settings.ENABLE_HIERARCHICAL_SOLVER and len(places) >= settings.HIERARCHICAL_MIN_PLACES:
+        # 🧩 Listas grandes: descomposición jerárquica (fuera del event loop)
+        clusters = await asyncio.to_thread(
+            optimizer.cluster_pois_hierarchical, places, accommodations[0] if accommodations else None
+        )
+    else:
+        clusters = optimizer.cluster_pois(places)
     if not clusters:
         # 🆕 DÍAS COMPLETAMENTE LIBRES CON SUGERENCIAS AUTOMÁTICAS
         logging.info("🏖️ Generando días libres con sugerencias automáticas")
@@ -3726,6 +3858,9 @@ async def _optimize_classic_method(
     # 🆕 Extraer horarios personalizados si existen
     custom_schedules = extra_info.get('custom_schedules', {}) if extra_info else {}
     
+    # 🧺 Las sugerencias de bloques libres se resuelven en batch al final
+    optimizer.begin_free_block_batch()
+    
     # Crear lista ordenada de fechas para tener índice de día
     for day_index, date_str in enumerate(sorted_dates):
         day_number = day_index + 1  # Día 1, 2, 3, etc.
@@ -3755,15 +3890,7 @@ async def _optimize_classic_method(
             )
             
             # Convertir objetos FreeBlock a diccionarios
-            free_blocks = []
-            for fb in free_blocks_objects:
-                free_blocks.append({
-                    "start_time": fb.start_time,
-                    "end_time": fb.end_time,
-                    "duration_minutes": fb.duration_minutes,
-                    "suggestions": fb.suggestions,
-                    "note": fb.note
-                })
+            free_blocks = [optimizer._free_block_to_dict(fb) for fb in free_blocks_objects]
             
             # Base heredada del último día activo
             inherited_base = last_active_base if last_active_base else None
@@ -3819,8 +3946,13 @@ async def _optimize_classic_method(
     # 🌍 DETECCIÓN DE INTERCITY TRANSFERS ENTRE DÍAS
     await optimizer._inject_intercity_transfers_between_days(days)
     
+    # 🧺 Sugerencias de bloques libres: una búsqueda por celda H3
+    await optimizer.flush_free_block_batch(days)
+    
     # 6. Enhanced metrics with semantic information
     optimization_metrics = optimizer.calculate_enhanced_metrics(days)
+    if optimizer.free_block_batch_stats:
+        optimization_metrics['free_block_suggestions'] = optimizer.free_block_batch_stats
     
     # 🧠 Agregar información semántica a las métricas
     if semantic_clustering and hasattr(optimizer, 'semantic_info'):
@@ -8,14 +8,15 @@ Sistema híbrido inteligente que combina:
 
 import asyncio
 import time
-import requests
 import logging
+import aiohttp
 from typing import Dict, Tuple, Optional, List
 from dataclasses import dataclass
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.geo_utils import haversine_km
+from utils.http_client_registry import get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -166,12 +167,13 @@ class HybridRoutingService:
                 'geometries': 'geojson'
             }
             
-            response = requests.get(url, params=params, timeout=self.TIMEOUT_OSRM)
+            # Pool HTTP compartido (no bloquea el event loop)
+            async with get_http_client("osrm").get(url, params=params, timeout=aiohttp.ClientTimeout(total=self.TIMEOUT_OSRM)) as response:
+                status = response.status
+                data = await response.json() if status == 200 else None
             processing_time = (time.time() - start_time) * 1000
             
-            if response.status_code == 200:
-                data = response.json()
-                
+            if status == 200:
                 if data['code'] == 'Ok' and data['routes']:
                     route = data['routes'][0]
                     
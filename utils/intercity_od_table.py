@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+🛣️ Intercity OD Table - Distancias y tiempos precalculados entre ciudades
+Tabla origen-destino construida offline (generate_intercity_od_table.py) con el
+motor de ruteo local (OSRM car) y guardada como binario compacto (.npz, sin pickle):
+
+    keys        (N,)    city_key de cada ciudad
+    names       (N,)    nombre visible
+    centers     (N, 2)  (lat, lon) usados para el ruteo
+    drive_km    (N, N)  distancia por carretera
+    drive_hours (N, N)  tiempo en auto
+    bus_hours   (N, N)  tiempo estimado en bus interurbano
+    source      (N, N)  0 = motor de ruteo, 1 = estimación geodésica
+    metadata    ()      JSON con versión, fecha y parámetros del build
+
+Lookups O(1): city_key → índice (dict) → celda de la matriz.
+
+Los pares con estimación geodésica solo se entregan si INTERCITY_OD_TRUST_ESTIMATES
+está activo (por defecto sí: es la misma estimación que usaría el fallback en vivo,
+así que la planificación multi-ciudad dentro de la tabla no consulta OSRM). Con el
+flag apagado se devuelven solo pares del motor de ruteo y el resto va a ruteo en vivo.
+"""
+
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+from settings import settings
+from utils.city_resolver import get_city_resolver
+
+logger = logging.getLogger(__name__)
+
+SOURCE_ROUTING_ENGINE = 0
+SOURCE_GEODESIC_ESTIMATE = 1
+SOURCE_NAMES = {SOURCE_ROUTING_ENGINE: 'osrm', SOURCE_GEODESIC_ESTIMATE: 'geodesic_estimate'}
+
+TRANSPORT_MODES = ('drive', 'bus')
+
+@dataclass(frozen=True)
+class ODEntry:
+    """Par origen-destino de la tabla"""
+    origin_key: str
+    destination_key: str
+    distance_km: float
+    drive_hours: float
+    bus_hours: float
+    source: str
+
+    def hours(self, mode: str = 'drive') -> float:
+        return self.bus_hours if mode == 'bus' else self.drive_hours
+
+class IntercityODTable:
+    """
+    🛣️ Tabla OD intercity cargada en memoria
+
+    Uso:
+        table = get_intercity_od_table()
+        entry = table.lookup('santiago', 'valparaiso')          # ODEntry o None
+        entry = table.lookup_coords((-33.45, -70.66), (-33.04, -71.61))
+
+    Un hit se cuenta solo cuando el par se entrega; las estimaciones descartadas
+    por configuración cuentan como miss (y en skipped_estimates).
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or settings.INTERCITY_OD_TABLE_PATH)
+        self.keys: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.metadata: Dict[str, Any] = {}
+        self.stats = {'hits': 0, 'misses': 0, 'skipped_estimates': 0}
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            logger.warning(f"⚠️ Tabla OD intercity no encontrada: {self.path} (se usará ruteo en vivo)")
+            return
+
+        with np.load(self.path, allow_pickle=False) as data:
+            self.keys = [str(key) for key in data['keys']]
+            self.names = [str(name) for name in data['names']]
+            self.centers = data['centers']
+            self.drive_km = data['drive_km']
+            self.drive_hours = data['drive_hours']
+            self.bus_hours = data['bus_hours']
+            self.source = data['source']
+            self.metadata = json.loads(str(data['metadata']))
+
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        logger.info(f"🛣️ Tabla OD intercity cargada: {len(self.keys)} ciudades "
+                    f"({self.metadata.get('built_at', '?')}, {self.metadata.get('engine', '?')})")
+
+    @property
+    def size(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def lookup(self, origin_key: str, destination_key: str,
+               trust_estimates: Optional[bool] = None) -> Optional[ODEntry]:
+        """
+        Par por city_key (None si alguna ciudad no está en la tabla o si el par es
+        una estimación geodésica y no se confía en estimaciones)
+        """
+        if trust_estimates is None:
+            trust_estimates = settings.INTERCITY_OD_TRUST_ESTIMATES
+        i = self.index.get(origin_key)
+        j = self.index.get(destination_key)
+        if i is None or j is None or i == j:
+            self.stats['misses'] += 1
+            return None
+        if not trust_estimates and int(self.source[i, j]) != SOURCE_ROUTING_ENGINE:
+            self.stats['misses'] += 1
+            self.stats['skipped_estimates'] += 1
+            return None
+        self.stats['hits'] += 1
+        return ODEntry(
+            origin_key=origin_key,
+            destination_key=destination_key,
+            distance_km=float(self.drive_km[i, j]),
+            drive_hours=float(self.drive_hours[i, j]),
+            bus_hours=float(self.bus_hours[i, j]),
+            source=SOURCE_NAMES.get(int(self.source[i, j]), 'unknown')
+        )
+
+    def key_for(self, lat: float, lon: float) -> Optional[str]:
+        """city_key de la tabla que contiene el punto (resolver offline H3)"""
+        if not self.index:
+            return None
+        location = get_city_resolver().resolve(lat, lon)
+        if location is None or location.city_key not in self.index:
+            return None
+        return location.city_key
+
+    def lookup_coords(self, origin: Any, destination: Any,
+                      trust_estimates: Optional[bool] = None) -> Optional[ODEntry]:
+        """Par por coordenadas (lat, lon) de origen y destino"""
+        origin_key = self.key_for(*origin)
+        destination_key = self.key_for(*destination)
+        if origin_key is None or destination_key is None:
+            self.stats['misses'] += 1
+            return None
+        return self.lookup(origin_key, destination_key, trust_estimates)
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'cities': self.size,
+            'path': str(self.path),
+            'built_at': self.metadata.get('built_at'),
+            'engine': self.metadata.get('engine'),
+            'trust_estimates': settings.INTERCITY_OD_TRUST_ESTIMATES,
+            'hit_rate_percentage': round(self.stats['hits'] / total * 100, 1) if total else 0.0
+        }
+
+def save_od_table(path: Path, keys: List[str], names: List[str], centers: np.ndarray,
+                  drive_km: np.ndarray, drive_hours: np.ndarray, bus_hours: np.ndarray,
+                  source: np.ndarray, metadata: Dict[str, Any]):
+    """Escribir la tabla en formato .npz comprimido (float32 / uint8)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(
+        path,
+        keys=np.array(keys, dtype=str),
+        names=np.array(names, dtype=str),
+        centers=np.asarray(centers, dtype=np.float64),
+        drive_km=np.asarray(drive_km, dtype=np.float32),
+        drive_hours=np.asarray(drive_hours, dtype=np.float32),
+        bus_hours=np.asarray(bus_hours, dtype=np.float32),
+        source=np.asarray(source, dtype=np.uint8),
+        metadata=np.array(json.dumps(metadata, ensure_ascii=False))
+    )
+
+# Instancia global
+_od_table: Optional[IntercityODTable] = None
+
+def get_intercity_od_table() -> IntercityODTable:
+    """Obtener la tabla OD intercity global (se carga en el primer uso)"""
+    global _od_table
+    if _od_table is None:
+        _od_table = IntercityODTable()
+    return _od_table
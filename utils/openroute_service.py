@@ -3,10 +3,10 @@
 Límites: 2,000 requests/día gratuito
 """
 
-import aiohttp
 import logging
 from typing import Dict, Tuple, Optional
 from utils.google_cache import cache_google_api
+from utils.http_client_registry import get_http_client
 from utils.geo_utils import haversine_km
 from settings import settings
 
@@ -56,14 +56,13 @@ class OpenRouteService:
                 'format': 'json'
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return self._parse_openroute_response(data)
-                    else:
-                        self.logger.warning(f"OpenRoute error {response.status}")
-                        return self._fallback_eta(origin, destination, transport_mode)
+            async with get_http_client("openroute").get(url, params=params) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    return self._parse_openroute_response(data)
+                else:
+                    self.logger.warning(f"OpenRoute error {response.status}")
+                    return self._fallback_eta(origin, destination, transport_mode)
                         
         except Exception as e:
             self.logger.warning(f"OpenRoute request failed: {e}")
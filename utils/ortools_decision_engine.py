@@ -18,12 +18,14 @@ import logging
 import time
 import hashlib
 from datetime import datetime, timedelta
+from collections import OrderedDict, Counter, deque
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
 from math import sqrt
 
 from settings import settings
 from services.city2graph_ortools_service import get_ortools_service
+from utils.city_resolver import get_city_resolver
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +52,94 @@ class ItineraryComplexity:
     transport_complexity: str
     overall_score: float  # 0.0 - 10.0
 
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano sobre valores ya ordenados"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+def count_trip_days(start_date: Any, end_date: Any) -> int:
+    """Días del itinerario (inclusive) aceptando date, datetime o ISO string"""
+    try:
+        if isinstance(start_date, str):
+            start_date = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+        if isinstance(end_date, str):
+            end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+        return (end_date - start_date).days + 1
+    except Exception:
+        return 1
+
+# Con menos de 3 lugares _make_decision nunca llega a la confianza mínima (0.5):
+# la decisión es legacy sin importar flags, rollout, salud ni complejidad
+LEGACY_ONLY_MAX_PLACES = 2
+
+def is_trivial_itinerary(places_count: int) -> bool:
+    """⚡ Itinerario que las reglas de decisión siempre envían a legacy: no requiere análisis"""
+    return places_count <= LEGACY_ONLY_MAX_PLACES
+
+class DecisionCache:
+    """
+    🗃️ Cache LRU acotado para decisiones de algoritmo
+    Además registra el overhead de cada decisión (µs) para reportar p50/p99
+    """
+    
+    def __init__(self, max_entries: int = 512, ttl_s: int = 600, max_samples: int = 1000):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._overhead_us = deque(maxlen=max_samples)
+        self.stats = {
+            "fast_path": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "evictions": 0
+        }
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["cache_misses"] += 1
+            return None
+        timestamp, value = entry
+        if time.time() - timestamp >= self.ttl_s:
+            del self._entries[key]
+            self.stats["cache_misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["cache_hits"] += 1
+        return value
+    
+    def put(self, key: str, value: Any):
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+    
+    def record_fast_path(self):
+        self.stats["fast_path"] += 1
+    
+    def record_overhead(self, started_at: float):
+        """Registrar overhead desde un time.perf_counter() previo"""
+        self._overhead_us.append((time.perf_counter() - started_at) * 1_000_000)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        samples = sorted(self._overhead_us)
+        lookups = self.stats["cache_hits"] + self.stats["cache_misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "cache_hit_rate": self.stats["cache_hits"] / lookups * 100 if lookups else 0.0,
+            "overhead_samples": len(samples),
+            "overhead_p50_us": round(_percentile(samples, 50), 1),
+            "overhead_p99_us": round(_percentile(samples, 99), 1)
+        }
+
 class ORToolsDecisionEngine:
     """
     🧠 Motor de decisión inteligente para OR-Tools
@@ -57,8 +147,10 @@ class ORToolsDecisionEngine:
     """
     
     def __init__(self):
-        self.decision_cache = {}
-        self.cache_ttl = 600  # 10 minutos
+        self.decision_cache = DecisionCache(
+            max_entries=settings.DECISION_CACHE_MAX_ENTRIES,
+            ttl_s=settings.DECISION_CACHE_TTL_S
+        )
         self.performance_history = []
         self.last_health_check = 0
         self.ortools_health_status = None
@@ -76,17 +168,25 @@ class ORToolsDecisionEngine:
             DecisionResult con decisión y metadata
         """
         start_time = time.time()
+        overhead_start = time.perf_counter()
         
         try:
+            # ⚡ Fast path: solo para entradas que las reglas completas ya envían a legacy
+            places_count = len(request_data.get("places", []))
+            if is_trivial_itinerary(places_count):
+                self.decision_cache.record_fast_path()
+                self.decision_cache.record_overhead(overhead_start)
+                return self._build_trivial_decision(places_count)
+            
             # Generar cache key para decisión
             cache_key = self._generate_cache_key(request_data)
             
             # Check cache primero
-            if cache_key in self.decision_cache:
-                cached_result = self.decision_cache[cache_key]
-                if time.time() - cached_result["timestamp"] < self.cache_ttl:
-                    logger.info(f"🎯 Decision cache hit: {'OR-Tools' if cached_result['result'].use_ortools else 'Legacy'}")
-                    return cached_result["result"]
+            cached_decision = self.decision_cache.get(cache_key)
+            if cached_decision is not None:
+                self.decision_cache.record_overhead(overhead_start)
+                logger.info(f"🎯 Decision cache hit: {'OR-Tools' if cached_decision.use_ortools else 'Legacy'}")
+                return cached_decision
             
             # Análisis de complejidad
             complexity = await self._analyze_complexity(request_data)
@@ -110,10 +210,8 @@ class ORToolsDecisionEngine:
             )
             
             # Cache resultado
-            self.decision_cache[cache_key] = {
-                "result": decision,
-                "timestamp": time.time()
-            }
+            self.decision_cache.put(cache_key, decision)
+            self.decision_cache.record_overhead(overhead_start)
             
             decision_time = (time.time() - start_time) * 1000
             logger.info(f"🎯 Decision made in {decision_time:.0f}ms: "
@@ -150,20 +248,7 @@ class ORToolsDecisionEngine:
         places_count = len(places)
         
         # Calcular días
-        try:
-            if isinstance(start_date, str):
-                start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            else:
-                start_dt = start_date
-            
-            if isinstance(end_date, str):
-                end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            else:
-                end_dt = end_date
-                
-            days_count = (end_dt - start_dt).days + 1
-        except:
-            days_count = 1
+        days_count = count_trip_days(start_date, end_date)
         
         # Análisis geográfico
         geographic_spread = self._calculate_geographic_spread(places)
@@ -420,6 +505,17 @@ class ORToolsDecisionEngine:
             if city:
                 return city
         
+        # Resolver offline por coordenadas: la ciudad con más lugares
+        coords = []
+        for place in places:
+            lat = get_place_attr(place, "lat", "latitude")
+            lon = get_place_attr(place, "lon", "longitude")
+            if lat is not None and lon is not None:
+                coords.append((float(lat), float(lon)))
+        resolved = [loc.city_key for loc in get_city_resolver().resolve_many(coords) if loc and loc.city_key]
+        if resolved:
+            return Counter(resolved).most_common(1)[0][0]
+        
         # 🔧 NUEVO: Detección automática usando clustering geográfico
         try:
             clusters = self._detect_geographic_clusters(places)
@@ -679,11 +775,48 @@ class ORToolsDecisionEngine:
             decision_metadata=decision_metadata
         )
     
+    def _build_trivial_decision(self, places_count: int) -> DecisionResult:
+        """⚡ Decisión legacy para muy pocos lugares (la misma que daría _make_decision)"""
+        return DecisionResult(
+            use_ortools=False,
+            confidence_score=0.1,
+            reasons=[f"too_few_places_{places_count}", "trivial_itinerary_fast_path"],
+            complexity_score=0.0,
+            estimated_execution_time_ms=8500,  # Basado en benchmark legacy
+            expected_success_rate=0.1,
+            fallback_strategy="legacy_only",
+            decision_metadata={
+                "fast_path": True,
+                "max_places": LEGACY_ONLY_MAX_PLACES,
+                "algorithm_version": "1.0_post_benchmark"
+            }
+        )
+    
+    def _places_fingerprint(self, places: List[Any]) -> str:
+        """Huella de lugares (coords redondeadas ~100m + tipo) para la cache key"""
+        parts = []
+        for place in places:
+            if isinstance(place, dict):
+                lat = place.get("lat", place.get("latitude"))
+                lon = place.get("lon", place.get("longitude"))
+                place_type = place.get("type", place.get("place_type"))
+            else:
+                lat = getattr(place, "lat", None)
+                lon = getattr(place, "lon", None)
+                place_type = getattr(place, "type", None)
+            place_type = getattr(place_type, "value", place_type)
+            try:
+                parts.append(f"{float(lat):.3f},{float(lon):.3f},{place_type}")
+            except (TypeError, ValueError):
+                parts.append(f"?,?,{place_type}")
+        return hashlib.md5("|".join(parts).encode()).hexdigest()
+    
     def _generate_cache_key(self, request_data: Dict) -> str:
         """Generar cache key para decisión"""
         # Key basado en factores relevantes para decisión
         factors = {
             "places_count": len(request_data.get("places", [])),
+            "places": self._places_fingerprint(request_data.get("places", [])),
             "start_date": str(request_data.get("start_date", "")),
             "end_date": str(request_data.get("end_date", "")),
             "transport_mode": request_data.get("transport_mode", ""),
@@ -736,7 +869,7 @@ class ORToolsDecisionEngine:
             "avg_confidence_ortools": sum(d["confidence"] for d in ortools_decisions) / max(len(ortools_decisions), 1),
             "avg_complexity_ortools": sum(d["complexity_score"] for d in ortools_decisions) / max(len(ortools_decisions), 1),
             "avg_decision_time_ms": sum(d["decision_time_ms"] for d in recent_decisions) / len(recent_decisions),
-            "cache_hit_rate": len(self.decision_cache) / max(len(recent_decisions), 1) * 100
+            "cache_hit_rate": self.decision_cache.get_stats()["cache_hit_rate"]
         }
 
 # Factory function para instancia singleton
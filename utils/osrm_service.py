@@ -3,10 +3,10 @@
 Servidor público gratuito sin límites estrictos
 """
 
-import aiohttp
 import logging
 from typing import Dict, Tuple
 from utils.google_cache import cache_google_api
+from utils.http_client_registry import get_http_client
 from utils.geo_utils import haversine_km
 
 class OSRMService:
@@ -48,13 +48,12 @@ class OSRMService:
             'geometries': 'polyline'
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params, timeout=10) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return self._parse_osrm_response(data)
-                else:
-                    raise Exception(f"OSRM HTTP {response.status}")
+        async with get_http_client("osrm").get(url, params=params) as response:
+            if response.status == 200:
+                data = await response.json()
+                return self._parse_osrm_response(data)
+            else:
+                raise Exception(f"OSRM HTTP {response.status}")
     
     async def _walking_eta(self, origin: Tuple[float, float], destination: Tuple[float, float]) -> Dict:
         """ETA para caminar - usar cálculo directo mejorado"""
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+📇 PLACE DETAILS CACHE
+Caché persistente de detalles de lugares indexado por place_id
+
+Características:
+- Un valor por (place_id, campo) con TTL propio por campo:
+  horarios cortos, rating medio, nombre/coordenadas largos
+- Fusiona campos de Nearby Search y de Place Details
+- Alias nombre+coordenadas → place_id para evitar la búsqueda previa
+- SQLite de un archivo (WAL) + LRU acotado en memoria
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# TTL por campo (nombres de campo de la API de Google Places)
+FIELD_TTL_S = {
+    # Cambian seguido
+    'opening_hours': 6 * HOUR,
+    'current_opening_hours': 6 * HOUR,
+    'business_status': 12 * HOUR,
+    # Cambian de a poco
+    'rating': 3 * DAY,
+    'user_ratings_total': 3 * DAY,
+    'price_level': 7 * DAY,
+    'reviews': 3 * DAY,
+    'photos': 7 * DAY,
+    # Prácticamente estables
+    'place_id': 90 * DAY,
+    'name': 30 * DAY,
+    'geometry': 30 * DAY,
+    'formatted_address': 30 * DAY,
+    'address_components': 30 * DAY,
+    'vicinity': 30 * DAY,
+    'types': 30 * DAY,
+}
+DEFAULT_FIELD_TTL_S = DAY
+ALIAS_TTL_S = 30 * DAY
+
+# Campos que Nearby Search entrega completos. No se fusionan: opening_hours (solo open_now),
+# photos (una sola foto) y types (lista parcial), para que Details los siga pidiendo enteros
+NEARBY_FIELDS = ('place_id', 'name', 'geometry', 'rating', 'user_ratings_total',
+                 'price_level', 'vicinity', 'business_status')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS place_fields (
+    place_id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    source TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (place_id, field)
+);
+CREATE INDEX IF NOT EXISTS idx_place_fields_expires ON place_fields(expires_at);
+CREATE TABLE IF NOT EXISTS place_aliases (
+    alias TEXT PRIMARY KEY,
+    place_id TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+def place_alias(name: str, lat: float, lon: float) -> str:
+    """Alias estable para búsquedas por nombre + coordenadas (~100m)"""
+    return f"{' '.join(name.lower().split())}@{round(lat, 3)},{round(lon, 3)}"
+
+class PlaceDetailsCache:
+    """
+    📇 Caché de detalles por place_id con TTL por campo
+
+    Uso:
+        cache = get_place_details_cache()
+        cached = cache.get(place_id, fields)      # None si falta o expiró algún campo
+        missing = cache.missing_fields(place_id, fields)
+        cache.merge(place_id, details_result, source='details')
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, max_memory_entries: Optional[int] = None):
+        self.db_path = Path(db_path or settings.PLACE_DETAILS_CACHE_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_memory_entries = max_memory_entries or settings.PLACE_DETAILS_CACHE_MEMORY_ENTRIES
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+        # place_id → {campo: (valor, expires_at)}
+        self._memory: "OrderedDict[str, Dict[str, Tuple[Any, float]]]" = OrderedDict()
+        self.stats = {'hits': 0, 'partial_hits': 0, 'misses': 0, 'fields_merged': 0, 'alias_hits': 0}
+
+    # ========================================================================
+    # LECTURA
+    # ========================================================================
+
+    def _load(self, place_id: str) -> Dict[str, Tuple[Any, float]]:
+        """Campos de un lugar (memoria primero, luego SQLite)"""
+        fields = self._memory.get(place_id)
+        if fields is not None:
+            self._memory.move_to_end(place_id)
+            return fields
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT field, value, expires_at FROM place_fields WHERE place_id = ?", (place_id,)
+            ).fetchall()
+        fields = {field: (json.loads(value), expires_at) for field, value, expires_at in rows}
+        self._remember(place_id, fields)
+        return fields
+
+    def _remember(self, place_id: str, fields: Dict[str, Tuple[Any, float]]):
+        self._memory[place_id] = fields
+        self._memory.move_to_end(place_id)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def missing_fields(self, place_id: str, fields: Iterable[str]) -> List[str]:
+        """Campos pedidos que no están en caché o ya expiraron"""
+        now = time.time()
+        cached = self._load(place_id)
+        return [f for f in fields if f not in cached or cached[f][1] < now]
+
+    def get(self, place_id: str, fields: Optional[Iterable[str]] = None,
+            allow_partial: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Detalles vigentes de un lugar
+
+        Args:
+            fields: Campos requeridos (None = todos los vigentes)
+            allow_partial: Retornar aunque falte alguno de los campos requeridos
+        """
+        now = time.time()
+        cached = self._load(place_id)
+        fresh = {f: value for f, (value, expires_at) in cached.items() if expires_at >= now}
+
+        if fields is not None:
+            fields = list(fields)
+            missing = [f for f in fields if f not in fresh]
+            if missing and not allow_partial:
+                self.stats['partial_hits' if fresh else 'misses'] += 1
+                return None
+            fresh = {f: fresh[f] for f in fields if f in fresh}
+
+        if not fresh:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        # Los campos conocidos como ausentes (null) cuentan como vigentes pero no se retornan
+        return {f: value for f, value in fresh.items() if value is not None}
+
+    def resolve_alias(self, name: str, lat: float, lon: float) -> Optional[str]:
+        """place_id previamente asociado a este nombre + coordenadas"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT place_id FROM place_aliases WHERE alias = ? AND expires_at >= ?",
+                (place_alias(name, lat, lon), time.time())
+            ).fetchone()
+        if row:
+            self.stats['alias_hits'] += 1
+        return row[0] if row else None
+
+    # ========================================================================
+    # ESCRITURA
+    # ========================================================================
+
+    def merge(self, place_id: str, data: Dict[str, Any], source: str,
+              fields: Optional[Iterable[str]] = None, complete: bool = False) -> int:
+        """
+        Fusionar campos de una respuesta de Google en el caché (transaccional)
+
+        Args:
+            fields: Solo fusionar estos campos (None = todos los presentes)
+            complete: La respuesta cubre todos los `fields` pedidos; los ausentes
+                se guardan como null para no volver a pedirlos hasta su TTL
+
+        Returns:
+            Número de campos escritos
+        """
+        if not place_id or not data:
+            return 0
+        now = time.time()
+        if complete and fields is not None:
+            values = {field: data.get(field) for field in fields}
+        else:
+            allowed = set(fields) if fields is not None else None
+            values = {
+                field: value for field, value in data.items()
+                if value is not None and (allowed is None or field in allowed)
+            }
+        if not values:
+            return 0
+
+        rows = [
+            (place_id, field, json.dumps(value, separators=(',', ':')), source, now,
+             now + FIELD_TTL_S.get(field, DEFAULT_FIELD_TTL_S))
+            for field, value in values.items()
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO place_fields (place_id, field, value, source, fetched_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(place_id, field) DO UPDATE SET "
+                    "value=excluded.value, source=excluded.source, fetched_at=excluded.fetched_at, "
+                    "expires_at=excluded.expires_at WHERE excluded.fetched_at >= place_fields.fetched_at",
+                    rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        cached = self._memory.get(place_id)
+        if cached is not None:
+            for _, field, _, _, _, expires_at in rows:
+                cached[field] = (values[field], expires_at)
+        self.stats['fields_merged'] += len(rows)
+        return len(rows)
+
+    def merge_nearby_results(self, results: List[Dict[str, Any]]) -> int:
+        """Fusionar resultados crudos de Nearby Search (solo campos completos)"""
+        merged = 0
+        for result in results:
+            try:
+                merged += self.merge(result.get('place_id'), result, source='nearby', fields=NEARBY_FIELDS)
+            except Exception as e:
+                logger.debug(f"No se pudo cachear resultado nearby: {e}")
+        return merged
+
+    def remember_alias(self, name: str, lat: float, lon: float, place_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO place_aliases (alias, place_id, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(alias) DO UPDATE SET place_id=excluded.place_id, expires_at=excluded.expires_at",
+                (place_alias(name, lat, lon), place_id, time.time() + ALIAS_TTL_S)
+            )
+
+    def purge_expired(self) -> int:
+        """Eliminar campos y alias expirados"""
+        now = time.time()
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM place_fields WHERE expires_at < ?", (now,)).rowcount
+            self._conn.execute("DELETE FROM place_aliases WHERE expires_at < ?", (now,))
+        self._memory.clear()
+        return deleted
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            places, fields = self._conn.execute(
+                "SELECT COUNT(DISTINCT place_id), COUNT(*) FROM place_fields"
+            ).fetchone()
+        return {**self.stats, 'places': places, 'fields': fields, 'memory_entries': len(self._memory)}
+
+# Instancia global
+_place_details_cache: Optional[PlaceDetailsCache] = None
+
+def get_place_details_cache() -> PlaceDetailsCache:
+    """Obtener el caché global de detalles de lugares"""
+    global _place_details_cache
+    if _place_details_cache is None:
+        _place_details_cache = PlaceDetailsCache()
+    return _place_details_cache
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+🏷️ Place Label Resolver - Nombres visibles para coordenadas (etiquetas de transfers)
+Resuelve en lote, del más barato al más caro:
+
+1. Lugares y hoteles conocidos del itinerario (vecino más cercano, vectorizado)
+2. Índice de hoteles (base local + Google cacheados)
+3. Caché persistente de nombres por coordenadas redondeadas (memoria LRU + SQLite)
+4. Google Places (una búsqueda concurrente por coordenada aún sin nombre)
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Any
+
+import numpy as np
+
+from settings import settings
+from services.hotel_index import get_hotel_index
+from utils.geo_utils import haversine_matrix_km
+
+logger = logging.getLogger(__name__)
+
+# Un punto del itinerario coincide con un lugar conocido a menos de esta distancia
+KNOWN_PLACE_RADIUS_KM = 0.05
+# Hotel del índice considerado "el mismo lugar" (~0.01°)
+KNOWN_HOTEL_RADIUS_KM = 1.0
+
+# Nombres genéricos que no sirven como etiqueta
+_GENERIC_MARKERS = ('Lugar de interés',)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS place_labels (
+    coord_key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    source TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+def _is_generic(name: Optional[str]) -> bool:
+    return not name or name.startswith('Lat ') or any(marker in name for marker in _GENERIC_MARKERS)
+
+class PlaceNameCache:
+    """🏷️ Caché de nombres por coordenadas redondeadas (memoria LRU + SQLite)"""
+
+    def __init__(self, db_path: Optional[Path] = None, ttl_s: Optional[float] = None,
+                 max_memory_entries: int = 20000):
+        self.db_path = Path(db_path or settings.PLACE_LABEL_CACHE_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_s = ttl_s or settings.PLACE_LABEL_TTL_DAYS * 24 * 3600
+        self.decimals = settings.PLACE_LABEL_COORD_DECIMALS
+        self.max_memory_entries = max_memory_entries
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+        # coord_key → (nombre, expires_at)
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0}
+
+    def key_for(self, lat: float, lon: float) -> str:
+        return f"{lat:.{self.decimals}f},{lon:.{self.decimals}f}"
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, str]:
+        """Nombres vigentes para las claves pedidas (una sola consulta SQL para las que no están en memoria)"""
+        now = time.time()
+        found: Dict[str, str] = {}
+        pending = []
+        for key in keys:
+            cached = self._memory.get(key)
+            if cached is None:
+                pending.append(key)
+            elif cached[1] >= now:
+                self._memory.move_to_end(key)
+                found[key] = cached[0]
+
+        if pending:
+            placeholders = ','.join('?' * len(pending))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT coord_key, name, expires_at FROM place_labels WHERE coord_key IN ({placeholders})",
+                    pending
+                ).fetchall()
+            for key, name, expires_at in rows:
+                self._remember(key, (name, expires_at))
+                if expires_at >= now:
+                    found[key] = name
+
+        self.stats['hits'] += len(found)
+        self.stats['misses'] += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, names: Dict[str, str], source: str = 'google'):
+        if not names:
+            return
+        expires_at = time.time() + self.ttl_s
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO place_labels (coord_key, name, source, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(coord_key) DO UPDATE SET name=excluded.name, source=excluded.source, "
+                "expires_at=excluded.expires_at",
+                [(key, name, source, expires_at) for key, name in names.items()]
+            )
+        for key, name in names.items():
+            self._remember(key, (name, expires_at))
+        self.stats['stores'] += len(names)
+
+    def _remember(self, key: str, value: Tuple[str, float]):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            persisted = self._conn.execute("SELECT COUNT(*) FROM place_labels").fetchone()[0]
+        total = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_rate_percentage': round(self.stats['hits'] / total * 100, 1) if total else 0.0,
+            'labels_persisted': persisted,
+            'coord_decimals': self.decimals
+        }
+
+class PlaceLabelResolver:
+    """
+    🏷️ Resolución de etiquetas para un itinerario
+
+    Uso:
+        resolver = PlaceLabelResolver(places_service)
+        resolver.add_known(cluster.places + [cluster.home_base])
+        await resolver.prefetch(points)            # todos los extremos de transfers del día
+        name = await resolver.resolve(point)       # None si nadie sabe el nombre
+    """
+
+    def __init__(self, places_service=None, name_cache: Optional[PlaceNameCache] = None):
+        self.places_service = places_service
+        self.name_cache = name_cache or get_place_name_cache()
+        self._known_names: List[str] = []
+        self._known_coords: List[Tuple[float, float]] = []
+        self._known_array: Optional[np.ndarray] = None
+        # Resueltos en este itinerario (incluye None: no volver a consultar)
+        self._resolved: Dict[str, Optional[str]] = {}
+        self.stats = {'known': 0, 'hotel_index': 0, 'name_cache': 0, 'places_api': 0, 'unresolved': 0}
+
+    def add_known(self, places: Iterable[Optional[Dict]]):
+        """Registrar lugares/hoteles del itinerario (dicts con name, lat, lon)"""
+        for place in places:
+            if not place or not place.get('name') or place.get('lat') is None or place.get('lon') is None:
+                continue
+            self._known_names.append(place['name'])
+            self._known_coords.append((float(place['lat']), float(place['lon'])))
+            self._known_array = None
+
+    async def resolve(self, point: Tuple[float, float]) -> Optional[str]:
+        return (await self.resolve_many([point]))[0]
+
+    async def prefetch(self, points: Iterable[Optional[Tuple[float, float]]]):
+        await self.resolve_many([p for p in points if p is not None])
+
+    async def resolve_many(self, points: Sequence[Tuple[float, float]]) -> List[Optional[str]]:
+        """Etiquetas para varios puntos en un solo lote (alineadas con points)"""
+        keys = [self.name_cache.key_for(lat, lon) for lat, lon in points]
+        pending: Dict[str, Tuple[float, float]] = {}
+        for key, point in zip(keys, points):
+            if key not in self._resolved and key not in pending:
+                pending[key] = point
+
+        if pending:
+            self._resolve_local(pending)
+        if pending:
+            cached = self.name_cache.get_many(list(pending))
+            for key, name in cached.items():
+                self._resolved[key] = name
+                del pending[key]
+            self.stats['name_cache'] += len(cached)
+        if pending:
+            await self._resolve_with_places(pending)
+
+        return [self._resolved.get(key) for key in keys]
+
+    def _resolve_local(self, pending: Dict[str, Tuple[float, float]]):
+        """Lugares conocidos del itinerario y luego índice de hoteles (sin I/O)"""
+        keys = list(pending)
+        coords = np.array([pending[key] for key in keys], dtype=float)
+
+        if self._known_coords:
+            if self._known_array is None:
+                self._known_array = np.array(self._known_coords, dtype=float)
+            distances = haversine_matrix_km(coords, self._known_array)
+            nearest = distances.argmin(axis=1)
+            for row, key in enumerate(keys):
+                if distances[row, nearest[row]] <= KNOWN_PLACE_RADIUS_KM:
+                    self._resolved[key] = self._known_names[nearest[row]]
+                    del pending[key]
+                    self.stats['known'] += 1
+
+        hotel_index = get_hotel_index()
+        for key in list(pending):
+            match = hotel_index.nearest(*pending[key])
+            if match is not None and match[1] <= KNOWN_HOTEL_RADIUS_KM:
+                self._resolved[key] = match[0]['name']
+                del pending[key]
+                self.stats['hotel_index'] += 1
+
+    async def _resolve_with_places(self, pending: Dict[str, Tuple[float, float]]):
+        """Una búsqueda de Places concurrente por coordenada sin nombre; persiste solo nombres reales"""
+        if self.places_service is None:
+            for key in pending:
+                self._resolved[key] = None
+            self.stats['unresolved'] += len(pending)
+            return
+
+        results = await asyncio.gather(*(self._lookup_name(*point) for point in pending.values()),
+                                       return_exceptions=True)
+        to_persist = {}
+        for key, result in zip(pending, results):
+            if isinstance(result, Exception):
+                logger.warning(f"⚠️ No se pudo obtener nombre del lugar: {result}")
+                result = (None, False)
+            name, real = result
+            self._resolved[key] = name
+            if name is None:
+                self.stats['unresolved'] += 1
+                continue
+            self.stats['places_api'] += 1
+            if real:
+                to_persist[key] = name
+        self.name_cache.put_many(to_persist)
+
+    async def _lookup_name(self, lat: float, lon: float) -> Tuple[Optional[str], bool]:
+        """(nombre, es_real): punto de interés a 1km y, si es genérico, alojamiento a 500m"""
+        nearby = await self.places_service.search_nearby(
+            lat=lat, lon=lon, types=['point_of_interest', 'establishment'], radius_m=1000, limit=1
+        )
+        if nearby and not _is_generic(nearby[0].get('name')):
+            return nearby[0]['name'], not nearby[0].get('synthetic', False)
+
+        hotels = await self.places_service.search_nearby(
+            lat=lat, lon=lon, types=['lodging', 'accommodation'], radius_m=500, limit=1
+        )
+        if hotels and hotels[0].get('name'):
+            return hotels[0]['name'], not hotels[0].get('synthetic', False)
+        return None, False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'known_places': len(self._known_names), 'resolved': len(self._resolved)}
+
+# Instancia global del caché persistente
+_place_name_cache: Optional[PlaceNameCache] = None
+
+def get_place_name_cache() -> PlaceNameCache:
+    """Obtener el caché global de nombres por coordenadas"""
+    global _place_name_cache
+    if _place_name_cache is None:
+        _place_name_cache = PlaceNameCache()
+    return _place_name_cache
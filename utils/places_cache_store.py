@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+🗄️ PLACES CACHE STORE
+Almacenamiento en un solo archivo SQLite para el caché geográfico de Places
+
+Características:
+- Una fila por entrada, payload JSON comprimido con zlib
+- Índices por clave y por celda H3 (búsqueda espacial sin leer todo el caché)
+- Carga perezosa: los payloads solo se leen cuando una búsqueda los necesita
+- Escrituras transaccionales (WAL) seguras entre workers concurrentes
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Iterable
+
+import h3
+
+logger = logging.getLogger(__name__)
+
+# Resolución H3 del índice espacial (~8.5km de arista: disk-1 cubre radios de búsqueda de hasta ~7km)
+STORE_H3_RESOLUTION = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS places_cache (
+    key TEXT PRIMARY KEY,
+    h3_cell TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    radius REAL NOT NULL,
+    place_types TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_accessed REAL NOT NULL,
+    access_count INTEGER NOT NULL DEFAULT 0,
+    ttl REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    compressed INTEGER NOT NULL DEFAULT 1,
+    place_count INTEGER NOT NULL DEFAULT 0,
+    size_bytes INTEGER NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_places_cache_cell ON places_cache(h3_cell);
+CREATE INDEX IF NOT EXISTS idx_places_cache_expires ON places_cache(expires_at);
+CREATE TABLE IF NOT EXISTS legacy_imports (
+    file_name TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+"""
+
+_META_COLUMNS = ("key, h3_cell, lat, lon, radius, place_types, created_at, "
+                 "last_accessed, access_count, ttl, place_count, size_bytes")
+
+def store_cell(lat: float, lon: float) -> str:
+    """Celda H3 del índice espacial para una ubicación"""
+    return h3.latlng_to_cell(lat, lon, STORE_H3_RESOLUTION)
+
+class PlacesCacheStore:
+    """
+    🗄️ Store SQLite de un solo archivo para entradas del caché de Places
+
+    Las filas de metadata (sin payload) se consultan por celda H3; el payload
+    comprimido se lee aparte con load_payload() solo cuando hay un hit.
+    """
+
+    def __init__(self, db_path: Path, compression: bool = True):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.compression = compression
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+    def _transaction(self, statements: Iterable[tuple]):
+        """Ejecutar varias sentencias en una sola transacción (BEGIN IMMEDIATE)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # ========================================================================
+    # LECTURA
+    # ========================================================================
+
+    def get_meta(self, key: str) -> Optional[Dict[str, Any]]:
+        """Metadata de una entrada por clave (sin payload)"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_META_COLUMNS} FROM places_cache WHERE key = ?", (key,)
+            ).fetchone()
+        return self._row_to_meta(row) if row else None
+
+    def get_meta_in_cells(self, cells: List[str]) -> List[Dict[str, Any]]:
+        """Metadata de todas las entradas indexadas en las celdas dadas"""
+        if not cells:
+            return []
+        placeholders = ",".join("?" for _ in cells)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_META_COLUMNS} FROM places_cache WHERE h3_cell IN ({placeholders})", list(cells)
+            ).fetchall()
+        return [self._row_to_meta(row) for row in rows]
+
+    def load_payload(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Leer y descomprimir el payload de una entrada"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT compressed, payload FROM places_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        raw = zlib.decompress(row["payload"]) if row["compressed"] else row["payload"]
+        return json.loads(raw.decode("utf-8"))
+
+    @staticmethod
+    def _row_to_meta(row: sqlite3.Row) -> Dict[str, Any]:
+        meta = dict(row)
+        meta["place_types"] = json.loads(meta["place_types"])
+        return meta
+
+    # ========================================================================
+    # ESCRITURA
+    # ========================================================================
+
+    def _upsert_statement(self, key: str, entry: Dict[str, Any]) -> tuple:
+        raw = json.dumps(entry["data"], separators=(",", ":")).encode("utf-8")
+        payload = zlib.compress(raw, 6) if self.compression else raw
+        lat, lon = entry["location"]
+        return (
+            "INSERT INTO places_cache (key, h3_cell, lat, lon, radius, place_types, created_at, "
+            "last_accessed, access_count, ttl, expires_at, compressed, place_count, size_bytes, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            # No pisar una entrada más nueva escrita por otro worker
+            "ON CONFLICT(key) DO UPDATE SET h3_cell=excluded.h3_cell, lat=excluded.lat, lon=excluded.lon, "
+            "radius=excluded.radius, place_types=excluded.place_types, created_at=excluded.created_at, "
+            "last_accessed=excluded.last_accessed, access_count=excluded.access_count, ttl=excluded.ttl, "
+            "expires_at=excluded.expires_at, compressed=excluded.compressed, place_count=excluded.place_count, "
+            "size_bytes=excluded.size_bytes, "
+            "payload=excluded.payload WHERE excluded.created_at >= places_cache.created_at",
+            (key, store_cell(lat, lon), lat, lon, entry["radius"], json.dumps(entry["place_types"]),
+             entry["created_at"], entry["last_accessed"], entry["access_count"], entry["ttl"],
+             entry["created_at"] + entry["ttl"], int(self.compression), len(entry["data"]), len(payload), payload)
+        )
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        """Guardar una entrada (dict con los campos de CacheEntry)"""
+        self._transaction([self._upsert_statement(key, entry)])
+
+    def put_many(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        """Guardar varias entradas en una sola transacción"""
+        if entries:
+            self._transaction([self._upsert_statement(key, entry) for key, entry in entries.items()])
+
+    def legacy_imports(self) -> Dict[str, float]:
+        """Archivos .json.gz legacy ya importados {nombre: mtime}"""
+        with self._lock:
+            rows = self._conn.execute("SELECT file_name, mtime FROM legacy_imports").fetchall()
+        return {row["file_name"]: row["mtime"] for row in rows}
+
+    def import_legacy(self, entries: Dict[str, Dict[str, Any]], files: Dict[str, float]) -> None:
+        """Importar entradas legacy y registrar sus archivos en la misma transacción"""
+        self._transaction(
+            [self._upsert_statement(key, entry) for key, entry in entries.items()] +
+            [("INSERT INTO legacy_imports (file_name, mtime) VALUES (?, ?) "
+              "ON CONFLICT(file_name) DO UPDATE SET mtime=excluded.mtime", (name, mtime))
+             for name, mtime in files.items()]
+        )
+
+    def touch_many(self, access: Dict[str, tuple]) -> None:
+        """Persistir estadísticas de acceso {key: (last_accessed, access_count)}"""
+        if access:
+            self._transaction([
+                ("UPDATE places_cache SET last_accessed = MAX(last_accessed, ?), "
+                 "access_count = MAX(access_count, ?) WHERE key = ?", (last, count, key))
+                for key, (last, count) in access.items()
+            ])
+
+    def delete_many(self, keys: List[str]) -> None:
+        if keys:
+            self._transaction([("DELETE FROM places_cache WHERE key = ?", (key,)) for key in keys])
+
+    def get_eviction_candidates(self) -> List[Dict[str, Any]]:
+        """Metadata mínima de todas las entradas para puntuar la evicción"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, access_count, last_accessed, created_at, ttl, size_bytes FROM places_cache"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_expired(self, now: Optional[float] = None) -> List[str]:
+        """Eliminar entradas expiradas; retorna sus claves"""
+        now = now or time.time()
+        with self._lock:
+            keys = [row["key"] for row in self._conn.execute(
+                "SELECT key FROM places_cache WHERE expires_at < ?", (now,)
+            ).fetchall()]
+        self.delete_many(keys)
+        return keys
+
+    def delete_older_than(self, cutoff_created_at: float) -> List[str]:
+        with self._lock:
+            keys = [row["key"] for row in self._conn.execute(
+                "SELECT key FROM places_cache WHERE created_at < ?", (cutoff_created_at,)
+            ).fetchall()]
+        self.delete_many(keys)
+        return keys
+
+    def clear(self) -> int:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM places_cache").fetchone()[0]
+        self._transaction([("DELETE FROM places_cache", ())])
+        return count
+
+    # ========================================================================
+    # ESTADÍSTICAS
+    # ========================================================================
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Conteos agregados sin leer payloads"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) AS entries, COALESCE(SUM(place_count), 0) AS places, "
+                "COALESCE(SUM(size_bytes), 0) AS payload_bytes, "
+                "COALESCE(AVG(access_count), 0) AS avg_access, "
+                "COALESCE(AVG(MAX(expires_at - ?, 0)), 0) AS avg_ttl_remaining "
+                "FROM places_cache", (time.time(),)
+            ).fetchone()
+        return dict(row)
+
+    def file_size_bytes(self) -> int:
+        """Tamaño en disco (base + WAL)"""
+        total = 0
+        for suffix in ("", "-wal"):
+            path = Path(str(self.db_path) + suffix)
+            if path.exists():
+                total += path.stat().st_size
+        return total
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
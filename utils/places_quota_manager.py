@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+💰 Places Quota Manager - Presupuesto diario de Google Places con degradación
+Cada llamada a Google consume unidades de costo según su endpoint contra un
+presupuesto móvil de 24h. Cuando el presupuesto se agota, las prioridades bajas
+dejan de llamar a Google (caché / sintéticos) para reservar cuota al itinerario.
+
+Prioridades (de mayor a menor):
+    CORE (itinerario) > HOTEL (búsqueda de hoteles) > FREE_BLOCK (bloques libres) > LAZY (sugerencias diferidas)
+
+La prioridad se propaga con un ContextVar: el código que llama a Google no
+necesita recibirla como parámetro.
+
+Uso:
+    with quota_priority(QuotaPriority.FREE_BLOCK):
+        await planner.plan(...)
+
+    get_quota_manager().consume('nearby_search')   # lanza QuotaExceededError si se recorta
+"""
+
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Dict, Any, Optional
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+WINDOW_S = 24 * 3600
+BUCKET_S = 60  # Gasto agregado por minuto (memoria acotada)
+
+class QuotaExceededError(Exception):
+    """API quota exceeded"""
+    pass
+
+class QuotaPriority(IntEnum):
+    """Clases de prioridad (menor valor = más importante)"""
+    CORE = 0
+    HOTEL = 1
+    FREE_BLOCK = 2
+    LAZY = 3
+
+# Unidades de costo por endpoint (≈ USD por 1000 requests de Google Maps Platform)
+ENDPOINT_COST_UNITS = {
+    'nearby_search': 32,
+    'text_search': 32,
+    'place_details': 17,
+    'geocode': 5,
+}
+DEFAULT_COST_UNITS = 32
+
+_current_priority: ContextVar[QuotaPriority] = ContextVar("places_quota_priority", default=QuotaPriority.CORE)
+
+@contextmanager
+def quota_priority(priority: QuotaPriority):
+    """Ejecutar un bloque (y las tareas que cree) con la prioridad dada"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+def current_priority() -> QuotaPriority:
+    return _current_priority.get()
+
+class PlacesQuotaManager:
+    """💰 Contabilidad de cuota con presupuesto móvil de 24h y recorte por prioridad"""
+
+    def __init__(self, daily_budget_units: Optional[float] = None,
+                 reserve_fractions: Optional[Dict[QuotaPriority, float]] = None,
+                 enabled: Optional[bool] = None):
+        self.daily_budget_units = daily_budget_units or settings.PLACES_DAILY_QUOTA_UNITS
+        self.enabled = settings.PLACES_QUOTA_ENABLED if enabled is None else enabled
+        # Fracción del presupuesto que debe quedar libre para que la prioridad pueda gastar
+        self.reserve_fractions = reserve_fractions or {
+            QuotaPriority.CORE: 0.0,
+            QuotaPriority.HOTEL: settings.PLACES_QUOTA_RESERVE_HOTEL,
+            QuotaPriority.FREE_BLOCK: settings.PLACES_QUOTA_RESERVE_FREE_BLOCK,
+            QuotaPriority.LAZY: settings.PLACES_QUOTA_RESERVE_LAZY,
+        }
+
+        self._buckets: deque = deque()  # [(minute_start, units)]
+        self._spent_window = 0.0
+        self.calls = {p.name.lower(): 0 for p in QuotaPriority}
+        self.shed = {p.name.lower(): 0 for p in QuotaPriority}
+        self.units_by_endpoint: Dict[str, float] = {}
+
+    def _prune(self, now: float):
+        while self._buckets and self._buckets[0][0] <= now - WINDOW_S:
+            _, units = self._buckets.popleft()
+            self._spent_window -= units
+
+    def spent_units(self) -> float:
+        """Unidades gastadas en las últimas 24h"""
+        self._prune(time.time())
+        return max(self._spent_window, 0.0)
+
+    def remaining_units(self) -> float:
+        return max(self.daily_budget_units - self.spent_units(), 0.0)
+
+    def allows(self, endpoint: str, priority: Optional[QuotaPriority] = None) -> bool:
+        """¿Puede la prioridad gastar en este endpoint sin invadir la reserva de las superiores?"""
+        if not self.enabled:
+            return True
+        priority = current_priority() if priority is None else priority
+        cost = ENDPOINT_COST_UNITS.get(endpoint, DEFAULT_COST_UNITS)
+        reserve = self.reserve_fractions.get(priority, 0.0) * self.daily_budget_units
+        return self.remaining_units() - cost >= reserve
+
+    def consume(self, endpoint: str, priority: Optional[QuotaPriority] = None) -> float:
+        """
+        Registrar una llamada a Google antes de enviarla
+
+        Raises:
+            QuotaExceededError: si la prioridad actual debe degradarse (la llamada no se registra)
+
+        Returns:
+            Unidades consumidas
+        """
+        priority = current_priority() if priority is None else priority
+        if not self.allows(endpoint, priority):
+            self.shed[priority.name.lower()] += 1
+            logger.info(f"💰 Cuota Places: recortada llamada {endpoint} ({priority.name}), "
+                        f"quedan {self.remaining_units():.0f}/{self.daily_budget_units:.0f} unidades")
+            raise QuotaExceededError(f"Places quota reserved for higher priorities ({priority.name}, {endpoint})")
+
+        cost = ENDPOINT_COST_UNITS.get(endpoint, DEFAULT_COST_UNITS)
+        minute = int(time.time() // BUCKET_S) * BUCKET_S
+        if self._buckets and self._buckets[-1][0] == minute:
+            self._buckets[-1][1] += cost
+        else:
+            self._buckets.append([minute, cost])
+        self._spent_window += cost
+        self.calls[priority.name.lower()] += 1
+        self.units_by_endpoint[endpoint] = self.units_by_endpoint.get(endpoint, 0) + cost
+        return cost
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas de cuota: presupuesto restante, llamadas y recortes por prioridad"""
+        remaining = self.remaining_units()
+        return {
+            'enabled': self.enabled,
+            'daily_budget_units': self.daily_budget_units,
+            'spent_units_24h': round(self.spent_units(), 1),
+            'remaining_units': round(remaining, 1),
+            'remaining_percentage': round(remaining / self.daily_budget_units * 100, 1) if self.daily_budget_units else 0.0,
+            'calls_by_priority': dict(self.calls),
+            'shed_by_priority': dict(self.shed),
+            'units_by_endpoint': dict(self.units_by_endpoint),
+            'degraded_priorities': [
+                p.name.lower() for p in QuotaPriority
+                if self.enabled and not self.allows('nearby_search', p)
+            ]
+        }
+
+# Instancia global
+_quota_manager: Optional[PlacesQuotaManager] = None
+
+def get_quota_manager() -> PlacesQuotaManager:
+    """Obtener el gestor global de cuota de Places"""
+    global _quota_manager
+    if _quota_manager is None:
+        _quota_manager = PlacesQuotaManager()
+    return _quota_manager
@@ -0,0 +1,236 @@
+"""
+🗺️ POI Clustering Engine - DBSCAN haversine acelerado con BallTree
+- Un BallTree y un grafo de vecinos por conjunto de coordenadas, reutilizado
+  para todos los eps que se prueben (el grafo se consulta al eps máximo y se filtra)
+- Memoización por hash canónico de coordenadas redondeadas + eps + min_samples
+- Centroides y radios por cluster calculados vectorizados
+"""
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple, Iterable
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from sklearn.cluster import DBSCAN
+from sklearn.neighbors import BallTree
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+COORD_DECIMALS = 6  # ~0.1m: redondeo para el hash canónico
+
+@dataclass(frozen=True)
+class ClusteringResult:
+    """
+    Resultado compacto respaldado por arrays (sin copiar los lugares)
+
+    Los miembros de cada cluster están contiguos en `order`:
+    members(k) = order[offsets[k]:offsets[k + 1]] para el k-ésimo cluster de `cluster_labels`.
+    """
+    labels: np.ndarray          # (N,) label DBSCAN por punto, -1 = ruido
+    cluster_labels: np.ndarray  # (K,) labels no-ruido en orden de primera aparición
+    label_position: np.ndarray  # (max_label + 1,) label → k
+    order: np.ndarray           # (M,) índices de puntos no-ruido agrupados por cluster
+    offsets: np.ndarray         # (K + 1,)
+    centroids: np.ndarray       # (K, 2) media de (lat, lon)
+    radii_km: np.ndarray        # (K,) distancia máxima de un miembro al centroide
+    eps_km: float
+    min_samples: int
+
+    @property
+    def n_clusters(self) -> int:
+        return len(self.cluster_labels)
+
+    @property
+    def noise_indices(self) -> np.ndarray:
+        return np.flatnonzero(self.labels == -1)
+
+    def members(self, label: int) -> np.ndarray:
+        k = self.label_position[label]
+        return self.order[self.offsets[k]:self.offsets[k + 1]]
+
+    def centroid(self, label: int) -> Tuple[float, float]:
+        lat, lon = self.centroids[self.label_position[label]]
+        return float(lat), float(lon)
+
+    def radius_km(self, label: int) -> float:
+        return float(self.radii_km[self.label_position[label]])
+
+    def groups_in_input_order(self) -> Iterable[Tuple[object, np.ndarray]]:
+        """
+        (label, índices) en orden de primera aparición; cada punto de ruido
+        es su propio grupo con label 'noise_{i}'
+        """
+        emitted = set()
+        for i, label in enumerate(self.labels.tolist()):
+            if label == -1:
+                yield f"noise_{i}", np.array([i])
+            elif label not in emitted:
+                emitted.add(label)
+                yield label, self.members(label)
+
+def _haversine_to_points_km(coords: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Distancia haversine fila a fila entre coords (N, 2) y centers (N, 2)"""
+    lat1, lon1 = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    lat2, lon2 = np.radians(centers[:, 0]), np.radians(centers[:, 1])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def _build_result(coords: np.ndarray, labels: np.ndarray, eps_km: float, min_samples: int) -> ClusteringResult:
+    """Agrupar miembros y calcular centroides/radios sin bucles por cluster"""
+    clustered = np.flatnonzero(labels >= 0)
+    # Labels en orden de primera aparición (igual que iterar los puntos en orden)
+    unique, first_seen = np.unique(labels[clustered], return_index=True)
+    cluster_labels = unique[np.argsort(first_seen, kind="stable")]
+
+    position = np.empty(unique.max() + 1 if len(unique) else 0, dtype=np.int64)
+    position[cluster_labels] = np.arange(len(cluster_labels))
+    point_cluster = position[labels[clustered]]
+
+    order = clustered[np.argsort(point_cluster, kind="stable")]
+    sizes = np.bincount(point_cluster, minlength=len(cluster_labels))
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+
+    centroids = np.zeros((len(cluster_labels), 2))
+    if len(cluster_labels):
+        centroids[:, 0] = np.bincount(point_cluster, weights=coords[clustered, 0]) / sizes
+        centroids[:, 1] = np.bincount(point_cluster, weights=coords[clustered, 1]) / sizes
+
+    radii = np.zeros(len(cluster_labels))
+    if len(clustered):
+        distances = _haversine_to_points_km(coords[clustered], centroids[point_cluster])
+        np.maximum.at(radii, point_cluster, distances)
+
+    for array in (labels, cluster_labels, position, order, offsets, centroids, radii):
+        array.flags.writeable = False
+    return ClusteringResult(labels=labels, cluster_labels=cluster_labels, label_position=position,
+                            order=order, offsets=offsets, centroids=centroids, radii_km=radii,
+                            eps_km=eps_km, min_samples=min_samples)
+
+class _NeighborGraph:
+    """
+    BallTree de un conjunto de coordenadas + vecinos consultados al mayor eps pedido
+    (un eps menor filtra el grafo existente; uno mayor reconsulta el mismo árbol)
+    """
+
+    def __init__(self, coords: np.ndarray):
+        self.n = len(coords)
+        self.radians = np.radians(coords)
+        self.tree = BallTree(self.radians, metric="haversine")
+        self.max_eps_km = -1.0
+
+    def ensure(self, eps_km: float):
+        if eps_km <= self.max_eps_km:
+            return
+        # Filas ordenadas por distancia: DBSCAN(metric='precomputed') no necesita reordenar el grafo
+        indices, distances = self.tree.query_radius(self.radians, r=eps_km / EARTH_RADIUS_KM,
+                                                    return_distance=True, sort_results=True)
+        self.indptr = np.concatenate(([0], np.cumsum([len(row) for row in indices])))
+        self.indices = np.concatenate(indices)
+        self.distances = np.concatenate(distances) * EARTH_RADIUS_KM
+        self.max_eps_km = eps_km
+
+    def sparse_within(self, eps_km: float) -> csr_matrix:
+        """Grafo de distancias (km) restringido a eps_km"""
+        keep = self.distances <= eps_km
+        row_lengths = np.add.reduceat(keep.astype(np.int64), self.indptr[:-1])
+        indptr = np.concatenate(([0], np.cumsum(row_lengths)))
+        # Distancia 0 (duplicados/diagonal) como entrada explícita: sigue siendo vecino
+        return csr_matrix((self.distances[keep], self.indices[keep], indptr), shape=(self.n, self.n))
+
+class POIClusteringEngine:
+    """
+    🗺️ DBSCAN haversine con BallTree reutilizable y memoización
+
+    Uso:
+        engine = get_poi_clustering_engine()
+        result = engine.fit(coords, eps_km=8.0)
+        for label, indices in result.groups_in_input_order(): ...
+    """
+
+    def __init__(self, max_results: int = 256, max_graphs: int = 64):
+        self.max_results = max_results
+        self.max_graphs = max_graphs
+        self._results: "OrderedDict[tuple, ClusteringResult]" = OrderedDict()
+        self._graphs: "OrderedDict[str, _NeighborGraph]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "graphs_built": 0, "fit_time_ms": 0.0}
+
+    @staticmethod
+    def coords_key(coords: np.ndarray) -> str:
+        """Hash canónico de coordenadas redondeadas (mismo orden = misma clave)"""
+        rounded = np.ascontiguousarray(np.round(coords, COORD_DECIMALS) + 0.0)
+        return hashlib.sha1(rounded.tobytes() + str(rounded.shape).encode()).hexdigest()
+
+    def _graph(self, key: str, coords: np.ndarray, eps_km: float) -> _NeighborGraph:
+        graph = self._graphs.get(key)
+        if graph is None:
+            graph = _NeighborGraph(coords)
+            self._graphs[key] = graph
+            self.stats["graphs_built"] += 1
+            while len(self._graphs) > self.max_graphs:
+                self._graphs.popitem(last=False)
+        self._graphs.move_to_end(key)
+        graph.ensure(eps_km)
+        return graph
+
+    def fit(self, coords: np.ndarray, eps_km: float, min_samples: Optional[int] = None) -> ClusteringResult:
+        """
+        DBSCAN haversine sobre (N, 2) coordenadas (lat, lon) en grados
+
+        Returns:
+            ClusteringResult memoizado (arrays de solo lectura)
+        """
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        min_samples = settings.CLUSTER_MIN_SAMPLES if min_samples is None else min_samples
+        key = self.coords_key(coords)
+        memo_key = (key, round(float(eps_km), 6), int(min_samples))
+
+        cached = self._results.get(memo_key)
+        if cached is not None:
+            self._results.move_to_end(memo_key)
+            self.stats["hits"] += 1
+            return cached
+
+        self.stats["misses"] += 1
+        start = time.perf_counter()
+        if len(coords) == 0:
+            labels = np.empty(0, dtype=np.int64)
+        else:
+            graph = self._graph(key, coords, eps_km).sparse_within(eps_km)
+            if min_samples <= 1:
+                # Todos los puntos son núcleo: DBSCAN = componentes conexas (mismo orden de labels)
+                _, labels = connected_components(graph, directed=False)
+            else:
+                labels = DBSCAN(eps=eps_km, min_samples=min_samples, metric="precomputed").fit(graph).labels_
+        result = _build_result(coords, np.asarray(labels, dtype=np.int64), float(eps_km), int(min_samples))
+        self.stats["fit_time_ms"] += (time.perf_counter() - start) * 1000
+
+        self._results[memo_key] = result
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+        return result
+
+    def get_stats(self) -> Dict[str, float]:
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "memoized_results": len(self._results),
+            "hit_rate": round(self.stats["hits"] / total, 3) if total else 0.0
+        }
+
+# Instancia global
+_engine: Optional[POIClusteringEngine] = None
+
+def get_poi_clustering_engine() -> POIClusteringEngine:
+    """Obtener el motor de clustering compartido"""
+    global _engine
+    if _engine is None:
+        _engine = POIClusteringEngine()
+    return _engine
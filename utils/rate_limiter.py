@@ -0,0 +1,70 @@
+"""
+🚦 Rate limiter token bucket para APIs externas
+Un bucket global por API key, compartido por todos los clientes del proceso
+"""
+
+import asyncio
+import time
+from typing import Dict, Any, Optional
+
+from settings import settings
+
+class TokenBucket:
+    """Token bucket asíncrono: `rate` tokens/seg con ráfagas hasta `capacity`"""
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = max(rate, 0.001)
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.stats = {"acquired": 0, "throttled": 0, "wait_time_s": 0.0}
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    async def acquire(self, tokens: float = 1.0):
+        """Esperar hasta tener `tokens` disponibles"""
+        async with self._lock:
+            self._refill()
+            if self.tokens < tokens:
+                wait_s = (tokens - self.tokens) / self.rate
+                self.stats["throttled"] += 1
+                self.stats["wait_time_s"] += wait_s
+                await asyncio.sleep(wait_s)
+                self._refill()
+            self.tokens -= tokens
+            self.stats["acquired"] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "rate_per_s": self.rate,
+            "capacity": self.capacity,
+            "tokens_available": round(self.tokens, 2)
+        }
+
+# Buckets globales por API key
+_buckets: Dict[str, TokenBucket] = {}
+
+def get_api_rate_limiter(api_key: Optional[str], rate: Optional[float] = None,
+                         capacity: Optional[int] = None) -> TokenBucket:
+    """Obtener (o crear) el token bucket de una API key"""
+    key = api_key or "anonymous"
+    bucket = _buckets.get(key)
+    if bucket is None:
+        bucket = TokenBucket(
+            rate=rate or settings.GOOGLE_PLACES_QPS,
+            capacity=capacity or settings.GOOGLE_PLACES_BURST
+        )
+        _buckets[key] = bucket
+    return bucket
+
+def get_rate_limiter_stats() -> Dict[str, Any]:
+    """Estadísticas de todos los buckets (API keys enmascaradas)"""
+    return {
+        (f"...{key[-4:]}" if len(key) > 4 else key): bucket.get_stats()
+        for key, bucket in _buckets.items()
+    }
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+🧭 Reverse Geocode Cache - Una resolución de ciudad por celda H3
+Todos los puntos de una misma celda (res 7 por defecto, ~5km²) comparten la
+respuesta de reverse geocoding. Persistido en SQLite entre reinicios.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Any
+
+import h3
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reverse_geocode (
+    cell TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+class ReverseGeocodeCache:
+    """🧭 Caché de reverse geocoding por celda H3 (memoria LRU + SQLite)"""
+
+    def __init__(self, db_path: Optional[Path] = None, h3_resolution: Optional[int] = None,
+                 ttl_s: Optional[float] = None, max_memory_entries: int = 20000):
+        self.db_path = Path(db_path or settings.REVERSE_GEOCODE_CACHE_PATH)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.h3_resolution = h3_resolution if h3_resolution is not None else settings.REVERSE_GEOCODE_H3_RES
+        self.ttl_s = ttl_s or settings.REVERSE_GEOCODE_TTL_DAYS * 24 * 3600
+        self.max_memory_entries = max_memory_entries
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+        # cell → (resultado, expires_at)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0}
+
+    def cell_for(self, lat: float, lon: float) -> str:
+        return h3.latlng_to_cell(lat, lon, self.h3_resolution)
+
+    def get(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        """Resultado cacheado para la celda del punto (None si no hay o expiró)"""
+        cell = self.cell_for(lat, lon)
+        now = time.time()
+
+        cached = self._memory.get(cell)
+        if cached is None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT result, expires_at FROM reverse_geocode WHERE cell = ?", (cell,)
+                ).fetchone()
+            if row is not None:
+                cached = (json.loads(row[0]), row[1])
+                self._remember(cell, cached)
+
+        if cached is None or cached[1] < now:
+            self.stats['misses'] += 1
+            return None
+        self._memory.move_to_end(cell)
+        self.stats['hits'] += 1
+        return dict(cached[0])
+
+    def put(self, lat: float, lon: float, result: Dict[str, Any], source: str = 'google') -> None:
+        """Guardar el resultado para toda la celda del punto"""
+        cell = self.cell_for(lat, lon)
+        now = time.time()
+        expires_at = now + self.ttl_s
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO reverse_geocode (cell, result, source, created_at, expires_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(cell) DO UPDATE SET result=excluded.result, source=excluded.source, "
+                "created_at=excluded.created_at, expires_at=excluded.expires_at",
+                (cell, json.dumps(result, ensure_ascii=False), source, now, expires_at)
+            )
+        self._remember(cell, (dict(result), expires_at))
+        self.stats['stores'] += 1
+
+    def _remember(self, cell: str, value: tuple):
+        self._memory[cell] = value
+        self._memory.move_to_end(cell)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cells = self._conn.execute("SELECT COUNT(*) FROM reverse_geocode").fetchone()[0]
+        total = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_rate_percentage': round(self.stats['hits'] / total * 100, 1) if total else 0.0,
+            'cells_persisted': cells,
+            'h3_resolution': self.h3_resolution
+        }
+
+# Instancia global
+_reverse_geocode_cache: Optional[ReverseGeocodeCache] = None
+
+def get_reverse_geocode_cache() -> ReverseGeocodeCache:
+    """Obtener el caché global de reverse geocoding"""
+    global _reverse_geocode_cache
+    if _reverse_geocode_cache is None:
+        _reverse_geocode_cache = ReverseGeocodeCache()
+    return _reverse_geocode_cache
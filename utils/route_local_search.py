@@ -0,0 +1,184 @@
+"""
+🔁 Local search para rutas intra-cluster del optimizador legacy
+2-opt, Or-opt y relocate sobre una matriz de tiempos del día, aceptando
+solo movimientos que no empeoren las ventanas horarias preferidas.
+"""
+
+import time
+from typing import List, Tuple, Dict
+
+import numpy as np
+
+from settings import settings
+from utils.geo_utils import haversine_matrix_km
+
+# Ventanas preferidas por parada: lista de (inicio, fin) en minutos desde medianoche
+StopWindows = List[Tuple[int, int]]
+
+def build_time_matrix_minutes(coords: np.ndarray, transport_mode: str = "walk") -> np.ndarray:
+    """
+    Matriz de tiempos de viaje (minutos) coherente con la política de modos:
+    caminata hasta WALK_THRESHOLD_KM, transporte/auto sobre eso.
+
+    Args:
+        coords: Array (N, 2) de (lat, lon)
+        transport_mode: Modo solicitado por el usuario
+
+    Returns:
+        Array (N, N) de minutos (diagonal 0)
+    """
+    km = haversine_matrix_km(coords)
+    motorized_kmh = (
+        settings.CITY_SPEED_KMH_TRANSIT
+        if settings.TRANSIT_AVAILABLE and transport_mode in ("walk", "transit")
+        else settings.CITY_SPEED_KMH_DRIVE
+    )
+    speed = np.where(km <= settings.WALK_THRESHOLD_KM, settings.CITY_SPEED_KMH_WALK, motorized_kmh)
+    minutes = np.maximum(km / speed * 60.0, settings.MIN_TRAVEL_MIN)
+    np.fill_diagonal(minutes, 0.0)
+    return minutes
+
+def _schedule(path: np.ndarray, matrix: np.ndarray, durations: np.ndarray,
+              windows: List[StopWindows], start_time: int, day_end: int) -> Tuple[float, float]:
+    """
+    Simular el día sobre un camino [depot, paradas..., depot]
+
+    Returns:
+        (minutos_fuera_de_ventana, minutos_de_viaje)
+    """
+    current = float(start_time)
+    violation = 0.0
+    travel = 0.0
+    for pos in range(1, len(path) - 1):
+        leg = matrix[path[pos - 1], path[pos]]
+        travel += leg
+        current += leg
+        stop = path[pos]
+        duration = durations[stop]
+
+        # Misma regla que _find_best_time_slot: primera ventana donde quepa
+        best_start = None
+        for w_start, w_end in windows[stop]:
+            if current >= w_start and current + duration <= w_end:
+                best_start = current
+                break
+            if current < w_start and w_start + duration <= w_end:
+                best_start = float(w_start)
+                break
+        if best_start is None:
+            best_start = current
+            violation += min(
+                (max(0.0, current + duration - w_end) + max(0.0, w_start - current)
+                 for w_start, w_end in windows[stop]),
+                default=0.0
+            )
+        current = best_start + duration
+        violation += max(0.0, current - day_end)
+    travel += matrix[path[-2], path[-1]]
+    return violation, travel
+
+def _reverse(path: np.ndarray, i: int, j: int) -> np.ndarray:
+    """2-opt: invertir path[i..j]"""
+    return np.concatenate([path[:i], path[i:j + 1][::-1], path[j + 1:]])
+
+def _move_segment(path: np.ndarray, a: int, b: int, j: int) -> np.ndarray:
+    """Or-opt: mover path[a..b] entre path[j] y path[j+1]"""
+    segment = path[a:b + 1]
+    rest = np.concatenate([path[:a], path[b + 1:]])
+    insert_at = j + 1 if j < a else j + 1 - (b - a + 1)
+    return np.concatenate([rest[:insert_at], segment, rest[insert_at:]])
+
+def optimize_stop_order(matrix: np.ndarray,
+                        durations: List[int],
+                        windows: List[StopWindows],
+                        start_time: int,
+                        day_end: int,
+                        max_passes: int = 50) -> Tuple[List[int], Dict[str, float]]:
+    """
+    Mejorar el orden de paradas con 2-opt, Or-opt (segmentos 2-3) y relocate
+
+    La matriz incluye un depot en el último índice (hotel, o nodo de costo 0
+    si el día no parte desde un hotel). El orden inicial es el índice natural
+    de las paradas. Los deltas de viaje se calculan vectorizados y solo los
+    movimientos que mejoran se validan contra las ventanas horarias.
+
+    Args:
+        matrix: Tiempos (N+1, N+1) en minutos; índice N = depot
+        durations: Duración de cada parada (N)
+        windows: Ventanas preferidas de cada parada (N)
+        start_time: Minuto de salida del depot
+        day_end: Fin de la ventana diaria
+        max_passes: Límite de movimientos aceptados
+
+    Returns:
+        (orden de paradas, métricas de la búsqueda)
+    """
+    t0 = time.perf_counter()
+    n = len(durations)
+    depot = n
+    path = np.array([depot] + list(range(n)) + [depot], dtype=np.int64)
+    durations_arr = np.asarray(list(durations) + [0], dtype=float)
+    windows = list(windows) + [[]]
+
+    violation, travel = _schedule(path, matrix, durations_arr, windows, start_time, day_end)
+    initial_travel = travel
+    moves = {"two_opt": 0, "or_opt": 0, "relocate": 0}
+
+    for _ in range(max_passes):
+        candidates = []  # (delta, kind, builder)
+
+        # 2-opt: invertir path[i..j] (1 <= i < j <= n)
+        i_idx, j_idx = np.triu_indices(n + 1, k=1)
+        mask = (i_idx >= 1) & (j_idx <= n)
+        i_idx, j_idx = i_idx[mask], j_idx[mask]
+        if len(i_idx):
+            delta = (matrix[path[i_idx - 1], path[j_idx]] + matrix[path[i_idx], path[j_idx + 1]]
+                     - matrix[path[i_idx - 1], path[i_idx]] - matrix[path[j_idx], path[j_idx + 1]])
+            for k in np.nonzero(delta < -1e-9)[0]:
+                candidates.append((delta[k], "two_opt", (_reverse, int(i_idx[k]), int(j_idx[k]))))
+
+        # Or-opt / relocate: mover segmento path[i..i+L-1] entre path[j] y path[j+1]
+        for seg_len in (1, 2, 3):
+            if seg_len > n - 1:
+                break
+            starts = np.arange(1, n - seg_len + 2)
+            ends = starts + seg_len - 1
+            removal = (matrix[path[starts - 1], path[ends + 1]]
+                       - matrix[path[starts - 1], path[starts]]
+                       - matrix[path[ends], path[ends + 1]])
+            js = np.arange(0, n + 1)
+            S, J = np.meshgrid(np.arange(len(starts)), js, indexing="ij")
+            valid = (J < starts[S] - 1) | (J > ends[S])
+            insertion = (matrix[path[J], path[starts[S]]] + matrix[path[ends[S]], path[J + 1]]
+                         - matrix[path[J], path[J + 1]])
+            delta = np.where(valid, removal[S] + insertion, np.inf)
+            kind = "relocate" if seg_len == 1 else "or_opt"
+            for s, j in zip(*np.nonzero(delta < -1e-9)):
+                candidates.append((delta[s, j], kind, (_move_segment, int(starts[s]), int(ends[s]), int(j))))
+
+        if not candidates:
+            break
+
+        # Primer candidato (mejor delta) que no empeore las ventanas horarias
+        candidates.sort(key=lambda c: c[0])
+        accepted = False
+        for _, kind, (builder, *args) in candidates:
+            new_path = builder(path, *args)
+            new_violation, new_travel = _schedule(new_path, matrix, durations_arr, windows, start_time, day_end)
+            if new_violation <= violation + 1e-9 and new_travel < travel - 1e-9:
+                path, violation, travel = new_path, new_violation, new_travel
+                moves[kind] += 1
+                accepted = True
+                break
+        if not accepted:
+            break
+
+    order = [int(node) for node in path[1:-1]]
+    return order, {
+        "initial_travel_minutes": round(float(initial_travel), 1),
+        "optimized_travel_minutes": round(float(travel), 1),
+        "saved_minutes": round(float(initial_travel - travel), 1),
+        "window_violation_minutes": round(float(violation), 1),
+        "moves": moves,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2)
+    }
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+🗃️ Shared Cache - Cachés de proceso acotadas (TTL + LRU) compartidas entre servicios
+Los servicios multi-ciudad se instancian por request; sus resultados (clustering de
+ciudades, rutas intercity) viven aquí para que requests sucesivos los reutilicen.
+
+- Memoria: OrderedDict LRU con expiración por entrada y límite de entradas
+- Disco (opcional): SQLite compartido por namespace si SHARED_CACHE_DISK_PATH está definido
+  (los valores deben ser serializables a JSON)
+
+Uso:
+    cache = get_shared_cache('city_clustering')
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value)
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shared_cache (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+"""
+
+# Campos de un POI que definen su identidad para el fingerprint
+POI_FINGERPRINT_FIELDS = ('name', 'city', 'country')
+POI_COORD_DECIMALS = 5  # ~1m
+
+def poi_fingerprint(pois: Sequence[Dict], extra: Any = None) -> Tuple[str, List[int]]:
+    """
+    Huella canónica de un conjunto de POIs (independiente del orden)
+
+    Args:
+        pois: POIs con lat, lon y opcionalmente name/city/country
+        extra: Parámetros adicionales que afectan el resultado (configuración)
+
+    Returns:
+        (fingerprint, order): order[k] es el índice en `pois` del k-ésimo POI canónico,
+        para reconstruir resultados cacheados sobre los dicts del request actual
+    """
+    rows = [
+        (round(float(poi['lat']), POI_COORD_DECIMALS), round(float(poi['lon']), POI_COORD_DECIMALS),
+         *(str(poi.get(field) or '') for field in POI_FINGERPRINT_FIELDS))
+        for poi in pois
+    ]
+    order = sorted(range(len(rows)), key=rows.__getitem__)
+    payload = json.dumps([rows[i] for i in order] + [repr(extra)], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest(), order
+
+class _DiskTier:
+    """SQLite compartido por todos los namespaces"""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM shared_cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, namespace: str, key: str, value: Any, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO shared_cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(namespace, key) DO UPDATE SET value=excluded.value, expires_at=excluded.expires_at",
+                (namespace, key, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+
+    def purge_expired(self, namespace: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM shared_cache WHERE namespace = ? AND expires_at < ?", (namespace, time.time())
+            ).rowcount
+
+class BoundedTTLCache:
+    """🗃️ Caché LRU con TTL por entrada, thread-safe, con tier de disco opcional"""
+
+    def __init__(self, namespace: str, max_entries: int, ttl_s: float, disk: Optional[_DiskTier] = None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._disk = disk
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()  # key → (valor, expires_at)
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] >= now:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return entry[0]
+                del self._entries[key]
+                self.stats['expired'] += 1
+
+        if self._disk is not None:
+            stored = self._disk.get(self.namespace, key)
+            if stored is not None:
+                with self._lock:
+                    self._remember(key, stored)
+                    self.stats['disk_hits'] += 1
+                return stored[0]
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def set(self, key: str, value: Any, ttl_s: Optional[float] = None):
+        expires_at = time.time() + (self.ttl_s if ttl_s is None else ttl_s)
+        with self._lock:
+            self._remember(key, (value, expires_at))
+            self.stats['stores'] += 1
+        if self._disk is not None:
+            try:
+                self._disk.set(self.namespace, key, value, expires_at)
+            except (TypeError, ValueError, sqlite3.Error) as e:
+                logger.warning(f"⚠️ Shared cache '{self.namespace}': no se pudo persistir {key[:16]}: {e}")
+
+    def _remember(self, key: str, entry: Tuple[Any, float]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def purge_expired(self) -> int:
+        """Eliminar entradas expiradas (memoria y disco)"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._entries.items() if expires_at < now]
+            for key in expired:
+                del self._entries[key]
+            self.stats['expired'] += len(expired)
+        if self._disk is not None:
+            self._disk.purge_expired(self.namespace)
+        return len(expired)
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """Snapshot de las entradas vigentes en memoria (LRU → MRU)"""
+        now = time.time()
+        with self._lock:
+            return [(key, value) for key, (value, expires_at) in self._entries.items() if expires_at >= now]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats['hits'] + self.stats['disk_hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_s': self.ttl_s,
+            'disk_tier': self._disk is not None,
+            'hit_rate_percentage': round((self.stats['hits'] + self.stats['disk_hits']) / lookups * 100, 1) if lookups else 0.0
+        }
+
+# ============================================================================
+# Registro de cachés por namespace
+# ============================================================================
+
+def _namespace_limits() -> Dict[str, Tuple[int, float]]:
+    return {
+        'city_clustering': (settings.CLUSTERING_CACHE_MAX_ENTRIES, settings.CLUSTERING_CACHE_TTL_S),
+        'intercity_routes': (settings.INTERCITY_ROUTES_CACHE_MAX_ENTRIES, settings.INTERCITY_ROUTES_CACHE_TTL_S),
+        'intercity_cities': (settings.INTERCITY_ROUTES_CACHE_MAX_ENTRIES, settings.INTERCITY_ROUTES_CACHE_TTL_S),
+    }
+
+_caches: Dict[str, BoundedTTLCache] = {}
+_disk_tier: Optional[_DiskTier] = None
+_registry_lock = threading.Lock()
+
+def get_shared_cache(namespace: str) -> BoundedTTLCache:
+    """Obtener (o crear) la caché compartida del namespace"""
+    global _disk_tier
+    cache = _caches.get(namespace)
+    if cache is not None:
+        return cache
+
+    with _registry_lock:
+        if namespace not in _caches:
+            if _disk_tier is None and settings.SHARED_CACHE_DISK_PATH:
+                _disk_tier = _DiskTier(Path(settings.SHARED_CACHE_DISK_PATH))
+            max_entries, ttl_s = _namespace_limits().get(
+                namespace, (settings.CLUSTERING_CACHE_MAX_ENTRIES, settings.CLUSTERING_CACHE_TTL_S)
+            )
+            _caches[namespace] = BoundedTTLCache(namespace, max_entries, ttl_s, _disk_tier)
+        return _caches[namespace]
+
+def get_shared_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Métricas de todas las cachés compartidas creadas"""
+    return {namespace: cache.get_stats() for namespace, cache in _caches.items()}